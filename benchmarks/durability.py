@@ -0,0 +1,82 @@
+"""
+Measure the cost of each save durability policy.
+
+Trees of typical sizes are saved repeatedly as compact JSON with every
+policy of :py:data:`persistence.DURABILITY_POLICIES`; the figures reported
+are saves per second and the write throughput.  Results depend heavily on
+the file system and the disk behind ``--dir`` (a RAM-backed ``/tmp`` makes
+``fsync`` nearly free), so run it where the task file really lives.
+
+Usage:
+    python benchmarks/durability.py [--dir .] [--seconds 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from task import Task  # noqa: E402
+from persistence import DURABILITY_POLICIES, save_tasks_to_json  # noqa: E402
+
+# Number of projects, each with 20 items of 3 steps (about 16 kB of JSON)
+SIZES = {"small": 2, "medium": 50, "large": 1000}
+
+
+def build_tree(projects):
+    root = Task("Main")
+    for p in range(projects):
+        project = Task(f"Project {p}", priority=p % 5)
+        for i in range(20):
+            item = Task(
+                f"Item {i} of project {p}",
+                due_date=f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                priority=i % 5,
+                completed=i % 3 == 0,
+            )
+            for j in range(3):
+                item.add_sub_task(Task(f"Step {j} – {i}"))
+            project.add_sub_task(item)
+        root.add_sub_task(project)
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--dir", default=".", help="Directory on the file system to measure"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=2.0, help="Time spent per measurement"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = os.path.join(tmp, "tasks.json")
+        for label, projects in SIZES.items():
+            tree = build_tree(projects)
+            save_tasks_to_json(tree, path)
+            size_mb = os.path.getsize(path) / 2**20
+            print(f"{label} tree ({size_mb:.2f} MiB)")
+            for policy in DURABILITY_POLICIES:
+                count = 0
+                start = time.perf_counter()
+                while True:
+                    save_tasks_to_json(tree, path, durability=policy)
+                    count += 1
+                    elapsed = time.perf_counter() - start
+                    if elapsed >= args.seconds:
+                        break
+                print(
+                    f"  {policy:<20} {count / elapsed:9.1f} saves/s  "
+                    f"{count * size_mb / elapsed:8.1f} MiB/s  "
+                    f"{elapsed / count * 1000:8.2f} ms/save"
+                )
+
+
+if __name__ == "__main__":
+    main()
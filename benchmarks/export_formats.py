@@ -0,0 +1,93 @@
+"""
+Measure CSV or ICS export and import of a large task tree.
+
+The tree has projects of 20 items with 3 steps each (81 tasks per project)
+under a single root, i.e. tasks of depth 0 to 3.  The figures reported are
+the wall time and tasks per second of the ``save_tasks_to_<format>`` and
+``load_tasks_from_<format>`` functions of :py:mod:`persistence`, the file
+size and, with ``--memory``, the peak of Python allocations of each step in
+a separate run with ``tracemalloc`` (the peak of the import includes the
+tree it builds).  The default sizes are a million CSV rows and 100k VTODOs.
+
+Usage:
+    python benchmarks/export_formats.py [--format csv|ics] [--rows N] [--memory]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from task import Task  # noqa: E402
+import persistence  # noqa: E402
+
+ROWS_PER_PROJECT = 81
+DEFAULT_ROWS = {"csv": 1_000_000, "ics": 100_000}
+
+
+def build_tree(rows):
+    root = Task("Main")
+    for p in range(max(1, rows // ROWS_PER_PROJECT)):
+        project = Task(f"Project {p}", priority=p % 5)
+        for i in range(20):
+            item = Task(
+                f"Item {i} of project {p}",
+                due_date=f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                priority=i % 5,
+                completed=i % 3 == 0,
+            )
+            for j in range(3):
+                item.add_sub_task(Task(f"Step {j}, item {i}"))
+            project.add_sub_task(item)
+        root.add_sub_task(project)
+    return root
+
+
+def measure(label, func, rows, memory):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    line = f"{label:<8} {elapsed:6.2f} s  {rows / elapsed / 1000:7.0f}k tasks/s"
+    if memory:
+        result = None
+        tracemalloc.start()
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        line += f"  peak {peak / 2**20:7.1f} MiB"
+    print(line)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--format", choices=sorted(DEFAULT_ROWS), default="csv")
+    parser.add_argument("--rows", type=int, help="Number of tasks")
+    parser.add_argument(
+        "--memory", action="store_true", help="Also measure peak allocations"
+    )
+    args = parser.parse_args()
+
+    requested = args.rows or DEFAULT_ROWS[args.format]
+    save = getattr(persistence, f"save_tasks_to_{args.format}")
+    load = getattr(persistence, f"load_tasks_from_{args.format}")
+
+    root = build_tree(requested)
+    rows = 1 + max(1, requested // ROWS_PER_PROJECT) * ROWS_PER_PROJECT
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"tasks.{args.format}")
+        measure("export", lambda: save(root, path), rows, args.memory)
+        print(f"file     {os.path.getsize(path) / 2**20:6.1f} MiB, {rows} tasks")
+        loaded = measure(
+            "import", lambda: load(path, use_cache=False), rows, args.memory
+        )
+        assert len(loaded.get_sub_tasks()) == len(root.get_sub_tasks())
+
+
+if __name__ == "__main__":
+    main()
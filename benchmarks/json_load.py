@@ -0,0 +1,102 @@
+"""
+Compare the JSON loaders with a whole-file ``json.loads`` parse.
+
+A task file of roughly ``--size-mb`` megabytes is generated, then each
+loader runs in a fresh interpreter so that its peak resident memory can be
+measured in isolation (Linux only, read from ``/proc/self/status``).  The figures reported are the wall time of the load
+and the growth of the peak RSS over the interpreter's baseline.
+
+Usage:
+    python benchmarks/json_load.py [--size-mb 100]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from task import Task  # noqa: E402
+from persistence import save_tasks_to_json  # noqa: E402
+
+LOADERS = {
+    "json.loads + from_dict": (
+        "from pathlib import Path; import json; from task import Task; "
+        "load = lambda p: Task.from_dict(json.loads(Path(p).read_bytes()))"
+    ),
+    "streaming loader": "from persistence import load_tasks_from_json as load",
+    "lazy loader": (
+        "import functools; from persistence import load_tasks_from_json; "
+        "load = functools.partial(load_tasks_from_json, lazy=True)"
+    ),
+}
+
+# ``ru_maxrss`` survives ``exec`` and may still hold the parent's peak, so
+# the high-water mark of the new address space is read from /proc instead.
+MEASURE = """
+import sys, time
+
+def peak_kib():
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+
+{setup}
+base = peak_kib()
+start = time.perf_counter()
+root = load(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(elapsed, (peak_kib() - base) / 1024, len(root.get_sub_tasks()))
+"""
+
+
+def build_tree(size_mb):
+    """Return a tree of projects with nested tasks of about ``size_mb`` MB."""
+    root = Task("Main")
+    # Each project below serializes to roughly 16 kB with indent=2
+    for p in range(max(1, size_mb * 65)):
+        project = Task(f"Project {p}", priority=p % 5)
+        for i in range(20):
+            item = Task(
+                f"Item {i} of project {p}",
+                due_date=f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                priority=i % 5,
+                completed=i % 3 == 0,
+            )
+            for j in range(3):
+                item.add_sub_task(Task(f"Step {j} – {i}"))
+            project.add_sub_task(item)
+        root.add_sub_task(project)
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.json")
+        save_tasks_to_json(build_tree(args.size_mb), path, indent=2)
+        print(f"file size: {os.path.getsize(path) / 2**20:.1f} MiB")
+        for label, setup in LOADERS.items():
+            result = subprocess.run(
+                [sys.executable, "-c", MEASURE.format(setup=setup), path],
+                cwd=ROOT,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            seconds, peak_mb, count = result.stdout.split()
+            print(
+                f"{label:<24} {float(seconds):7.2f} s  "
+                f"peak +{float(peak_mb):8.1f} MiB  ({count} projects)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare the streaming JSON writer with ``json.dump`` of ``Task.to_dict()``.
+
+For each variant the wall time, the peak of Python allocations during the
+save (measured in a separate run with ``tracemalloc``) and the file size are
+reported.
+
+Usage:
+    python benchmarks/json_save.py [--size-mb 30]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from persistence import save_tasks_to_json  # noqa: E402
+from json_load import build_tree  # noqa: E402
+
+
+def _dump_dict(task, path):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(task.to_dict(), fh, indent=2)
+
+
+VARIANTS = [
+    ("json.dump(to_dict, indent=2)", _dump_dict),
+    ("streaming, indent=2", lambda t, p: save_tasks_to_json(t, p, indent=2)),
+    ("streaming, compact", save_tasks_to_json),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=30)
+    args = parser.parse_args()
+
+    root = build_tree(args.size_mb)
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, save) in enumerate(VARIANTS):
+            path = os.path.join(tmp, f"{i}.json")
+            start = time.perf_counter()
+            save(root, path)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            save(root, path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print(
+                f"{label:<30} {elapsed:6.2f} s  peak {peak / 2**20:7.1f} MiB  "
+                f"file {os.path.getsize(path) / 2**20:7.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
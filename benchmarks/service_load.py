@@ -0,0 +1,163 @@
+"""
+Measure how many requests per second the local service answers.
+
+``orga.py serve`` is started on a temporary task file in a separate
+process; clients then open persistent connections and send calls as fast
+as the replies come back, over line-delimited JSON-RPC and over HTTP, for
+a read workload (``query``), a write workload (``complete`` toggling tasks
+on and off, saved by the service) and batches of 20 reads.  Every workload
+runs for ``--seconds`` and reports calls per second and the median time a
+client waits for a reply.
+
+Usage:
+    python benchmarks/service_load.py [--clients 8] [--seconds 2] [--tasks 1000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from task import Task  # noqa: E402
+from persistence import save_tasks_to_json  # noqa: E402
+
+BATCH_SIZE = 20
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(workload, client, i, tasks):
+    path = str((client * 7919 + i) % tasks + 1)
+    if workload == "write":
+        return {"method": "complete", "params": {"path": path, "undo": i % 2 == 1}}
+    return {"method": "query", "params": {"search": f"task {path}"}}
+
+
+class _LineClient:
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    async def send(self, body):
+        self.writer.write(body + b"\n")
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+
+class _HttpClient(_LineClient):
+    async def send(self, body):
+        port = self.writer.get_extra_info("peername")[1]
+        self.writer.write(
+            b"POST /rpc HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (port, len(body), body)
+        )
+        await self.writer.drain()
+        while await self.reader.readline() != b"\r\n":
+            pass
+        chunks = []
+        while size := int(await self.reader.readline(), 16):
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+        await self.reader.readline()
+        return json.loads(b"".join(chunks))
+
+
+async def _client(port, protocol, workload, number, tasks, deadline, latencies):
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", port, limit=1 << 24
+    )
+    client = (_HttpClient if protocol == "http" else _LineClient)(reader, writer)
+    calls = 0
+    while time.perf_counter() < deadline:
+        if workload == "batch":
+            body = [
+                dict(_request("read", number, calls + j, tasks), jsonrpc="2.0", id=j)
+                for j in range(BATCH_SIZE)
+            ]
+        else:
+            body = dict(_request(workload, number, calls, tasks), jsonrpc="2.0", id=1)
+        start = time.perf_counter()
+        reply = await client.send(json.dumps(body).encode())
+        latencies.append(time.perf_counter() - start)
+        assert isinstance(reply, list) or "result" in reply, reply
+        calls += BATCH_SIZE if workload == "batch" else 1
+    writer.close()
+    return calls
+
+
+async def _run(port, protocol, workload, clients, seconds, tasks):
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + seconds
+    counts = await asyncio.gather(
+        *(
+            _client(port, protocol, workload, n, tasks, deadline, latencies)
+            for n in range(clients)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--tasks", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.json")
+        root = Task("Main")
+        for i in range(args.tasks):
+            root.add_sub_task(Task(f"Task {i + 1}", priority=i % 5))
+        save_tasks_to_json(root, path)
+
+        port = _free_port()
+        env = dict(os.environ, XDG_RUNTIME_DIR=tmp)
+        server = subprocess.Popen(
+            [sys.executable, "orga.py", "serve", "--file", path, "--port", str(port)],
+            cwd=ROOT,
+            env=env,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            server.stderr.readline()  # "Serving ..." once listening
+            print(f"{args.clients} clients, {args.tasks} tasks")
+            for protocol in ("line", "http"):
+                for workload in ("read", "write", "batch"):
+                    rate, latency = asyncio.run(
+                        _run(
+                            port,
+                            protocol,
+                            workload,
+                            args.clients,
+                            args.seconds,
+                            args.tasks,
+                        )
+                    )
+                    label = f"{protocol} {workload}"
+                    print(
+                        f"{label:<12} {rate:10.0f} calls/s"
+                        f"  median {latency * 1000:6.2f} ms per reply"
+                    )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
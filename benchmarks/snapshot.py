@@ -0,0 +1,81 @@
+"""
+Measure how quickly a large task file opens as JSON and as a binary snapshot.
+
+A tree of ``--projects`` top-level tasks with ``--items`` sub-tasks each is
+written in both formats.  For the JSON file the full parse is timed; for the
+snapshot the time to map the file, the time to decode the top level (what
+the main window shows first) and the time to expand one row are reported.
+
+Usage:
+    python benchmarks/snapshot.py [--projects 1000] [--items 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import persistence  # noqa: E402
+from task import Task  # noqa: E402
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=1000)
+    args = parser.parse_args()
+
+    root = Task("Main")
+    for p in range(args.projects):
+        project = Task(f"Project {p}", priority=p % 5)
+        project.sub_tasks = [
+            Task(f"Item {i}", due_date="2025-06-30", completed=i % 2 == 0)
+            for i in range(args.items)
+        ]
+        root.add_sub_task(project)
+    total = 1 + args.projects * (args.items + 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "tasks.json")
+        snap_path = os.path.join(tmp, "tasks.snapshot")
+        _, json_save = _timed(lambda: persistence.save_tasks_to_json(root, json_path))
+        _, snap_save = _timed(
+            lambda: persistence.save_tasks_to_snapshot(root, snap_path)
+        )
+        del root
+
+        print(f"{total} tasks")
+        print(
+            f"JSON      {os.path.getsize(json_path) / 2**20:7.1f} MiB  "
+            f"save {json_save:6.2f} s"
+        )
+        print(
+            f"snapshot  {os.path.getsize(snap_path) / 2**20:7.1f} MiB  "
+            f"save {snap_save:6.2f} s"
+        )
+
+        _, json_load = _timed(lambda: persistence.load_tasks_from_json(json_path))
+        print(f"JSON full parse           {json_load * 1000:9.1f} ms")
+
+        snap, snap_open = _timed(
+            lambda: persistence.load_tasks_from_snapshot(snap_path)
+        )
+        top, top_time = _timed(snap.get_sub_tasks)
+        _, expand_time = _timed(top[0].get_sub_tasks)
+        print(f"snapshot open             {snap_open * 1000:9.1f} ms")
+        print(f"snapshot top level        {top_time * 1000:9.1f} ms")
+        print(f"snapshot expand one row   {expand_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare the start-up time of the headless CLI with the GUI start-up path.
+
+Each variant runs in a fresh interpreter several times and the median wall
+time is reported.  The GUI variant imports ``window`` (tkinter, ttkbootstrap,
+tkcalendar when installed) and creates the ``Tk`` root when a display is
+available; it stops before entering the main loop.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--tasks N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from task import Task  # noqa: E402
+from persistence import save_tasks_to_json  # noqa: E402
+
+GUI_SNIPPET = """
+import os, tkinter
+import window
+if os.environ.get("DISPLAY") or os.name == "nt":
+    root = tkinter.Tk()
+    root.destroy()
+"""
+
+
+def _time(cmd, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, check=True, capture_output=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _imported_modules(cmd):
+    """Return the module names reported by ``-X importtime`` for ``cmd``."""
+    result = subprocess.run(
+        [cmd[0], "-X", "importtime"] + cmd[1:],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return {
+        line.rsplit("|", 1)[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.json")
+        root = Task("Main")
+        for i in range(args.tasks):
+            root.add_sub_task(Task(f"Task {i}", priority=i % 5))
+        save_tasks_to_json(root, path)
+
+        baseline = [sys.executable, "-c", "pass"]
+        cli = [sys.executable, "orga.py", "cli", "--file", path, "list", "--depth", "1"]
+        gui = [sys.executable, "-c", GUI_SNIPPET]
+
+        results = [
+            ("python -c pass", _time(baseline, args.runs)),
+            ("orga.py cli list", _time(cli, args.runs)),
+            ("GUI imports + Tk()", _time(gui, args.runs)),
+        ]
+        for label, seconds in results:
+            print(f"{label:<22} {seconds * 1000:8.1f} ms")
+
+        loaded = _imported_modules(cli)
+        print("CLI imports tkinter:", "tkinter" in loaded)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+This module implements the headless command-line interface of the task manager.
+
+It only depends on ``task``, ``controller``, ``merge``, ``persistence``
+and ``instance`` so that it starts quickly and works without a display, e.g. from cron jobs or shell
+pipelines.  It is reached through ``python -m orga cli ...``.
+
+Tasks are addressed by dotted, 1-based paths as printed by ``list``:
+``2`` is the second top-level task and ``2.1`` its first sub-task.
+
+When an instance of the application has the task file open (see
+:py:mod:`instance`), commands are forwarded to it and applied to its tasks.
+
+Functions:
+- main(argv): Parse ``argv`` and run the selected sub-command.
+- execute(controller, argv, out, err): Run a forwarded sub-command.
+
+Usage:
+    python -m orga cli add "Write report" --due 2025-12-31 --priority 1
+    python -m orga cli list
+    python -m orga cli complete 1
+    python -m orga cli query --pending --due-before 2025-12-31
+    python -m orga cli export tasks.csv
+    python -m orga cli export tasks/ --format dir
+    python -m orga cli export changes.ics --since 1760000000.0
+    python -m orga cli diff other.json --apply
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+from pathlib import Path
+
+import instance
+import merge
+import persistence
+from controller import TaskController
+from journal import attach, fold
+
+
+class CliError(Exception):
+    """Raised for invalid command-line input such as unknown task paths."""
+
+
+_SAVERS = {
+    # Exports are meant to be read by people; auto-saves stay compact
+    ".json": functools.partial(persistence.save_tasks_to_json, indent=2),
+    ".csv": persistence.save_tasks_to_csv,
+    ".ics": persistence.save_tasks_to_ics,
+    persistence.SNAPSHOT_SUFFIX: persistence.save_tasks_to_snapshot,
+}
+
+
+def _parse_path(text):
+    """Return the 0-based indices of a dotted, 1-based task path."""
+    try:
+        indices = [int(part) - 1 for part in text.split(".")]
+    except ValueError:
+        raise CliError(f"invalid task path: {text!r}") from None
+    if any(i < 0 for i in indices):
+        raise CliError(f"invalid task path: {text!r}")
+    return indices
+
+
+def _resolve(root, text):
+    """Return ``(parent, index)`` of the task addressed by ``text``."""
+    indices = _parse_path(text)
+    parent = root
+    for depth, index in enumerate(indices):
+        sub_tasks = parent.get_sub_tasks()
+        if index >= len(sub_tasks):
+            raise CliError(f"no task at {text}")
+        if depth == len(indices) - 1:
+            return parent, index
+        parent = sub_tasks[index]
+    raise CliError(f"no task at {text}")
+
+
+def _walk(task, prefix="", max_depth=None):
+    """Yield ``(path, task)`` for the descendants of ``task`` in display order."""
+    stack = [(prefix, task.get_sub_tasks(), 0)]
+    while stack:
+        path_prefix, sub_tasks, index = stack.pop()
+        if index >= len(sub_tasks):
+            continue
+        stack.append((path_prefix, sub_tasks, index + 1))
+        sub = sub_tasks[index]
+        path = f"{path_prefix}{index + 1}"
+        yield path, sub
+        if max_depth is None or path.count(".") + 1 < max_depth:
+            stack.append((path + ".", sub.get_sub_tasks(), 0))
+
+
+def _format(path, task):
+    mark = "x" if task.completed else " "
+    indent = "  " * path.count(".")
+    text = f"{indent}{path:<6} [{mark}] {task.name}"
+    if task.due_date:
+        text += f"  due {task.due_date}"
+    if task.priority is not None:
+        text += f"  p{task.priority}"
+    return text
+
+
+def _record(path, task):
+    return {
+        "path": path,
+        "name": task.name,
+        "due_date": task.due_date,
+        "priority": task.priority,
+        "completed": task.completed,
+        "uid": task.uid,
+    }
+
+
+def _print_tasks(rows, as_json, out):
+    if as_json:
+        json.dump([_record(path, task) for path, task in rows], out)
+        out.write("\n")
+        return
+    for path, task in rows:
+        out.write(_format(path, task) + "\n")
+
+
+def _cmd_add(controller, args, out):
+    if args.parent:
+        parent, index = _resolve(controller.task, args.parent)
+        target = controller.spawn(parent.get_sub_tasks()[index])
+        prefix = args.parent + "."
+    else:
+        target = controller
+        prefix = ""
+    target.add_task(args.name, due_date=args.due, priority=args.priority)
+    out.write(f"{prefix}{len(target.get_sub_tasks())}\n")
+
+
+def _cmd_complete(controller, args, out):
+    parent, index = _resolve(controller.task, args.path)
+    target = controller.spawn(parent)
+    if args.undo:
+        target.mark_task_incomplete(index)
+    else:
+        target.mark_task_completed(index)
+
+
+def _cmd_list(controller, args, out):
+    root = controller.task
+    prefix = ""
+    if args.path:
+        parent, index = _resolve(root, args.path)
+        root = parent.get_sub_tasks()[index]
+        prefix = args.path + "."
+    _print_tasks(_walk(root, prefix, args.depth), args.json, out)
+
+
+def _query_filters(
+    search=None,
+    pending=False,
+    completed=False,
+    due_before=None,
+    due_after=None,
+    priority_above=None,
+    priority_below=None,
+):
+    """Return the keyword arguments of :py:meth:`Task.matches` for a query."""
+    threshold = priority_above if priority_above is not None else priority_below
+    return {
+        "search_term": (search or "").lower().strip(),
+        "hide_completed": pending,
+        "show_completed_only": completed,
+        "due_value": due_before or due_after or "",
+        "before": bool(due_before),
+        "after": bool(due_after),
+        "prio_value": "" if threshold is None else str(threshold),
+        "above": priority_above is not None,
+        "below": priority_below is not None,
+    }
+
+
+def _cmd_query(controller, args, out):
+    filters = _query_filters(
+        args.search,
+        args.pending,
+        args.completed,
+        args.due_before,
+        args.due_after,
+        args.priority_above,
+        args.priority_below,
+    )
+    rows = (
+        (path, task)
+        for path, task in _walk(controller.task)
+        if task.matches(**filters)
+    )
+    _print_tasks(rows, args.json, out)
+
+
+def _cmd_export(controller, args, out):
+    if args.format == "dir":
+        persistence.save_tasks_to_directory(
+            controller.task, args.output, durability=args.durability
+        )
+        return
+    suffixes = [suffix.lower() for suffix in Path(args.output).suffixes]
+    if suffixes and suffixes[-1] in (".gz", ".xz", ".bz2"):
+        suffixes.pop()
+    fmt = args.format or (suffixes[-1] if suffixes else "")
+    if not fmt.startswith("."):
+        fmt = "." + fmt
+    saver = _SAVERS.get(fmt)
+    if saver is None:
+        raise CliError(f"unsupported export format: {fmt}")
+    kwargs = {"durability": args.durability}
+    if args.compress_level is not None:
+        kwargs["compresslevel"] = args.compress_level
+    if fmt not in (".csv", ".ics"):
+        if args.since is not None:
+            raise CliError(f"--since is not supported for {fmt} exports")
+        saver(controller.task, args.output, **kwargs)
+        return
+    # Saved with the tree so that later exports use the same uids
+    controller.assign_uids()
+    watermark = saver(controller.task, args.output, since=args.since, **kwargs)
+    out.write(f"{watermark!r}\n")
+
+
+_DIFF_MARKS = {
+    "inserted": "+",
+    "deleted": "-",
+    "moved": ">",
+    "reordered": "=",
+    "changed": "*",
+}
+
+
+def _cmd_diff(controller, args, out):
+    if not Path(args.other).exists():
+        raise CliError(f"no such file: {args.other}")
+    operations = merge.diff(controller.task, persistence.load_tasks(args.other))
+    for kind, task, detail in merge.changes(operations):
+        text = f"{_DIFF_MARKS[kind]} {task.name}"
+        if kind in ("inserted", "moved"):
+            text += f"  in {detail.name}"
+        elif kind == "changed":
+            text += "  " + ", ".join(f"{k}={v!r}" for k, v in detail.items())
+        out.write(text + "\n")
+    if args.apply:
+        controller.apply_batch(operations)
+
+
+def build_parser():
+    """Return the ``argparse`` parser of the ``cli`` sub-command."""
+    parser = argparse.ArgumentParser(
+        prog="orga.py cli", description="Headless task manager commands"
+    )
+    parser.add_argument(
+        "--file",
+        default="tasks.json",
+        help="Path to the tasks file (JSON, compressed JSON or .snapshot) "
+        "or directory store",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        metavar="N",
+        help="Compression level used when writing compressed files",
+    )
+    parser.add_argument(
+        "--no-forward",
+        action="store_true",
+        help="Work on the file directly even when a running instance has "
+        "it open (commands are sent to that instance by default)",
+    )
+    parser.add_argument(
+        "--shared",
+        action="store_true",
+        help="Lock the tasks file while saving and merge changes other "
+        "processes saved since it was read",
+    )
+    parser.add_argument(
+        "--durability",
+        choices=persistence.DURABILITY_POLICIES,
+        default=persistence.DURABILITY_FSYNC_FILE,
+        help="What saves flush to the disk before completing "
+        "(default: %(default)s)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Add a task")
+    add.add_argument("name")
+    add.add_argument("--parent", help="Path of the parent task, e.g. 2.1")
+    add.add_argument("--due", help="Due date (YYYY-MM-DD)")
+    add.add_argument("--priority", type=int)
+    add.set_defaults(func=_cmd_add)
+
+    lst = commands.add_parser("list", help="List tasks as an indented tree")
+    lst.add_argument("path", nargs="?", help="Only list below this task")
+    lst.add_argument("--depth", type=int, help="Maximum depth to show")
+    lst.add_argument("--json", action="store_true", help="Print JSON records")
+    lst.set_defaults(func=_cmd_list)
+
+    complete = commands.add_parser("complete", help="Mark a task as completed")
+    complete.add_argument("path")
+    complete.add_argument(
+        "--undo", action="store_true", help="Mark the task as not completed"
+    )
+    complete.set_defaults(func=_cmd_complete)
+
+    export = commands.add_parser("export", help="Export tasks to a file")
+    export.add_argument("output")
+    export.add_argument(
+        "--format", choices=["json", "csv", "ics", "snapshot", "dir"]
+    )
+    export.add_argument(
+        "--since",
+        type=float,
+        metavar="WATERMARK",
+        help="Only export CSV/ICS changes made after the watermark printed "
+        "by a previous export",
+    )
+    export.set_defaults(func=_cmd_export)
+
+    diff = commands.add_parser(
+        "diff", help="Print what changes between the tasks and another file"
+    )
+    diff.add_argument("other", help="Task file in any supported format")
+    diff.add_argument(
+        "--apply",
+        action="store_true",
+        help="Change the tasks to match the other file",
+    )
+    diff.set_defaults(func=_cmd_diff)
+
+    query = commands.add_parser("query", help="Print tasks matching filters")
+    query.add_argument("--search", help="Text contained in the task name")
+    state = query.add_mutually_exclusive_group()
+    state.add_argument("--completed", action="store_true")
+    state.add_argument("--pending", action="store_true")
+    due = query.add_mutually_exclusive_group()
+    due.add_argument("--due-before", metavar="DATE")
+    due.add_argument("--due-after", metavar="DATE")
+    prio = query.add_mutually_exclusive_group()
+    prio.add_argument("--priority-above", type=int, metavar="N")
+    prio.add_argument("--priority-below", type=int, metavar="N")
+    query.add_argument("--json", action="store_true", help="Print JSON records")
+    query.set_defaults(func=_cmd_query)
+    return parser
+
+
+def main(argv=None, out=None):
+    """Run the command line interface and return the process exit code."""
+    out = out if out is not None else sys.stdout
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = build_parser().parse_args(argv)
+    path = Path(args.file).resolve()
+    if not args.no_forward:
+        try:
+            reply = instance.forward(
+                path, {"command": "cli", "argv": argv, "cwd": os.getcwd()}
+            )
+        except OSError as err:
+            sys.stderr.write(
+                f"error: the running instance did not answer ({err}); it may "
+                "still be loading, try again or pass --no-forward\n"
+            )
+            return 1
+        if reply is not None:
+            out.write(reply.get("output", ""))
+            sys.stderr.write(reply.get("error", ""))
+            return reply["code"]
+    shared = None
+    if args.shared:
+        from sharing import SharedFile
+
+        shared = SharedFile(path)
+        task = shared.load()
+    else:
+        task = persistence.load_tasks(path)
+    controller = TaskController(task, save_path=path)
+    if shared is not None:
+        controller.scheduler.shared = shared
+        controller.scheduler.on_conflict = controller.sync_tasks
+    controller.scheduler.compresslevel = args.compress_level
+    controller.scheduler.durability = args.durability
+    if shared is not None:
+        return _run(controller, args, out, sys.stderr)
+    # The GUI's latest auto-saves may only be in the journal
+    journal = attach(controller, durability=args.durability)
+    try:
+        return _run(controller, args, out, sys.stderr)
+    finally:
+        if journal is not None:
+            fold(controller, journal)
+
+
+def _run(controller, args, out, err):
+    try:
+        args.func(controller, args, out)
+    except CliError as error:
+        err.write(f"error: {error}\n")
+        return 1
+    return 0 if controller.scheduler.flush() else 1
+
+
+def execute(controller, argv, out, err, cwd=None):
+    """Run the sub-command ``argv`` on the tasks of a running instance.
+
+    Used for commands forwarded by :py:mod:`instance`: the global options
+    are ignored, and relative file names are taken relative to ``cwd``,
+    the directory the command was started in.  Returns the exit code.
+    """
+    try:
+        # Usage and help messages go to the client, not to this process
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            args = build_parser().parse_args(argv)
+    except SystemExit as stop:
+        return stop.code
+    for name in ("output", "other"):
+        value = getattr(args, name, None)
+        if value is not None and cwd is not None:
+            setattr(args, name, os.path.join(cwd, value))
+    return _run(controller, args, out, err)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
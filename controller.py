@@ -8,34 +8,143 @@ Usage:
     This module provides the TaskController class for managing tasks in a to-do list.
     It can be used to add, edit, delete tasks, and retrieve task information.
 """
-from pathlib import Path
+import contextlib
+import functools
+import itertools
+import time
 
+import merge
 from task import Task
+from events import EventBus, TaskEvent, ADDED, REMOVED, MOVED, CHANGED, REORDERED
 import persistence
+from locking import ReadWriteLock
 
 
 class InvalidTaskIndexError(IndexError):
     """Raised when a provided task index does not exist."""
 
 
+def _writes(method):
+    """Hold the controller's lock for writing while ``method`` runs."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.lock is None:
+            return method(self, *args, **kwargs)
+        with self.lock.write():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _changed_list(kind, sub_tasks, items):
+    """Return ``sub_tasks`` as changed by a batch operation of ``kind``
+    (see :py:meth:`TaskController.apply_batch`), without modifying it.
+
+    Raises:
+        InvalidTaskIndexError: An index does not match ``sub_tasks``.
+        ValueError: ``kind`` is unknown or an order lists other tasks.
+    """
+    if kind == "insert":
+        size, last = len(sub_tasks), 0
+        for count, (index, _) in enumerate(items):
+            if not last <= index <= size + count:
+                raise InvalidTaskIndexError(index)
+            last = index
+        merged = []
+        remaining = iter(sub_tasks)
+        for index, task in items:
+            merged.extend(itertools.islice(remaining, index - len(merged)))
+            merged.append(task)
+        merged.extend(remaining)
+        return merged
+    if kind == "remove":
+        for index, task in items:
+            if not 0 <= index < len(sub_tasks) or sub_tasks[index] is not task:
+                raise InvalidTaskIndexError(index)
+        gone = {id(task) for _, task in items}
+        return [t for t in sub_tasks if id(t) not in gone]
+    if kind == "order":
+        ids = {id(t) for t in items}
+        if len(items) != len(sub_tasks) or any(id(t) not in ids for t in sub_tasks):
+            raise ValueError("order must list the same sub-tasks")
+        return list(items)
+    raise ValueError(f"unknown batch operation {kind!r}")
+
+
+def _check_batch(operations):
+    """Raise the error applying ``operations`` would raise, if any.
+
+    The operations are applied to copies of the sub-task lists they
+    change, so the tree is left untouched.
+    """
+    lists = {}
+    for step in operations:
+        kind, parent = step[0], step[1]
+        if kind == "update":
+            for attr in step[3]:
+                getattr(step[2], attr)
+            continue
+        entry = lists.setdefault(id(parent), [parent, parent.sub_tasks])
+        entry[1] = _changed_list(kind, entry[1], step[2])
+
+
+def _batch_changes(operations):
+    """Return the tasks whose fields or sub-task lists ``operations`` of
+    :py:meth:`TaskController.apply_batch` change."""
+    return [step[2] if step[0] == "update" else step[1] for step in operations]
+
+
 class TaskController:
     """
     Represents a controller for managing tasks in a to-do list.
 
     Attributes:
         task (Task): The main task managed by the controller.
+        root (Task): Root of the tree :pyattr:`task` belongs to, which keeps
+            the tombstones of deleted tasks.
+        bus (EventBus): Bus receiving a ``TaskEvent`` for every change.
+        scheduler (SaveScheduler): Auto-save scheduler shared by every
+            controller of the tree, or ``None`` when auto-saving is disabled.
+        top (Task): Top-level task of the tree containing :pyattr:`task`,
+            or ``None`` for the root controller and when it is not known.
+        lock (ReadWriteLock): Lock shared by every controller of the tree
+            in thread-safe mode, ``None`` otherwise.  Methods changing the
+            tree hold it for writing; use :py:meth:`reading` around code
+            reading the tree from other threads.
 
     Methods:
         __init__: Initializes a new TaskController object with a given task.
         add_task: Adds a new task to the task controller.
         edit_task: Edits the name of a task at the specified index.
         delete_task: Deletes a task at the specified index.
+        update_task: Sets several attributes of a task in one step.
+        spawn: Returns a controller for a sub-task sharing this controller's
+            bus and save scheduler.
         get_task_name: Returns the name of the task.
         get_sub_tasks: Returns the list of sub-tasks associated with the task.
         sort_tasks_by_priority: Sort tasks by their priority value.
+        apply_batch: Apply operations anywhere in the tree as one undoable
+            step.
+        merge_tasks: Merge an imported tree into the current one.
+        sync_tasks: Take over the changes of another version of the tree.
+        reload_tasks: Apply a version of the file written by another
+            program.
+        reading: Keep the tree unchanged while reading it.
+        assign_uids: Give a uid to every task that has none yet.
     """
 
-    def __init__(self, task, save_path=None):
+    def __init__(
+        self,
+        task,
+        save_path=None,
+        bus=None,
+        scheduler=None,
+        root=None,
+        lock=None,
+        thread_safe=False,
+        top=None,
+    ):
         """
         Initializes a new TaskController object.
 
@@ -43,9 +152,35 @@ class TaskController:
             task (Task): The main task managed by the controller.
             save_path (str or Path, optional): Path used for automatic JSON
                 persistence.  If ``None`` (default), auto-saving is disabled.
+            bus (EventBus, optional): Event bus shared with other controllers
+                working on the same tree.  A new bus is created by default.
+            scheduler (SaveScheduler, optional): Save scheduler of the root
+                controller.  Sub-task controllers pass it so that their edits
+                are written with the whole tree.  When omitted, one saving
+                :pyattr:`task` is created if ``save_path`` is given.
+            root (Task, optional): Root of the tree when ``task`` is one of
+                its sub-tasks.  Defaults to ``task``.
+            lock (ReadWriteLock, optional): Lock of the root controller,
+                passed by sub-task controllers.
+            thread_safe (bool, optional): Create a lock when none is given,
+                so that the tree may be read and changed from several
+                threads.  Events are then published on the thread making
+                the change, with the lock held.
+            top (Task, optional): See :pyattr:`top`; passed by
+                :py:meth:`spawn`.
         """
         self.task = task
-        self.save_path = Path(save_path) if save_path is not None else None
+        self.root = root if root is not None else task
+        if lock is None and thread_safe:
+            lock = ReadWriteLock()
+        self.lock = lock
+        self.top = top
+        if scheduler is None and save_path is not None:
+            scheduler = persistence.SaveScheduler(lambda: self.task, save_path)
+            scheduler.lock = lock
+        self.scheduler = scheduler
+        self.save_path = scheduler.path if scheduler is not None else None
+        self.bus = bus if bus is not None else EventBus()
         # Stacks used to store undo and redo operations.  Each entry is a
         # tuple describing the operation that should be executed when popped.
         #
@@ -54,18 +189,148 @@ class TaskController:
         #   ('delete', index, task)     -> remove task at ``index``
         #   ('setattr', index, values)  -> set attributes on task ``index``
         #   ('move', from_idx, to_idx)  -> move task from ``from_idx`` to ``to_idx``
+        #   ('batch', operations)       -> apply operations of ``apply_batch``
         self._undo_stack = []
         self._redo_stack = []
 
     # ------------------------------------------------------------------
-    def _auto_save(self):
-        """Write current tasks to :pyattr:`save_path` if configured."""
-        if self.save_path is not None:
-            try:
-                persistence.save_tasks_to_json(self.task, self.save_path)
-            except Exception:
-                pass
+    def _publish(
+        self, kind, task, index=None, old_index=None, fields=(), parent=None
+    ):
+        """Publish a ``TaskEvent`` about a child of ``parent`` (default:
+        :pyattr:`task`).
+
+        Added, removed and changed tasks are stamped first (see
+        :py:meth:`Task.touch`), so subscribers see their new revision and
+        incremental exports pick them up.  Moves within the same list
+        change no task.  The tasks and their parent are given a uid, which
+        events and journal records identify them by.
+        """
+        parent = parent if parent is not None else self.task
+        parent.ensure_uid()
+        if task is not None:
+            task.ensure_uid()
+        if kind == REORDERED:
+            for sub in parent.get_sub_tasks():
+                sub.ensure_uid()
+        now = time.time()
+        if kind == ADDED:
+            for added in task.walk():
+                added.touch(now)
+            self.root.unmark_deleted(task)
+        elif kind == REMOVED:
+            self.root.mark_deleted(task, now)
+        elif kind == CHANGED:
+            task.touch(now)
+        self.bus.publish(
+            TaskEvent(
+                kind,
+                task,
+                parent,
+                index=index,
+                old_index=old_index,
+                fields=fields,
+            )
+        )
+
+    def spawn(self, task):
+        """Return a controller for ``task`` sharing this controller's bus and scheduler.
+
+        ``task`` is a descendant of :pyattr:`task`, or :pyattr:`task` itself.
+        """
+        top = self.top
+        if top is None and task is not self.root:
+            # Children of the root are the top-level tasks
+            if any(sub is task for sub in self.root.get_sub_tasks()):
+                top = task
+        return TaskController(
+            task,
+            bus=self.bus,
+            scheduler=self.scheduler,
+            root=self.root,
+            lock=self.lock,
+            top=top,
+        )
+
+    def join(self, other):
+        """Share ``other``'s event bus, save scheduler and lock.
+
+        Both controllers then see each other's changes and their edits are
+        saved together with ``other``'s tree.
+        """
+        self.bus = other.bus
+        self.root = other.root
+        self.lock = other.lock
+        if other.scheduler is not None:
+            self.scheduler = other.scheduler
+            self.save_path = other.save_path
+
+    def reading(self):
+        """Return a context manager keeping the tree unchanged in its block.
+
+        Readers of other threads, such as exports and searches, run in
+        parallel with each other and only wait for changes in progress.
+        Without :pyattr:`lock` the block is not protected.
+        """
+        if self.lock is None:
+            return contextlib.nullcontext()
+        return self.lock.read()
+
+    @_writes
+    def replace_task(self, task):
+        """Manage ``task`` instead of the current tree, e.g. after an import.
+
+        The undo history refers to the previous tree and is therefore cleared.
+        """
+        if self.root is self.task:
+            self.root = task
+        self.task = task
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+
+    def _auto_save(self, changed=None):
+        """Mark the tree dirty in the shared save scheduler, if any.
+
+        ``changed`` is the task whose fields were edited, or a list of such
+        tasks; by default it is :pyattr:`task`, whose list of sub-tasks
+        changed.  When :pyattr:`top` is known it is passed instead, so that
+        directory stores find the shard to rewrite without searching.
+        """
+        if self.scheduler is None:
+            return
+        if self.top is not None:
+            changed = self.top
+        elif changed is None:
+            changed = self.task
+        self.scheduler.mark_dirty(changed)
+
+    def _save_change(self, changed):
+        """Mark ``changed`` dirty, or the whole tree when it is ``None``."""
+        if changed is None:
+            if self.scheduler is not None:
+                self.scheduler.mark_dirty()
+        else:
+            self._auto_save(changed)
+
+    @_writes
+    def assign_uids(self):
+        """Give a uid to every task of the tree that has none yet.
+
+        CSV and iCalendar exports refer to tasks by uid; assigning them
+        here, under the write lock, saves them with the tree so that later
+        exports use the same ones.
 
+        Returns:
+            list[Task]: The tasks given a uid.
+        """
+        assigned = [t for t in self.task.walk() if t.uid is None]
+        for t in assigned:
+            t.ensure_uid()
+        if assigned:
+            self._save_change(assigned)
+        return assigned
+
+    @_writes
     def add_task(self, task_name, due_date=None, priority=None):
         """
         Adds a new task to the task controller.
@@ -74,12 +339,15 @@ class TaskController:
             task_name (str): The name of the new task to be added.
         """
         new_task = Task(task_name, due_date=due_date, priority=priority)
+        new_task.ensure_uid()
         self.task.add_sub_task(new_task)
         idx = len(self.task.sub_tasks) - 1
         self._undo_stack.append(("delete", idx, new_task))
         self._redo_stack.clear()
+        self._publish(ADDED, new_task, index=idx)
         self._auto_save()
 
+    @_writes
     def edit_task(self, task_index, new_name):
         """
         Edits the name of a task at the specified index.
@@ -95,8 +363,12 @@ class TaskController:
         sub_tasks[task_index].name = new_name
         self._undo_stack.append(("setattr", task_index, {"name": old_name}))
         self._redo_stack.clear()
-        self._auto_save()
+        self._publish(
+            CHANGED, sub_tasks[task_index], index=task_index, fields=("name",)
+        )
+        self._auto_save(sub_tasks[task_index])
 
+    @_writes
     def delete_task(self, index):
         """
         Deletes a task at the specified index.
@@ -111,8 +383,31 @@ class TaskController:
         self.task.remove_sub_task(removed)
         self._undo_stack.append(("add", index, removed))
         self._redo_stack.clear()
+        self._publish(REMOVED, removed, index=index)
         self._auto_save()
 
+    @_writes
+    def update_task(self, index, **values):
+        """Set several attributes of the task at ``index`` as one undoable step.
+
+        Args:
+            index (int): The index of the task to update.
+            **values: Attribute names and their new values, e.g.
+                ``name="New", completed=True``.
+        """
+        sub_tasks = self.get_sub_tasks()
+        if not 0 <= index < len(sub_tasks):
+            raise InvalidTaskIndexError(index)
+        task = sub_tasks[index]
+        prev = {attr: getattr(task, attr) for attr in values}
+        for attr, val in values.items():
+            setattr(task, attr, val)
+        self._undo_stack.append(("setattr", index, prev))
+        self._redo_stack.clear()
+        self._publish(CHANGED, task, index=index, fields=tuple(values))
+        self._auto_save(task)
+
+    @_writes
     def mark_task_completed(self, index):
         """Mark the task at the given index as completed."""
         sub_tasks = self.get_sub_tasks()
@@ -122,8 +417,12 @@ class TaskController:
         sub_tasks[index].mark_completed()
         self._undo_stack.append(("setattr", index, {"completed": prev}))
         self._redo_stack.clear()
-        self._auto_save()
+        self._publish(
+            CHANGED, sub_tasks[index], index=index, fields=("completed",)
+        )
+        self._auto_save(sub_tasks[index])
 
+    @_writes
     def mark_task_incomplete(self, index):
         """Mark the task at the given index as not completed."""
         sub_tasks = self.get_sub_tasks()
@@ -133,8 +432,12 @@ class TaskController:
         sub_tasks[index].mark_incomplete()
         self._undo_stack.append(("setattr", index, {"completed": prev}))
         self._redo_stack.clear()
-        self._auto_save()
+        self._publish(
+            CHANGED, sub_tasks[index], index=index, fields=("completed",)
+        )
+        self._auto_save(sub_tasks[index])
 
+    @_writes
     def set_task_due_date(self, index, due_date):
         """Set the due date for a task at the given index."""
         sub_tasks = self.get_sub_tasks()
@@ -144,8 +447,12 @@ class TaskController:
         sub_tasks[index].set_due_date(due_date)
         self._undo_stack.append(("setattr", index, {"due_date": prev}))
         self._redo_stack.clear()
-        self._auto_save()
+        self._publish(
+            CHANGED, sub_tasks[index], index=index, fields=("due_date",)
+        )
+        self._auto_save(sub_tasks[index])
 
+    @_writes
     def set_task_priority(self, index, priority):
         """Set the priority for a task at the given index."""
         sub_tasks = self.get_sub_tasks()
@@ -155,8 +462,12 @@ class TaskController:
         sub_tasks[index].set_priority(priority)
         self._undo_stack.append(("setattr", index, {"priority": prev}))
         self._redo_stack.clear()
-        self._auto_save()
+        self._publish(
+            CHANGED, sub_tasks[index], index=index, fields=("priority",)
+        )
+        self._auto_save(sub_tasks[index])
 
+    @_writes
     def move_task(self, from_index, to_index):
         """Move a task from ``from_index`` to ``to_index``.
 
@@ -173,6 +484,7 @@ class TaskController:
         sub_tasks.insert(to_index, task)
         self._undo_stack.append(("move", to_index, from_index))
         self._redo_stack.clear()
+        self._publish(MOVED, task, index=to_index, old_index=from_index)
         self._auto_save()
 
     def get_task_name(self):
@@ -193,21 +505,156 @@ class TaskController:
         """
         return self.task.get_sub_tasks()
 
+    @_writes
     def sort_tasks_by_priority(self):
         """Sort the controller's sub tasks by priority (None values last)."""
         self.task.sub_tasks.sort(key=lambda t: (t.priority is None, t.priority))
+        self._publish(REORDERED, None)
         self._auto_save()
 
+    @_writes
     def sort_tasks_by_due_date(self):
         """Sort the controller's sub tasks by due date (None values last)."""
         self.task.sub_tasks.sort(key=lambda t: (t.due_date is None, t.due_date))
+        self._publish(REORDERED, None)
         self._auto_save()
 
+    @_writes
     def sort_tasks_by_name(self):
         """Sort the controller's sub tasks alphabetically by name."""
         self.task.sub_tasks.sort(key=lambda t: t.name.lower())
+        self._publish(REORDERED, None)
         self._auto_save()
 
+    # --- Batches -----------------------------------------------------------
+
+    @_writes
+    def apply_batch(self, operations):
+        """Apply ``operations`` to the tree as one undoable step.
+
+        Operations name the tasks they change, so they may reach anywhere
+        below :pyattr:`task`:
+
+        ``("insert", parent, [(index, task), ...])``
+            Insert the tasks into ``parent``'s sub-tasks, by ascending index;
+            every index counts the tasks inserted before it.
+        ``("remove", parent, [(index, task), ...])``
+            Remove the tasks at the given indices of ``parent``'s sub-tasks,
+            by descending index.
+        ``("order", parent, tasks)``
+            Replace ``parent``'s sub-tasks by ``tasks``, the same tasks in
+            another order.
+        ``("update", parent, task, values)``
+            Set the attributes in ``values`` on ``task``, a sub-task of
+            ``parent``.
+
+        Each list of sub-tasks is rebuilt once per operation, so a batch
+        costs time linear in the size of the lists it changes.  A
+        ``TaskEvent`` is published for every task added, removed or changed
+        and every list reordered, and the whole tree is saved.
+
+        The batch is applied entirely or not at all: the operations are
+        checked against the tree before the first one is applied, and when
+        one of them would fail its error is raised and nothing changes.
+
+        Args:
+            operations (list of tuple): Operations as produced by
+                :py:func:`merge.plan_merge` or :py:func:`merge.diff`.
+
+        Raises:
+            InvalidTaskIndexError: An index does not match the tree, or the
+                indices of an insertion are not ascending.
+            ValueError: An operation is unknown or reorders other tasks than
+                ``parent``'s sub-tasks.
+        """
+        if not operations:
+            return
+        inverse = self._apply_operation(("batch", list(operations)))
+        self._undo_stack.append(inverse)
+        self._redo_stack.clear()
+        self._save_change(_batch_changes(operations))
+
+    @_writes
+    def merge_tasks(self, imported):
+        """Merge the tree ``imported`` into :pyattr:`task` as one undoable step.
+
+        Unlike :py:meth:`replace_task` the current tasks, the undo history
+        and the tasks shown by windows are kept; only the differences are
+        applied (see :py:func:`merge.plan_merge`).
+
+        Returns:
+            list of tuple: The operations applied.
+        """
+        operations = merge.plan_merge(self.task, imported)
+        self.apply_batch(operations)
+        return operations
+
+    @_writes
+    def sync_tasks(self, other):
+        """Take over the changes of ``other``, another version of the tree.
+
+        ``other`` is typically what another process saved to the same file
+        (see :py:class:`sharing.SharedFile`).  Of every task, the version
+        changed last is kept, and deletions are merged the same way (see
+        :py:func:`merge.plan_merge` with ``newer_only``).  The changes are
+        applied as one undoable step.
+
+        Returns:
+            list of tuple: The operations applied.
+        """
+        operations = merge.plan_merge(self.task, other, newer_only=True)
+        self.apply_batch(operations)
+        return operations
+
+    @_writes
+    def reload_tasks(self, other):
+        """Bring the tree up to date with ``other``, a newer version of its
+        file written by another program.
+
+        When every edit is saved, the tree is changed into ``other`` (see
+        :py:func:`merge.diff`); otherwise the latest version of every task
+        is kept as in :py:meth:`sync_tasks`, so unsaved edits survive.  The
+        changes are applied as one undoable step, and open windows update
+        only the rows they concern.
+
+        Returns:
+            list of tuple: The operations applied.
+        """
+        scheduler = self.scheduler
+        if scheduler is not None and (
+            scheduler.dirty
+            or (scheduler.journal is not None and scheduler.journal.records)
+        ):
+            return self.sync_tasks(other)
+        operations = merge.diff(self.task, other)
+        self.apply_batch(operations)
+        return operations
+
+    def _apply_batch_step(self, step):
+        """Apply one operation of a batch and return its inverse."""
+        kind, parent = step[0], step[1]
+        if kind == "update":
+            task, values = step[2], step[3]
+            prev = {}
+            for attr, val in values.items():
+                prev[attr] = getattr(task, attr)
+                setattr(task, attr, val)
+            self._publish(CHANGED, task, fields=tuple(values), parent=parent)
+            return ("update", parent, task, prev)
+        items, sub_tasks = step[2], parent.sub_tasks
+        previous = list(sub_tasks) if kind == "order" else None
+        sub_tasks[:] = _changed_list(kind, sub_tasks, items)
+        if kind == "insert":
+            for index, task in items:
+                self._publish(ADDED, task, index=index, parent=parent)
+            return ("remove", parent, items[::-1])
+        if kind == "remove":
+            for index, task in items:
+                self._publish(REMOVED, task, index=index, parent=parent)
+            return ("insert", parent, items[::-1])
+        self._publish(REORDERED, None, parent=parent)
+        return ("order", parent, previous)
+
     # --- Undo/Redo support -------------------------------------------------
 
     def _apply_operation(self, operation):
@@ -216,10 +663,12 @@ class TaskController:
         if op_type == "add":
             index, task = operation[1], operation[2]
             self.task.sub_tasks.insert(index, task)
+            self._publish(ADDED, task, index=index)
             return ("delete", index, task)
         if op_type == "delete":
             index, task = operation[1], operation[2]
             self.task.sub_tasks.pop(index)
+            self._publish(REMOVED, task, index=index)
             return ("add", index, task)
         if op_type == "setattr":
             index, values = operation[1], operation[2]
@@ -231,7 +680,15 @@ class TaskController:
             for attr, val in values.items():
                 prev[attr] = getattr(task, attr)
                 setattr(task, attr, val)
+            self._publish(CHANGED, task, index=index, fields=tuple(values))
             return ("setattr", index, prev)
+        if op_type == "batch":
+            # Checked first so that a failing batch publishes no event and
+            # stamps no task
+            _check_batch(operation[1])
+            inverses = [self._apply_batch_step(step) for step in operation[1]]
+            inverses.reverse()
+            return ("batch", inverses)
         if op_type == "move":
             from_idx, to_idx = operation[1], operation[2]
             sub_tasks = self.get_sub_tasks()
@@ -241,9 +698,22 @@ class TaskController:
                 raise InvalidTaskIndexError(to_idx)
             task = sub_tasks.pop(from_idx)
             sub_tasks.insert(to_idx, task)
+            self._publish(MOVED, task, index=to_idx, old_index=from_idx)
             return ("move", to_idx, from_idx)
         return None
 
+    def _changed_task(self, operation):
+        """Return the task modified by applying ``operation``.
+
+        Batches return the list of the tasks and parents they change.
+        """
+        if operation[0] == "setattr":
+            return self.get_sub_tasks()[operation[1]]
+        if operation[0] == "batch":
+            return _batch_changes(operation[1])
+        return self.task
+
+    @_writes
     def undo(self):
         """Undo the most recent operation, if any."""
         if not self._undo_stack:
@@ -252,8 +722,9 @@ class TaskController:
         inverse = self._apply_operation(op)
         if inverse:
             self._redo_stack.append(inverse)
-        self._auto_save()
+        self._save_change(self._changed_task(op))
 
+    @_writes
     def redo(self):
         """Redo the most recently undone operation, if any."""
         if not self._redo_stack:
@@ -262,4 +733,4 @@ class TaskController:
         inverse = self._apply_operation(op)
         if inverse:
             self._undo_stack.append(inverse)
-        self._auto_save()
+        self._save_change(self._changed_task(op))
@@ -0,0 +1,102 @@
+"""
+This module defines the change notifications shared by controllers and windows.
+
+Classes:
+- TaskEvent: Describes a single change made to the task tree.
+- EventBus: Dispatches ``TaskEvent`` objects to subscribed callbacks.
+
+Usage:
+    A single ``EventBus`` is shared by every ``TaskController`` working on the
+    same task tree.  Windows subscribe to it and update only the rows affected
+    by each event instead of rebuilding their whole tree view.
+"""
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"
+CHANGED = "changed"
+REORDERED = "reordered"
+
+
+class TaskEvent:
+    """
+    Describes a change made to the task tree.
+
+    Attributes:
+        kind (str): One of ``added``, ``removed``, ``moved``, ``changed`` or
+            ``reordered``.
+        task (Task): The task that was added, removed, moved or changed.  For
+            ``reordered`` events this is ``None``.
+        parent (Task): The task whose ``sub_tasks`` list contains ``task``.
+        index (int, optional): Position of ``task`` in ``parent`` after the
+            change (or before it for ``removed`` events).
+        old_index (int, optional): Previous position for ``moved`` events.
+        fields (tuple of str): Names of the attributes changed by ``changed``
+            events.
+        task_id (str, optional): uid of ``task``.
+        parent_id (str, optional): uid of ``parent``.
+
+    Events only describe changes; the controller gives the tasks their uid
+    before publishing.
+    """
+
+    def __init__(
+        self, kind, task, parent, index=None, old_index=None, fields=()
+    ):
+        self.kind = kind
+        self.task = task
+        self.parent = parent
+        self.index = index
+        self.old_index = old_index
+        self.fields = tuple(fields)
+        self.task_id = task.uid if task is not None else None
+        self.parent_id = parent.uid if parent is not None else None
+
+    def __repr__(self):
+        return (
+            f"TaskEvent({self.kind!r}, task={self.task_id!r}, "
+            f"parent={self.parent_id!r}, index={self.index!r})"
+        )
+
+
+class EventBus:
+    """
+    Dispatches ``TaskEvent`` objects to subscribed callbacks.
+
+    Methods:
+        subscribe: Register a callback receiving every published event.
+        unsubscribe: Remove a previously registered callback.
+        publish: Deliver an event to all subscribers.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Register ``callback`` and return it for convenience."""
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        """Remove ``callback`` if it is subscribed."""
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def publish(self, event):
+        """Deliver ``event`` to every subscriber.
+
+        A failing subscriber is logged and does not prevent delivery to the
+        remaining ones.
+        """
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Event subscriber %r failed", callback)
@@ -0,0 +1,326 @@
+"""
+This module keeps a single running instance per task file.
+
+The first instance listens on a Unix domain socket named after the task
+file.  Later invocations of ``orga.py`` for the same file connect to it,
+forward their request (show the window, or a ``cli`` sub-command) and
+print the reply, instead of loading the file a second time and racing the
+running instance's auto-saves.  Requests are accepted on a thread and each
+one is read on a short-lived thread of its own, but they are handled on
+the GUI thread by :py:meth:`InstanceServer.poll`, so the running
+controller is never touched concurrently.
+
+A request is one line of JSON, such as ``{"command": "cli", "argv":
+["add", "Report"], "cwd": "/home/me"}`` or ``{"command": "show"}``; the
+reply is one line ``{"code": 0, "output": "...", "error": ""}``.
+
+Classes:
+- InstanceServer: Listens for requests of later invocations.
+
+Functions:
+- supported(): Return whether Unix domain sockets are available.
+- socket_path(file_path): Return the socket of the instance of a file.
+- running(file_path): Return whether an instance of a file accepts requests.
+- forward(file_path, request): Send a request to the running instance.
+- forward_argv(argv, request): Send a request for a command line, before
+  the application's modules are imported.
+
+Usage:
+    reply = forward(path, {"command": "show"})
+    if reply is None:
+        server = InstanceServer(path, handle)
+        server.start()
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import socket
+import stat
+import tempfile
+import threading
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+# Longest request accepted, to keep stray clients from exhausting memory
+_MAX_REQUEST = 1 << 20
+
+# Global options of ``orga.py`` and ``orga.py cli`` understood by
+# :py:func:`forward_argv`; any other option makes it step aside
+_VALUE_OPTIONS = ("--file", "--compress-level", "--durability")
+_FLAG_OPTIONS = ("--shared", "--startup-report")
+
+
+def supported():
+    """Return whether this platform has Unix domain sockets."""
+    return hasattr(socket, "AF_UNIX")
+
+
+def socket_path(file_path):
+    """Return the socket of the instance working on ``file_path``.
+
+    Sockets live in ``$XDG_RUNTIME_DIR`` or in a per-user directory of the
+    temporary directory, and are named after a hash of the resolved path
+    (socket paths are limited to about 100 bytes).
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    if not base:
+        user = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+        base = os.path.join(tempfile.gettempdir(), f"orga-{user}")
+    name = hashlib.sha256(os.fsencode(Path(file_path).resolve())).hexdigest()
+    return Path(base) / f"orga-{name[:16]}.sock"
+
+
+def _private(directory):
+    """Return whether only the current user can use the socket ``directory``.
+
+    ``$XDG_RUNTIME_DIR`` is private by definition.  The directory in the
+    temporary directory could have been created by another user, who would
+    then receive the requests meant for the running instance: it must be a
+    real directory owned by the current user with mode ``0o700``.
+    """
+    if os.environ.get("XDG_RUNTIME_DIR") or not hasattr(os, "getuid"):
+        return True
+    try:
+        st = os.lstat(directory)
+    except OSError:
+        return False
+    return (
+        stat.S_ISDIR(st.st_mode)
+        and st.st_uid == os.getuid()
+        and stat.S_IMODE(st.st_mode) == 0o700
+    )
+
+
+def _listening(path):
+    """Return whether an instance accepts connections on the socket ``path``."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with probe:
+        try:
+            probe.connect(os.fspath(path))
+        except OSError:
+            return False
+    return True
+
+
+def running(file_path):
+    """Return whether an instance working on ``file_path`` accepts requests."""
+    return supported() and _listening(socket_path(file_path))
+
+
+def _read_line(sock):
+    """Return the bytes ``sock`` sends up to a newline or end of stream."""
+    chunks = []
+    size = 0
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+        size += len(data)
+        if data.endswith(b"\n") or size > _MAX_REQUEST:
+            break
+    return b"".join(chunks)
+
+
+def forward(file_path, request, timeout=30.0):
+    """Send ``request`` to the instance working on ``file_path``.
+
+    Args:
+        file_path (str or Path): The task file.
+        request (dict): The request (see the module documentation).
+        timeout (float, optional): Seconds to wait for the reply.
+
+    Returns:
+        dict or None: The reply, or ``None`` when no instance is running or
+        the socket directory is not private (see :py:class:`InstanceServer`).
+
+    Raises:
+        OSError: The instance did not answer in time, or its reply was not
+            valid JSON (for example because it exited meanwhile).
+    """
+    if not supported():
+        return None
+    path = socket_path(file_path)
+    if path.parent.exists() and not _private(path.parent):
+        logger.warning("Not forwarding through %s: not private", path.parent)
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(os.fspath(path))
+        except (FileNotFoundError, ConnectionRefusedError):
+            # Nobody listening, or a socket left behind by a crash
+            return None
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        data = _read_line(sock)
+    try:
+        return json.loads(data)
+    except ValueError as err:
+        raise OSError(f"invalid reply from the running instance: {err}") from None
+
+
+def forward_argv(argv, request):
+    """Send ``request`` for the command line ``argv`` to the running instance.
+
+    Only the global options are scanned, without ``argparse`` or any module
+    of the application, so that forwarding takes a few milliseconds: the
+    running instance parses the command itself.  Command lines that ask for
+    help, opt out of forwarding (``--no-forward``, ``--new-instance``) or
+    use options this function does not know return ``None`` as well, and
+    are left to the full parser.
+
+    Args:
+        argv (list): Arguments of ``orga.py`` or of ``orga.py cli``.
+        request (dict): The request; a ``cli`` request may be followed by
+            its sub-command, any other takes no positional argument.
+
+    Returns:
+        dict or None: The reply, or ``None`` when nothing was forwarded.
+    """
+    file_path = "tasks.json"
+    args = iter(argv)
+    for arg in args:
+        if not arg.startswith("-"):
+            if request.get("command") == "cli":
+                break
+            return None
+        name, eq, value = arg.partition("=")
+        if name in _VALUE_OPTIONS:
+            if not eq:
+                value = next(args, None)
+                if value is None:
+                    return None
+            if name == "--file":
+                file_path = value
+        elif name not in _FLAG_OPTIONS or eq:
+            return None
+    return forward(Path(file_path).resolve(), request)
+
+
+class InstanceServer:
+    """Accepts the requests of later invocations for one task file.
+
+    Attributes:
+        path (Path): The socket, see :py:func:`socket_path`.
+        handle (callable): Handler of the requests; may be set after
+            :py:meth:`start`, before the first :py:meth:`poll`.
+        handled (int): Requests handled so far.
+    """
+
+    def __init__(self, file_path, handle):
+        """
+        Args:
+            file_path (str or Path): The task file.
+            handle (callable): Called on the thread calling
+                :py:meth:`poll` with every request; returns the reply.
+        """
+        self.path = socket_path(file_path)
+        self.handle = handle
+        self.handled = 0
+        self._sock = None
+        self._requests = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Listen on :pyattr:`path`.
+
+        Returns ``False``, and the caller runs without accepting requests,
+        when Unix domain sockets are not available, when the socket
+        directory may be used by other users, or when another instance
+        started listening meanwhile.
+        """
+        if not supported():
+            return False
+        directory = self.path.parent
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if not _private(directory):
+            logger.warning(
+                "Not accepting requests: %s must belong to you with mode 0700",
+                directory,
+            )
+            return False
+        import fcntl
+
+        # Instances starting together take turns, so that none removes the
+        # socket another one just bound
+        with open(self.path.with_suffix(".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if _listening(self.path):
+                logger.warning("Another instance listens on %s", self.path)
+                return False
+            try:
+                # Left behind by an instance that crashed
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(os.fspath(self.path))
+            os.chmod(self.path, 0o600)
+            sock.listen()
+        self._sock = sock
+        self._thread = threading.Thread(
+            target=self._accept, args=(sock,), daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def _accept(self, sock):
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return  # closed
+            # Read on a thread of its own, so that a client that is slow to
+            # send its request does not hold up the others
+            threading.Thread(target=self._receive, args=(conn,), daemon=True).start()
+
+    def _receive(self, conn):
+        try:
+            conn.settimeout(5.0)
+            request = json.loads(_read_line(conn))
+        except (OSError, ValueError) as err:
+            logger.warning("Ignoring invalid request: %s", err)
+            conn.close()
+            return
+        self._requests.put((request, conn))
+
+    def poll(self):
+        """Handle the requests received so far and send their replies."""
+        while True:
+            try:
+                request, conn = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                reply = self.handle(request)
+            except Exception as err:  # reported to the client
+                logger.exception("Failed to handle %r", request)
+                reply = {"code": 1, "output": "", "error": f"{err}\n"}
+            self.handled += 1
+            with conn:
+                try:
+                    conn.sendall(json.dumps(reply).encode("utf-8") + b"\n")
+                except OSError:
+                    pass
+
+    def close(self):
+        """Stop listening and remove the socket."""
+        if self._sock is None:
+            return
+        try:
+            # Wakes up the thread blocked in accept()
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._sock = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,598 @@
+"""
+This module keeps a crash-recovery journal next to a task file.
+
+Instead of rewriting the whole task file on every auto-save, the changes
+published on a controller's ``EventBus`` are appended to
+``<task file>.journal`` as checksummed records.  On start-up the records are
+replayed onto the task file up to the last one that verifies, and once the
+journal grows past a size or record-count threshold it is compacted into a
+fresh task file on a background thread, so replay time stays bounded.
+
+Classes:
+- Journal: Records, replays and compacts the journal of one task file.
+- JournalRecovery: Describes what start-up recovery found and did.
+
+Functions:
+- attach(controller): Replays and keeps the journal of a controller's file.
+- fold(controller, journal): Folds the journal into the file on exit.
+
+File format:
+    The journal starts with a header naming the task file it applies to
+    (its size, modification time and inode), so a journal left behind by a
+    save that replaced the task file is recognised as stale.  Each record
+    is its length and CRC-32 followed by a JSON object describing one
+    change.  Tasks are addressed by uid, and the root by ``null``; a full
+    save therefore gives every task a uid before a journal is started.
+
+Usage:
+    journal = Journal(path, lambda: controller.task)
+    controller.bus.subscribe(journal.record)
+    controller.scheduler.journal = journal
+    recovery = journal.recover(task)
+
+    Programs that load a task file and then change it use
+    ``journal = attach(controller)`` instead, and ``fold(controller,
+    journal)`` before they exit.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+import persistence
+from events import ADDED, REMOVED, MOVED, CHANGED, REORDERED
+from task import Task
+from worker import BackgroundJob
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+_MAGIC = b"TMJRNL1\n"
+_HEADER = struct.Struct("<QqQ")
+_RECORD = struct.Struct("<II")
+# Fields a ``set`` record may change
+_FIELDS = frozenset(
+    ("name", "due_date", "priority", "completed", "modified", "revision")
+)
+
+
+class JournalError(ValueError):
+    """Raised when a record does not apply to the tree it is replayed onto."""
+
+
+def _identity(path):
+    """Return what identifies the current version of the file at ``path``."""
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _assign_uids(task):
+    """Give ``task`` and all of its sub-tasks a uid."""
+    stack = [task]
+    while stack:
+        current = stack.pop()
+        current.ensure_uid()
+        stack.extend(current.get_sub_tasks())
+
+
+def _read_journal(path):
+    """Return ``(identity, records, valid_end, size)`` of a journal file.
+
+    ``records`` holds the decoded records up to the last one whose checksum
+    verifies; ``valid_end`` is the offset just after it.  ``identity`` is
+    ``None`` if the header itself is incomplete.
+    """
+    with open(path, "rb") as fh:
+        data = fh.read()
+    start = len(_MAGIC) + _HEADER.size
+    if len(data) < start or not data.startswith(_MAGIC):
+        return None, [], 0, len(data)
+    identity = _HEADER.unpack_from(data, len(_MAGIC))
+    records = []
+    pos = start
+    while pos + _RECORD.size <= len(data):
+        length, checksum = _RECORD.unpack_from(data, pos)
+        payload = data[pos + _RECORD.size:pos + _RECORD.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        try:
+            records.append(json.loads(payload))
+        except ValueError:
+            break
+        pos += _RECORD.size + length
+    return identity, records, pos, len(data)
+
+
+def _encode_record(record):
+    payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return _RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class _Replayer:
+    """Apply journal records to a task tree, addressing tasks by uid."""
+
+    def __init__(self, root):
+        self.root = root
+        self._index = None
+
+    def _add_to_index(self, task):
+        stack = [task]
+        while stack:
+            current = stack.pop()
+            if current.uid is not None:
+                self._index[current.uid] = current
+            stack.extend(current.get_sub_tasks())
+
+    def _lookup(self, uid):
+        if uid is None:
+            return self.root
+        if self._index is None:
+            # Built on first use so that replaying an empty journal does not
+            # materialize a lazily loaded tree.
+            self._index = {}
+            self._add_to_index(self.root)
+        try:
+            return self._index[uid]
+        except KeyError:
+            raise JournalError(f"unknown task {uid!r}") from None
+
+    def apply(self, record):
+        op = record.get("op")
+        if op == "set":
+            task = self._lookup(record["uid"])
+            for field, value in record["fields"].items():
+                if field in _FIELDS:
+                    setattr(task, field, value)
+            return
+        sub_tasks = self._lookup(record.get("parent")).sub_tasks
+        if op == "add":
+            index = record["index"]
+            if not 0 <= index <= len(sub_tasks):
+                raise JournalError(f"cannot add at index {index}")
+            task = Task.from_dict(record["task"])
+            sub_tasks.insert(index, task)
+            self.root.unmark_deleted(task)
+            if self._index is not None:
+                self._add_to_index(task)
+        elif op == "remove":
+            index = record["index"]
+            uid = record["uid"]
+            if not 0 <= index < len(sub_tasks) or sub_tasks[index].uid != uid:
+                raise JournalError(f"no task {uid!r} at index {index}")
+            removed = sub_tasks.pop(index)
+            if record.get("at") is not None:
+                self.root.mark_deleted(removed, record["at"])
+        elif op == "move":
+            old, new = record["from"], record["to"]
+            if not 0 <= old < len(sub_tasks) or not 0 <= new <= len(sub_tasks):
+                raise JournalError(f"cannot move from {old} to {new}")
+            sub_tasks.insert(new, sub_tasks.pop(old))
+        elif op == "order":
+            by_uid = {task.uid: task for task in sub_tasks}
+            uids = record["uids"]
+            if len(uids) != len(sub_tasks) or set(uids) != set(by_uid):
+                raise JournalError("reordered tasks do not match")
+            sub_tasks[:] = [by_uid[uid] for uid in uids]
+        else:
+            raise JournalError(f"unknown record {op!r}")
+
+
+def _replay(root, records):
+    """Apply ``records`` to ``root``; return ``(applied, error)``.
+
+    Replay stops at the first record that does not apply.
+    """
+    replayer = _Replayer(root)
+    for count, record in enumerate(records):
+        try:
+            replayer.apply(record)
+        except (JournalError, KeyError, TypeError, AttributeError) as err:
+            return count, f"record {count + 1}: {err}"
+    return len(records), None
+
+
+class JournalRecovery:
+    """
+    Describes what :py:meth:`Journal.recover` found and did.
+
+    Attributes:
+        replayed (int): Number of records applied to the loaded tasks.
+        discarded_bytes (int): Size of the incomplete or corrupt tail that
+            was cut off the journal.
+        stale (bool): The journal belonged to an older version of the task
+            file and was ignored.
+        kept (str or None): Name the records of a stale journal were moved
+            to instead of being deleted.
+        kept_records (int): Number of records in ``kept``.
+        error (str or None): Why replay stopped before the last record.
+        removed (list of str): Leftovers of interrupted saves that were
+            deleted.
+    """
+
+    def __init__(self):
+        self.replayed = 0
+        self.discarded_bytes = 0
+        self.stale = False
+        self.kept = None
+        self.kept_records = 0
+        self.error = None
+        self.removed = []
+
+    @property
+    def recovered(self):
+        """``True`` if anything beyond a clean replay had to be done."""
+        return bool(
+            self.discarded_bytes or self.stale or self.error or self.removed
+        )
+
+    def format(self):
+        """Return a short human-readable summary."""
+        lines = [f"replayed {self.replayed} journal record(s)"]
+        if self.discarded_bytes:
+            lines.append(
+                f"discarded {self.discarded_bytes} bytes of an incomplete save"
+            )
+        if self.kept:
+            lines.append(
+                f"kept {self.kept_records} journal record(s) written for "
+                f"another version of the file in {self.kept}"
+            )
+        elif self.stale:
+            lines.append("ignored a journal left over from an older file")
+        if self.error:
+            lines.append(f"stopped at an inconsistent {self.error}")
+        for name in self.removed:
+            lines.append(f"removed {name} of an interrupted save")
+        return "\n".join(lines)
+
+
+class Journal:
+    """
+    Crash-recovery journal of the task file at ``path``.
+
+    Attributes:
+        path (Path): The task file.
+        journal_path (Path): ``path`` with :py:data:`JOURNAL_SUFFIX` added.
+        max_bytes (int): Journal size that triggers a compaction.
+        max_records (int): Record count that triggers a compaction.
+        records (int): Records currently stored in the journal file.
+        recovery (JournalRecovery or None): Result of :py:meth:`recover`.
+    """
+
+    def __init__(
+        self,
+        path,
+        get_task,
+        max_bytes=1 << 20,
+        max_records=1000,
+        durability=persistence.DURABILITY_NONE,
+    ):
+        """
+        Args:
+            path (str or Path): Task file the journal belongs to.
+            get_task (callable): Returns the root ``Task`` of the tree whose
+                events are recorded.
+            max_bytes (int, optional): Compact once the journal is larger.
+            max_records (int, optional): Compact once it holds more records.
+            durability (str, optional): Durability policy of appends,
+                compactions and resets (see ``persistence``).
+        """
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.name + JOURNAL_SUFFIX)
+        self.get_task = get_task
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.durability = durability
+        self.records = 0
+        self.recovery = None
+        self._identity = None
+        self._size = 0
+        self._pending = []
+        self._job = None
+        # Serializes appends and full saves with the file swaps of a
+        # compaction
+        self._lock = threading.RLock()
+
+    # --- Recording -----------------------------------------------------
+
+    def record(self, event):
+        """``EventBus`` subscriber turning a ``TaskEvent`` into a record."""
+        root = self.get_task()
+        parent = None if event.parent is root else event.parent_id
+        if event.kind == ADDED:
+            _assign_uids(event.task)
+            record = {
+                "op": "add",
+                "parent": parent,
+                "index": event.index,
+                "task": event.task.to_dict(),
+            }
+        elif event.kind == REMOVED:
+            record = {
+                "op": "remove",
+                "parent": parent,
+                "index": event.index,
+                "uid": event.task_id,
+                "at": event.task.modified,
+            }
+        elif event.kind == MOVED:
+            record = {
+                "op": "move",
+                "parent": parent,
+                "from": event.old_index,
+                "to": event.index,
+            }
+        elif event.kind == CHANGED:
+            record = {
+                "op": "set",
+                "uid": event.task_id,
+                "fields": {
+                    f: getattr(event.task, f)
+                    for f in event.fields + ("modified", "revision")
+                },
+            }
+        elif event.kind == REORDERED:
+            record = {
+                "op": "order",
+                "parent": parent,
+                "uids": [t.uid for t in event.parent.get_sub_tasks()],
+            }
+        else:
+            return
+        self._pending.append(_encode_record(record))
+
+    def discard_pending(self):
+        """Forget records that have not been committed yet."""
+        self._pending.clear()
+
+    @property
+    def valid(self):
+        """``True`` if records can be appended for the current task file."""
+        if self._identity is None:
+            return False
+        try:
+            return _identity(self.path) == self._identity
+        except OSError:
+            return False
+
+    def commit(self):
+        """Append the pending records to the journal file."""
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        with self._lock:
+            with open(self.journal_path, "ab") as fh:
+                fh.write(data)
+                fh.flush()
+                if self.durability != persistence.DURABILITY_NONE:
+                    os.fsync(fh.fileno())
+            self.records += len(self._pending)
+            self._size += len(data)
+        self._pending.clear()
+
+    def checkpoint(self, save):
+        """Run ``save()``, a full save of the task file, and start an empty
+        journal for the new file.
+
+        Every task is given a uid first so that later records can address
+        it.  A compaction cannot replace the file while this runs.
+        """
+        with self._lock:
+            _assign_uids(self.get_task())
+            save()
+            self.reset()
+
+    def reset(self):
+        """Start an empty journal for the task file that was just saved."""
+        with self._lock:
+            identity = _identity(self.path)
+            header = _MAGIC + _HEADER.pack(*identity)
+            with persistence._atomic_output(
+                self.journal_path, self.durability
+            ) as fh:
+                fh.write(header)
+            self._identity = identity
+            self._size = len(header)
+            self.records = 0
+        self._pending.clear()
+
+    # --- Recovery ------------------------------------------------------
+
+    def _leftovers(self):
+        name = self.path.name
+        return [
+            self.path.with_name(name + ".tmp"),
+            self.path.with_name(".compact-" + name),
+            self.path.with_name(".compact-" + name + ".tmp"),
+            self.journal_path.with_name(self.journal_path.name + ".tmp"),
+        ]
+
+    def _keep_aside(self):
+        """Rename the journal to an unused name and return that name."""
+        name = self.journal_path.name + ".stale"
+        kept = self.journal_path.with_name(name)
+        number = 1
+        while kept.exists():
+            number += 1
+            kept = self.journal_path.with_name(f"{name}{number}")
+        os.replace(self.journal_path, kept)
+        return kept.name
+
+    def recover(self, task):
+        """Replay the journal onto ``task``, freshly loaded from the file.
+
+        Leftovers of interrupted saves are removed, an incomplete last
+        record is cut off and a journal written for another version of the
+        file is ignored; if it holds records, it is renamed rather than
+        deleted so they can still be looked at.  Returns a
+        :py:class:`JournalRecovery`, also kept in :pyattr:`recovery`.
+        """
+        recovery = JournalRecovery()
+        pending = self.journal_path.with_name(self.journal_path.name + ".new")
+        base = _identity(self.path) if self.path.exists() else None
+        with self._lock:
+            if pending.exists():
+                if base is not None and _read_journal(pending)[0] == base:
+                    # A compaction replaced the task file but was interrupted
+                    # before its journal took the old one's place.
+                    os.replace(pending, self.journal_path)
+                else:
+                    pending.unlink()
+                    recovery.removed.append(pending.name)
+            records = []
+            if self.journal_path.exists():
+                identity, records, end, size = _read_journal(self.journal_path)
+                if base is None or identity != base:
+                    recovery.stale = True
+                    if records:
+                        recovery.kept = self._keep_aside()
+                        recovery.kept_records = len(records)
+                    else:
+                        self.journal_path.unlink()
+                    records = []
+                elif end < size:
+                    recovery.discarded_bytes = size - end
+                    with open(self.journal_path, "r+b") as fh:
+                        fh.truncate(end)
+            if self.journal_path.exists():
+                applied, recovery.error = _replay(task, records)
+                recovery.replayed = applied
+                self._size = end
+                self.records = applied
+                # After an inconsistent record the next save starts a new
+                # journal instead of appending to this one.
+                self._identity = base if recovery.error is None else None
+            for leftover in self._leftovers():
+                if leftover.exists():
+                    leftover.unlink()
+                    recovery.removed.append(leftover.name)
+        self.recovery = recovery
+        if recovery.recovered:
+            logger.warning(
+                "Recovered %s: %s", self.path, recovery.format().replace("\n", "; ")
+            )
+        return recovery
+
+    def replay(self, task):
+        """Apply the committed records to ``task`` loaded from the file."""
+        if not self.valid:
+            return task
+        with self._lock:
+            records = _read_journal(self.journal_path)[1]
+        _replay(task, records)
+        return task
+
+    # --- Compaction ----------------------------------------------------
+
+    def needs_compaction(self):
+        return self.records > self.max_records or self._size > self.max_bytes
+
+    @property
+    def compacting(self):
+        return self._job is not None and not self._job.done
+
+    def start_compaction(self):
+        """Compact on a background thread unless one is already running."""
+        if self.compacting:
+            return self._job
+        self._job = BackgroundJob(lambda progress: self.compact())
+        return self._job.start()
+
+    def compact(self):
+        """Fold the journal into a fresh task file.
+
+        The task file and journal are read from disk, so the tree in memory
+        is never touched and edits may continue meanwhile; records appended
+        during the compaction are carried over to the new journal.  Returns
+        ``False`` if the task file was replaced by a full save meanwhile.
+        """
+        with self._lock:
+            identity = self._identity
+            if identity is None or not self.valid:
+                return False
+            end = self._size
+            count = self.records
+        records = _read_journal(self.journal_path)[1][:count]
+        task = persistence.load_tasks(self.path)
+        applied, error = _replay(task, records)
+        if error is not None:
+            logger.warning("Not compacting %s: %s", self.path, error)
+            return False
+
+        compacted = self.path.with_name(".compact-" + self.path.name)
+        pending = self.journal_path.with_name(self.journal_path.name + ".new")
+        try:
+            persistence.save_tasks(task, compacted, durability=self.durability)
+            with self._lock:
+                if self._identity != identity or not self.valid:
+                    compacted.unlink()
+                    return False
+                with open(self.journal_path, "rb") as fh:
+                    fh.seek(end)
+                    tail = fh.read()
+                new_identity = _identity(compacted)
+                header = _MAGIC + _HEADER.pack(*new_identity)
+                # Written before the task file is replaced so that recover()
+                # finds a journal matching whichever file survives a crash.
+                with persistence._atomic_output(pending, self.durability) as fh:
+                    fh.write(header)
+                    fh.write(tail)
+                os.replace(compacted, self.path)
+                persistence.PARSE_CACHE.record_save(self.path, source=compacted)
+                os.replace(pending, self.journal_path)
+                if self.durability == persistence.DURABILITY_FSYNC_FILE_AND_DIR:
+                    persistence._fsync_directory(self.path.parent)
+                self._identity = _identity(self.path)
+                self._size = len(header) + len(tail)
+                self.records -= count
+        except BaseException:
+            for leftover in (compacted, pending):
+                try:
+                    leftover.unlink()
+                except OSError:
+                    pass
+            raise
+        return True
+
+    def wait(self, timeout=None):
+        """Wait for a running compaction; return ``True`` if none is left."""
+        return self._job is None or self._job.wait(timeout)
+
+
+def attach(controller, durability=persistence.DURABILITY_NONE):
+    """Replay the journal of ``controller``'s task file and keep journaling.
+
+    The latest edits of a program auto-saving through a journal may only be
+    in the journal, so a program that loads the file and then changes it
+    replays the journal onto its tasks first and appends its own changes
+    to it.  Returns the :py:class:`Journal`, or ``None`` for a directory
+    store, which has none.
+    """
+    path = Path(controller.save_path)
+    if path.is_dir():
+        return None
+    journal = Journal(path, lambda: controller.task, durability=durability)
+    # Logs what had to be recovered
+    journal.recover(controller.task)
+    controller.bus.subscribe(journal.record)
+    controller.scheduler.journal = journal
+    return journal
+
+
+def fold(controller, journal):
+    """Save ``controller``'s tasks in full if ``journal`` holds records.
+
+    Called before a program exits, so that programs reading the file
+    without replaying the journal see every edit too.  Returns ``False``
+    if the save failed; the journal is then left in place.
+    """
+    journal.wait()
+    if not (journal.records and journal.valid):
+        return True
+    # A save of the whole tree goes through Journal.checkpoint
+    controller.scheduler.mark_dirty()
+    return controller.scheduler.flush()
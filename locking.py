@@ -0,0 +1,123 @@
+"""
+This module provides the readers-writer lock of thread-safe controllers.
+
+Exports, searches and saves only read the task tree, so any number of them
+may run at the same time; edits need the tree to themselves.  A
+:py:class:`ReadWriteLock` lets many threads hold it for reading, or one
+thread for writing.
+
+Classes:
+- ReadWriteLock: Lock shared by readers and exclusive for a writer.
+
+Usage:
+    lock = ReadWriteLock()
+    with lock.read():
+        save_tasks(controller.task, path)
+    with lock.write():
+        controller.task.add_sub_task(task)
+"""
+import contextlib
+import threading
+
+
+class ReadWriteLock:
+    """Lets many threads read, or one thread write.
+
+    Writers are preferred: once a writer waits, threads starting to read
+    wait as well, so that a steady stream of readers cannot starve it.  The
+    lock is re-entrant on both sides: the writing thread may read and write
+    again, and a reading thread may read again even while a writer waits.
+    A reading thread asking to write would wait for itself and gets a
+    ``RuntimeError`` instead.
+
+    Attributes:
+        readers (int): Threads currently reading.
+        writing (bool): ``True`` while a thread writes.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self.readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        # Read depth of the current thread
+        self._local = threading.local()
+
+    @property
+    def writing(self):
+        return self._writer is not None
+
+    def acquire_read(self):
+        """Wait until no thread writes, then read."""
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        if depth or self._writer == threading.get_ident():
+            # Nested read, or the writing thread reading: already excluded
+            local.depth = depth + 1
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self.readers += 1
+        local.depth = 1
+
+    def release_read(self):
+        """Release one level of a read."""
+        local = self._local
+        local.depth -= 1
+        if local.depth or self._writer == threading.get_ident():
+            return
+        with self._cond:
+            self.readers -= 1
+            if not self.readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """Wait until no other thread reads or writes, then write.
+
+        Raises:
+            RuntimeError: The current thread holds the lock for reading.
+        """
+        me = threading.get_ident()
+        if self._writer == me:
+            self._write_depth += 1
+            return
+        if getattr(self._local, "depth", 0):
+            raise RuntimeError("cannot write while reading")
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self.readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+        self._write_depth = 1
+
+    def release_write(self):
+        """Release one level of a write."""
+        self._write_depth -= 1
+        if self._write_depth:
+            return
+        with self._cond:
+            self._writer = None
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def read(self):
+        """Hold the lock for reading in a ``with`` block."""
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write(self):
+        """Hold the lock for writing in a ``with`` block."""
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
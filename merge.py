@@ -0,0 +1,393 @@
+"""
+This module compares task trees and merges one into another.
+
+Tasks of the two trees are matched by uid or, when either side has none, by
+a fingerprint of their name, due date and parent (the task their parent was
+matched to).  Both lookups are hash maps built in one pass over a tree, so
+comparing or merging trees takes time linear in their size.
+
+Functions:
+- diff(old_root, new_root): Return the operations turning one tree into the
+  other (see ``TaskController.apply_batch``).
+- changes(operations): Describe operations as inserted, deleted, moved,
+  reordered and changed tasks.
+- plan_merge(current, imported): Return the operations merging ``imported``
+  into ``current``.
+- subtree_digests(root), trees_equal(first, second): Compare trees by
+  digest.
+
+Usage:
+    operations = diff(controller.task, load_tasks("tasks.json"))
+    controller.apply_batch(operations)
+"""
+import collections
+import hashlib
+
+from task import Task
+
+
+# Fields copied from imported tasks onto the tasks they match
+MERGED_FIELDS = ("name", "due_date", "priority", "completed")
+
+
+class _Index:
+    """Hash maps finding the existing task matching an imported one."""
+
+    def __init__(self, root):
+        self.parent_of = {}
+        self.depth = {id(root): 0}
+        self.by_uid = {}
+        # Fingerprint -> tasks without a uid / with a uid, in tree order
+        self.by_print = collections.defaultdict(collections.deque)
+        self.by_print_uid = collections.defaultdict(collections.deque)
+        self.matched = set()
+        stack = [root]
+        while stack:
+            task = stack.pop()
+            children = task.get_sub_tasks()
+            depth = self.depth[id(task)] + 1
+            for child in children:
+                self.parent_of[id(child)] = task
+                self.depth[id(child)] = depth
+                fingerprint = (child.name, child.due_date, id(task))
+                if child.uid is None:
+                    self.by_print[fingerprint].append(child)
+                else:
+                    self.by_uid.setdefault(child.uid, child)
+                    self.by_print_uid[fingerprint].append(child)
+            stack.extend(children)
+
+    def _take(self, queue):
+        while queue:
+            task = queue.popleft()
+            if id(task) not in self.matched:
+                return task
+        return None
+
+    def match(self, task, parent):
+        """Return the unmatched existing task ``task`` corresponds to, if any.
+
+        ``parent`` is the existing task the parent of ``task`` was matched
+        to; the fingerprint of ``task`` includes it, so tasks of the same
+        name only match within the same list.
+        """
+        found = None
+        if task.uid is not None:
+            found = self.by_uid.get(task.uid)
+            if found is not None and id(found) in self.matched:
+                found = None
+        if found is None:
+            fingerprint = (task.name, task.due_date, id(parent))
+            found = self._take(self.by_print.get(fingerprint, ()))
+            if found is None and task.uid is None:
+                found = self._take(self.by_print_uid.get(fingerprint, ()))
+        if found is not None:
+            self.matched.add(id(found))
+        return found
+
+
+def _copy(task):
+    """Return a new task with the fields of ``task`` but no sub-tasks."""
+    return Task(
+        task.name,
+        due_date=task.due_date,
+        priority=task.priority,
+        completed=task.completed,
+        uid=task.uid,
+    )
+
+
+def _changed_fields(old, new):
+    """Return the values of :py:data:`MERGED_FIELDS` ``new`` changes."""
+    return {
+        field: getattr(new, field)
+        for field in MERGED_FIELDS
+        if getattr(new, field) != getattr(old, field)
+    }
+
+
+def subtree_digests(root):
+    """Return a digest of every subtree of ``root``, keyed by ``id(task)``.
+
+    The digest of a task covers every field :py:meth:`Task.to_dict` saves
+    and the digests of its sub-tasks in order, so two subtrees with the same
+    digest are equal.  The tree is walked with an explicit stack.
+    """
+    digests = {}
+    stack = [(root, False)]
+    while stack:
+        task, expanded = stack.pop()
+        children = task.get_sub_tasks()
+        if children and not expanded:
+            stack.append((task, True))
+            stack.extend((child, False) for child in children)
+            continue
+        fields = (
+            task.name,
+            task.due_date,
+            task.priority,
+            task.completed,
+            task.uid,
+            task.modified,
+            task.revision,
+            sorted(task.deleted.items()),
+        )
+        digest = hashlib.blake2b(repr(fields).encode(), digest_size=16)
+        for child in children:
+            digest.update(digests[id(child)])
+        digests[id(task)] = digest.digest()
+    return digests
+
+
+def trees_equal(first, second):
+    """Return whether the trees ``first`` and ``second`` are equal.
+
+    Unlike comparing :py:meth:`Task.to_dict` results this works for trees
+    of any depth.
+    """
+    return subtree_digests(first)[id(first)] == subtree_digests(second)[id(second)]
+
+
+def diff(old_root, new_root):
+    """Return the operations turning the tree ``old_root`` into ``new_root``.
+
+    Tasks are matched as described in the module documentation; subtrees
+    whose digest (see :py:func:`subtree_digests`) is the same in both trees
+    are skipped as a whole.  The operations refer to the tasks of
+    ``old_root`` and are, in order:
+
+    * ``("remove", parent, items)`` for deleted tasks and tasks moved to
+      another parent, deepest parents first;
+    * ``("insert", parent, items)`` for new tasks (copies of those of
+      ``new_root``, with their new sub-tasks) and moved tasks, and
+      ``("order", parent, tasks)`` for lists whose order changed, parents
+      before their sub-tasks;
+    * ``("update", parent, task, values)`` for changed fields of
+      :py:data:`MERGED_FIELDS`; ``parent`` is ``None`` for the root.
+
+    They can be applied with :py:meth:`TaskController.apply_batch`, after
+    which ``old_root`` has the structure and fields of ``new_root``.  Neither
+    tree is modified by this function, and an empty list means that there
+    is nothing to change.  Only the time stamps (see :py:meth:`Task.touch`)
+    are not carried over.
+    """
+    old_digests = subtree_digests(old_root)
+    new_digests = subtree_digests(new_root)
+    if old_digests[id(old_root)] == new_digests[id(new_root)]:
+        return []
+    index = _Index(old_root)
+    removals = []
+    structure = []
+    updates = []
+    values = _changed_fields(old_root, new_root)
+    if values:
+        updates.append(("update", None, old_root, values))
+    # Old tasks whose sub-tasks were compared, and matched tasks that now
+    # belong to another parent
+    paired = set()
+    moved = []
+
+    # ``(target, task, is_new)``: ``target`` receives the sub-tasks of
+    # ``task``; new targets are copies that are not in the tree yet
+    stack = [(old_root, new_root, False)]
+    while stack:
+        target, task, is_new = stack.pop()
+        final = []
+        for child in task.get_sub_tasks():
+            existing = index.match(child, target)
+            if existing is None:
+                copy = _copy(child)
+                final.append(copy)
+                stack.append((copy, child, True))
+                continue
+            final.append(existing)
+            values = _changed_fields(existing, child)
+            if values:
+                updates.append(("update", target, existing, values))
+            if index.parent_of[id(existing)] is not target:
+                moved.append(existing)
+            if old_digests[id(existing)] != new_digests[id(child)]:
+                stack.append((existing, child, False))
+        if is_new:
+            target.sub_tasks.extend(final)
+            continue
+        paired.add(id(target))
+        old_children = target.get_sub_tasks()
+        in_final = {id(t) for t in final}
+        old_ids = {id(t) for t in old_children}
+        gone = [(i, t) for i, t in enumerate(old_children) if id(t) not in in_final]
+        if gone:
+            gone.reverse()
+            removals.append((index.depth[id(target)], ("remove", target, gone)))
+        added = [(i, t) for i, t in enumerate(final) if id(t) not in old_ids]
+        if added:
+            structure.append(("insert", target, added))
+        kept = [t for t in old_children if id(t) in in_final]
+        if kept != [t for t in final if id(t) in old_ids]:
+            structure.append(("order", target, final))
+
+    # Tasks moved out of deleted parents leave them before they are removed
+    leaving = {}
+    for task in moved:
+        parent = index.parent_of[id(task)]
+        if id(parent) not in paired:
+            leaving.setdefault(id(parent), [parent, set()])[1].add(id(task))
+    for parent, ids in leaving.values():
+        items = [(i, t) for i, t in enumerate(parent.get_sub_tasks()) if id(t) in ids]
+        items.reverse()
+        removals.append((index.depth[id(parent)], ("remove", parent, items)))
+    removals.sort(key=lambda removal: -removal[0])
+    return [op for _, op in removals] + structure + updates
+
+
+def changes(operations):
+    """Yield ``(kind, task, detail)`` describing ``operations`` for review.
+
+    ``kind`` is ``"deleted"``, ``"inserted"`` or ``"moved"`` with the
+    parent as ``detail``, ``"reordered"`` with the parent as ``task``, or
+    ``"changed"`` with the new values as ``detail``.  New subtrees are
+    reported by their top task.
+    """
+    removed = set()
+    inserted = set()
+    # Existing tasks moved into new subtrees: id -> new parent
+    nested = {}
+    for operation in operations:
+        if operation[0] == "remove":
+            removed.update(id(task) for _, task in operation[2])
+        elif operation[0] == "insert":
+            for _, task in operation[2]:
+                inserted.add(id(task))
+                stack = [task]
+                while stack:
+                    parent = stack.pop()
+                    for child in parent.get_sub_tasks():
+                        nested[id(child)] = parent
+                    stack.extend(parent.get_sub_tasks())
+    for operation in operations:
+        kind, parent = operation[0], operation[1]
+        if kind == "remove":
+            for _, task in reversed(operation[2]):
+                if id(task) in nested:
+                    yield "moved", task, nested[id(task)]
+                elif id(task) not in inserted:
+                    yield "deleted", task, parent
+        elif kind == "insert":
+            for _, task in operation[2]:
+                yield ("moved" if id(task) in removed else "inserted"), task, parent
+        elif kind == "order":
+            yield "reordered", parent, None
+        elif kind == "update":
+            yield "changed", operation[2], operation[3]
+
+
+def _newer(task, existing):
+    """Return whether ``task`` was changed after ``existing``."""
+    return (task.modified or 0) > (existing.modified or 0)
+
+
+def _deleted_since(root, task):
+    """Return whether ``root`` deleted ``task`` after it was last changed."""
+    tombstone = root.deleted.get(task.uid) if task.uid is not None else None
+    return tombstone is not None and tombstone[0] >= (task.modified or 0)
+
+
+def plan_merge(current, imported, newer_only=False):
+    """Return the operations merging the tree ``imported`` into ``current``.
+
+    Every sub-task of ``imported`` is matched to at most one task of
+    ``current`` (see the module documentation).  Matched tasks receive the
+    imported values of :py:data:`MERGED_FIELDS` that differ and are moved
+    when the import places them under another parent; unmatched tasks are
+    added at the end of their parent's sub-tasks.  Existing tasks missing
+    from the import are kept, and the roots themselves are left unchanged.
+
+    With ``newer_only``, as when taking over a save of another process, the
+    two roots are versions of the same tree and each task keeps its latest
+    version (see :py:attr:`Task.modified`): only tasks the import changed
+    later are updated or moved, tasks deleted from ``current`` after the
+    import last changed them are not added back, and tasks the import
+    deleted after ``current`` last changed them are removed.
+
+    ``current`` is not modified.  The result is a list of ``("remove", ...)``
+    operations (for moved tasks), then ``("insert", ...)`` and then
+    ``("update", ...)`` operations, grouped per parent so that applying them
+    takes linear time; see :py:meth:`TaskController.apply_batch`.
+    """
+    index = _Index(current)
+    # id(parent) -> [parent, tasks]; dictionaries keep the order in which
+    # parents were first seen, so inserted tasks precede their children
+    removed = {}
+    inserted = {}
+    updates = []
+
+    stack = [
+        (child, current, False) for child in reversed(imported.get_sub_tasks())
+    ]
+    while stack:
+        task, parent, parent_is_new = stack.pop()
+        existing = index.match(task, parent)
+        if existing is None:
+            if newer_only and _deleted_since(current, task):
+                continue
+            target = _copy(task)
+            is_new = True
+        else:
+            target = existing
+            is_new = False
+            take = not newer_only or _newer(task, existing)
+            values = _changed_fields(existing, task) if take else None
+            if values:
+                updates.append(("update", parent, existing, values))
+            old_parent = index.parent_of[id(existing)]
+            if old_parent is not parent:
+                if take:
+                    removed.setdefault(id(old_parent), [old_parent, []])[1].append(
+                        existing
+                    )
+                else:
+                    # Stays where it is; its sub-tasks are still merged
+                    parent = None
+        if parent is None:
+            pass
+        elif parent_is_new:
+            # The parent is not in the tree yet and is added with its subtree
+            parent.sub_tasks.append(target)
+        elif is_new or index.parent_of[id(target)] is not parent:
+            inserted.setdefault(id(parent), [parent, []])[1].append(target)
+
+        stack.extend(
+            (child, target, is_new) for child in reversed(task.get_sub_tasks())
+        )
+    if newer_only:
+        for uid, (when, _) in imported.deleted.items():
+            existing = index.by_uid.get(uid)
+            if (
+                existing is not None
+                and id(existing) not in index.matched
+                and when >= (existing.modified or 0)
+            ):
+                old_parent = index.parent_of[id(existing)]
+                removed.setdefault(id(old_parent), [old_parent, []])[1].append(
+                    existing
+                )
+    operations = []
+    remaining = {}
+    # Tasks leave removed parents before these are removed themselves
+    for parent, tasks in sorted(
+        removed.values(), key=lambda entry: -index.depth[id(entry[0])]
+    ):
+        gone = {id(t) for t in tasks}
+        items = [
+            (i, t) for i, t in enumerate(parent.sub_tasks) if id(t) in gone
+        ]
+        items.reverse()
+        operations.append(("remove", parent, items))
+        remaining[id(parent)] = len(parent.sub_tasks) - len(items)
+    for parent, tasks in inserted.values():
+        start = remaining.get(id(parent), len(parent.sub_tasks))
+        operations.append(
+            ("insert", parent, [(start + i, t) for i, t in enumerate(tasks)])
+        )
+    operations.extend(updates)
+    return operations
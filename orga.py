@@ -6,8 +6,17 @@ saved to a JSON file (``tasks.json``) upon closing the application.
 
 Modules:
 - tkinter: provides the Tk GUI toolkit for building the application's GUI.
+  It is only imported when the GUI starts.
 - messagebox: a sub-module of tkinter used for displaying message boxes.
-- persistence: helper functions for saving and loading task data in JSON.
+- persistence: helper functions for saving and loading task data in JSON,
+  binary snapshots or directory stores.
+- cli: headless command-line interface, run with ``python -m orga cli``.
+- sharing: locking and merging saves of a file shared by several processes
+  (``--shared``).
+- instance: forwards later invocations to the running instance of a file
+  (``--new-instance`` opens another one).
+- service: JSON-RPC and HTTP service for other local programs, run with
+  ``python -m orga serve``.
 
 Classes:
 - Task: represents a single task in the to-do list.
@@ -17,35 +26,117 @@ Classes:
 Functions:
 - on_closing(): handles the closing event of the application,
                 prompting the user to save modifications before closing.
+- main(): starts the GUI, the headless CLI when the first argument is
+          ``cli`` or the local service when it is ``serve``.
+          ``--startup-report`` prints how long each start-up phase of
+          the GUI took.
 
 Usage:
-    Run this script to launch the to-do list application.
+    Run this script to launch the to-do list application, or
+    ``python -m orga cli --help`` for scripted use without a display.
 """
-import argparse
+import io
+import os
+import sys
+import threading
+import time
 from pathlib import Path
-import tkinter as tk
-from tkinter import messagebox as tkMessageBox
-from task import Task
-from window import Window
-from controller import TaskController
-from persistence import load_tasks_from_json, save_tasks_to_json
 
+import instance
 
-def load_tasks(path="tasks.json"):
-    """Load tasks from the given JSON ``path`` using JSON persistence."""
-    return load_tasks_from_json(path)
+# ``argparse`` and the modules of the application are imported by the
+# functions using them, so that invocations forwarded to a running instance
+# (see :py:func:`instance.forward_argv`) exit before loading them.
+
+
+# How often the GUI handles requests forwarded by later invocations
+_SERVE_INTERVAL_MS = 50
+
+
+def __getattr__(name):
+    # ``tkMessageBox`` is resolved lazily so that importing this module (and
+    # running the CLI) does not load tkinter.
+    if name == "tkMessageBox":
+        from tkinter import messagebox
+
+        return messagebox
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_tasks(path="tasks.json", progress=None, lazy=False):
+    """Load tasks from ``path``, a JSON file, a binary snapshot or a
+    directory store.
+
+    With ``lazy`` sub-tasks below the top level are only built once they
+    are accessed, e.g. when their row is expanded.
+    """
+    import persistence
+
+    return persistence.load_tasks(path, progress, lazy=lazy)
+
+
+class StartupReport:
+    """Time the start-up phases of the GUI, in the spirit of ``-X importtime``.
+
+    Every call to :py:meth:`mark` closes a phase and records its duration,
+    the time elapsed since start-up and the modules imported during it.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phases = []
+        self._start = self._last = clock()
+        self._modules = set(sys.modules)
+
+    def mark(self, label):
+        """Close the current phase under ``label``."""
+        now = self.clock()
+        modules = set(sys.modules)
+        self.phases.append(
+            (label, now - self._last, now - self._start, len(modules - self._modules))
+        )
+        self._last = now
+        self._modules = modules
+
+    def format(self):
+        """Return the report as text, one line per phase."""
+        lines = ["startup: self [ms] | cumulative [ms] | modules | phase"]
+        for label, own, total, modules in self.phases:
+            lines.append(
+                f"startup: {own * 1000:9.1f} | {total * 1000:15.1f} | "
+                f"{modules:7d} | {label}"
+            )
+        return "\n".join(lines)
 
 
 # Main program
 def _tasks_equal(t1, t2):
     """Return ``True`` if the two task trees are identical."""
-    try:
-        return t1.to_dict() == t2.to_dict()
-    except Exception:
-        return False
+    import merge
+
+    return merge.trees_equal(t1, t2)
+
+
+def _tk_after(root):
+    """Return an ``after(delay_ms, func)`` for the auto-save scheduler.
 
+    Edits made on worker threads through the thread-safe controller
+    schedule their save from those threads; like
+    ``Window._on_task_event``, the timer is then handed to the Tk thread,
+    which created ``root``, instead of being started off it.
+    """
+    tk_thread = threading.get_ident()
+
+    def after(delay_ms, func):
+        if threading.get_ident() == tk_thread:
+            root.after(delay_ms, func)
+        else:
+            root.after(0, lambda: root.after(delay_ms, func))
+
+    return after
 
-def on_closing(task, rt, path="tasks.json"):
+
+def on_closing(task, rt, path="tasks.json", scheduler=None):
     """Handle the closing event and optionally save modifications.
 
     Parameters
@@ -56,20 +147,65 @@ def on_closing(task, rt, path="tasks.json"):
         The root window or widget that should be destroyed.
     path : str or Path, optional
         File path used to load and save tasks. Defaults to ``"tasks.json"``.
+    scheduler : SaveScheduler, optional
+        Auto-save scheduler whose pending write is flushed before comparing
+        the tasks with the file.  Its durability policy also applies when
+        the tasks are saved here, and the file is compared with the tasks
+        only after its journal, if any, has been replayed.  A journal that
+        still holds records is folded into the file before closing.
     """
+    from tkinter import messagebox as tkMessageBox
+    import persistence
+
+    journal = scheduler.journal if scheduler is not None else None
+    kwargs = {}
+    if scheduler is not None:
+        scheduler.flush()
+        if scheduler.durability is not None:
+            kwargs["durability"] = scheduler.durability
+    existing = None
     try:
-        existing = load_tasks_from_json(path)
+        if journal is not None and journal.records:
+            existing = load_tasks(path)
+            journal.replay(existing)
+            unchanged = _tasks_equal(task, existing)
+        else:
+            # Usually answered from the digest the last save recorded
+            unchanged = persistence.tasks_match_file(task, path)
     except Exception:
-        existing = None
+        unchanged = False
 
-    if existing is not None and _tasks_equal(task, existing):
+    def fold_journal(tree):
+        # Writes the journaled edits into the file itself, so that programs
+        # reading it without replaying the journal see them too
+        try:
+            journal.checkpoint(
+                lambda: persistence.save_tasks(tree, path, **kwargs)
+            )
+        except OSError as err:
+            # The journal is kept and replayed on the next load
+            print(f"Failed to save {path}: {err}", file=sys.stderr)
+
+    if unchanged:
+        if existing is not None:
+            fold_journal(task)
         rt.destroy()
         return
 
     save_changes = tkMessageBox.askyesno("Quit", "Save your modification?")
     if save_changes:
         try:
-            save_tasks_to_json(task, path)
+            if journal is not None:
+                journal.checkpoint(
+                    lambda: persistence.save_tasks(task, path, **kwargs)
+                )
+            elif scheduler is not None and scheduler.shared is not None:
+                # Merges what other processes saved instead of overwriting it
+                scheduler.mark_dirty()
+                if not scheduler.flush():
+                    raise OSError(f"failed to save {path}")
+            else:
+                persistence.save_tasks(task, path, **kwargs)
         except OSError:
             try:
                 tkMessageBox.showwarning(
@@ -78,27 +214,290 @@ def on_closing(task, rt, path="tasks.json"):
                 )
             except Exception:
                 pass
+    elif existing is not None:
+        fold_journal(existing)
     rt.destroy()
 
 
-if __name__ == "__main__":
+def run_gui(
+    file_path,
+    report=None,
+    compresslevel=None,
+    durability=None,
+    shared=False,
+    single_instance=False,
+):
+    """Open the main window for the tasks stored in ``file_path``.
+
+    The window is shown right away with an empty tree while the file is
+    parsed on a worker thread; the tasks are filled in once loading
+    completes.  Auto-saving is paused until then so that the placeholder
+    tree never overwrites the file.
+
+    Unless ``file_path`` is a directory store, auto-saves are appended to a
+    crash-recovery journal (see :py:mod:`journal`) that is replayed after
+    loading; what recovery found is printed to ``stderr``.
+
+    With ``shared``, other processes may work on the same file: saves lock
+    it and merge what others saved in the meantime (see :py:mod:`sharing`)
+    instead of using a journal.  Either way, once the tasks are shown the
+    file is watched (see :py:mod:`watcher`) and changes written by other
+    programs are applied to the open windows.
+
+    With ``single_instance``, later invocations for the same file forward
+    their requests to this one (see :py:mod:`instance`): they raise the
+    window, and ``cli`` commands are run on the open tasks once they are
+    loaded.
+
+    Args:
+        file_path (str or Path): JSON file holding the tasks.
+        report (StartupReport, optional): Receives the start-up timings,
+            which are printed to ``stderr`` once the tasks are shown.
+        compresslevel (int, optional): Compression level of auto-saves when
+            ``file_path`` ends in ``.gz``, ``.xz`` or ``.bz2``.
+        durability (str, optional): Durability policy of the saves, one of
+            ``persistence.DURABILITY_POLICIES``.
+        shared (bool, optional): Share ``file_path`` with other processes.
+        single_instance (bool, optional): Serve the requests of later
+            invocations.
+    """
+    import tkinter as tk
+    import persistence
+    from controller import TaskController
+    from task import Task
+    from window import Window
+    from worker import BackgroundJob
+    from journal import Journal
+    from watcher import FileWatcher
+
+    if report is not None:
+        report.mark("import GUI modules")
+
+    root = tk.Tk()
+    root.title("Task Manager")
+
+    # Thread-safe: exports and loads read the tree on worker threads
+    controller = TaskController(Task("Main"), save_path=file_path, thread_safe=True)
+    # Coalesce auto-saves from every window into one write per burst of edits
+    controller.scheduler.after = _tk_after(root)
+    controller.scheduler.compresslevel = compresslevel
+    controller.scheduler.durability = durability
+    controller.scheduler.pause()
+    journal = None
+    shared_file = None
+    if shared:
+        from sharing import SharedFile
+
+        shared_file = SharedFile(file_path)
+        controller.scheduler.shared = shared_file
+        controller.scheduler.on_conflict = controller.sync_tasks
+    elif not Path(file_path).is_dir():
+        journal = Journal(
+            file_path,
+            lambda: controller.task,
+            durability=durability or persistence.DURABILITY_NONE,
+        )
+        controller.bus.subscribe(journal.record)
+        controller.scheduler.journal = journal
+    window = Window(root, controller)
+    root.update_idletasks()
+    if report is not None:
+        report.mark("show main window")
+
+    def handle_request(request):
+        if request.get("command") == "cli":
+            import cli
+
+            out, err = io.StringIO(), io.StringIO()
+            code = cli.execute(
+                controller, request["argv"], out, err, cwd=request.get("cwd")
+            )
+            return {"code": code, "output": out.getvalue(), "error": err.getvalue()}
+        root.deiconify()
+        root.lift()
+        root.focus_force()
+        return {"code": 0, "output": "", "error": ""}
+
+    server = None
+    if single_instance:
+        from instance import InstanceServer
+
+        # Listen right away so that later invocations wait for the tasks
+        # instead of loading them a second time
+        server = InstanceServer(file_path, handle_request)
+        if not server.start():
+            server = None
+
+    def serve():
+        server.poll()
+        root.after(_SERVE_INTERVAL_MS, serve)
+
+    def load(progress):
+        if shared_file is not None:
+            return shared_file.load(progress, lazy=True)
+        task = load_tasks(file_path, progress, lazy=True)
+        if journal is not None:
+            journal.recover(task)
+        return task
+
+    job = BackgroundJob(load).start()
+
+    def finish_loading():
+        if not job.done:
+            root.after(20, finish_loading)
+            return
+        if job.error is not None:
+            # Saving stays paused so that the empty placeholder tree never
+            # overwrites the file that could not be read
+            if server is not None:
+                server.close()
+            try:
+                from tkinter import messagebox as tkMessageBox
+
+                tkMessageBox.showerror(
+                    "Load Error",
+                    f"Failed to load tasks from {file_path}:\n{job.error}\n\n"
+                    "Changes will not be saved.",
+                )
+            except Exception:
+                pass
+            return
+        window._replace_tasks(job.result)
+        controller.scheduler.resume(discard=True)
+        if journal is not None and journal.recovery is not None:
+            if journal.recovery.recovered:
+                print(journal.recovery.format(), file=sys.stderr)
+            if journal.needs_compaction():
+                journal.start_compaction()
+        if report is not None:
+            report.mark("load and display tasks")
+            print(report.format(), file=sys.stderr)
+        if not Path(file_path).is_dir():
+            FileWatcher(file_path, root.after, controller.reload_tasks).start()
+        if server is not None:
+            serve()
+
+    def close():
+        if not job.done or job.error is not None:
+            # Nothing can have been saved yet; stop parsing and quit.
+            job.cancel()
+            root.destroy()
+            return
+        on_closing(
+            controller.task, root, file_path, scheduler=controller.scheduler
+        )
+
+    root.after(0, finish_loading)
+    root.protocol("WM_DELETE_WINDOW", close)
+    try:
+        root.mainloop()
+    finally:
+        if server is not None:
+            server.close()
+    return window
+
+
+def _not_answered(err, option):
+    """Report that the running instance did not answer; return the exit code."""
+    sys.stderr.write(
+        f"error: the running instance did not answer ({err}); it may still "
+        f"be loading, try again or pass {option}\n"
+    )
+    return 1
+
+
+def main(argv=None):
+    """Run the GUI, or the headless CLI or service when ``argv`` starts with
+    ``cli`` or ``serve``."""
+    report = StartupReport()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] == "cli":
+        try:
+            reply = instance.forward_argv(argv[1:], {
+                "command": "cli", "argv": argv[1:], "cwd": os.getcwd()
+            })
+        except OSError as err:
+            return _not_answered(err, "--no-forward")
+        if reply is not None:
+            sys.stdout.write(reply["output"])
+            sys.stderr.write(reply["error"])
+            return reply["code"]
+        import cli
+
+        return cli.main(argv[1:])
+    if argv and argv[0] == "serve":
+        import service
+
+        return service.main(argv[1:])
+    try:
+        reply = instance.forward_argv(argv, {"command": "show"})
+    except OSError as err:
+        return _not_answered(err, "--new-instance")
+    if reply is not None:
+        sys.stderr.write(reply["error"])
+        return reply["code"]
+
+    import argparse
+    import persistence
 
     parser = argparse.ArgumentParser(description="Task Manager")
     parser.add_argument(
         "--file",
         default="tasks.json",
-        help="Path to the tasks JSON file",
+        help="Path to the tasks file (JSON, compressed JSON or .snapshot) "
+        "or directory store",
     )
-    args = parser.parse_args()
-
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        metavar="N",
+        help="Compression level used when auto-saving compressed files",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="Print how long each start-up phase took to stderr",
+    )
+    parser.add_argument(
+        "--durability",
+        choices=persistence.DURABILITY_POLICIES,
+        default=persistence.DURABILITY_FSYNC_FILE,
+        help="What saves flush to the disk before completing "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shared",
+        action="store_true",
+        help="Share the tasks file with other running instances: saves "
+        "lock it and merge the changes of the others",
+    )
+    parser.add_argument(
+        "--new-instance",
+        action="store_true",
+        help="Open another window even if an instance already has the "
+        "tasks file open (by default that instance is brought to front)",
+    )
+    args = parser.parse_args(argv)
     file_path = Path(args.file).resolve()
+    if not args.new_instance:
+        try:
+            reply = instance.forward(file_path, {"command": "show"})
+        except OSError as err:
+            return _not_answered(err, "--new-instance")
+        if reply is not None:
+            sys.stderr.write(reply["error"])
+            return reply["code"]
 
-    root = tk.Tk()
-    root.title("Task Manager")
+    run_gui(
+        file_path,
+        report=report if args.startup_report else None,
+        compresslevel=args.compress_level,
+        durability=args.durability,
+        shared=args.shared,
+        single_instance=not args.new_instance,
+    )
+    return 0
 
-    main_tasks = load_tasks(file_path)
 
-    controller = TaskController(main_tasks, save_path=file_path)
-    window = Window(root, controller)
-    root.protocol("WM_DELETE_WINDOW", lambda: on_closing(main_tasks, root, file_path))
-    root.mainloop()
+if __name__ == "__main__":
+    sys.exit(main())
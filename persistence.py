@@ -1,209 +1,2969 @@
+import bz2
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import io
+import itertools
 import json
 import logging
+import lzma
 import csv
+import datetime
+import functools
+import gc
+import hashlib
+import mmap
+import multiprocessing
+import os
+import re
+import stat
+import struct
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
 from task import Task
 
+try:
+    import orjson as _fast_json
+except ImportError:  # optional, only makes JSON files faster to read and write
+    _fast_json = None
+
 
 logger = logging.getLogger(__name__)
 
+_CHUNK_SIZE = 1 << 16
+
+
+class OperationCancelled(Exception):
+    """Raised by a load or save whose :py:class:`Progress` was cancelled."""
+
+
+class Progress:
+    """Progress and cancellation state shared with a running load or save.
+
+    Loads report bytes read; saves report bytes (JSON) or tasks (CSV, ICS)
+    written.  Another thread may call :py:meth:`cancel`; the operation then
+    stops at its next progress update by raising ``OperationCancelled``.
+
+    Attributes:
+        done (int): Amount of work processed so far.
+        total (int or None): Expected amount of work, if known.
+        unit (str): ``"bytes"``, ``"tasks"`` or ``"files"``.
+    """
+
+    def __init__(self):
+        self.done = 0
+        self.total = None
+        self.unit = "bytes"
+        self._cancelled = threading.Event()
+
+    def start(self, total=None, unit="bytes"):
+        """Reset the counters for an operation of ``total`` ``unit``."""
+        self.done = 0
+        self.total = total
+        self.unit = unit
+        self.check()
+
+    def advance(self, amount=1):
+        """Record ``amount`` more units of work."""
+        self.done += amount
+        self.check()
+
+    def check(self):
+        """Raise ``OperationCancelled`` if :py:meth:`cancel` was called."""
+        if self._cancelled.is_set():
+            raise OperationCancelled()
+
+    def cancel(self):
+        """Ask the running operation to stop."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def fraction(self):
+        """Return the completed fraction, or ``None`` if the total is unknown."""
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+
+
+class _ProgressWriter:
+    """File wrapper reporting the number of characters written."""
+
+    def __init__(self, fh, progress):
+        self._fh = fh
+        self._progress = progress
+
+    def write(self, text):
+        self._fh.write(text)
+        self._progress.advance(len(text))
+
+
+# Compressed files are written according to their suffix and recognised by
+# their magic bytes when read, whatever their name.
+_COMPRESSION_SUFFIXES = {".gz": gzip, ".xz": lzma, ".bz2": bz2}
+_COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", gzip),
+    (b"\xfd7zXZ\x00", lzma),
+    (b"BZh", bz2),
+)
+
+
+def _compression_for_suffix(path):
+    """Return the compression module matching the suffix of ``path``."""
+    return _COMPRESSION_SUFFIXES.get(Path(path).suffix.lower())
+
+
+def _compression_for_magic(header):
+    """Return the compression module whose magic bytes start ``header``."""
+    for magic, module in _COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return module
+    return None
+
+
+def _level_kwargs(module, compresslevel):
+    if compresslevel is None:
+        return {}
+    if module is lzma:
+        return {"preset": compresslevel}
+    return {"compresslevel": compresslevel}
+
+
+class _ProgressReader(io.RawIOBase):
+    """Raw stream reporting the number of bytes read from ``fh``."""
+
+    def __init__(self, fh, progress):
+        self._fh = fh
+        self._progress = progress
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._fh.readinto(buffer)
+        if count:
+            self._progress.advance(count)
+        return count
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+@contextlib.contextmanager
+def _open_input(path, progress=None, encoding=None, newline=None):
+    """Open ``path`` for reading, decompressing it if needed.
+
+    gzip, xz and bzip2 files are detected by their magic bytes and
+    decompressed while they are read.  ``progress`` receives the number of
+    bytes read from disk.  The stream is binary unless ``encoding`` is given.
+    """
+    with contextlib.ExitStack() as stack:
+        fh = stack.enter_context(open(path, "rb"))
+        module = _compression_for_magic(fh.read(6))
+        fh.seek(0)
+        if progress is not None:
+            progress.start(os.fstat(fh.fileno()).st_size)
+            fh = stack.enter_context(
+                io.BufferedReader(_ProgressReader(fh, progress), _CHUNK_SIZE)
+            )
+        if module is not None:
+            fh = stack.enter_context(module.open(fh, "rb"))
+        if encoding is not None:
+            fh = stack.enter_context(
+                io.TextIOWrapper(fh, encoding=encoding, newline=newline)
+            )
+        yield fh
+
+
+# Durability policies of saves.  Every save writes a temporary sibling of
+# the target and renames it over the target, so a crash leaves either the
+# old or the new file.  The policy decides what is flushed to the disk
+# before returning: nothing, the new file's data, or also the directory
+# entry of the rename.
+DURABILITY_NONE = "none"
+DURABILITY_FSYNC_FILE = "fsync-file"
+DURABILITY_FSYNC_FILE_AND_DIR = "fsync-file-and-dir"
+DURABILITY_POLICIES = (
+    DURABILITY_NONE,
+    DURABILITY_FSYNC_FILE,
+    DURABILITY_FSYNC_FILE_AND_DIR,
+)
+
+
+def _fsync_directory(path):
+    if os.name != "posix":
+        # Directories cannot be opened for fsync on Windows
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def _atomic_output(path, durability=DURABILITY_NONE):
+    """Yield a binary file that replaces ``path`` once the block succeeds.
+
+    The data is written to ``<name>.tmp`` next to ``path``, flushed to the
+    disk according to ``durability`` and renamed over ``path``.  If the
+    block raises, the temporary file is removed and ``path`` is untouched.
+    """
+    if durability not in DURABILITY_POLICIES:
+        raise ValueError(f"Unknown durability policy: {durability!r}")
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as fh:
+            yield fh
+            fh.flush()
+            if durability != DURABILITY_NONE:
+                os.fsync(fh.fileno())
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except OSError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    PARSE_CACHE.record_save(path)
+    if durability == DURABILITY_FSYNC_FILE_AND_DIR:
+        _fsync_directory(path.parent)
+
+
+@contextlib.contextmanager
+def _open_output(
+    path, progress=None, compresslevel=None, durability=DURABILITY_NONE, **kwargs
+):
+    """Open ``path`` for writing text through :py:func:`_atomic_output`.
+
+    Paths ending in ``.gz``, ``.xz`` or ``.bz2`` are compressed while they
+    are written, using ``compresslevel`` (the codec's default if ``None``).
+    If the save fails or is cancelled the previous file is left as it was.
+    """
+    module = _compression_for_suffix(path)
+    with _atomic_output(path, durability) as raw:
+        if module is None:
+            binary = raw
+        elif module is gzip:
+            # Name the original file in the header, not the temporary one
+            binary = gzip.GzipFile(
+                os.fspath(path), "wb", fileobj=raw,
+                **_level_kwargs(module, compresslevel),
+            )
+        else:
+            binary = module.open(raw, "wb", **_level_kwargs(module, compresslevel))
+        fh = io.TextIOWrapper(binary, **kwargs)
+        try:
+            yield fh
+            fh.flush()
+        finally:
+            # Leave closing ``raw`` to _atomic_output, which syncs it first
+            fh.detach()
+            if binary is not raw:
+                binary.close()
+
+
+class SaveScheduler:
+    """Coalesce auto-save requests for one task file.
+
+    Every controller working on the same tree shares a single scheduler.
+    Edits only mark the tree dirty; the whole tree is then written once,
+    either right away or, when an ``after`` callable such as ``Tk.after`` is
+    configured, ``delay_ms`` milliseconds after the first pending edit.
+    Directory stores only rewrite the shards containing changed tasks.
+    With a :py:class:`journal.Journal` attached, edits are appended to the
+    journal instead of rewriting the file.  With a
+    :py:class:`sharing.SharedFile`, the file is written under its lock and
+    saves made by other processes in the meantime are merged first.
+
+    Attributes:
+        path (Path): File the tasks are written to.
+        dirty (bool): ``True`` while changes have not been written yet.
+        journal (Journal or None): Crash-recovery journal of ``path``.
+        shared (SharedFile or None): Set when other processes may save
+            ``path`` too.
+        on_conflict (callable or None): Called with the tree another
+            process saved when a save of :pyattr:`shared` would overwrite
+            it, to merge it into the tree being saved; ``None`` makes such
+            saves fail.
+        lock (ReadWriteLock or None): Lock of a thread-safe controller,
+            held for reading while the tree is written.
+    """
+
+    def __init__(
+        self,
+        get_task,
+        path,
+        delay_ms=500,
+        after=None,
+        compresslevel=None,
+        durability=None,
+    ):
+        """
+        Args:
+            get_task (callable): Returns the root ``Task`` to save.
+            path (str or Path): Destination JSON file, compressed when it
+                ends in ``.gz``, ``.xz`` or ``.bz2``, a binary snapshot
+                when it ends in ``.snapshot``, or an existing directory
+                store.
+            delay_ms (int, optional): Delay used with ``after``.
+            after (callable, optional): ``after(delay_ms, func)`` scheduling
+                function.  Without it every edit is written immediately.
+                It is called on the thread making the edit, and must hand
+                the timer to its event loop's thread itself.
+            compresslevel (int, optional): Compression level of compressed
+                files; the codec's default when ``None``.
+            durability (str, optional): One of
+                :py:data:`DURABILITY_POLICIES`; the save functions' default
+                (``"none"``) when ``None``.
+        """
+        self.get_task = get_task
+        self.path = Path(path)
+        self.delay_ms = delay_ms
+        self.after = after
+        self.compresslevel = compresslevel
+        self.durability = durability
+        self.journal = None
+        self.shared = None
+        self.on_conflict = None
+        self.lock = None
+        self._flush_mutex = threading.Lock()
+        self.dirty = False
+        self.paused = False
+        # Whether a timer is running; edits of other threads may start one
+        self._pending = False
+        self._timer_lock = threading.Lock()
+        # Tasks changed since the last write, or None if all of them may be
+        self._changed = []
+
+    def pause(self):
+        """Stop writing the file until :py:meth:`resume` is called."""
+        self.paused = True
+
+    def resume(self, discard=False):
+        """Allow writes again.
+
+        Args:
+            discard (bool, optional): Forget edits recorded while paused
+                instead of scheduling a write for them.
+        """
+        self.paused = False
+        if discard:
+            self.dirty = False
+            self._changed = []
+            if self.journal is not None:
+                self.journal.discard_pending()
+        elif self.dirty:
+            self.mark_dirty()
+
+    def mark_dirty(self, task=None):
+        """Record a change and schedule a write of the tree.
+
+        Args:
+            task (Task or list, optional): Task whose fields or sub-task
+                list changed, or a list of such tasks.  Directory stores
+                then only rewrite the shards containing them; without it
+                every shard is rewritten.
+        """
+        self.dirty = True
+        if task is None:
+            self._changed = None
+        elif self._changed is not None:
+            if isinstance(task, list):
+                self._changed.extend(task)
+            else:
+                self._changed.append(task)
+        if self.paused:
+            return
+        if self.after is None:
+            self.flush()
+            return
+        with self._timer_lock:
+            if self._pending:
+                return
+            self._pending = True
+        self.after(self.delay_ms, self._on_timer)
+
+    def _on_timer(self):
+        with self._timer_lock:
+            self._pending = False
+        self.flush()
+
+    def _merge(self, other):
+        """Pass ``other`` to :pyattr:`on_conflict` while saves are paused.
+
+        The edits the merge makes are written by the save in progress.
+        """
+        paused = self.paused
+        self.paused = True
+        try:
+            self.on_conflict(other)
+        finally:
+            self.paused = paused
+
+    def flush(self):
+        """Write the tree now if it has unsaved changes.
+
+        Returns ``True`` when nothing is left to save.  Failures are logged
+        and leave the scheduler dirty so the next edit retries.
+        """
+        if not self.dirty:
+            return True
+        if self.paused:
+            return False
+        if self.path.is_dir():
+            # Shards are named after the uids of the top-level tasks; new
+            # ones are given out while no thread reads the tree
+            if self.lock is None:
+                assign_shard_uids(self.get_task())
+            else:
+                with self.lock.write():
+                    assign_shard_uids(self.get_task())
+        if self.lock is None:
+            return self._write()
+        # Saves only read the tree, alongside other readers, unless they
+        # may merge what other processes saved
+        merging = self.shared is not None and self.on_conflict is not None
+        with self.lock.write() if merging else self.lock.read():
+            with self._flush_mutex:
+                return self._write()
+
+    def _write(self):
+        if not self.dirty:
+            return True  # written by another thread in the meantime
+        kwargs = {}
+        if self.compresslevel is not None:
+            kwargs["compresslevel"] = self.compresslevel
+        if self.durability is not None:
+            kwargs["durability"] = self.durability
+        task = self.get_task()
+        try:
+            if self.path.is_dir():
+                dirty = None
+                if self._changed is not None:
+                    dirty = _dirty_shards(task, self._changed)
+                save_tasks_to_directory(
+                    task,
+                    self.path,
+                    dirty=dirty,
+                    durability=self.durability or DURABILITY_NONE,
+                )
+            elif self.shared is not None:
+                merge = None if self.on_conflict is None else self._merge
+                self.shared.save(
+                    lambda: save_tasks(task, self.path, **kwargs), merge
+                )
+            elif self.journal is None:
+                save_tasks(task, self.path, **kwargs)
+            elif self._changed is not None and self.journal.valid:
+                self.journal.commit()
+                if self.journal.needs_compaction():
+                    self.journal.start_compaction()
+            else:
+                self.journal.checkpoint(
+                    lambda: save_tasks(task, self.path, **kwargs)
+                )
+        except Exception as err:
+            logger.warning("Failed to auto-save tasks to %s: %s", self.path, err)
+            return False
+        self.dirty = False
+        self._changed = []
+        return True
+
+
+_JSON_ENCODER = json.JSONEncoder()
+_encode_json_string = json.encoder.encode_basestring_ascii
+
+
+def _json_value(value):
+    """Encode a scalar task field exactly like ``json.dumps`` does."""
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if type(value) is str:
+        return _encode_json_string(value)
+    return _JSON_ENCODER.encode(value)
+
+
+def _iter_json(task, indent=None):
+    """Yield the JSON text of ``task`` in pieces, one task at a time.
+
+    The output is identical to ``json.dumps(task.to_dict(), indent=indent)``
+    with compact ``(",", ":")`` separators when ``indent`` is ``None``.  The
+    tree is walked with an explicit stack, so neither the nested dictionary
+    nor deep recursion is needed.
+    """
+    if indent is None:
+        key_sep = ":"
+
+        def newline(level):
+            return ""
+
+    else:
+        key_sep = ": "
+
+        def newline(level):
+            return "\n" + " " * (indent * level)
+
+    def head(t, level):
+        inner = newline(level + 1)
+        return (
+            f'{{{inner}"name"{key_sep}{_json_value(t.name)},'
+            f'{inner}"sub_tasks"{key_sep}['
+        )
+
+    def tail(t, level):
+        inner = newline(level + 1)
+        text = (
+            f',{inner}"due_date"{key_sep}{_json_value(t.due_date)}'
+            f',{inner}"priority"{key_sep}{_json_value(t.priority)}'
+            f',{inner}"completed"{key_sep}{_json_value(t.completed)}'
+        )
+        if t.uid is not None:
+            text += f',{inner}"uid"{key_sep}{_json_value(t.uid)}'
+        if t.modified is not None:
+            text += f',{inner}"modified"{key_sep}{_json_value(t.modified)}'
+        if t.revision:
+            text += f',{inner}"revision"{key_sep}{_json_value(t.revision)}'
+        if t.deleted:
+            if indent is None:
+                deleted = json.dumps(t.deleted, separators=(",", ":"))
+            else:
+                deleted = json.dumps(t.deleted, indent=indent).replace(
+                    "\n", inner
+                )
+            text += f',{inner}"deleted"{key_sep}{deleted}'
+        return text + newline(level) + "}"
+
+    yield head(task, 0)
+    if not task.sub_tasks:
+        yield "]" + tail(task, 0)
+        return
+    # Each entry is ``(task, level of its braces, iterator over sub-tasks)``
+    stack = [(task, 0, iter(task.sub_tasks))]
+    first = True
+    while stack:
+        parent, level, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            yield newline(level + 1) + "]" + tail(parent, level)
+            first = False
+            continue
+        yield ("" if first else ",") + newline(level + 2) + head(child, level + 2)
+        if child.sub_tasks:
+            stack.append((child, level + 2, iter(child.sub_tasks)))
+            first = True
+        else:
+            yield "]" + tail(child, level + 2)
+            first = False
+
+
+def _fast_json_fields(task):
+    """Return the mapping the fast JSON library serializes ``task`` as.
+
+    Keys are in the order :py:func:`_iter_json` writes them; the sub-tasks
+    are passed back to the library, which calls this function for each.
+    """
+    data = {
+        "name": task.name,
+        "sub_tasks": task.sub_tasks,
+        "due_date": task.due_date,
+        "priority": task.priority,
+        "completed": task.completed,
+    }
+    if task.uid is not None:
+        data["uid"] = task.uid
+    if task.modified is not None:
+        data["modified"] = task.modified
+    if task.revision:
+        data["revision"] = task.revision
+    if task.deleted:
+        data["deleted"] = task.deleted
+    return data
+
+
+def _json_pieces(task, fast=True):
+    """Return the compact JSON text of ``task`` as an iterable of pieces.
+
+    With ``fast`` the optional ``orjson`` library encodes the tree when it is
+    installed (non-ASCII characters are then written as UTF-8 rather than
+    escaped); trees it cannot encode, e.g. nested deeper than it supports,
+    fall back to :py:func:`_iter_json`.
+    """
+    if fast and _fast_json is not None:
+        try:
+            text = _fast_json.dumps(task, default=_fast_json_fields).decode()
+        except _fast_json.JSONEncodeError:
+            pass
+        else:
+            return (
+                text[i:i + _CHUNK_SIZE] for i in range(0, len(text), _CHUNK_SIZE)
+            )
+    return _iter_json(task)
+
+
+def _read_json(fh, fast=True):
+    """Parse the JSON document of the binary stream ``fh`` into a tree.
+
+    With ``fast`` and ``orjson`` installed the whole document is decoded by
+    the library, which is about twice as fast as the streaming
+    :py:class:`_JSONTaskReader` but holds the decoded document in memory.
+    Documents it rejects are handed to the streaming reader, which accepts
+    or reports them exactly as without the library.
+    """
+    if fast and _fast_json is not None:
+        data = fh.read()
+        try:
+            with _gc_paused():
+                mapping = _fast_json.loads(data)
+                if isinstance(mapping, dict):
+                    return _JSONTaskReader._task_from_mapping(mapping)
+        except (ValueError, TypeError, RecursionError):
+            pass
+        fh = io.BytesIO(data)
+    return _JSONTaskReader(fh).read()
+
+
+def _blocks(pieces):
+    """Yield ``pieces`` joined into blocks of about ``_CHUNK_SIZE``."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= _CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _write_buffered(fh, pieces, digest=None):
+    """Write ``pieces`` to ``fh`` in joined blocks of about ``_CHUNK_SIZE``.
+
+    ``digest`` (a ``hashlib`` object, optional) is updated with the UTF-8
+    encoding of everything written.
+    """
+    for block in _blocks(pieces):
+        fh.write(block)
+        if digest is not None:
+            digest.update(block.encode("utf-8"))
+
+
+def save_tasks_to_json(
+    task,
+    path,
+    progress=None,
+    indent=None,
+    compresslevel=None,
+    durability=DURABILITY_NONE,
+    fast=True,
+):
+    """Save ``task`` hierarchy to ``path`` in JSON format.
+
+    The tree is serialized incrementally (see :py:func:`_iter_json`).  The
+    default compact output is meant for auto-saves; pass ``indent=2`` for
+    human-readable exports.  ``progress`` (:py:class:`Progress`, optional)
+    receives the number of characters written and allows cancelling the
+    save.  A ``.gz``, ``.xz`` or ``.bz2`` suffix compresses the file with
+    ``compresslevel``.  The file is replaced atomically and flushed to the
+    disk according to ``durability`` (see :py:data:`DURABILITY_POLICIES`).
+
+    Compact saves are encoded by the optional ``orjson`` library when it is
+    installed and ``fast`` is set (see :py:func:`_json_pieces`).  They
+    record the digest of what they wrote in :py:data:`PARSE_CACHE`, so
+    :py:func:`tasks_match_file` can later tell whether the file still
+    matches a tree without reading it.
+    """
+    digest = _new_digest() if indent is None else None
+    if indent is None:
+        pieces = _json_pieces(task, fast)
+    else:
+        pieces = _iter_json(task, indent)
+    with _open_output(
+        path, progress, compresslevel, durability, encoding="utf-8"
+    ) as fh:
+        if progress is not None:
+            progress.start()
+            fh = _ProgressWriter(fh, progress)
+        _write_buffered(fh, pieces, digest)
+    if digest is not None:
+        PARSE_CACHE.put(
+            PARSE_CACHE.key(path, "json"), digest=digest.digest(), written=True
+        )
 
-def save_tasks_to_json(task, path):
-    """Save ``task`` hierarchy to ``path`` in JSON format."""
-    with open(path, "w", encoding="utf-8") as fh:
-        json.dump(task.to_dict(), fh, indent=2)
 
+# Tokens of the streaming JSON reader: punctuation, strings (raw content
+# between the quotes) and the remaining scalars.
+_JSON_TOKEN = re.compile(
+    r'[ \t\n\r]*(?:'
+    r'([{}\[\],:])'
+    r'|"([^"\\]*(?:\\.[^"\\]*)*)"'
+    r'|(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?'
+    r'|true|false|null|NaN|-?Infinity)'
+    r')',
+    re.DOTALL,
+)
+_JSON_NUMBER_CHARS = frozenset("0123456789.eE+-")
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_JSON_DECODER = json.JSONDecoder()
+_JSON_CONSTANTS = {
+    "true": True,
+    "false": False,
+    "null": None,
+    "NaN": float("nan"),
+    "Infinity": float("inf"),
+    "-Infinity": float("-inf"),
+}
 
-def load_tasks_from_json(path):
+# Kinds of open containers while streaming
+_TASK, _TASK_LIST, _OBJECT, _LIST = range(4)
+# What the reader expects next
+_KEY_OR_END, _KEY, _COLON, _VALUE_OR_END, _VALUE, _AFTER_VALUE = range(6)
+
+
+class _NotATaskTree(ValueError):
+    """The JSON document is valid so far but its root is not an object."""
+
+
+class _JSONTaskReader:
+    """Build a ``Task`` tree from a JSON file without a whole-file parse.
+
+    The file is read and decoded in chunks of ``_CHUNK_SIZE`` bytes and
+    tokenized with a regular expression.  Task objects are turned into
+    ``Task`` instances as soon as their closing brace is read, so neither the
+    file content nor an intermediate dictionary tree is ever held in memory
+    as a whole.  Values of keys ``Task.from_dict`` ignores are still parsed
+    (to validate the document) and then dropped.
+    """
+
+    def __init__(self, fh, chunk_size=_CHUNK_SIZE):
+        self._fh = fh
+        self._chunk_size = chunk_size
+        # ``utf-8-sig`` skips a byte order mark like ``json.loads`` does
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Append the next chunk to the buffer; return ``False`` at EOF."""
+        if self._eof:
+            return False
+        data = self._fh.read(self._chunk_size)
+        self._eof = not data
+        self._buf = self._buf[self._pos:] + self._decoder.decode(
+            data, final=self._eof
+        )
+        self._pos = 0
+        return True
+
+    def _token(self):
+        """Return the next ``(punctuation, string, scalar)`` match groups."""
+        while True:
+            match = _JSON_TOKEN.match(self._buf, self._pos)
+            # A token touching the end of the buffer, or a number followed
+            # by what could be more of it, may have been cut in two
+            if self._eof or (
+                match is not None
+                and match.end() < len(self._buf)
+                and (
+                    match.lastindex != 3
+                    or self._buf[match.end()] not in _JSON_NUMBER_CHARS
+                )
+            ):
+                break
+            self._fill()
+        if match is None:
+            raise ValueError("Invalid JSON: unexpected data or end of file")
+        self._pos = match.end()
+        punct, raw, scalar = match.groups()
+        if raw is not None and "\\" in raw:
+            raw = json.decoder.scanstring(self._buf, match.start(2))[0]
+        return punct, raw, scalar
+
+    @staticmethod
+    def _scalar(text):
+        value = _JSON_CONSTANTS.get(text)
+        if value is not None or text in _JSON_CONSTANTS:
+            return value
+        if "." in text or "e" in text or "E" in text:
+            return float(text)
+        return int(text)
+
+    @staticmethod
+    def _close(kind, container):
+        if kind == _TASK:
+            sub_tasks = container.get("sub_tasks", [])
+            if not isinstance(sub_tasks, list):
+                raise TypeError("'sub_tasks' must be a list of tasks")
+            return Task(
+                container.get("name") or "Unnamed",
+                sub_tasks=sub_tasks,
+                due_date=container.get("due_date"),
+                priority=container.get("priority"),
+                completed=container.get("completed", False),
+                uid=container.get("uid"),
+                modified=container.get("modified"),
+                revision=container.get("revision", 0),
+                deleted=container.get("deleted"),
+            )
+        return container
+
+    def _decode_task(self):
+        """Decode a whole sub-task with the C-accelerated ``json`` scanner.
+
+        Most sub-trees are small enough to lie entirely in the buffer; those
+        are decoded in one call instead of token by token.  Returns ``None``
+        (leaving the position untouched) when the object is cut off by the
+        end of the buffer or is not valid, in which case the token-level
+        parser takes over and reports any error.
+        """
+        if len(self._buf) - self._pos < self._chunk_size // 2:
+            self._fill()
+        pos = _JSON_WHITESPACE.match(self._buf, self._pos).end()
+        if self._buf.startswith("{", pos):
+            try:
+                data, end = _JSON_DECODER.raw_decode(self._buf, pos)
+                task = self._task_from_mapping(data)
+            except (ValueError, TypeError, RecursionError):
+                return None
+            self._pos = end
+            return task
+        return None
+
+    @classmethod
+    def _task_from_mapping(cls, data):
+        sub_tasks = data.get("sub_tasks", [])
+        if not isinstance(sub_tasks, list):
+            raise TypeError("'sub_tasks' must be a list of tasks")
+        tasks = []
+        for sub in sub_tasks:
+            if not isinstance(sub, dict):
+                raise ValueError("Invalid JSON: sub-tasks must be objects")
+            tasks.append(cls._task_from_mapping(sub))
+        data["sub_tasks"] = tasks
+        return cls._close(_TASK, data)
+
+    def read(self):
+        """Parse the whole file and return its root ``Task``."""
+        punct, _, _ = self._token()
+        if punct != "{":
+            raise _NotATaskTree("expected mapping")
+        # Each open container is ``[kind, container, pending key]``
+        stack = [[_TASK, {}, None]]
+        expect = _KEY_OR_END
+        while True:
+            frame = stack[-1]
+            if frame[0] == _TASK_LIST and (
+                expect == _VALUE or expect == _VALUE_OR_END
+            ):
+                task = self._decode_task()
+                if task is not None:
+                    frame[1].append(task)
+                    expect = _AFTER_VALUE
+                    continue
+            punct, raw, scalar = self._token()
+            is_object = frame[0] == _TASK or frame[0] == _OBJECT
+            if (
+                expect == _AFTER_VALUE
+                or (expect == _KEY_OR_END and punct == "}")
+                or (expect == _VALUE_OR_END and punct == "]")
+            ):
+                if punct == "," and expect == _AFTER_VALUE:
+                    expect = _KEY if is_object else _VALUE
+                    continue
+                if punct != ("}" if is_object else "]"):
+                    raise ValueError("Invalid JSON: expected ',' or closing bracket")
+                stack.pop()
+                value = self._close(frame[0], frame[1])
+                if not stack:
+                    self._expect_end()
+                    return value
+                frame = stack[-1]
+                expect = _AFTER_VALUE
+            elif expect == _KEY_OR_END or expect == _KEY:
+                if raw is None:
+                    raise ValueError("Invalid JSON: expected a string key")
+                frame[2] = raw
+                expect = _COLON
+                continue
+            elif expect == _COLON:
+                if punct != ":":
+                    raise ValueError("Invalid JSON: expected ':'")
+                expect = _VALUE
+                continue
+            elif punct == "{":
+                if frame[0] == _TASK_LIST:
+                    stack.append([_TASK, {}, None])
+                else:
+                    stack.append([_OBJECT, {}, None])
+                expect = _KEY_OR_END
+                continue
+            elif punct == "[":
+                if frame[0] == _TASK and frame[2] == "sub_tasks":
+                    stack.append([_TASK_LIST, [], None])
+                else:
+                    stack.append([_LIST, [], None])
+                expect = _VALUE_OR_END
+                continue
+            elif punct is not None:
+                raise ValueError(f"Invalid JSON: unexpected {punct!r}")
+            else:
+                if frame[0] == _TASK_LIST:
+                    raise ValueError("Invalid JSON: sub-tasks must be objects")
+                value = raw if raw is not None else self._scalar(scalar)
+                expect = _AFTER_VALUE
+            # Store a completed value in its parent container
+            if frame[0] == _LIST or frame[0] == _TASK_LIST:
+                frame[1].append(value)
+            else:
+                frame[1][frame[2]] = value
+
+    def _expect_end(self):
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                raise ValueError("Invalid JSON: extra data after the root object")
+            if not self._fill():
+                return
+
+
+# Text up to the next bracket outside of strings, and that bracket.  Empty
+# arrays and objects without a non-empty array inside (such as tasks
+# without sub-tasks) are skipped by the expression itself.  No part of it
+# ever needs to be matched again, so Python 3.11 and later are told not to
+# keep backtracking positions, which makes it several times faster.
+_POSSESSIVE = "+" if sys.version_info >= (3, 11) else ""
+_JSON_STRING = rf'"[^"\\]*{_POSSESSIVE}(?:\\.[^"\\]*{_POSSESSIVE})*{_POSSESSIVE}"'
+_JSON_PLAIN = rf'[^"\[\]{{}}]*{_POSSESSIVE}'
+_JSON_FLAT = (
+    rf"{_JSON_PLAIN}(?:(?:{_JSON_STRING}|\[[ \t\n\r]*\]){_JSON_PLAIN})*"
+    + _POSSESSIVE
+)
+_JSON_BRACKET = re.compile(
+    rf"{_JSON_PLAIN}(?:(?:{_JSON_STRING}|\[[ \t\n\r]*\]|\{{{_JSON_FLAT}\}})"
+    rf"{_JSON_PLAIN})*{_POSSESSIVE}([\[\]{{}}])"
+)
+# Text before the array of a ``sub_tasks`` member; the key's opening quote
+# follows ``{`` or ``,``, so it cannot be the end of another string.
+_SUB_TASKS_KEY = re.compile(r'[{,][ \t\n\r]*"sub_tasks"[ \t\n\r]*:[ \t\n\r]*\Z')
+
+
+class _LazyJSONSource:
+    """Materialize sub-task lists from spans of a JSON document.
+
+    The document is scanned once for brackets outside of strings, which
+    yields the span of every task object with sub-tasks and of its
+    ``sub_tasks`` array.  A list of tasks is built by decoding only the
+    members of each object, with the C-accelerated ``json`` decoder and the
+    array replaced by ``[]``; the array itself is parsed the same way by
+    :py:meth:`Task.defer_sub_tasks` when it is first accessed.  Opening a
+    file thus costs a scan of it, and expanding a task the size of its own
+    members.  The document is kept for as long as a deferred task refers
+    to it.
+    """
+
+    def __init__(self, text):
+        self._text = text
+        # Start of an object with sub-tasks -> (start of its ``sub_tasks``
+        # array, end of the array, end of the object)
+        self._spans = {}
+
+    def _scan(self, start):
+        """Record the spans of the objects inside the value at ``start``.
+
+        Returns:
+            int: The offset after the array or object at ``start``.
+        """
+        text = self._text
+        stack = [start]
+        keyed = set()
+        arrays = {}
+        pos = start + 1
+        while stack:
+            match = _JSON_BRACKET.match(text, pos)
+            if match is None:
+                raise ValueError("Invalid JSON: unterminated array or object")
+            bracket = match.group(1)
+            pos = match.end()
+            if bracket in "[{":
+                if (
+                    bracket == "["
+                    and text[stack[-1]] == "{"
+                    and _SUB_TASKS_KEY.search(text, max(0, pos - 65), pos - 1)
+                ):
+                    keyed.add(pos - 1)
+                stack.append(pos - 1)
+                continue
+            opened = stack.pop()
+            if text[opened] != ("[" if bracket == "]" else "{"):
+                raise ValueError(f"Invalid JSON: unexpected {bracket!r}")
+            if opened in keyed:
+                arrays[stack[-1]] = (opened, pos)
+            elif opened in arrays:
+                self._spans[opened] = arrays.pop(opened) + (pos,)
+        return pos
+
+    def _object(self, start):
+        """Decode the members of the task object at ``start``.
+
+        Returns:
+            tuple: The members, the offset of the non-empty ``sub_tasks``
+            array left out of them (``None`` without one) and the offset
+            after the object.
+        """
+        span = self._spans.get(start)
+        if span is None:
+            data, end = _JSON_DECODER.raw_decode(self._text, start)
+            if not isinstance(data, dict):
+                raise ValueError("Invalid JSON: sub-tasks must be objects")
+            return data, None, end
+        bracket, after, end = span
+        text = self._text
+        data = _JSON_DECODER.decode(text[start:bracket] + "[]" + text[after:end])
+        return data, bracket, end
+
+    def _task(self, data, bracket=None, expand=False):
+        """Build the task of the members ``data``.
+
+        Its sub-tasks are parsed from the array at ``bracket``, or built
+        from the mappings in ``data``, when first accessed, or right away
+        with ``expand``.
+        """
+        sub_tasks = data.get("sub_tasks", [])
+        if not isinstance(sub_tasks, list):
+            raise TypeError("'sub_tasks' must be a list of tasks")
+        task = Task(
+            data.get("name") or "Unnamed",
+            due_date=data.get("due_date"),
+            priority=data.get("priority"),
+            completed=data.get("completed", False),
+            uid=data.get("uid"),
+            modified=data.get("modified"),
+            revision=data.get("revision", 0),
+            deleted=data.get("deleted"),
+        )
+        if bracket is not None:
+            load = functools.partial(self.task_list, bracket)
+        elif sub_tasks:
+            if not all(isinstance(sub, dict) for sub in sub_tasks):
+                raise ValueError("Invalid JSON: sub-tasks must be objects")
+            load = functools.partial(self._from_mappings, sub_tasks)
+        else:
+            return task
+        if expand:
+            task.sub_tasks = load()
+        else:
+            task.defer_sub_tasks(load)
+        return task
+
+    def _from_mappings(self, items):
+        return [self._task(data) for data in items]
+
+    def _elements(self, start):
+        """Return ``(tasks, end)`` of the array of task objects at ``start``."""
+        text = self._text
+        tasks = []
+        match = self._token(start + 1)
+        if match.group(1) == "]":
+            return tasks, match.end()
+        pos = start + 1
+        while True:
+            pos = _JSON_WHITESPACE.match(text, pos).end()
+            if not text.startswith("{", pos):
+                raise ValueError("Invalid JSON: sub-tasks must be objects")
+            data, bracket, end = self._object(pos)
+            tasks.append(self._task(data, bracket))
+            match = _JSON_TOKEN.match(text, end)
+            if match is None or match.group(1) not in (",", "]"):
+                raise ValueError("Invalid JSON: expected ',' or ']'")
+            if match.group(1) == "]":
+                return tasks, match.end()
+            pos = match.end()
+
+    def task_list(self, start):
+        """Parse the array of task objects starting at ``start``."""
+        return self._elements(start)[0]
+
+    def _token(self, pos):
+        match = _JSON_TOKEN.match(self._text, pos)
+        if match is None:
+            raise ValueError(f"Invalid JSON at character {pos}")
+        return match
+
+    def root(self):
+        """Return the root task with its direct sub-tasks parsed."""
+        text = self._text
+        match = self._token(0)
+        if match.group(1) != "{":
+            raise _NotATaskTree("expected mapping")
+        start = match.end() - 1
+        self._scan(start)
+        data, bracket, end = self._object(start)
+        if _JSON_WHITESPACE.match(text, end).end() != len(text):
+            raise ValueError("Invalid JSON: extra data after the root object")
+        return self._task(data, bracket, expand=True)
+
+
+def load_tasks_from_json(
+    path, progress=None, lazy=False, use_cache=True, fast=True
+):
     """Load tasks from a JSON file at ``path`` and return a ``Task``.
 
+    The file is parsed incrementally (see :py:class:`_JSONTaskReader`), so
+    peak memory stays close to the size of the resulting task tree.
+
+    With ``lazy`` only the root and its direct sub-tasks are built; deeper
+    levels are parsed from the file content kept in memory when they are
+    first accessed (see :py:class:`_LazyJSONSource`).  Errors in those
+    levels are then raised on access rather than reported here.
+
+    Unless ``use_cache`` is false, a file that has not changed since it was
+    last parsed is not read again (see :py:class:`ParseCache`).  Other files
+    are decoded by the optional ``orjson`` library when it is installed and
+    ``fast`` is set (see :py:func:`_read_json`).
+
     If the file cannot be read or contains invalid JSON, a new ``Task('Main')``
-    is returned and a warning is printed.
+    is returned and a warning is printed.  ``progress`` receives the number
+    of bytes read; cancelling it raises ``OperationCancelled``.
 
     """
+    key, task = _cached_load(path, "json", progress, use_cache)
+    if task is not None:
+        return task
     try:
-        with open(path, "r", encoding="utf-8") as fh:
-            data = json.load(fh)
-        if not isinstance(data, dict):
-            logger.warning("Invalid JSON structure in %s: expected mapping", path)
-            return Task("Main")
-        return Task.from_dict(data)
-    except (FileNotFoundError, json.JSONDecodeError, OSError, TypeError) as err:
+        with _open_input(path, progress) as fh:
+            if key is not None:
+                fh = _DigestReader(fh)
+            if lazy:
+                data = fh.read()
+                try:
+                    task = _LazyJSONSource(data.decode("utf-8-sig")).root()
+                except RecursionError:
+                    # Too deep for the json scanner; the streaming reader
+                    # keeps its own stack
+                    task = _JSONTaskReader(io.BytesIO(data)).read()
+            else:
+                task = _read_json(fh, fast)
+    except _NotATaskTree:
+        logger.warning("Invalid JSON structure in %s: expected mapping", path)
+        return Task("Main")
+    except (FileNotFoundError, ValueError, OSError, TypeError) as err:
         logger.warning("Failed to load tasks from %s: %s", path, err)
         return Task("Main")
+    if key is not None:
+        # A lazy tree is only complete once it has been walked, so only
+        # the digest of its file is recorded
+        _cache_tree(
+            key, None if lazy else task, fh.size, digest=fh.digest.digest()
+        )
+    return task
 
 
-def _iterate_tasks(task, depth=0):
-    """Yield ``(task, depth)`` for ``task`` and all of its subtasks recursively."""
-    yield task, depth
+# Binary snapshots
+#
+# A snapshot stores the tree in pre-order as fixed-width records followed by
+# a heap of UTF-8 strings.  All integers are little-endian.
+#
+#   header   magic, version, record size, node count, records offset,
+#            heap offset
+#   records  parent index (-1 for the root), index after the node's subtree,
+#            priority, due date ordinal (0 for none), flags, then
+#            ``(offset, length)`` of the name, the uid and the extras in the
+#            heap
+#   heap     strings referenced by the records
+#
+# Since every subtree is a contiguous range of records, the children of a
+# node are found by hopping from one subtree end to the next.  Values the
+# fixed fields cannot represent exactly (a priority that is not a 32-bit
+# integer, a due date that is not an ISO date, ...) are kept as a JSON
+# object in the extras so that snapshots round-trip exactly with JSON.
+SNAPSHOT_SUFFIX = ".snapshot"
+_SNAPSHOT_MAGIC = b"TMSNAP\r\n"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<8sHHIQQ")
+_SNAPSHOT_RECORD = struct.Struct("<iIiiI6I")
+_SNAP_HAS_PRIORITY = 1
+_SNAP_COMPLETED = 2
+_SNAP_HAS_UID = 4
+_SNAP_HAS_EXTRAS = 8
+_SNAP_HAS_NAME = 16
+_INT32_RANGE = range(-(2**31), 2**31)
+
+
+def _snapshot_fields(task, heap):
+    """Return the record fields of ``task`` after ``(parent, end)``."""
+
+    def store(text):
+        data = text.encode("utf-8")
+        offset = len(heap)
+        heap.extend(data)
+        return offset, len(data)
+
+    flags = 0
+    extras = {}
+    name_ref = uid_ref = extras_ref = (0, 0)
+    if type(task.name) is str:
+        flags |= _SNAP_HAS_NAME
+        name_ref = store(task.name)
+    else:
+        extras["name"] = task.name
+    priority = 0
+    if task.priority is not None:
+        if type(task.priority) is int and task.priority in _INT32_RANGE:
+            flags |= _SNAP_HAS_PRIORITY
+            priority = task.priority
+        else:
+            extras["priority"] = task.priority
+    due = 0
+    if task.due_date is not None:
+        try:
+            date = datetime.date.fromisoformat(task.due_date)
+        except (TypeError, ValueError):
+            date = None
+        if date is not None and date.isoformat() == task.due_date:
+            due = date.toordinal()
+        else:
+            extras["due_date"] = task.due_date
+    if task.completed is True:
+        flags |= _SNAP_COMPLETED
+    elif task.completed is not False:
+        extras["completed"] = task.completed
+    if task.uid is not None:
+        if type(task.uid) is str:
+            flags |= _SNAP_HAS_UID
+            uid_ref = store(task.uid)
+        else:
+            extras["uid"] = task.uid
+    if task.modified is not None:
+        extras["modified"] = task.modified
+    if task.revision:
+        extras["revision"] = task.revision
+    if task.deleted:
+        extras["deleted"] = task.deleted
+    if extras:
+        flags |= _SNAP_HAS_EXTRAS
+        extras_ref = store(json.dumps(extras, separators=(",", ":")))
+    return (priority, due, flags) + name_ref + uid_ref + extras_ref
+
+
+def _encode_snapshot(task, progress=None):
+    """Return the binary snapshot of ``task`` as a list of byte strings."""
+    _start_task_progress(task, progress)
+    records = bytearray()
+    heap = bytearray()
+    count = 0
+    # ``(task, parent index)``; ``task`` is ``None`` for the marker that
+    # closes the subtree of the record at ``parent index``.
+    stack = [(task, -1)]
+    while stack:
+        node, parent = stack.pop()
+        if node is None:
+            struct.pack_into("<I", records, parent * _SNAPSHOT_RECORD.size + 4, count)
+            continue
+        if progress is not None:
+            progress.advance()
+        index = count
+        count += 1
+        records.extend(
+            _SNAPSHOT_RECORD.pack(parent, 0, *_snapshot_fields(node, heap))
+        )
+        stack.append((None, index))
+        for child in reversed(node.sub_tasks):
+            stack.append((child, index))
+    if len(heap) >= 2**32:
+        raise ValueError("Snapshot string heap exceeds 4 GiB")
+
+    records_offset = _SNAPSHOT_HEADER.size
+    heap_offset = records_offset + len(records)
+    header = _SNAPSHOT_HEADER.pack(
+        _SNAPSHOT_MAGIC,
+        _SNAPSHOT_VERSION,
+        _SNAPSHOT_RECORD.size,
+        count,
+        records_offset,
+        heap_offset,
+    )
+    return [header, records, heap]
+
+
+def save_tasks_to_snapshot(task, path, progress=None, durability=DURABILITY_NONE):
+    """Write the task hierarchy to ``path`` as a binary snapshot.
+
+    Like every save the file is written next to ``path`` and then moved
+    over it, so a snapshot that is still memory-mapped by a lazily loaded
+    tree is never modified in place.  ``progress`` receives the number of
+    tasks written.  See :py:func:`save_tasks_to_json` for ``durability``.
+    """
+    parts = _encode_snapshot(task, progress)
+    with _atomic_output(path, durability) as fh:
+        fh.writelines(parts)
+
+
+class _Snapshot:
+    """Read-only view of a memory-mapped snapshot.
+
+    Tasks are created one level at a time: a task's name and fields are
+    decoded when its parent's sub-tasks are first accessed, and its own
+    sub-tasks are deferred with :py:meth:`Task.defer_sub_tasks`.  The map
+    stays open for as long as a deferred task refers to it.
+    """
+
+    def __init__(self, mapped):
+        self._map = mapped
+        (
+            magic,
+            version,
+            record_size,
+            self.count,
+            self._records,
+            self._heap,
+        ) = _SNAPSHOT_HEADER.unpack_from(mapped, 0)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError("Not a task snapshot")
+        if version != _SNAPSHOT_VERSION or record_size != _SNAPSHOT_RECORD.size:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        if (
+            self.count == 0
+            or self._records < _SNAPSHOT_HEADER.size
+            or self._heap != self._records + self.count * record_size
+            or self._heap > len(mapped)
+            or self._record(0)[1] != self.count
+        ):
+            raise ValueError("Truncated or corrupt snapshot")
+
+    def _record(self, index):
+        return _SNAPSHOT_RECORD.unpack_from(
+            self._map, self._records + index * _SNAPSHOT_RECORD.size
+        )
+
+    def _string(self, offset, length):
+        start = self._heap + offset
+        if start + length > len(self._map):
+            raise ValueError("Truncated or corrupt snapshot")
+        return str(self._map[start:start + length], "utf-8")
+
+    def task(self, index):
+        """Return the task stored in record ``index``."""
+        (
+            _parent,
+            end,
+            priority,
+            due,
+            flags,
+            name_offset,
+            name_length,
+            uid_offset,
+            uid_length,
+            extras_offset,
+            extras_length,
+        ) = self._record(index)
+        if not index < end <= self.count:
+            raise ValueError("Truncated or corrupt snapshot")
+        fields = {
+            "due_date": (
+                datetime.date.fromordinal(due).isoformat() if due else None
+            ),
+            "priority": priority if flags & _SNAP_HAS_PRIORITY else None,
+            "completed": bool(flags & _SNAP_COMPLETED),
+            "uid": (
+                self._string(uid_offset, uid_length)
+                if flags & _SNAP_HAS_UID
+                else None
+            ),
+        }
+        name = (
+            self._string(name_offset, name_length)
+            if flags & _SNAP_HAS_NAME
+            else None
+        )
+        if flags & _SNAP_HAS_EXTRAS:
+            extras = json.loads(self._string(extras_offset, extras_length))
+            name = extras.pop("name", name)
+            fields.update(extras)
+        task = Task(name, **fields)
+        if end > index + 1:
+            task.defer_sub_tasks(functools.partial(self.children, index, end))
+        return task
+
+    def children(self, index, end):
+        """Return the tasks whose records are direct children of ``index``."""
+        tasks = []
+        child = index + 1
+        while child < end:
+            tasks.append(self.task(child))
+            next_child = self._record(child)[1]
+            if next_child <= child:
+                raise ValueError("Truncated or corrupt snapshot")
+            child = next_child
+        return tasks
+
+
+def is_snapshot(path):
+    """Return whether ``path`` holds a binary snapshot."""
+    try:
+        with open(path, "rb") as fh:
+            return fh.read(len(_SNAPSHOT_MAGIC)) == _SNAPSHOT_MAGIC
+    except OSError:
+        return False
+
+
+def copy_tasks(task):
+    """Return a copy of the tree ``task`` that shares no object with it.
+
+    The tree is encoded as a binary snapshot in memory and the copy is
+    decoded from it lazily, so only the encoding needs the tree to stay
+    unchanged: background exports hold a controller's lock for the copy,
+    not for writing the file.
+    """
+    return _Snapshot(b"".join(_encode_snapshot(task))).task(0)
+
+
+def load_tasks_from_snapshot(path, progress=None):
+    """Open the binary snapshot at ``path`` and return its root ``Task``.
+
+    The file is memory-mapped rather than read: only the root is decoded
+    up front and every other task when its parent's sub-tasks are first
+    accessed, e.g. when a row of the task tree is expanded.  If the file is
+    missing or not a valid snapshot a new ``Task('Main')`` is returned and a
+    warning is printed.
+    """
+    try:
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if progress is not None:
+                progress.start(size)
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        root = _Snapshot(mapped).task(0)
+        if progress is not None:
+            progress.advance(size)
+        return root
+    except OperationCancelled:
+        raise
+    except (ValueError, OSError, TypeError, struct.error) as err:
+        logger.warning("Failed to load tasks from %s: %s", path, err)
+        return Task("Main")
+
+
+# Parse cache
+#
+# Parsed files are remembered by their resolved path, modification time,
+# size and inode together with the format they were read as.  Saves replace
+# a file with a new inode, so any rewrite makes the old entry unreachable;
+# it is then dropped by the next entry stored for the same file or by the
+# LRU eviction.
+_ENTRY_OVERHEAD = 256
+
+
+def _new_digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+class _DigestReader:
+    """Binary file wrapper hashing and counting the bytes read."""
+
+    def __init__(self, fh):
+        self._fh = fh
+        self.digest = _new_digest()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._fh.read(size)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+
+class _CacheEntry:
+    __slots__ = ("tree", "digest", "written", "parsed")
+
+    def __init__(self):
+        self.tree = None
+        self.digest = None
+        self.written = False
+        self.parsed = False
+
+    @property
+    def size(self):
+        return _ENTRY_OVERHEAD + (len(self.tree) if self.tree else 0)
+
+
+class ParseCache:
+    """Small LRU cache of parsed task files, bounded by memory.
+
+    Trees are kept as the bytes of their binary snapshot (see
+    :py:func:`_encode_snapshot`), so every hit returns a new, lazily decoded
+    ``Task`` the caller may modify freely.  Encoding a tree costs about as
+    much as parsing it, so a tree is only kept once its file is parsed a
+    second time; files read once pay nothing but a digest.  JSON entries also hold the
+    digest of the file's content, which :py:func:`tasks_match_file` uses to
+    compare a tree with a file without parsing it.
+
+    The least recently used entries are dropped once the entries exceed
+    ``max_bytes``; trees of files larger than a quarter of it are not kept
+    at all, only their digest.  ``max_bytes=0`` disables the cache.  The cache may be used from
+    several threads.
+
+    Every save, in any format, also records which version of its file it
+    wrote, so that :py:mod:`watcher` can tell the process's own saves from
+    changes made by other programs (see :py:meth:`own_save`).
+
+    Attributes:
+        max_bytes (int): Memory budget of the entries.
+        size (int): Approximate memory held by the entries.
+        hits (int): Trees returned from the cache.
+        misses (int): Lookups that found no tree.
+    """
+
+    def __init__(self, max_bytes=32 * 2**20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._files = {}
+        # Resolved path -> identity of the version a save wrote
+        self._saves = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path, fmt):
+        """Return the cache key of ``path`` read as ``fmt``, or ``None``.
+
+        ``None`` is returned for paths that cannot be examined.
+        """
+        try:
+            resolved = Path(path).resolve()
+            st = os.stat(resolved)
+        except (OSError, RuntimeError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return (str(resolved), st.st_mtime_ns, st.st_size, st.st_ino, fmt)
+
+    def tree(self, key):
+        """Return a new ``Task`` tree cached for ``key``, or ``None``."""
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None or entry.tree is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            data = entry.tree
+        return _Snapshot(data).task(0)
+
+    def digest(self, key):
+        """Return ``(digest, written)`` recorded for ``key``, or ``None``.
+
+        ``written`` tells whether the digest comes from a compact save, i.e.
+        whether it is the digest of the tree's canonical JSON.
+        """
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None or entry.digest is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry.digest, entry.written
+
+    def parsed(self, key):
+        """Return whether the file of ``key`` was parsed before."""
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            return entry is not None and entry.parsed
+
+    def put(self, key, tree=None, digest=None, written=False, parsed=False):
+        """Record the snapshot bytes ``tree`` and/or ``digest`` for ``key``.
+
+        ``parsed`` marks the file as parsed (see :py:meth:`parsed`).
+        """
+        if key is None or self.max_bytes <= 0:
+            return
+        with self._lock:
+            stale = self._files.get(key[0::4])
+            if stale is not None and stale != key:
+                self._discard(stale)
+            self._files[key[0::4]] = key
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = _CacheEntry()
+            else:
+                self.size -= entry.size
+            if tree is not None:
+                entry.tree = tree
+            entry.parsed = entry.parsed or parsed
+            if digest is not None:
+                entry.written = written or (
+                    entry.written and entry.digest == digest
+                )
+                entry.digest = digest
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes and self._entries:
+                self._discard(next(iter(self._entries)))
+
+    def record_save(self, path, source=None):
+        """Remember the current version of ``path`` as written by a save.
+
+        ``source`` is the file the save wrote and then renamed to ``path``;
+        the entries of that version, such as the digest of a compact JSON
+        save, are moved to ``path``.
+        """
+        if self.max_bytes <= 0:
+            return
+        key = self.key(path, None)
+        if key is None:
+            return
+        old = str(Path(source).resolve()) if source is not None else None
+        with self._lock:
+            self._saves[key[0]] = key[1:4]
+            if old is None:
+                return
+            self._saves.pop(old, None)
+            for moved in [k for k in self._entries if k[0] == old]:
+                entry = self._entries[moved]
+                self._discard(moved)
+                if moved[1:4] == key[1:4]:
+                    renamed = key[:4] + moved[4:]
+                    stale = self._files.get(renamed[0::4])
+                    if stale is not None:
+                        self._discard(stale)
+                    self._files[renamed[0::4]] = renamed
+                    self._entries[renamed] = entry
+                    self.size += entry.size
+
+    def own_save(self, path):
+        """Return whether the current version of ``path`` was written by a
+        save of this process."""
+        key = self.key(path, None)
+        if key is None:
+            return False
+        with self._lock:
+            return self._saves.get(key[0]) == key[1:4]
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+            if self._files.get(key[0::4]) == key:
+                del self._files[key[0::4]]
+
+    def clear(self):
+        """Forget every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._files.clear()
+            self._saves.clear()
+            self.size = 0
+
+
+#: Cache shared by the loaders and :py:func:`tasks_match_file`
+PARSE_CACHE = ParseCache()
+
+
+def _cached_load(path, fmt, progress, use_cache):
+    """Return ``(key, task)`` for ``path``; ``task`` is ``None`` on a miss.
+
+    ``key`` is ``None`` when the cache is bypassed.
+    """
+    if not use_cache:
+        return None, None
+    key = PARSE_CACHE.key(path, fmt)
+    task = PARSE_CACHE.tree(key)
+    if task is not None and progress is not None:
+        progress.start(key[2])
+        progress.advance(key[2])
+    return key, task
+
+
+def _cache_tree(key, task, size, digest=None):
+    """Store ``task`` parsed from ``size`` bytes of content under ``key``."""
+    tree = None
+    if (
+        task is not None
+        and size <= PARSE_CACHE.max_bytes // 4
+        and PARSE_CACHE.parsed(key)
+    ):
+        tree = b"".join(_encode_snapshot(task))
+    PARSE_CACHE.put(key, tree=tree, digest=digest, parsed=True)
+
+
+def _json_digest(task):
+    """Return the digest of ``task`` saved as compact JSON."""
+    digest = _new_digest()
+    for block in _blocks(_json_pieces(task)):
+        digest.update(block.encode("utf-8"))
+    return digest.digest()
+
+
+def tasks_match_file(task, path, use_cache=True):
+    """Return whether ``path`` holds a tree equal to ``task``.
+
+    If :py:data:`PARSE_CACHE` knows the digest of the file's content, the
+    tree is serialized and hashed instead of the file being parsed; a match
+    means the file holds exactly that JSON.  Otherwise the file is loaded
+    with :py:func:`load_tasks` and compared field by field.
+    """
+    if use_cache:
+        known = PARSE_CACHE.digest(PARSE_CACHE.key(path, "json"))
+        if known is not None:
+            digest, written = known
+            if _json_digest(task) == digest:
+                return True
+            if written:
+                # The file holds the canonical JSON of another tree
+                return False
+    existing = load_tasks(path, use_cache=use_cache)
+    return existing.to_dict() == task.to_dict()
+
+
+# Directory stores
+#
+# A directory store keeps every top-level task in its own JSON file (a
+# shard) named after the task's uid, and the root's own fields together
+# with the order of the shards in a small manifest.  Saves only rewrite the
+# shards that changed, and large stores are parsed by a pool of processes.
+SHARD_MANIFEST = "manifest.json"
+_SHARD_FILE = re.compile(r"task-[A-Za-z0-9_-]+\.json\Z")
+_SHARD_UID = re.compile(r"[A-Za-z0-9_-]{1,64}\Z")
+# Below this many bytes of shards starting worker processes costs more than
+# parsing in the calling process.
+_PARALLEL_LOAD_BYTES = 4 * 2**20
+# Shards that could not be read by the last load of each store, by resolved
+# store path.  Their tasks are missing from the tree, so saves keep them
+# listed in the manifest instead of deleting them as removed tasks.
+_UNREADABLE_SHARDS = {}
+
+
+def _shard_name(uid):
+    uid = str(uid)
+    if not _SHARD_UID.match(uid):
+        uid = hashlib.sha1(uid.encode("utf-8")).hexdigest()
+    return f"task-{uid}.json"
+
+
+def _read_manifest(path):
+    with open(path, "rb") as fh:
+        manifest = json.loads(fh.read())
+    if not isinstance(manifest, dict):
+        raise ValueError("the manifest must be a mapping")
+    shards = manifest.get("shards")
+    if not isinstance(shards, list) or not all(
+        isinstance(name, str) and _SHARD_FILE.match(name) for name in shards
+    ):
+        raise ValueError("the manifest must list the shard file names")
+    return manifest
+
+
+def _dirty_shards(task, changed):
+    """Return the uids of the top-level tasks of ``task`` containing any of
+    the ``changed`` tasks.
+
+    Controllers usually report the top-level task itself (see
+    ``TaskController.top``); other tasks are searched for in the sub-tasks
+    loaded so far only, since deferred ones cannot have been changed.
+    Changes to ``task`` itself only affect the manifest and are ignored.
+    The top-level tasks must have their uids (see
+    :py:func:`assign_shard_uids`).
+    """
+    tops = {id(sub): sub for sub in task.get_sub_tasks()}
+    dirty = set()
+    ids = set()
+    for current in changed:
+        if id(current) in tops:
+            dirty.add(current.uid)
+        elif current is not task:
+            ids.add(id(current))
+    if not ids:
+        return dirty
+    for sub in tops.values():
+        if sub.uid in dirty:
+            continue
+        stack = [sub]
+        while stack:
+            current = stack.pop()
+            if id(current) in ids:
+                dirty.add(sub.uid)
+                break
+            if current.sub_tasks_loaded:
+                stack.extend(current.get_sub_tasks())
+    return dirty
+
+
+def assign_shard_uids(task):
+    """Give every top-level task of ``task`` a uid no other one has.
+
+    Directory stores name the shards after these uids.  Returns the tasks
+    that were given a new uid.
+    """
+    assigned = []
+    seen = set()
     for sub in task.get_sub_tasks():
-        yield from _iterate_tasks(sub, depth + 1)
-
-
-def save_tasks_to_csv(task, path):
-    """Write the task hierarchy to ``path`` in CSV format."""
-    with open(path, "w", newline="", encoding="utf-8") as fh:
-        writer = csv.writer(fh)
-        writer.writerow(["Name", "Due Date", "Priority", "Completed", "Depth"])
-        for t, depth in _iterate_tasks(task):
-            writer.writerow(
-                [
-                    t.name,
-                    t.due_date or "",
-                    "" if t.priority is None else t.priority,
-                    1 if t.completed else 0,
-                    depth,
-                ]
-            )
+        if sub.uid is not None and _shard_name(sub.uid) in seen:
+            # Two tasks would share a file; give the copy its own uid
+            sub.uid = None
+        if sub.uid is None:
+            sub.ensure_uid()
+            assigned.append(sub)
+        seen.add(_shard_name(sub.uid))
+    return assigned
 
 
-def save_tasks_to_ics(task, path):
-    """Write the task hierarchy to ``path`` as an iCalendar file."""
-    with open(path, "w", encoding="utf-8") as fh:
-        fh.write("BEGIN:VCALENDAR\n")
-        fh.write("VERSION:2.0\n")
-        fh.write("PRODID:-//Task Manager//EN\n")
-        for t, _ in _iterate_tasks(task):
-            fh.write("BEGIN:VTODO\n")
-            fh.write(f"SUMMARY:{t.name}\n")
-            if t.due_date:
-                dt = t.due_date.replace("-", "") + "T000000Z"
-                fh.write(f"DUE:{dt}\n")
-            if t.priority is not None:
-                fh.write(f"PRIORITY:{t.priority}\n")
-            fh.write(f"STATUS:{'COMPLETED' if t.completed else 'NEEDS-ACTION'}\n")
-            fh.write("END:VTODO\n")
-        fh.write("END:VCALENDAR\n")
-
-
-def load_tasks_from_csv(path):
-    """Load tasks from a CSV file at ``path`` and return a ``Task``.
+def save_tasks_to_directory(
+    task, path, progress=None, dirty=None, durability=DURABILITY_NONE
+):
+    """Save ``task`` as a directory store at ``path``.
 
-    The first row after the header becomes the root task and remaining rows
-    become its direct subtasks.  If loading fails, a new ``Task('Main')`` is
-    returned and a warning is printed.
+    Every top-level task is written to its own shard file and the root's
+    fields and the shard order to :py:data:`SHARD_MANIFEST`.  With ``dirty``,
+    a collection of top-level task uids, only those shards and shards that
+    do not exist yet are written.  Shards of removed tasks are deleted;
+    shards the last :py:func:`load_tasks_from_directory` of the store could
+    not read stay listed in the manifest.  ``progress`` receives the number
+    of top-level tasks processed.
+
+    The manifest is written last, so after a crash it still lists shards
+    that exist.  With ``durability`` set to ``fsync-file-and-dir`` the
+    directory is synced once, after the manifest, rather than per shard.
+
+    Top-level tasks without a uid of their own are given one first (see
+    :py:func:`assign_shard_uids`); :py:class:`SaveScheduler` does that
+    before it saves, so that its saves only read the tree.
+    """
+    assign_shard_uids(task)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    manifest_path = path / SHARD_MANIFEST
+    try:
+        old_names = _read_manifest(manifest_path)["shards"]
+    except (OSError, ValueError):
+        old_names = []
+
+    sub_tasks = task.get_sub_tasks()
+    if progress is not None:
+        progress.start(len(sub_tasks), unit="files")
+    shard_durability = durability
+    if durability == DURABILITY_FSYNC_FILE_AND_DIR:
+        shard_durability = DURABILITY_FSYNC_FILE
+    names = []
+    for sub in sub_tasks:
+        name = _shard_name(sub.uid)
+        names.append(name)
+        shard = path / name
+        if dirty is None or sub.uid in dirty or not shard.exists():
+            save_tasks_to_json(sub, shard, durability=shard_durability)
+        if progress is not None:
+            progress.advance()
+
+    manifest = {
+        "name": task.name,
+        "due_date": task.due_date,
+        "priority": task.priority,
+        "completed": task.completed,
+    }
+    if task.uid is not None:
+        manifest["uid"] = task.uid
+    if task.modified is not None:
+        manifest["modified"] = task.modified
+    if task.revision:
+        manifest["revision"] = task.revision
+    if task.deleted:
+        manifest["deleted"] = task.deleted
+    unreadable = _UNREADABLE_SHARDS.get(path.resolve(), ())
+    seen = set(names)
+    names.extend(
+        name for name in old_names if name in unreadable and name not in seen
+    )
+    manifest["shards"] = names
+    with _atomic_output(manifest_path, durability) as fh:
+        fh.write(json.dumps(manifest, indent=2).encode("utf-8"))
+
+    for name in set(old_names).difference(names):
+        (path / name).unlink(missing_ok=True)
+
+
+def _load_shard(path):
+    with _open_input(path) as fh:
+        return _JSONTaskReader(fh).read()
+
+
+def _skip_shard(path, err):
+    logger.warning("Skipping unreadable shard %s: %s", path, err)
+
+
+def _load_shards(paths, progress):
+    """Parse the shards in the calling process; unreadable ones are ``None``."""
+    tasks = []
+    for shard in paths:
+        try:
+            tasks.append(_load_shard(shard))
+        except (ValueError, OSError, TypeError, RecursionError) as err:
+            _skip_shard(shard, err)
+            tasks.append(None)
+        if progress is not None:
+            progress.advance()
+    return tasks
+
+
+def _encode_shard(path):
+    """Parse one shard in a worker process and return it as a snapshot.
+
+    Snapshot bytes are far cheaper to send back than pickled ``Task``
+    objects, and the calling process decodes them lazily.
     """
+    return b"".join(_encode_snapshot(_load_shard(path)))
+
+
+def _load_shards_in_pool(paths, workers, progress):
+    """Parse the shards in worker processes; unreadable ones are ``None``."""
+    # Worker processes are spawned rather than forked: the GUI loads from a
+    # thread while Tk runs, and forking a threaded process is unsafe.
+    pool = concurrent.futures.ProcessPoolExecutor(
+        min(workers, len(paths)),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    futures = []
     try:
-        with open(path, newline="", encoding="utf-8") as fh:
-            reader = csv.reader(fh)
-            header = next(reader, None)
-            depth_index = (
-                header.index("Depth") if header and "Depth" in header else None
+        futures = [pool.submit(_encode_shard, shard) for shard in paths]
+        tasks = []
+        for shard, future in zip(paths, futures):
+            try:
+                tasks.append(_Snapshot(future.result()).task(0))
+            except (ValueError, OSError, TypeError, RecursionError) as err:
+                _skip_shard(shard, err)
+                tasks.append(None)
+            if progress is not None:
+                progress.advance()
+        return tasks
+    finally:
+        # Shards not parsed yet when loading was cancelled or failed
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def load_tasks_from_directory(path, progress=None, workers=None):
+    """Load the directory store at ``path`` and return its root ``Task``.
+
+    Shards are parsed by a pool of ``workers`` processes when there is more
+    than one of them.  By default one process per CPU is used on machines
+    with several CPUs once the shards add up to a few megabytes; tasks
+    parsed by the pool are then materialized lazily, like snapshots.
+    ``workers=1`` parses every shard in the calling process.  ``progress``
+    receives the number of shards loaded.
+
+    Shards that cannot be read are skipped with a warning, and kept by
+    later saves (see :py:func:`save_tasks_to_directory`).  If the manifest
+    cannot be read, a new ``Task('Main')`` is returned and a warning is
+    printed.
+    """
+    path = Path(path)
+    key = path.resolve()
+    paths = []
+    try:
+        manifest = _read_manifest(path / SHARD_MANIFEST)
+        paths = [path / name for name in manifest["shards"]]
+        if progress is not None:
+            progress.start(len(paths), unit="files")
+        if workers is None:
+            workers = os.cpu_count() or 1
+            size = sum(
+                shard.stat().st_size for shard in paths if shard.exists()
             )
+            if size < _PARALLEL_LOAD_BYTES:
+                workers = 1
+        if workers > 1 and len(paths) > 1:
+            loaded = _load_shards_in_pool(paths, workers, progress)
+        else:
+            loaded = _load_shards(paths, progress)
+        sub_tasks = [sub for sub in loaded if sub is not None]
+        _UNREADABLE_SHARDS[key] = {
+            shard.name for shard, sub in zip(paths, loaded) if sub is None
+        }
+        root = Task(
+            manifest.get("name") or "Unnamed",
+            due_date=manifest.get("due_date"),
+            priority=manifest.get("priority"),
+            completed=manifest.get("completed", False),
+            uid=manifest.get("uid"),
+            modified=manifest.get("modified"),
+            revision=manifest.get("revision", 0),
+            deleted=manifest.get("deleted"),
+        )
+        root.sub_tasks = sub_tasks
+        return root
+    except OperationCancelled:
+        raise
+    except (
+        ValueError,
+        OSError,
+        TypeError,
+        concurrent.futures.BrokenExecutor,
+    ) as err:
+        logger.warning("Failed to load tasks from %s: %s", path, err)
+        # None of the shards made it into the tree
+        _UNREADABLE_SHARDS[key] = {shard.name for shard in paths}
+        return Task("Main")
 
-            first_row = next(reader, None)
-            if first_row is None:
-                return Task("Main")
 
-            def _parse(row):
-                name, due, prio, comp = row[:4]
-                priority = int(prio) if prio else None
-                completed = bool(int(comp)) if comp else False
-                return name, due, priority, completed
+def save_tasks(task, path, progress=None, **kwargs):
+    """Save ``task`` to ``path`` in the format given by its suffix.
 
-            if depth_index is None:
-                name, due, priority, completed = _parse(first_row)
-                root = Task(
-                    name, due_date=due or None, priority=priority, completed=completed
-                )
-                for row in reader:
-                    try:
-                        r_name, r_due, r_prio, r_comp = row[:4]
-                    except ValueError:
-                        continue
-                    r_priority = int(r_prio) if r_prio else None
-                    r_completed = bool(int(r_comp)) if r_comp else False
-                    root.add_sub_task(
-                        Task(
-                            r_name,
-                            due_date=r_due or None,
-                            priority=r_priority,
-                            completed=r_completed,
-                        )
-                    )
-                return root
-
-            stack = []
-            root = None
-
-            def handle(row, current_stack):
-                try:
-                    name, due, prio, comp = row[:4]
-                    depth = (
-                        int(row[depth_index])
-                        if len(row) > depth_index and row[depth_index] != ""
-                        else 0
-                    )
-                except (ValueError, IndexError):
-                    return None
-                priority = int(prio) if prio else None
-                completed = bool(int(comp)) if comp else False
-                task = Task(
-                    name, due_date=due or None, priority=priority, completed=completed
+    Existing directories are directory stores; files are written by the
+    registered codec of their suffix (see :py:func:`codec_for_path`), and
+    anything else as compact JSON (compressed for ``.gz``, ``.xz`` and
+    ``.bz2``).  Extra keyword arguments are passed on to the saver of the
+    format when it accepts them; only ``durability`` applies to all of them.
+    """
+    durability = kwargs.get("durability", DURABILITY_NONE)
+    if Path(path).is_dir():
+        return save_tasks_to_directory(
+            task, path, progress, durability=durability
+        )
+    codec = codec_for_path(path)
+    if codec is not None and codec.name != "json":
+        return codec.save(task, path, progress, **kwargs)
+    if progress is not None:
+        kwargs["progress"] = progress
+    return save_tasks_to_json(task, path, **kwargs)
+
+
+def load_tasks(path, progress=None, lazy=False, use_cache=True):
+    """Load a task file in any registered format.
+
+    Directories are loaded as directory stores.  The format of a file is
+    recognised from its content, or failing that from its suffix (see
+    :py:func:`detect_codec`); anything unrecognised is read as (possibly
+    compressed) JSON, lazily if ``lazy`` is set.  Files are read through
+    :py:data:`PARSE_CACHE` unless ``use_cache`` is false.  Snapshots are
+    always loaded lazily.
+    """
+    if Path(path).is_dir():
+        return load_tasks_from_directory(path, progress)
+    codec = detect_codec(path) or codec_for_path(path)
+    if codec is not None and codec.name != "json":
+        return codec.load(path, progress, lazy=lazy, use_cache=use_cache)
+    return load_tasks_from_json(path, progress, lazy=lazy, use_cache=use_cache)
+
+
+def _iterate_tasks(task, depth=0):
+    """Yield ``(task, depth)`` for ``task`` and all of its subtasks in order.
+
+    The tree is walked with a stack of sub-task iterators rather than nested
+    generators, so every step costs the same whatever the depth.
+    """
+    stack = [iter((task,))]
+    while stack:
+        for t in stack[-1]:
+            yield t, depth + len(stack) - 1
+            sub_tasks = t.get_sub_tasks()
+            if sub_tasks:
+                stack.append(iter(sub_tasks))
+                break
+        else:
+            stack.pop()
+
+
+def _batched(items, size):
+    """Yield lists of up to ``size`` consecutive ``items``."""
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _start_task_progress(task, progress):
+    if progress is not None:
+        progress.start(sum(1 for _ in _iterate_tasks(task)), unit="tasks")
+
+
+# CSV files hold one row per task in pre-order; the depth column tells the
+# parent of each row, which is the closest preceding row one level up.
+_CSV_HEADER = ["Name", "Due Date", "Priority", "Completed", "Depth"]
+_CSV_CHANGE_COLUMNS = ["UID", "Parent UID", "Sequence", "Deleted"]
+_CSV_BATCH = 1024
+_CSV_FLAGS = {"": False, "0": False, "1": True}
+
+
+def _csv_rows(task):
+    """Yield the CSV row of every task of the hierarchy."""
+    for t, depth in _iterate_tasks(task):
+        priority = t.priority
+        yield (
+            t.name,
+            t.due_date or "",
+            "" if priority is None else priority,
+            1 if t.completed else 0,
+            depth,
+        )
+
+
+def _export_uid(task):
+    """Return the uid ``task`` is exported under, without changing the task.
+
+    Tasks without a uid get a new one for this export only; exporting
+    through :py:meth:`TaskController.assign_uids` first keeps them stable
+    across exports.
+    """
+    return task.uid if task.uid is not None else uuid.uuid4().hex
+
+
+def _csv_changes(task, since, progress=None):
+    """Yield the rows of an incremental CSV export (see ``save_tasks_to_csv``)."""
+    parents = []
+    for t, depth in _iterate_tasks(task):
+        del parents[depth:]
+        parents.append(_export_uid(t))
+        if progress is not None:
+            progress.advance()
+        if _changed_since(t, since):
+            priority = t.priority
+            yield (
+                t.name,
+                t.due_date or "",
+                "" if priority is None else priority,
+                1 if t.completed else 0,
+                depth,
+                parents[-1],
+                parents[-2] if depth else "",
+                t.revision,
+                0,
+            )
+    for uid, (when, revision) in task.deleted.items():
+        if when >= since:
+            yield ("", "", "", "", "", uid, "", revision, 1)
+
+
+def save_tasks_to_csv(
+    task,
+    path,
+    progress=None,
+    compresslevel=None,
+    durability=DURABILITY_NONE,
+    since=None,
+):
+    """Write the task hierarchy to ``path`` in CSV format.
+
+    ``since`` (a POSIX time) makes the export incremental: only the tasks
+    changed at or after that time are written, followed by a row for every
+    task deleted since then.  Such files have the extra columns ``UID``,
+    ``Parent UID``, ``Sequence`` (the task's revision) and ``Deleted``.
+    The function returns the time the export started, to be passed as
+    ``since`` to the next one.
+
+    ``progress`` receives the number of tasks written.  A ``.gz``, ``.xz`` or
+    ``.bz2`` suffix compresses the file with ``compresslevel``.  See
+    :py:func:`save_tasks_to_json` for ``durability``.
+    """
+    watermark = time.time()
+    _start_task_progress(task, progress)
+    with _open_output(
+        path, progress, compresslevel, durability, newline="", encoding="utf-8"
+    ) as fh:
+        _write_csv(task, fh, progress, since)
+    return watermark
+
+
+def _write_csv(task, fh, progress=None, since=None):
+    """Write the CSV rows of ``task`` to the text stream ``fh``."""
+    writer = csv.writer(fh)
+    if since is not None:
+        writer.writerow(_CSV_HEADER + _CSV_CHANGE_COLUMNS)
+        for batch in _batched(_csv_changes(task, since, progress), _CSV_BATCH):
+            writer.writerows(batch)
+        return
+    writer.writerow(_CSV_HEADER)
+    for batch in _batched(_csv_rows(task), _CSV_BATCH):
+        writer.writerows(batch)
+        if progress is not None:
+            progress.advance(len(batch))
+
+
+# iCalendar (RFC 5545) files hold one VTODO per task in pre-order.  Every
+# VTODO carries the task's uid, and sub-tasks name their parent's uid in a
+# RELATED-TO property, so the hierarchy survives a round trip.  Content
+# lines end with CRLF and are folded after 75 octets.
+_ICS_LINE_OCTETS = 75
+_ICS_CONTENT_LINE = re.compile(
+    r'([A-Za-z0-9-]+)'
+    r'((?:;[A-Za-z0-9-]+=(?:"[^"]*"|[^;:,"]*)(?:,(?:"[^"]*"|[^;:,"]*))*)*)'
+    r':'
+)
+_ICS_FOLD = re.compile(r"\r?\n[ \t]")
+_ICS_MARKERS = frozenset(("BEGIN", "END"))
+_ICS_PARAM = re.compile(r';([A-Za-z0-9-]+)=("[^"]*"|[^;:"]*)')
+_ICS_ESCAPED = re.compile(r"\\([\\;,nN])")
+_ICS_UNESCAPE = {"\\": "\\", ";": ";", ",": ",", "n": "\n", "N": "\n"}
+
+
+def _ics_text(value):
+    """Escape ``value`` as an iCalendar TEXT value."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _ics_untext(value):
+    """Decode an iCalendar TEXT value."""
+    if "\\" not in value:
+        return value
+    return _ICS_ESCAPED.sub(lambda m: _ICS_UNESCAPE[m.group(1)], value)
+
+
+def _ics_fold(line):
+    """Return ``line`` with CRLF, folded into lines of at most 75 octets."""
+    if len(line) <= _ICS_LINE_OCTETS and line.isascii():
+        return line + "\r\n"
+    data = line.encode("utf-8")
+    if len(data) <= _ICS_LINE_OCTETS:
+        return line + "\r\n"
+    parts = []
+    start = 0
+    # Continuation lines start with a space, which counts towards the limit
+    limit = _ICS_LINE_OCTETS
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Never split a UTF-8 sequence
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start = end
+        limit = _ICS_LINE_OCTETS - 1
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_time(timestamp):
+    """Format a POSIX time as an iCalendar UTC date-time."""
+    return datetime.datetime.fromtimestamp(
+        timestamp, datetime.timezone.utc
+    ).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _changed_since(t, since):
+    return since is None or (t.modified is not None and t.modified >= since)
+
+
+def _ics_pieces(task, progress=None, since=None):
+    """Yield the folded content lines of the calendar holding ``task``.
+
+    Sub-tasks refer to their parent by uid, and calendar clients match the
+    items of later exports by it; tasks without one are exported under a
+    new uid (see :py:func:`_export_uid`).  With ``since`` only tasks
+    changed at or after that time are included, followed by a cancelled
+    VTODO for every task deleted since then.
+    """
+    stamp = _ics_time(time.time())
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Task Manager//EN\r\n"
+    parents = []
+    for t, depth in _iterate_tasks(task):
+        del parents[depth:]
+        parents.append(_export_uid(t))
+        if progress is not None:
+            progress.advance()
+        if not _changed_since(t, since):
+            continue
+        lines = [
+            "BEGIN:VTODO\r\n",
+            _ics_fold("UID:" + _ics_text(parents[-1])),
+            f"DTSTAMP:{stamp}\r\n",
+            _ics_fold("SUMMARY:" + _ics_text(t.name)),
+        ]
+        if depth:
+            lines.append(
+                _ics_fold("RELATED-TO;RELTYPE=PARENT:" + _ics_text(parents[-2]))
+            )
+        if t.due_date:
+            lines.append(f"DUE:{t.due_date.replace('-', '')}T000000Z\r\n")
+        if t.priority is not None:
+            lines.append(f"PRIORITY:{t.priority}\r\n")
+        if t.revision:
+            lines.append(f"SEQUENCE:{t.revision}\r\n")
+        if t.modified is not None:
+            lines.append(f"LAST-MODIFIED:{_ics_time(t.modified)}\r\n")
+        lines.append(
+            "STATUS:COMPLETED\r\n" if t.completed else "STATUS:NEEDS-ACTION\r\n"
+        )
+        lines.append("END:VTODO\r\n")
+        yield "".join(lines)
+    if since is not None:
+        for uid, (when, revision) in task.deleted.items():
+            if when >= since:
+                yield (
+                    "BEGIN:VTODO\r\n"
+                    + _ics_fold("UID:" + _ics_text(uid))
+                    + f"DTSTAMP:{stamp}\r\nSEQUENCE:{revision}\r\n"
+                    f"LAST-MODIFIED:{_ics_time(when)}\r\n"
+                    "STATUS:CANCELLED\r\nEND:VTODO\r\n"
                 )
-                while len(current_stack) > depth:
-                    current_stack.pop()
-                parent = current_stack[-1] if depth and current_stack else None
-                if parent is None:
-                    current_stack[:] = [task]
-                    return task
-                parent.add_sub_task(task)
-                current_stack.append(task)
-                return current_stack[0]
-
-            root = handle(first_row, stack)
-            for row in reader:
-                r = handle(row, stack)
-                if r is not None:
-                    root = r
-
-            return root if root is not None else Task("Main")
+    yield "END:VCALENDAR\r\n"
+
+
+def save_tasks_to_ics(
+    task,
+    path,
+    progress=None,
+    compresslevel=None,
+    durability=DURABILITY_NONE,
+    since=None,
+):
+    """Write the task hierarchy to ``path`` as an iCalendar file.
+
+    Every task becomes a VTODO whose ``UID`` is the task's uid (assigned if
+    missing); sub-tasks refer to their parent with ``RELATED-TO``, and the
+    task's revision is its ``SEQUENCE``.  The calendar is generated one
+    VTODO at a time and written in blocks.
+
+    ``since`` (a POSIX time) makes the export incremental: only tasks whose
+    ``modified`` time is at or after it are written, and tasks deleted since
+    then are written with ``STATUS:CANCELLED``.  The function returns the
+    time the export started, to be passed as ``since`` to the next one.
+
+    ``progress`` receives the number of tasks written.  A ``.gz``, ``.xz`` or
+    ``.bz2`` suffix compresses the file with ``compresslevel``.  See
+    :py:func:`save_tasks_to_json` for ``durability``.
+    """
+    watermark = time.time()
+    _start_task_progress(task, progress)
+    with _open_output(
+        path, progress, compresslevel, durability, newline="", encoding="utf-8"
+    ) as fh:
+        _write_buffered(fh, _ics_pieces(task, progress, since))
+    return watermark
+
+
+def load_tasks_from_csv(path, progress=None, use_cache=True):
+    """Load tasks from a CSV file at ``path`` and return a ``Task``.
+
+    The first row after the header becomes the root task and remaining rows
+    become its direct subtasks.  If loading fails, a new ``Task('Main')`` is
+    returned and a warning is printed.  ``progress`` receives the number of
+    bytes read.  See :py:func:`load_tasks_from_json` for ``use_cache``.
+    """
+    key, task = _cached_load(path, "csv", progress, use_cache)
+    if task is not None:
+        return task
+    try:
+        with _open_input(path, progress, encoding="utf-8", newline="") as fh:
+            task = _read_csv(fh)
+    except OperationCancelled:
+        raise
     except Exception as err:
         logger.warning("Failed to load tasks from %s: %s", path, err)
         return Task("Main")
+    if key is not None:
+        _cache_tree(key, task, key[2])
+    return task
 
 
-def load_tasks_from_ics(path):
-    """Load tasks from an iCalendar file written by :py:meth:`save_tasks_to_ics`."""
+@contextlib.contextmanager
+def _gc_paused():
+    """Suspend the cyclic garbage collector while a large tree is built.
+
+    Every task created stays alive, so the collections triggered by the
+    allocations would only traverse the growing tree again and again.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
     try:
-        tasks = []
-        current = None
-        with open(path, "r", encoding="utf-8") as fh:
-            for raw in fh:
-                line = raw.strip()
-                if line == "BEGIN:VTODO":
-                    current = {}
-                elif line == "END:VTODO":
-                    if current is not None:
-                        name = current.get("SUMMARY", "Unnamed")
-                        due = current.get("DUE")
-                        if due and len(due) >= 8:
-                            due = f"{due[0:4]}-{due[4:6]}-{due[6:8]}"
-                        prio = current.get("PRIORITY")
-                        try:
-                            prio_val = int(prio) if prio else None
-                        except ValueError:
-                            prio_val = None
-                        status = current.get("STATUS", "NEEDS-ACTION").upper()
-                        completed = status == "COMPLETED"
-                        tasks.append(
-                            Task(
-                                name,
-                                due_date=due or None,
-                                priority=prio_val,
-                                completed=completed,
-                            )
-                        )
-                    current = None
-                elif current is not None and ":" in line:
-                    key, value = line.split(":", 1)
-                    current[key] = value
-
-        if not tasks:
-            return Task("Main")
-        root = tasks[0]
-        for t in tasks[1:]:
-            root.add_sub_task(t)
-        return root
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read_csv(fh):
+    """Return the task tree of the CSV rows read from ``fh``."""
+    reader = csv.reader(fh)
+    header = next(reader, None)
+    depth_index = header.index("Depth") if header and "Depth" in header else None
+    with _gc_paused():
+        return _tree_from_records(_csv_records(reader, depth_index))
+
+
+def _csv_records(rows, depth_index):
+    """Yield ``(depth, task)`` for every row of ``rows``.
+
+    Without a depth column the first row is the root and every other row
+    one of its sub-tasks.  Rows with fewer than four fields or an invalid
+    depth are skipped; an invalid priority or completion flag is an error.
+    """
+    flags = _CSV_FLAGS
+    depth = 0
+    for row in rows:
+        if len(row) < 4:
+            continue
+        name, due, prio, comp = row[:4]
+        if depth_index is None:
+            pass
+        elif len(row) > depth_index and row[depth_index] != "":
+            try:
+                depth = int(row[depth_index])
+            except ValueError:
+                continue
+        else:
+            depth = 0
+        completed = flags.get(comp)
+        if completed is None:
+            completed = bool(int(comp))
+        yield depth, Task(
+            name, None, due or None, int(prio) if prio else None, completed
+        )
+        if depth_index is None:
+            depth = 1
+
+
+def _tree_from_records(records):
+    """Link ``(depth, task)`` pairs in pre-order into a tree; return its root.
+
+    Only the ancestors of the current row are kept on a stack, so the extra
+    memory does not grow with the number of rows.  A row deeper than its
+    predecessor's children is attached to the deepest open task; a later
+    row of depth 0 starts a new tree which replaces the previous one.
+    """
+    stack = []
+    root = None
+    for depth, task in records:
+        if depth and stack:
+            del stack[depth:]
+            stack[-1].add_sub_task(task)
+            stack.append(task)
+        else:
+            stack[:] = [task]
+            root = task
+    return root if root is not None else Task("Main")
+
+
+def load_tasks_from_ics(path, progress=None, use_cache=True):
+    """Load tasks from an iCalendar file written by :py:meth:`save_tasks_to_ics`.
+
+    ``progress`` receives the number of bytes read.  See
+    :py:func:`load_tasks_from_json` for ``use_cache``.
+    """
+    key, task = _cached_load(path, "ics", progress, use_cache)
+    if task is not None:
+        return task
+    try:
+        with _open_input(path, progress, encoding="utf-8") as fh:
+            task = _read_ics(fh)
+    except OperationCancelled:
+        raise
     except Exception as err:
         logger.warning("Failed to load tasks from %s: %s", path, err)
         return Task("Main")
+    if key is not None:
+        _cache_tree(key, task, key[2])
+    return task
+
+
+def _ics_unfolded(fh):
+    """Yield the content lines of ``fh`` with folded lines joined again.
+
+    The text is read in blocks; each block is cut after its last complete
+    content line and unfolded with a single substitution.
+    """
+    carry = ""
+    while True:
+        chunk = fh.read(_CHUNK_SIZE)
+        text = carry + chunk
+        if not chunk:
+            break
+        # The line after the cut must not be a continuation, so the cut
+        # falls between two content lines
+        cut = text.rfind("\n", 0, len(text) - 1)
+        while cut >= 0 and text[cut + 1] in " \t":
+            cut = text.rfind("\n", 0, cut)
+        if cut < 0:
+            carry = text
+            continue
+        carry = text[cut + 1:]
+        yield from _ICS_FOLD.sub("", text[:cut]).split("\n")
+    if text:
+        yield from _ICS_FOLD.sub("", text).split("\n")
+
+
+def _ics_todos(lines):
+    """Yield ``(task, parent uid)`` for every VTODO in ``lines``.
+
+    Components nested in a VTODO (alarms) are skipped, and properties
+    other than those :py:func:`_ics_pieces` writes are ignored.
+    """
+    current = None
+    nested = 0
+    for line in lines:
+        line = line.rstrip("\r")
+        colon = line.find(":")
+        if colon > 0 and line.find(";", 0, colon) < 0:
+            # No parameters: the name is everything before the colon
+            name = line[:colon].upper()
+            value = line[colon + 1:]
+            params = ""
+        else:
+            match = _ICS_CONTENT_LINE.match(line)
+            if match is None:
+                continue
+            name = match.group(1).upper()
+            value = line[match.end():]
+            params = match.group(2)
+        if current is not None and not nested and name not in _ICS_MARKERS:
+            if name == "RELATED-TO":
+                reltype = dict(_ICS_PARAM.findall(params)).get(
+                    "RELTYPE", "PARENT"
+                )
+                if reltype.strip('"').upper() != "PARENT":
+                    continue
+            current[name] = value
+            continue
+        if name == "BEGIN":
+            if current is not None:
+                nested += 1
+            elif value.upper() == "VTODO":
+                current = {}
+            continue
+        if name == "END":
+            if nested:
+                nested -= 1
+            elif current is not None and value.upper() == "VTODO":
+                # Cancelled items are tombstones of deleted tasks
+                if current.get("STATUS", "").upper() != "CANCELLED":
+                    yield _ics_task(current)
+                current = None
+
+
+def _ics_task(properties):
+    """Return ``(task, parent uid)`` for the properties of a VTODO."""
+    due = properties.get("DUE")
+    if due and len(due) >= 8:
+        due = f"{due[0:4]}-{due[4:6]}-{due[6:8]}"
+    prio = properties.get("PRIORITY")
+    try:
+        priority = int(prio) if prio else None
+    except ValueError:
+        priority = None
+    uid = properties.get("UID")
+    parent = properties.get("RELATED-TO")
+    try:
+        revision = int(properties.get("SEQUENCE", 0))
+    except ValueError:
+        revision = 0
+    try:
+        modified = datetime.datetime.strptime(
+            properties["LAST-MODIFIED"], "%Y%m%dT%H%M%SZ"
+        ).replace(tzinfo=datetime.timezone.utc).timestamp()
+    except (KeyError, ValueError):
+        modified = None
+    task = Task(
+        _ics_untext(properties.get("SUMMARY", "Unnamed")),
+        due_date=due or None,
+        priority=priority,
+        completed=properties.get("STATUS", "").upper() == "COMPLETED",
+        uid=_ics_untext(uid) if uid else None,
+        modified=modified,
+        revision=revision,
+    )
+    return task, _ics_untext(parent) if parent else None
+
+
+def _link_tasks(records):
+    """Build a tree from ``(task, parent uid)`` pairs; return its root.
+
+    Sub-tasks are attached to the task with their parent's uid, in the
+    order they are listed; those listed before their parent follow the
+    ones listed after it.  The first task without a (known) parent is the
+    root; other tasks without one, e.g. every task of a calendar written by
+    another program, become its direct sub-tasks.  Links that would form a
+    cycle are dropped, and tasks repeating a uid keep no uid of their own.
+    """
+    by_uid = {}
+    parent_of = {}
+    pending = []
+    top = []
+    for task, parent_uid in records:
+        uid = task.uid
+        if uid is not None:
+            if uid in by_uid:
+                task.uid = None
+            else:
+                by_uid[uid] = task
+        if parent_uid is None:
+            top.append(task)
+            continue
+        parent = by_uid.get(parent_uid)
+        if parent is None or parent is task:
+            # The parent may still follow
+            pending.append((task, parent_uid))
+            continue
+        # A task listed after its parent has no sub-tasks yet, so this
+        # link cannot close a cycle
+        parent.add_sub_task(task)
+        parent_of[id(task)] = parent
+
+    for task, parent_uid in pending:
+        parent = by_uid.get(parent_uid)
+        ancestor = parent
+        while ancestor is not None and ancestor is not task:
+            ancestor = parent_of.get(id(ancestor))
+        if parent is None or ancestor is task:
+            top.append(task)
+        else:
+            parent.add_sub_task(task)
+            parent_of[id(task)] = parent
+
+    if not top:
+        return Task("Main")
+    root = top[0]
+    for task in top[1:]:
+        root.add_sub_task(task)
+    return root
+
+
+def _read_ics(fh):
+    """Return the task tree of the VTODO components read from ``fh``."""
+    with _gc_paused():
+        return _link_tasks(_ics_todos(_ics_unfolded(fh)))
+
+
+# Serializer registry
+#
+# Every file format is described by a ``Codec``.  Files are matched to a
+# codec by the magic bytes their (decompressed) content starts with, or
+# failing that by their suffix.  Further formats can be added with
+# :py:func:`register_codec`.
+_MAGIC_BYTES = 64
+
+
+class Codec:
+    """A task file format with streaming readers and writers.
+
+    Attributes:
+        name (str): Name the codec is registered under, e.g. ``"csv"``.
+        label (str): Name of the format shown to users.
+        suffixes (tuple of str): File suffixes of the format, e.g. ``(".csv",)``.
+        magic (tuple of bytes): Prefixes the content of such files starts
+            with once decompressed and stripped of a byte order mark and of
+            leading white space.
+        binary (bool): Whether :py:meth:`read` and :py:meth:`write` take
+            binary streams.  Text streams are UTF-8 and opened with
+            ``newline=""``.
+        compressible (bool): Whether files may be gzip, xz or bzip2
+            compressed.
+        load_options (frozenset of str): Keyword arguments :py:meth:`load`
+            passes on to the loader.
+        save_options (frozenset of str): Keyword arguments :py:meth:`save`
+            passes on to the saver.
+
+    Methods:
+        read(fh): Return the task tree read from the stream ``fh``.
+        write(task, fh): Write the task tree to the stream ``fh``.
+        load(path, progress=None, **options): Load a task file.
+        save(task, path, progress=None, **options): Save a task file.
+        filetypes(): Return the file dialog patterns of the format.
+    """
+
+    def __init__(
+        self,
+        name,
+        label,
+        suffixes,
+        magic,
+        reader,
+        writer,
+        loader,
+        saver,
+        binary=False,
+        compressible=True,
+        load_options=(),
+        save_options=(),
+    ):
+        self.name = name
+        self.label = label
+        self.suffixes = tuple(suffixes)
+        self.magic = tuple(magic)
+        self.binary = binary
+        self.compressible = compressible
+        self.load_options = frozenset(load_options)
+        self.save_options = frozenset(save_options)
+        self._reader = reader
+        self._writer = writer
+        self._loader = loader
+        self._saver = saver
+
+    def __repr__(self):
+        return f"<Codec {self.name}>"
+
+    def matches(self, header):
+        """Return whether the file content ``header`` is in this format."""
+        if header.startswith(codecs.BOM_UTF8):
+            header = header[len(codecs.BOM_UTF8):]
+        header = header.lstrip()
+        return any(header.startswith(magic) for magic in self.magic)
+
+    def read(self, fh):
+        """Return the task tree read from the open stream ``fh``."""
+        return self._reader(fh)
+
+    def write(self, task, fh):
+        """Write ``task`` and its sub-tasks to the open stream ``fh``."""
+        self._writer(task, fh)
+
+    def load(self, path, progress=None, **options):
+        """Load the task file at ``path``.
+
+        Options the loader does not take (see :pyattr:`load_options`) are
+        ignored, so callers can pass the same ones for every format.
+        """
+        options = {k: v for k, v in options.items() if k in self.load_options}
+        return self._loader(path, progress, **options)
+
+    def save(self, task, path, progress=None, **options):
+        """Save ``task`` to ``path``, ignoring options the saver does not take."""
+        options = {k: v for k, v in options.items() if k in self.save_options}
+        return self._saver(task, path, progress, **options)
+
+    def filetypes(self):
+        """Return ``(label, patterns)`` pairs for file dialogs."""
+        patterns = " ".join("*" + suffix for suffix in self.suffixes)
+        types = [(f"{self.label} files", patterns)]
+        if self.compressible:
+            compressed = " ".join(
+                f"*{suffix}{compression}"
+                for suffix in self.suffixes
+                for compression in _COMPRESSION_SUFFIXES
+            )
+            types.append((f"Compressed {self.label} files", compressed))
+        types.append(("All files", "*.*"))
+        return types
+
+
+_CODECS = {}
+
+
+def register_codec(codec):
+    """Add ``codec`` to the registry, replacing any codec of the same name."""
+    _CODECS[codec.name] = codec
+
+
+def get_codec(name):
+    """Return the codec registered as ``name``; raise ``KeyError`` otherwise."""
+    return _CODECS[name]
+
+
+def registered_codecs():
+    """Return the registered codecs in registration order."""
+    return list(_CODECS.values())
+
+
+def codec_for_path(path):
+    """Return the codec of the suffix of ``path``, or ``None``.
+
+    A compression suffix is skipped, so ``tasks.csv.gz`` is a CSV file.
+    """
+    suffixes = [suffix.lower() for suffix in Path(path).suffixes]
+    if suffixes and suffixes[-1] in _COMPRESSION_SUFFIXES:
+        suffixes.pop()
+    if not suffixes:
+        return None
+    for codec in _CODECS.values():
+        if suffixes[-1] in codec.suffixes:
+            return codec
+    return None
+
+
+def detect_codec(path):
+    """Return the codec recognised from the content of ``path``, or ``None``.
+
+    Compressed files are recognised by the content they decompress to.
+    Missing and unreadable files give ``None``.
+    """
+    try:
+        with open(path, "rb") as fh:
+            header = fh.read(_MAGIC_BYTES)
+            module = _compression_for_magic(header)
+            if module is not None:
+                fh.seek(0)
+                with module.open(fh, "rb") as inner:
+                    header = inner.read(_MAGIC_BYTES)
+    except (OSError, EOFError, lzma.LZMAError):
+        return None
+    for codec in _CODECS.values():
+        if codec.matches(header):
+            return codec
+    return None
+
+
+def _write_json(task, fh):
+    for block in _blocks(_json_pieces(task)):
+        fh.write(block.encode("utf-8"))
+
+
+def _read_snapshot(fh):
+    return _Snapshot(fh.read()).task(0)
+
+
+def _write_snapshot(task, fh):
+    fh.writelines(_encode_snapshot(task))
+
+
+register_codec(
+    Codec(
+        "json",
+        "JSON",
+        (".json",),
+        (b"{",),
+        _read_json,
+        _write_json,
+        load_tasks_from_json,
+        save_tasks_to_json,
+        binary=True,
+        load_options=("lazy", "use_cache", "fast"),
+        save_options=("indent", "compresslevel", "durability", "fast"),
+    )
+)
+register_codec(
+    Codec(
+        "csv",
+        "CSV",
+        (".csv",),
+        (b"Name,Due Date,",),
+        _read_csv,
+        _write_csv,
+        load_tasks_from_csv,
+        save_tasks_to_csv,
+        load_options=("use_cache",),
+        save_options=("compresslevel", "durability", "since"),
+    )
+)
+register_codec(
+    Codec(
+        "ics",
+        "iCalendar",
+        (".ics",),
+        (b"BEGIN:VCALENDAR",),
+        _read_ics,
+        lambda task, fh: _write_buffered(fh, _ics_pieces(task)),
+        load_tasks_from_ics,
+        save_tasks_to_ics,
+        load_options=("use_cache",),
+        save_options=("compresslevel", "durability", "since"),
+    )
+)
+register_codec(
+    Codec(
+        "snapshot",
+        "Snapshot",
+        (SNAPSHOT_SUFFIX,),
+        (_SNAPSHOT_MAGIC,),
+        _read_snapshot,
+        _write_snapshot,
+        load_tasks_from_snapshot,
+        save_tasks_to_snapshot,
+        binary=True,
+        compressible=False,
+        save_options=("durability",),
+    )
+)
+
+
+def _bench_tree(count):
+    """Return a tree of about ``count`` tasks: projects of items of steps."""
+    root = Task("Main")
+    for p in range((count + 99) // 100):
+        project = Task(f"Project {p}", priority=p % 5)
+        for i in range(24):
+            item = Task(
+                f"Item {i} of project {p}",
+                due_date=f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                priority=i % 5,
+                completed=i % 3 == 0,
+                uid=f"{p:x}-{i:x}",
+            )
+            for j in range(3):
+                item.add_sub_task(Task(f"Step {j} \u2013 {i}"))
+            project.add_sub_task(item)
+        root.add_sub_task(project)
+    return root
+
+
+def _bench(args):
+    """Print the save and load throughput of every registered codec."""
+    import tempfile
+
+    tree = _bench_tree(args.tasks)
+    count = sum(1 for _ in tree.walk())
+    print(f"{count} tasks, best of {args.repeat} runs")
+    print(f"  {'codec':<16}{'size':>10}{'save':>12}{'load':>12}{'tasks/s':>14}")
+    runs = [(codec.name, codec, {}) for codec in registered_codecs()]
+    if _fast_json is not None:
+        runs.insert(1, ("json (stdlib)", get_codec("json"), {"fast": False}))
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, codec, options in runs:
+            path = Path(tmp, "bench" + codec.suffixes[0])
+            save = load = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                codec.save(tree, path, **options)
+                save = min(save, time.perf_counter() - start)
+                start = time.perf_counter()
+                loaded = codec.load(path, use_cache=False, **options)
+                # Snapshots decode their tasks on access
+                sum(1 for _ in loaded.walk())
+                load = min(load, time.perf_counter() - start)
+            size = path.stat().st_size / 2**20
+            print(
+                f"  {label:<16}{size:>7.1f} MiB"
+                f"{size / save:>7.1f} MiB/s{size / load:>7.1f} MiB/s"
+                f"{count / load:>14,.0f}"
+            )
+    return 0
+
+
+def main(argv=None):
+    """Run ``python -m persistence`` and return the exit code."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m persistence", description="Task file utilities"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser(
+        "bench", help="Measure the throughput of every registered codec"
+    )
+    bench.add_argument(
+        "--tasks", type=int, default=100_000, help="Size of the generated tree"
+    )
+    bench.add_argument(
+        "--repeat", type=int, default=3, help="Runs per codec; the best counts"
+    )
+    bench.set_defaults(func=_bench)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,630 @@
+"""
+This module serves the tasks to other local programs over a socket.
+
+Editor plugins, scripts and dashboards call ``query``, ``list``, ``add``,
+``edit``, ``complete`` and ``move`` on a running :py:class:`TaskService`
+instead of each parsing the task file.  The service runs on ``asyncio``
+and only uses the standard library.  One port speaks two protocols, told
+apart by the first line a client sends:
+
+- line-delimited JSON-RPC 2.0: every line is a request, or a batch (an
+  array of requests), and is answered by one line;
+- HTTP/1.1: ``POST /rpc`` takes the same JSON-RPC bodies and
+  ``GET /tasks?path=2&depth=1`` streams the tasks as one JSON object per
+  line.
+
+The service has no authentication.  So that web pages open in a browser
+cannot use it, HTTP requests must name the service's own address in their
+``Host`` header (``localhost:8765``, not a name rebound to the loopback
+address), must not carry an ``Origin`` header, and ``POST /rpc`` bodies
+must be sent as ``Content-Type: application/json``, which pages can only
+send after a preflight the service does not answer.
+
+Connections stay open for any number of requests.  Reads are answered
+right away; calls that change the tasks go through one queue, consumed by
+a single writer task, so edits of concurrent clients are applied one at a
+time in the order they arrived and are saved together.  Large listings are
+sent in chunks, waiting for slow clients to catch up between them.
+
+Tasks are addressed by the dotted, 1-based paths of :py:mod:`cli`.
+
+Classes:
+- TaskService: Serves the tasks of a controller.
+- RpcError: A JSON-RPC error returned to the client.
+
+Functions:
+- main(argv): Serve a task file until interrupted.
+
+Usage:
+    python -m orga serve --file tasks.json --port 8765
+    echo '{"jsonrpc": "2.0", "id": 1, "method": "add",
+           "params": {"name": "Report"}}' | nc 127.0.0.1 8765
+"""
+import argparse
+import asyncio
+import inspect
+import io
+import ipaddress
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import cli
+import persistence
+from controller import InvalidTaskIndexError, TaskController
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+TASK_ERROR = -32000
+
+# Records per chunk of a streamed listing
+_CHUNK_ROWS = 500
+# Longest line or HTTP body accepted
+_MAX_REQUEST = 1 << 20
+# How often requests forwarded by ``orga.py cli`` are handled
+_SERVE_INTERVAL = 0.05
+
+_HTTP_METHODS = (b"GET ", b"POST ", b"HEAD ", b"PUT ", b"DELETE ", b"OPTIONS ")
+_HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    415: "Unsupported Media Type",
+    501: "Not Implemented",
+}
+
+
+class RpcError(Exception):
+    """Error returned to the client in a JSON-RPC error object.
+
+    Attributes:
+        code (int): JSON-RPC error code, such as :py:data:`INVALID_PARAMS`.
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _records(root, path=None, depth=None):
+    """Return the records of the tasks below ``path`` (the whole tree by
+    default), as printed by ``orga.py cli list --json``."""
+    prefix = ""
+    if path:
+        parent, index = cli._resolve(root, path)
+        root = parent.get_sub_tasks()[index]
+        prefix = path + "."
+    return [cli._record(p, task) for p, task in cli._walk(root, prefix, depth)]
+
+
+# Methods; each takes the controller and the call's named parameters ----
+
+
+def _rpc_list(controller, path=None, depth=None):
+    return _records(controller.task, path, depth)
+
+
+def _rpc_query(
+    controller,
+    search=None,
+    pending=False,
+    completed=False,
+    due_before=None,
+    due_after=None,
+    priority_above=None,
+    priority_below=None,
+):
+    filters = cli._query_filters(
+        search,
+        pending,
+        completed,
+        due_before,
+        due_after,
+        priority_above,
+        priority_below,
+    )
+    return [
+        cli._record(path, task)
+        for path, task in cli._walk(controller.task)
+        if task.matches(**filters)
+    ]
+
+
+def _rpc_add(controller, name, parent=None, due_date=None, priority=None):
+    target = controller
+    prefix = ""
+    if parent:
+        owner, index = cli._resolve(controller.task, parent)
+        target = controller.spawn(owner.get_sub_tasks()[index])
+        prefix = parent + "."
+    target.add_task(name, due_date=due_date, priority=priority)
+    return f"{prefix}{len(target.get_sub_tasks())}"
+
+
+def _rpc_edit(controller, path, name=None, due_date=None, priority=None):
+    parent, index = cli._resolve(controller.task, path)
+    values = {
+        attr: value
+        for attr, value in (
+            ("name", name), ("due_date", due_date), ("priority", priority)
+        )
+        if value is not None
+    }
+    if values:
+        controller.spawn(parent).update_task(index, **values)
+    return path
+
+
+def _rpc_complete(controller, path, undo=False):
+    parent, index = cli._resolve(controller.task, path)
+    target = controller.spawn(parent)
+    if undo:
+        target.mark_task_incomplete(index)
+    else:
+        target.mark_task_completed(index)
+    return path
+
+
+def _rpc_move(controller, path, to):
+    """Move the task at ``path`` to the 1-based position ``to`` among its
+    siblings; return its new path."""
+    parent, index = cli._resolve(controller.task, path)
+    if not isinstance(to, int) or not 1 <= to <= len(parent.get_sub_tasks()):
+        raise cli.CliError(f"invalid position: {to!r}")
+    controller.spawn(parent).move_task(index, to - 1)
+    prefix, dot, _ = path.rpartition(".")
+    return f"{prefix}{dot}{to}"
+
+
+# name -> (function, changes the tasks)
+METHODS = {
+    "list": (_rpc_list, False),
+    "query": (_rpc_query, False),
+    "add": (_rpc_add, True),
+    "edit": (_rpc_edit, True),
+    "complete": (_rpc_complete, True),
+    "move": (_rpc_move, True),
+}
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _error(request_id, code, message):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
+
+
+class TaskService:
+    """Serves JSON-RPC calls on the tasks of a controller.
+
+    The service must run on the thread owning the controller, or the
+    controller must not be used by any other thread meanwhile.
+
+    Attributes:
+        controller (TaskController): Controller whose tasks are served.
+        host (str): Address listened on; only local clients by default.
+        port (int): Port listened on; the one chosen by the system once
+            :py:meth:`start` returned when ``0`` was given.
+        calls (int): Calls answered so far, batched ones included.
+        writes (int): Calls applied by the writer task so far.
+    """
+
+    def __init__(self, controller, host="127.0.0.1", port=DEFAULT_PORT):
+        """
+        Args:
+            controller (TaskController): Controller of the served tasks.
+            host (str, optional): Address to listen on.
+            port (int, optional): Port to listen on, ``0`` for any free one.
+        """
+        self.controller = controller
+        self.host = host
+        self.port = port
+        self.calls = 0
+        self.writes = 0
+        self._server = None
+        self._queue = None
+        self._writer = None
+
+    async def start(self):
+        """Listen for clients and start the writer task."""
+        loop = asyncio.get_running_loop()
+        scheduler = self.controller.scheduler
+        if scheduler is not None and scheduler.after is None:
+            # Coalesce the saves of a burst of calls into one write
+            scheduler.after = lambda ms, func: loop.call_later(ms / 1000, func)
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._apply_writes())
+        self._server = await asyncio.start_server(
+            self._serve, self.host, self.port, limit=_MAX_REQUEST
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop listening, finish the queued writes and save the tasks."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._writer is not None:
+            await self._queue.join()
+            self._writer.cancel()
+            self._writer = None
+        if self.controller.scheduler is not None:
+            self.controller.scheduler.flush()
+
+    async def _apply_writes(self):
+        while True:
+            func, params, future = await self._queue.get()
+            try:
+                if not future.cancelled():
+                    future.set_result(func(self.controller, **params))
+            except Exception as err:
+                future.set_exception(err)
+            finally:
+                self.writes += 1
+                self._queue.task_done()
+
+    # JSON-RPC -----------------------------------------------------------
+
+    async def call(self, request):
+        """Answer one JSON-RPC request object.
+
+        Returns the response object, or ``None`` for a notification (a
+        request without ``id``).
+        """
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0":
+            return _error(None, INVALID_REQUEST, "Invalid Request")
+        request_id = request.get("id")
+        try:
+            result = await self._call(request.get("method"), request.get("params"))
+        except RpcError as err:
+            response = _error(request_id, err.code, str(err))
+        except (cli.CliError, InvalidTaskIndexError, ValueError) as err:
+            response = _error(request_id, TASK_ERROR, str(err))
+        except Exception as err:  # reported to the client
+            logger.exception("Call %r failed", request)
+            response = _error(request_id, TASK_ERROR, f"internal error: {err}")
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        self.calls += 1
+        return response if "id" in request else None
+
+    async def _call(self, method, params):
+        if method not in METHODS:
+            raise RpcError(METHOD_NOT_FOUND, f"Method not found: {method!r}")
+        func, writes = METHODS[method]
+        params = {} if params is None else params
+        if not isinstance(params, dict):
+            raise RpcError(INVALID_PARAMS, "params must be an object")
+        try:
+            inspect.signature(func).bind(None, **params)
+        except TypeError as err:
+            raise RpcError(INVALID_PARAMS, str(err)) from None
+        if not writes:
+            return func(self.controller, **params)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((func, params, future))
+        return await future
+
+    async def _answer(self, body):
+        """Yield the encoded response to ``body`` in chunks."""
+        try:
+            request = json.loads(body)
+        except ValueError:
+            yield _dumps(_error(None, PARSE_ERROR, "Parse error"))
+            return
+        if isinstance(request, list):
+            if not request:
+                yield _dumps(_error(None, INVALID_REQUEST, "Invalid Request"))
+                return
+            # One at a time, so that each call sees the previous ones
+            responses = [await self.call(item) for item in request]
+            responses = [r for r in responses if r is not None]
+            if responses:
+                yield _dumps(responses)
+            return
+        response = await self.call(request)
+        if response is None:
+            return
+        result = response.get("result")
+        if not isinstance(result, list) or len(result) <= _CHUNK_ROWS:
+            yield _dumps(response)
+            return
+        # The records were collected at once; only their encoding and
+        # sending is spread over the chunks
+        yield _dumps({"jsonrpc": "2.0", "id": response["id"]})[:-1] + b',"result":['
+        for start in range(0, len(result), _CHUNK_ROWS):
+            chunk = b",".join(_dumps(r) for r in result[start:start + _CHUNK_ROWS])
+            yield (b"," if start else b"") + chunk
+        yield b"]}"
+
+    # Connections --------------------------------------------------------
+
+    async def _serve(self, reader, writer):
+        try:
+            line = await reader.readline()
+            if line.startswith(_HTTP_METHODS):
+                await self._serve_http(line, reader, writer)
+            else:
+                await self._serve_lines(line, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError:
+            # Line longer than _MAX_REQUEST
+            writer.write(_dumps(_error(None, INVALID_REQUEST, "Request too long")))
+            writer.write(b"\n")
+        finally:
+            writer.close()
+
+    async def _serve_lines(self, line, reader, writer):
+        while line:
+            if line.strip():
+                answered = False
+                async for chunk in self._answer(line):
+                    writer.write(chunk)
+                    await writer.drain()
+                    answered = True
+                if answered:
+                    writer.write(b"\n")
+                    await writer.drain()
+            line = await reader.readline()
+
+    async def _serve_http(self, line, reader, writer):
+        while line:
+            try:
+                method, target, version = line.decode("latin-1").split()
+            except ValueError:
+                await self._send(writer, 400, [b'{"error":"bad request line"}'])
+                return
+            headers = {}
+            while True:
+                header = await reader.readline()
+                if header in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = header.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            connection = headers.get("connection", "").lower()
+            keep = (
+                connection != "close"
+                if version == "HTTP/1.1"
+                else connection == "keep-alive"
+            )
+            if "origin" in headers:
+                await self._send(writer, 403, [b'{"error":"cross-origin request"}'])
+                return
+            if headers.get("host", "").lower() not in self._hosts():
+                await self._send(writer, 403, [b'{"error":"unknown host"}'])
+                return
+            url = urlsplit(target)
+            if url.path == "/rpc" and method == "POST":
+                content_type = headers.get("content-type", "")
+                if content_type.partition(";")[0].strip().lower() != (
+                    "application/json"
+                ):
+                    await self._send(writer, 415, [b'{"error":"expected JSON"}'])
+                    return
+                if "transfer-encoding" in headers:
+                    await self._send(writer, 501, [b'{"error":"chunked bodies"}'])
+                    return
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= _MAX_REQUEST:
+                    await self._send(writer, 413, [b'{"error":"invalid body length"}'])
+                    return
+                body = await reader.readexactly(length)
+                await self._send(
+                    writer, 200, self._answer(body), version, keep
+                )
+            elif url.path == "/tasks" and method == "GET":
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                await self._send(
+                    writer,
+                    200,
+                    self._listing(query),
+                    version,
+                    keep,
+                    "application/x-ndjson",
+                )
+            elif url.path in ("/rpc", "/tasks"):
+                await self._send(writer, 405, [b'{"error":"method not allowed"}'])
+                return
+            else:
+                await self._send(writer, 404, [b'{"error":"not found"}'])
+                return
+            if not keep:
+                return
+            line = await reader.readline()
+
+    def _hosts(self):
+        """Return the ``Host`` headers HTTP clients of the service may send."""
+        hosts = {"localhost", "127.0.0.1", "[::1]", self.host.lower()}
+        if ":" in self.host:
+            hosts.add(f"[{self.host.lower()}]")
+        return {f"{host}:{self.port}" for host in hosts}
+
+    async def _listing(self, query):
+        """Yield the tasks requested by ``GET /tasks`` as JSON lines."""
+        try:
+            depth = int(query["depth"]) if "depth" in query else None
+            records = _records(self.controller.task, query.get("path"), depth)
+        except (cli.CliError, ValueError) as err:
+            yield _dumps({"error": str(err)}) + b"\n"
+            return
+        for start in range(0, len(records), _CHUNK_ROWS):
+            yield b"".join(
+                _dumps(r) + b"\n" for r in records[start:start + _CHUNK_ROWS]
+            )
+
+    async def _send(
+        self,
+        writer,
+        status,
+        chunks,
+        version="HTTP/1.1",
+        keep=False,
+        content_type="application/json",
+    ):
+        """Send an HTTP response whose body is made of ``chunks``.
+
+        HTTP/1.1 clients get the chunks as they are produced, with chunked
+        transfer encoding; others get one body of known length.
+        """
+        head = [
+            f"HTTP/1.1 {status} {_HTTP_REASONS[status]}",
+            f"Content-Type: {content_type}",
+            f"Connection: {'keep-alive' if keep else 'close'}",
+        ]
+        if version != "HTTP/1.1":
+            if hasattr(chunks, "__aiter__"):
+                body = b"".join([chunk async for chunk in chunks])
+            else:
+                body = b"".join(chunks)
+            head.append(f"Content-Length: {len(body)}")
+            writer.write("\r\n".join(head).encode("latin-1") + b"\r\n\r\n" + body)
+            await writer.drain()
+            return
+        head.append("Transfer-Encoding: chunked")
+        writer.write("\r\n".join(head).encode("latin-1") + b"\r\n\r\n")
+        if not hasattr(chunks, "__aiter__"):
+            chunks = _aiter(chunks)
+        async for chunk in chunks:
+            if chunk:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def _forwarded(controller, path):
+    """Return the handler of requests forwarded by later invocations of
+    ``orga.py`` (see :py:mod:`instance`) while the service runs."""
+
+    def handle(request):
+        if request.get("command") != "cli":
+            return {
+                "code": 1,
+                "output": "",
+                "error": f"{path} is served by process {os.getpid()} "
+                "(orga.py serve); stop it or pass --new-instance\n",
+            }
+        out, err = io.StringIO(), io.StringIO()
+        code = cli.execute(
+            controller, request["argv"], out, err, cwd=request.get("cwd")
+        )
+        return {"code": code, "output": out.getvalue(), "error": err.getvalue()}
+
+    return handle
+
+
+async def _serve_file(path, host, port):
+    """Serve the task file ``path`` until cancelled; return the exit code."""
+    import instance
+    from journal import attach, fold
+
+    # ``orga.py cli`` commands for the file are run here rather than racing
+    # the service's saves.  Listening before the file is loaded keeps a
+    # second instance from recovering its journal meanwhile; requests wait
+    # in the queue until the first poll().
+    forwarded = instance.InstanceServer(path, None)
+    if not forwarded.start():
+        if instance.running(path):
+            print(
+                f"error: {path} is open in another instance of orga.py; "
+                "close it or use its service",
+                file=sys.stderr,
+            )
+            return 1
+        forwarded = None
+    service = None
+    journal = None
+    try:
+        controller = TaskController(persistence.load_tasks(path), save_path=path)
+        # The GUI's latest auto-saves may only be in the journal
+        journal = attach(controller)
+        if forwarded is not None:
+            forwarded.handle = _forwarded(controller, path)
+        service = TaskService(controller, host, port)
+        await service.start()
+        print(f"Serving {path} on {service.host}:{service.port}", file=sys.stderr)
+        while True:
+            if forwarded is not None:
+                forwarded.poll()
+            await asyncio.sleep(_SERVE_INTERVAL)
+    finally:
+        if forwarded is not None:
+            forwarded.close()
+        if service is not None:
+            await service.close()
+        if journal is not None:
+            fold(controller, journal)
+
+
+def _loopback(host):
+    """Return whether ``host`` only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main(argv=None):
+    """Serve a task file until interrupted; return the exit code."""
+    parser = argparse.ArgumentParser(
+        prog="orga.py serve", description="Serve the tasks to local programs"
+    )
+    parser.add_argument(
+        "--file", default="tasks.json", help="Path to the tasks file"
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (default: %(default)s, local clients only)",
+    )
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Port (default: %(default)s)"
+    )
+    args = parser.parse_args(argv)
+    if not _loopback(args.host):
+        print(
+            f"warning: serving on {args.host} lets other machines read and "
+            "change the tasks without authentication",
+            file=sys.stderr,
+        )
+    try:
+        return asyncio.run(
+            _serve_file(Path(args.file).resolve(), args.host, args.port)
+        )
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+This module lets several processes work on the same task file.
+
+Saves hold an advisory lock on ``<task file>.lock`` and check a generation
+counter stored in that file: every save increments it, so an instance whose
+tasks were read at an older generation notices that another one saved in
+between and merges that save before writing, instead of overwriting it.
+Edits by tools that do not take the lock are recognised from the size,
+modification time and inode of the task file.  :py:meth:`SharedFile.poll`
+only compares those with ``os.stat``, so checking for changes made by
+others is cheap enough to do every second and never parses the file.
+
+Classes:
+- FileLock: Re-entrant advisory lock of a task file.
+- SharedFile: Loads and saves a task file shared with other processes.
+- LockTimeout: Raised when the lock is not obtained in time.
+- StaleFileError: Raised by a save that would overwrite another one.
+
+Functions:
+- file_identity(path): Return the size, modification time and inode of a
+  file.
+
+Usage:
+    shared = SharedFile(path)
+    task = shared.load()
+    controller.scheduler.shared = shared
+    controller.scheduler.on_conflict = controller.sync_tasks
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+import persistence
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+LOCK_SUFFIX = ".lock"
+_RETRY_DELAY = 0.01
+
+
+class LockTimeout(TimeoutError):
+    """Raised when another process holds a :py:class:`FileLock` too long."""
+
+
+class StaleFileError(OSError):
+    """Raised when a save would overwrite changes it has not seen."""
+
+
+def file_identity(path):
+    """Return what identifies the current version of ``path``, or ``None``."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _try_lock(fd):
+    """Lock ``fd`` without waiting; return whether it succeeded."""
+    try:
+        if os.name == "nt":
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd):
+    if os.name == "nt":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class FileLock:
+    """Advisory lock of a task file, shared by the threads of a process.
+
+    The lock is taken on ``<task file>.lock`` with ``flock`` (``msvcrt``
+    locking on Windows), so it only excludes processes that use it too.  It
+    is re-entrant: nested ``with`` blocks of the same thread only lock the
+    file once.  The lock file also stores the generation counter of
+    :py:class:`SharedFile`.
+
+    Attributes:
+        path (Path): The lock file.
+        timeout (float): Seconds to wait for another process to release the
+            lock before :py:class:`LockTimeout` is raised.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        """
+        Args:
+            path (str or Path): Task file to lock.
+            timeout (float, optional): See :pyattr:`timeout`.
+        """
+        path = Path(path)
+        self.path = path.with_name(path.name + LOCK_SUFFIX)
+        self.timeout = timeout
+        self._fd = None
+        self._depth = 0
+        self._mutex = threading.RLock()
+
+    def acquire(self):
+        """Wait for the lock.
+
+        Raises:
+            LockTimeout: Another process kept it for :pyattr:`timeout`.
+        """
+        self._mutex.acquire()
+        if self._depth:
+            self._depth += 1
+            return
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            deadline = time.monotonic() + self.timeout
+            while not _try_lock(fd):
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise LockTimeout(f"{self.path} is locked by another process")
+                time.sleep(_RETRY_DELAY)
+        except BaseException:
+            self._mutex.release()
+            raise
+        self._fd = fd
+        self._depth = 1
+
+    def release(self):
+        """Release one level of the lock."""
+        self._depth -= 1
+        if not self._depth:
+            fd, self._fd = self._fd, None
+            try:
+                _unlock(fd)
+            finally:
+                os.close(fd)
+        self._mutex.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def read_generation(self):
+        """Return the generation stored in the lock file (0 if none).
+
+        Must be called while the lock is held.
+        """
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        data = os.read(self._fd, 64)
+        try:
+            return int(data)
+        except ValueError:
+            return 0
+
+    def write_generation(self, generation):
+        """Store ``generation`` in the lock file; the lock must be held."""
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.ftruncate(self._fd, 0)
+        os.write(self._fd, b"%d\n" % generation)
+
+
+class SharedFile:
+    """A task file that other processes may load and save concurrently.
+
+    Saves go through :py:meth:`save`, which holds the lock, checks that
+    nobody saved since the tasks in memory were read and increments the
+    generation.  :py:meth:`poll` tells whether the file changed since then.
+
+    Attributes:
+        path (Path): The task file.
+        lock (FileLock): Lock of the task file.
+        generation (int or None): Generation of the file the tasks in
+            memory were read from or last saved to; ``None`` before the
+            first :py:meth:`load` or :py:meth:`save`.
+        identity (tuple or None): Size, modification time and inode of the
+            file at that point.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        """
+        Args:
+            path (str or Path): The task file.
+            timeout (float, optional): Seconds to wait for the lock.
+        """
+        self.path = Path(path)
+        self.lock = FileLock(self.path, timeout)
+        self.generation = None
+        self.identity = None
+
+    def load(self, progress=None, **kwargs):
+        """Load the tasks with :py:func:`persistence.load_tasks`.
+
+        The lock is only held to read the generation, not while parsing;
+        a save made by another process during the parse makes the next
+        :py:meth:`save` merge it (the file then no longer matches
+        :pyattr:`identity`).
+        """
+        with self.lock:
+            self.generation = self.lock.read_generation()
+            self.identity = file_identity(self.path)
+        return persistence.load_tasks(self.path, progress, **kwargs)
+
+    def poll(self):
+        """Return whether the file changed since it was loaded or saved.
+
+        Only the file's status is read, never its content.
+        """
+        return file_identity(self.path) != self.identity
+
+    def save(self, write, merge=None):
+        """Call ``write()`` to save the tasks while holding the lock.
+
+        If another process saved the file since the tasks were read,
+        ``merge`` is called with the tree it saved first, so that ``write``
+        includes those changes; without ``merge`` the save is rejected.
+
+        Args:
+            write (callable): Writes the tasks to :pyattr:`path`.
+            merge (callable, optional): Takes over the changes of a tree
+                saved by another process.
+
+        Raises:
+            StaleFileError: The file changed and ``merge`` is ``None``.
+            LockTimeout: Another process kept the lock too long.
+        """
+        with self.lock:
+            generation = self.lock.read_generation()
+            stale = self.generation is not None and (
+                generation != self.generation
+                or file_identity(self.path) != self.identity
+            )
+            if stale:
+                if merge is None:
+                    raise StaleFileError(
+                        f"{self.path} was saved by another process"
+                    )
+                merge(persistence.load_tasks(self.path, use_cache=False))
+            write()
+            self.generation = generation + 1
+            self.lock.write_generation(self.generation)
+            self.identity = file_identity(self.path)
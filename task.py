@@ -7,6 +7,16 @@ Classes:
 Usage:
     This module provides the Task class for managing tasks in a to-do list.
 """
+import datetime
+import itertools
+import time
+import uuid
+
+# Tombstones are dropped once they are this old (in seconds).  A copy of
+# the tree last synchronized, or an export last taken with ``since``,
+# before then no longer learns about those deletions.
+TOMBSTONE_MAX_AGE = 180 * 24 * 60 * 60
+
 class Task:
     """
     Represents a task in the to-do list.
@@ -14,6 +24,16 @@ class Task:
     Attributes:
         name (str): The name of the task.
         sub_tasks (list of Task, optional): A list of sub-tasks associated with the task.
+        uid (str, optional): Stable identifier of the task.  Assigned lazily by
+            :py:meth:`ensure_uid` and persisted once set.
+        modified (float, optional): POSIX time of the last change made through
+            a ``TaskController``, or ``None`` if it was never changed.
+        revision (int): Number of such changes, used as the ICS ``SEQUENCE``.
+        deleted (dict): Tombstones of tasks removed from the tree, mapping
+            their uid to ``[modified, revision]`` of the removal.  Only kept
+            by the root task.
+        sub_tasks_loaded (bool): ``False`` while the sub-tasks of a task read
+            from a snapshot have not been accessed yet.
 
     Methods:
         __init__:
@@ -31,11 +51,40 @@ class Task:
         get_sub_tasks:
             Returns the list of sub-tasks associated with the task.
 
+        defer_sub_tasks:
+            Loads the sub-tasks on first access instead of up front.
+
+        walk:
+            Yields the task and all of its sub-tasks.
+
+        touch:
+            Records a change of the task.
+
+        mark_deleted, unmark_deleted:
+            Add or drop the tombstones of a removed sub-tree.
+
+        prune_deleted:
+            Drops expired tombstones.
+
         prt_sbtsk:
             Returns a string representation of the sub-tasks of the task.
+
+        matches:
+            Returns whether the task passes the list filters.
     """
 
-    def __init__(self, name, sub_tasks=None, due_date=None, priority=None, completed=False):
+    def __init__(
+        self,
+        name,
+        sub_tasks=None,
+        due_date=None,
+        priority=None,
+        completed=False,
+        uid=None,
+        modified=None,
+        revision=0,
+        deleted=None,
+    ):
         """
         Initializes a new Task object.
 
@@ -45,12 +94,56 @@ class Task:
             due_date (str, optional): Optional due date for the task.
             priority (int, optional): Optional priority level for the task.
             completed (bool, optional): Completion status of the task.
+            uid (str, optional): Stable identifier of the task.
+            modified (float, optional): Time of the last change.
+            revision (int, optional): Number of changes so far.
+            deleted (dict, optional): Tombstones of removed tasks.
         """
         self.name = name
+        self._load_sub_tasks = None
         self.sub_tasks = sub_tasks if sub_tasks is not None else []
         self.due_date = due_date
         self.priority = priority
         self.completed = completed
+        self.uid = uid
+        self.modified = modified
+        self.revision = revision
+        self.deleted = deleted if deleted is not None else {}
+
+    @property
+    def sub_tasks(self):
+        """The list of sub-tasks, loaded on first access if deferred.
+
+        When loading fails the error is raised and the sub-tasks stay
+        deferred, so that the task is never saved without them.
+        """
+        if self._load_sub_tasks is not None:
+            self._sub_tasks = self._load_sub_tasks()
+            self._load_sub_tasks = None
+        return self._sub_tasks
+
+    @sub_tasks.setter
+    def sub_tasks(self, sub_tasks):
+        self._load_sub_tasks = None
+        self._sub_tasks = sub_tasks
+
+    def defer_sub_tasks(self, load):
+        """Load the sub-tasks by calling ``load()`` when first accessed.
+
+        ``load`` must return a non-empty list; tasks without sub-tasks should
+        simply keep an empty list.
+        """
+        self._load_sub_tasks = load
+        self._sub_tasks = None
+
+    @property
+    def sub_tasks_loaded(self):
+        """``False`` while the sub-tasks are still deferred."""
+        return self._load_sub_tasks is None
+
+    def has_sub_tasks(self):
+        """Return whether the task has sub-tasks, without loading them."""
+        return self._load_sub_tasks is not None or bool(self._sub_tasks)
 
     def __str__(self):
         """
@@ -93,6 +186,66 @@ class Task:
         """
         return self.sub_tasks
 
+    def ensure_uid(self):
+        """Return the task's uid, generating a new one if it has none yet."""
+        if self.uid is None:
+            self.uid = uuid.uuid4().hex
+        return self.uid
+
+    def walk(self):
+        """Yield this task and all of its sub-tasks in pre-order."""
+        stack = [self]
+        while stack:
+            task = stack.pop()
+            yield task
+            stack.extend(reversed(task.get_sub_tasks()))
+
+    def touch(self, when=None):
+        """Record a change made at ``when`` (default: now).
+
+        Sets :pyattr:`modified` and increments :pyattr:`revision`.
+        """
+        self.modified = time.time() if when is None else when
+        self.revision += 1
+
+    def mark_deleted(self, task, when):
+        """Keep tombstones for ``task`` and its sub-tasks, removed at ``when``.
+
+        Called on the root of the tree.  The removed tasks are touched so
+        that restoring them later gives them a higher revision than their
+        tombstone's.  Tombstones older than :py:data:`TOMBSTONE_MAX_AGE`
+        are dropped meanwhile.
+        """
+        for removed in task.walk():
+            removed.touch(when)
+            if removed.uid is not None:
+                # Re-inserted so that the tombstones stay ordered by age
+                self.deleted.pop(removed.uid, None)
+                self.deleted[removed.uid] = [when, removed.revision]
+        self.prune_deleted(when - TOMBSTONE_MAX_AGE)
+
+    def prune_deleted(self, before):
+        """Drop the tombstones of tasks removed before ``before``.
+
+        Tombstones are kept in the order the tasks were removed, so only
+        the oldest ones are looked at.  Returns the number dropped.
+        """
+        expired = [
+            uid
+            for uid, _ in itertools.takewhile(
+                lambda item: item[1][0] < before, self.deleted.items()
+            )
+        ]
+        for uid in expired:
+            del self.deleted[uid]
+        return len(expired)
+
+    def unmark_deleted(self, task):
+        """Drop the tombstones of ``task`` and its sub-tasks, e.g. on undo."""
+        if self.deleted:
+            for restored in task.walk():
+                self.deleted.pop(restored.uid, None)
+
     def set_due_date(self, due_date):
         """Set the due date for the task."""
         self.due_date = due_date
@@ -109,6 +262,77 @@ class Task:
         """Mark this task as not completed."""
         self.completed = False
 
+    def matches(
+        self,
+        search_term="",
+        hide_completed=False,
+        show_completed_only=False,
+        due_value="",
+        before=False,
+        after=False,
+        prio_value="",
+        above=False,
+        below=False,
+    ):
+        """
+        Returns whether the task passes the given filters.
+
+        Args:
+            search_term (str): Lower-case text that must appear in the name.
+            hide_completed (bool): Reject completed tasks.
+            show_completed_only (bool): Reject tasks that are not completed.
+            due_value (str): ISO date compared with the due date when
+                ``before`` or ``after`` is set.  Invalid dates disable the
+                due date filter.
+            prio_value (str): Integer threshold compared with the priority
+                when ``above`` or ``below`` is set.
+
+        Returns:
+            bool: ``True`` if the task should be shown.
+        """
+        if show_completed_only and not self.completed:
+            return False
+
+        if hide_completed and self.completed:
+            return False
+
+        if search_term and search_term not in self.name.lower():
+            return False
+
+        if due_value and (before or after):
+            try:
+                fdate = datetime.date.fromisoformat(due_value)
+            except ValueError:
+                # Invalid user input - skip due date filtering entirely
+                return True
+
+            try:
+                tdate = (
+                    datetime.date.fromisoformat(str(self.due_date))
+                    if self.due_date
+                    else None
+                )
+            except ValueError:
+                tdate = None
+            if before and (tdate is None or tdate >= fdate):
+                return False
+            if after and (tdate is None or tdate <= fdate):
+                return False
+
+        if prio_value and (above or below):
+            try:
+                threshold = int(prio_value)
+            except ValueError:
+                threshold = None
+            if threshold is not None:
+                pval = self.priority
+                if above and (pval is None or pval <= threshold):
+                    return False
+                if below and (pval is None or pval >= threshold):
+                    return False
+
+        return True
+
     def prt_sbtsk(self):
         """
         Returns a string representation of the sub-tasks of the task.
@@ -125,14 +349,27 @@ class Task:
         return ", ".join(names)
 
     def to_dict(self):
-        """Return a dictionary representation of this task."""
-        return {
+        """Return a dictionary representation of this task.
+
+        The ``uid``, ``modified``, ``revision`` and ``deleted`` keys are only
+        present once they have been set.
+        """
+        data = {
             "name": self.name,
             "sub_tasks": [t.to_dict() for t in self.sub_tasks],
             "due_date": self.due_date,
             "priority": self.priority,
             "completed": self.completed,
         }
+        if self.uid is not None:
+            data["uid"] = self.uid
+        if self.modified is not None:
+            data["modified"] = self.modified
+        if self.revision:
+            data["revision"] = self.revision
+        if self.deleted:
+            data["deleted"] = self.deleted
+        return data
 
     @classmethod
     def from_dict(cls, data):
@@ -150,4 +387,8 @@ class Task:
             due_date=due_date,
             priority=priority,
             completed=completed,
+            uid=data.get("uid"),
+            modified=data.get("modified"),
+            revision=data.get("revision", 0),
+            deleted=data.get("deleted"),
         )
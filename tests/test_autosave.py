@@ -36,3 +36,93 @@ def test_move_task_autosaves(tmp_path, monkeypatch):
     controller.move_task(0, 1)
     assert called['task'] is controller.task
     assert called['path'] == path
+
+
+def test_subtask_controller_saves_root_tree(tmp_path, monkeypatch):
+    path = tmp_path / "tasks.json"
+    controller = TaskController(Task("Main"), save_path=path)
+    controller.add_task("Parent")
+    saved = []
+    monkeypatch.setattr(
+        persistence, "save_tasks_to_json", lambda task, p: saved.append((task, p))
+    )
+    child = controller.spawn(controller.get_sub_tasks()[0])
+    child.add_task("Child")
+    assert child.save_path == path
+    assert saved == [(controller.task, path)]
+
+
+def test_scheduler_coalesces_edits(tmp_path, monkeypatch):
+    path = tmp_path / "tasks.json"
+    timers = []
+    saved = []
+    monkeypatch.setattr(
+        persistence, "save_tasks_to_json", lambda task, p: saved.append(task)
+    )
+    controller = TaskController(Task("Main"), save_path=path)
+    controller.scheduler.after = lambda ms, func: timers.append(func)
+    controller.add_task("A")
+    controller.spawn(controller.get_sub_tasks()[0]).add_task("B")
+    controller.mark_task_completed(0)
+    assert saved == []
+    assert len(timers) == 1
+    timers.pop()()
+    assert saved == [controller.task]
+    assert not controller.scheduler.dirty
+
+
+def test_scheduler_flush_failure_keeps_dirty(tmp_path, monkeypatch):
+    def fail(task, p):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(persistence, "save_tasks_to_json", fail)
+    controller = TaskController(Task("Main"), save_path=tmp_path / "tasks.json")
+    controller.add_task("A")
+    assert controller.scheduler.dirty
+    assert not controller.scheduler.flush()
+
+
+def test_paused_scheduler_does_not_write(tmp_path, monkeypatch):
+    saved = []
+    monkeypatch.setattr(
+        persistence, "save_tasks_to_json", lambda task, path: saved.append(path)
+    )
+    controller = TaskController(Task("Main"), save_path=tmp_path / "t.json")
+    controller.scheduler.pause()
+    controller.add_task("A")
+    assert saved == []
+    assert controller.scheduler.flush() is False
+
+    controller.scheduler.resume()
+    assert len(saved) == 1
+
+    controller.scheduler.pause()
+    controller.add_task("B")
+    controller.scheduler.resume(discard=True)
+    assert len(saved) == 1
+    assert not controller.scheduler.dirty
+
+
+def test_edits_of_several_threads_start_one_timer(tmp_path):
+    import threading
+
+    controller = TaskController(
+        Task("Main"), save_path=tmp_path / "tasks.json", thread_safe=True
+    )
+    timers = []
+    controller.scheduler.after = lambda ms, func: timers.append(func)
+    start = threading.Barrier(8)
+
+    def edit(name):
+        start.wait()
+        for i in range(50):
+            controller.add_task(f"{name}{i}")
+
+    threads = [threading.Thread(target=edit, args=(n,)) for n in "ABCDEFGH"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(timers) == 1
+    timers.pop()()
+    assert len(persistence.load_tasks(tmp_path / "tasks.json").get_sub_tasks()) == 400
@@ -0,0 +1,75 @@
+import pytest
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+worker = load_module("worker")
+Task = task.Task
+
+
+def build_tree(count=50):
+    main = Task("Main")
+    for i in range(count):
+        sub = Task(f"Task {i}", priority=i % 3)
+        sub.add_sub_task(Task(f"Child {i}"))
+        main.add_sub_task(sub)
+    return main
+
+
+def test_load_reports_bytes_read(tmp_path):
+    path = tmp_path / "tasks.json"
+    persistence.save_tasks_to_json(build_tree(), path)
+    progress = persistence.Progress()
+    loaded = persistence.load_tasks_from_json(path, progress=progress)
+    assert len(loaded.get_sub_tasks()) == 50
+    assert progress.total == path.stat().st_size
+    assert progress.fraction == 1.0
+
+
+def test_save_reports_tasks_written(tmp_path):
+    progress = persistence.Progress()
+    persistence.save_tasks_to_csv(build_tree(), tmp_path / "t.csv", progress=progress)
+    assert progress.unit == "tasks"
+    assert progress.done == progress.total == 101
+
+
+def test_cancelled_save_removes_partial_file(tmp_path):
+    path = tmp_path / "tasks.ics"
+
+    class CancelAfter(persistence.Progress):
+        def advance(self, amount=1):
+            if self.done >= 10:
+                self.cancel()
+            super().advance(amount)
+
+    with pytest.raises(persistence.OperationCancelled):
+        persistence.save_tasks_to_ics(build_tree(), path, progress=CancelAfter())
+    assert not path.exists()
+
+
+def test_cancelled_load_is_not_swallowed(tmp_path):
+    path = tmp_path / "tasks.csv"
+    persistence.save_tasks_to_csv(build_tree(), path)
+    progress = persistence.Progress()
+    progress.cancel()
+    with pytest.raises(persistence.OperationCancelled):
+        persistence.load_tasks_from_csv(path, progress=progress)
+
+
+def test_background_job_returns_result():
+    job = worker.BackgroundJob(lambda progress: "done").start()
+    assert job.wait(5)
+    assert job.result == "done"
+    assert job.error is None
+
+
+def test_background_job_cancel():
+    def slow(progress):
+        progress.start(1000)
+        while True:
+            progress.advance()
+
+    job = worker.BackgroundJob(slow).start()
+    job.cancel()
+    assert job.wait(5)
+    assert job.cancelled
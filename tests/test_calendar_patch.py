@@ -28,6 +28,9 @@ def test_style_patch_applies(monkeypatch):
 
     monkeypatch.delitem(sys.modules, "window", raising=False)
     win = load_module("window")
+    # tkcalendar is only imported once a date entry is needed
+    assert win._TkCalendar is None
+    win._load_calendar()
     assert hasattr(win._TkCalendar, "_bootstrap_patch")
 
     cal = win._TkCalendar(style="test")
@@ -71,6 +74,8 @@ def test_builder_missing_methods_patched(monkeypatch):
 
     monkeypatch.delitem(sys.modules, "window", raising=False)
     win = load_module("window")
+    assert not hasattr(dummy_ttkb.style.StyleBuilderTTK, "create_date_toplevel_style")
+    win._load_bootstrap()
 
     builder_cls = dummy_ttkb.style.StyleBuilderTTK
     assert hasattr(builder_cls, "create_date_toplevel_style")
@@ -0,0 +1,121 @@
+import gzip
+import io
+import json
+import subprocess
+import sys
+from helpers import ROOT, load_module
+
+cli = load_module("cli")
+persistence = load_module("persistence")
+
+
+def run(path, *argv):
+    out = io.StringIO()
+    code = cli.main(["--file", str(path)] + list(argv), out=out)
+    return code, out.getvalue()
+
+
+def test_add_list_and_complete(tmp_path):
+    path = tmp_path / "tasks.json"
+    assert run(path, "add", "Parent", "--priority", "1") == (0, "1\n")
+    assert run(path, "add", "Child", "--parent", "1", "--due", "2025-01-01")[1] == "1.1\n"
+    assert run(path, "complete", "1.1")[0] == 0
+
+    saved = persistence.load_tasks_from_json(path)
+    child = saved.get_sub_tasks()[0].get_sub_tasks()[0]
+    assert child.name == "Child" and child.completed
+
+    code, text = run(path, "list")
+    assert code == 0
+    assert text.splitlines() == [
+        "1      [ ] Parent  p1",
+        "  1.1    [x] Child  due 2025-01-01",
+    ]
+
+
+def test_query_json(tmp_path):
+    path = tmp_path / "tasks.json"
+    run(path, "add", "Alpha", "--priority", "1")
+    run(path, "add", "Beta", "--priority", "5")
+    code, text = run(path, "query", "--priority-above", "2", "--json")
+    assert code == 0
+    assert [r["name"] for r in json.loads(text)] == ["Beta"]
+
+
+def test_export_and_invalid_path(tmp_path, capsys):
+    path = tmp_path / "tasks.json"
+    run(path, "add", "A")
+    assert run(path, "export", str(tmp_path / "out.csv"))[0] == 0
+    assert "A" in (tmp_path / "out.csv").read_text(encoding="utf-8")
+    assert run(path, "complete", "3")[0] == 1
+    assert "no task at 3" in capsys.readouterr().err
+
+
+def test_cli_does_not_import_tkinter(tmp_path):
+    code = (
+        "import sys, orga; orga.main(['cli', '--file', sys.argv[1], 'list']); "
+        "print('tkinter' in sys.modules, 'window' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, str(tmp_path / "tasks.json")],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_export_compressed_json(tmp_path):
+    path = tmp_path / "tasks.json.gz"
+    out = tmp_path / "export.json.gz"
+    assert run(path, "add", "A")[0] == 0
+    assert path.read_bytes()[:2] == b"\x1f\x8b"
+    assert run(path, "export", str(out))[0] == 0
+    with gzip.open(out, "rt", encoding="utf-8") as fh:
+        data = json.load(fh)
+    assert [t["name"] for t in data["sub_tasks"]] == ["A"]
+
+
+def test_export_and_edit_directory_store(tmp_path):
+    path = tmp_path / "tasks.json"
+    store = tmp_path / "store"
+    assert run(path, "add", "A")[0] == 0
+    assert run(path, "export", str(store), "--format", "dir")[0] == 0
+    assert run(store, "add", "B", "--parent", "1")[0] == 0
+    code, output = run(store, "list")
+    assert code == 0
+    assert "A" in output and "1.1" in output and "B" in output
+
+
+def test_incremental_export(tmp_path):
+    path = tmp_path / "tasks.json"
+    run(path, "add", "A")
+    code, text = run(path, "export", str(tmp_path / "full.ics"))
+    assert code == 0
+    since = text.strip()
+    assert "uid" in json.loads(path.read_text())["sub_tasks"][0]
+    run(path, "add", "B")
+    code, text = run(path, "export", str(tmp_path / "d.csv"), "--since", since)
+    assert code == 0 and float(text) > float(since)
+    rows = (tmp_path / "d.csv").read_text(encoding="utf-8").splitlines()
+    assert [r.split(",")[0] for r in rows[1:]] == ["B"]
+    assert run(path, "export", str(tmp_path / "x.json"), "--since", since)[0] == 1
+
+
+def test_diff_and_apply(tmp_path):
+    path = tmp_path / "tasks.json"
+    other = tmp_path / "other.csv"
+    run(path, "add", "A")
+    run(path, "add", "B")
+    run(path, "complete", "1")
+    run(path, "export", str(other))
+    run(path, "add", "C")
+    run(path, "complete", "1", "--undo")
+
+    code, text = run(path, "diff", str(other))
+    assert code == 0
+    assert text.splitlines() == ["- C", "* A  completed=True"]
+    assert run(path, "diff", str(other), "--apply")[0] == 0
+    assert run(path, "diff", str(other)) == (0, "")
+    assert run(path, "diff", str(tmp_path / "missing.json"))[0] == 1
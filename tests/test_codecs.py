@@ -0,0 +1,90 @@
+import gzip
+import io
+
+import pytest
+
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+Task = task.Task
+
+
+def build_tree():
+    main = Task('Main', due_date='2025-12-31', priority=1)
+    for i in range(5):
+        sub = Task(f'Task {i} – é', priority=i % 3, completed=i % 2 == 0)
+        sub.add_sub_task(Task(f'Step {i}', uid=f'step-{i}'))
+        main.add_sub_task(sub)
+    return main
+
+
+def names(tree):
+    return [t.name for t in tree.walk()]
+
+
+@pytest.mark.parametrize('name', ['json', 'csv', 'ics', 'snapshot'])
+def test_format_is_detected_from_content(tmp_path, name):
+    codec = persistence.get_codec(name)
+    path = tmp_path / 'tasks.json'
+    codec.save(build_tree(), path)
+    assert persistence.detect_codec(path) is codec
+    assert names(persistence.load_tasks(path)) == names(build_tree())
+
+    if codec.compressible:
+        packed = tmp_path / 'tasks.dat'
+        packed.write_bytes(gzip.compress(path.read_bytes()))
+        assert persistence.detect_codec(packed) is codec
+        assert names(persistence.load_tasks(packed)) == names(build_tree())
+
+
+def test_suffix_lookup_and_saving(tmp_path):
+    assert persistence.codec_for_path('a/tasks.CSV.gz').name == 'csv'
+    assert persistence.codec_for_path('tasks.snapshot').name == 'snapshot'
+    assert persistence.codec_for_path('tasks.txt') is None
+    assert persistence.detect_codec(tmp_path / 'missing.json') is None
+
+    path = tmp_path / 'tasks.ics.gz'
+    persistence.save_tasks(build_tree(), path, compresslevel=1, indent=2)
+    assert gzip.decompress(path.read_bytes()).startswith(b'BEGIN:VCALENDAR')
+
+
+@pytest.mark.parametrize('name', ['json', 'csv', 'ics', 'snapshot'])
+def test_codecs_read_and_write_streams(name):
+    codec = persistence.get_codec(name)
+    if codec.binary:
+        fh = io.BytesIO()
+    else:
+        fh = io.StringIO(newline='')
+    codec.write(build_tree(), fh)
+    fh.seek(0)
+    assert names(codec.read(fh)) == names(build_tree())
+
+
+def test_fast_json_matches_stdlib(tmp_path):
+    deep = root = Task('Deep')
+    for i in range(400):
+        child = Task(f'Level {i}')
+        deep.add_sub_task(child)
+        deep = child
+    for tree in (build_tree(), root):
+        fast, slow = tmp_path / 'fast.json', tmp_path / 'slow.json'
+        persistence.save_tasks_to_json(tree, fast)
+        persistence.save_tasks_to_json(tree, slow, fast=False)
+        loaded = [
+            persistence.load_tasks_from_json(p, use_cache=False, fast=f)
+            for p in (fast, slow)
+            for f in (True, False)
+        ]
+        assert all(t.to_dict() == tree.to_dict() for t in loaded)
+
+    bad = tmp_path / 'bad.json'
+    bad.write_text('{"name": "A", "sub_tasks": "x"}')
+    assert persistence.load_tasks_from_json(bad).name == 'Main'
+
+
+def test_bench_reports_every_codec(capsys):
+    assert persistence.main(['bench', '--tasks', '200', '--repeat', '1']) == 0
+    out = capsys.readouterr().out
+    for codec in persistence.registered_codecs():
+        assert f'  {codec.name} ' in out
@@ -0,0 +1,73 @@
+import gzip
+import lzma
+
+import pytest
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+Task = task.Task
+
+
+def build_task_tree():
+    main = Task('Main', due_date='2025-12-31', priority=1)
+    sub = Task('Sub1', completed=True)
+    sub.add_sub_task(Task('Deep', priority=2))
+    main.add_sub_task(sub)
+    main.add_sub_task(Task('Sub2', due_date='2026-01-01'))
+    return main
+
+
+@pytest.mark.parametrize(
+    "name, magic",
+    [("tasks.json.gz", b"\x1f\x8b"), ("tasks.json.xz", b"\xfd7zXZ"),
+     ("tasks.json.bz2", b"BZh")],
+)
+def test_json_round_trip_compressed(tmp_path, name, magic):
+    tree = build_task_tree()
+    path = tmp_path / name
+    persistence.save_tasks_to_json(tree, path, compresslevel=1)
+    assert path.read_bytes().startswith(magic)
+    assert persistence.load_tasks_from_json(path).to_dict() == tree.to_dict()
+
+
+def test_csv_round_trip_compressed(tmp_path):
+    tree = build_task_tree()
+    path = tmp_path / "tasks.csv.gz"
+    persistence.save_tasks_to_csv(tree, path)
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        assert fh.readline().startswith("Name,")
+    loaded = persistence.load_tasks_from_csv(path)
+    assert loaded.to_dict() == tree.to_dict()
+
+
+def test_compression_detected_by_content(tmp_path):
+    """A compressed file is recognised whatever its name."""
+    path = tmp_path / "tasks.json"
+    with lzma.open(path, "wt", encoding="utf-8") as fh:
+        fh.write('{"name": "Main", "sub_tasks": [{"name": "A"}]}')
+    loaded = persistence.load_tasks_from_json(path)
+    assert [t.name for t in loaded.get_sub_tasks()] == ["A"]
+
+
+def test_progress_counts_compressed_bytes(tmp_path):
+    path = tmp_path / "tasks.json.gz"
+    persistence.save_tasks_to_json(build_task_tree(), path)
+    progress = persistence.Progress()
+    persistence.load_tasks_from_json(path, progress)
+    assert progress.total == path.stat().st_size
+    assert progress.done == progress.total
+
+
+def test_scheduler_uses_compresslevel(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        persistence,
+        "save_tasks_to_json",
+        lambda task, path, **kw: calls.append(kw),
+    )
+    scheduler = persistence.SaveScheduler(
+        lambda: Task("Main"), tmp_path / "t.json.gz", compresslevel=3
+    )
+    scheduler.mark_dirty()
+    assert calls == [{"compresslevel": 3}]
@@ -130,3 +130,25 @@ def test_undo_redo_move(monkeypatch=None):
     assert [t.name for t in c.get_sub_tasks()] == ['A', 'B']
     c.redo()
     assert [t.name for t in c.get_sub_tasks()] == ['B', 'A']
+
+
+def test_changes_are_stamped_and_deletions_kept():
+    c = create_controller()
+    c.add_task('A')
+    c.add_task('B')
+    a, b = c.get_sub_tasks()
+    assert a.revision == 1 and a.modified is not None
+    c.edit_task(0, 'A2')
+    assert a.revision == 2 and b.revision == 1
+
+    sub = c.spawn(b)
+    sub.add_task('Child')
+    child = b.get_sub_tasks()[0]
+    child.ensure_uid()
+    b.ensure_uid()
+    c.delete_task(1)
+    assert set(c.task.deleted) == {b.uid, child.uid}
+    assert c.task.deleted[b.uid] == [b.modified, b.revision]
+    c.undo()
+    assert c.task.deleted == {}
+    assert b.revision > 2
@@ -0,0 +1,157 @@
+import json
+
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+controller_mod = load_module("controller")
+Task = task.Task
+TaskController = controller_mod.TaskController
+
+
+def build_task_tree():
+    main = Task('Main', due_date='2025-12-31', priority=1)
+    project = Task('Project é', uid='p1')
+    project.add_sub_task(Task('Step', due_date='2026-01-01'))
+    project.get_sub_tasks()[0].add_sub_task(Task('Deep', completed=True))
+    main.add_sub_task(project)
+    main.add_sub_task(Task('Errand', priority=3, uid='../escape'))
+    main.add_sub_task(Task('Other'))
+    return main
+
+
+def test_directory_store_round_trip(tmp_path):
+    tree = build_task_tree()
+    persistence.save_tasks_to_directory(tree, tmp_path / 'store')
+    manifest = json.loads((tmp_path / 'store' / 'manifest.json').read_text())
+    assert manifest['name'] == 'Main'
+    assert len(manifest['shards']) == 3
+    assert manifest['shards'][0] == 'task-p1.json'
+    assert all('/' not in name for name in manifest['shards'])
+
+    loaded = persistence.load_tasks(tmp_path / 'store')
+    assert loaded.to_dict() == tree.to_dict()
+
+
+def test_directory_store_loads_in_parallel(tmp_path):
+    tree = build_task_tree()
+    persistence.save_tasks_to_directory(tree, tmp_path)
+    progress = persistence.Progress()
+    loaded = persistence.load_tasks_from_directory(
+        tmp_path, progress, workers=2
+    )
+    assert loaded.to_dict() == tree.to_dict()
+    assert progress.done == progress.total == 3
+
+
+def test_autosave_rewrites_only_changed_shards(tmp_path, monkeypatch):
+    persistence.save_tasks_to_directory(build_task_tree(), tmp_path)
+    root = persistence.load_tasks(tmp_path)
+    controller = TaskController(root, save_path=tmp_path)
+
+    written = []
+    save_json = persistence.save_tasks_to_json
+
+    def record(task, path, *args, **kwargs):
+        written.append(path.name)
+        return save_json(task, path, *args, **kwargs)
+
+    monkeypatch.setattr(persistence, 'save_tasks_to_json', record)
+    project = root.get_sub_tasks()[0]
+    controller.spawn(project.get_sub_tasks()[0]).add_task('New')
+    assert written == ['task-p1.json']
+
+    written.clear()
+    controller.add_task('Added')
+    assert len(written) == 1 and written[0] != 'task-p1.json'
+
+    written.clear()
+    controller.delete_task(1)
+    assert written == []
+    assert len(list(tmp_path.glob('task-*.json'))) == 3
+    assert persistence.load_tasks(tmp_path).to_dict() == root.to_dict()
+
+
+def test_invalid_manifest_falls_back(tmp_path, caplog):
+    persistence.save_tasks_to_directory(build_task_tree(), tmp_path)
+    (tmp_path / 'manifest.json').write_text('{"shards": ["../tasks.json"]}')
+    loaded = persistence.load_tasks_from_directory(tmp_path)
+    assert loaded.name == 'Main'
+    assert loaded.get_sub_tasks() == []
+    assert 'Failed to load tasks' in caplog.text
+
+
+def test_unreadable_shards_are_skipped_and_kept(tmp_path, caplog):
+    tree = Task('Main')
+    for i in range(5):
+        tree.add_sub_task(Task(f'T{i}', uid=f't{i}'))
+    persistence.save_tasks_to_directory(tree, tmp_path)
+    (tmp_path / 'task-t2.json').write_text('{"name": ')
+    root = persistence.load_tasks_from_directory(tmp_path, workers=1)
+    assert [t.name for t in root.get_sub_tasks()] == ['T0', 'T1', 'T3', 'T4']
+    assert 'task-t2.json' in caplog.text
+
+    controller = TaskController(root, save_path=tmp_path)
+    controller.add_task('New')
+    controller.delete_task(0)
+    assert not (tmp_path / 'task-t0.json').exists()
+    assert (tmp_path / 'task-t2.json').read_text() == '{"name": '
+    manifest = json.loads((tmp_path / 'manifest.json').read_text())
+    assert len(manifest['shards']) == 5 and 'task-t2.json' in manifest['shards']
+    # Also when parsed by worker processes
+    loaded = persistence.load_tasks_from_directory(tmp_path, workers=2)
+    assert [t.name for t in loaded.get_sub_tasks()] == ['T1', 'T3', 'T4', 'New']
+
+
+def test_autosave_leaves_unloaded_shards_deferred(tmp_path, monkeypatch):
+    tree = Task('Main')
+    for i in range(3):
+        project = Task(f'P{i}', uid=f'p{i}')
+        project.add_sub_task(Task(f'Step {i}'))
+        tree.add_sub_task(project)
+    persistence.save_tasks_to_directory(tree, tmp_path)
+    root = persistence.load_tasks_from_directory(tmp_path, workers=2)
+    controller = TaskController(root, save_path=tmp_path)
+    first, second, third = root.get_sub_tasks()
+    assert not second.sub_tasks_loaded
+
+    written = []
+    save_json = persistence.save_tasks_to_json
+
+    def record(task, path, *args, **kwargs):
+        written.append(path.name)
+        return save_json(task, path, *args, **kwargs)
+
+    monkeypatch.setattr(persistence, 'save_tasks_to_json', record)
+    controller.spawn(first).spawn(first.get_sub_tasks()[0]).add_task('Sub')
+    step = third.get_sub_tasks()[0]
+    controller.apply_batch([('update', third, step, {'name': 'Renamed'})])
+    assert written == ['task-p0.json', 'task-p2.json']
+    assert not second.sub_tasks_loaded
+
+
+def test_shard_uids_are_given_out_under_the_write_lock(tmp_path, monkeypatch):
+    persistence.save_tasks_to_directory(Task('Main'), tmp_path)
+    tree = Task('Main')
+    tree.add_sub_task(Task('A', uid='same'))
+    tree.add_sub_task(Task('B', uid='same'))
+    tree.add_sub_task(Task('C'))
+    controller = TaskController(tree, save_path=tmp_path, thread_safe=True)
+
+    writing = []
+    ensure_uid = Task.ensure_uid
+
+    def record(self):
+        writing.append(controller.lock.writing)
+        return ensure_uid(self)
+
+    monkeypatch.setattr(Task, 'ensure_uid', record)
+    controller.scheduler.mark_dirty()
+    assert writing and all(writing)
+
+    a, b, c = tree.get_sub_tasks()
+    assert a.uid == 'same' and len({a.uid, b.uid, c.uid}) == 3
+    loaded = persistence.load_tasks_from_directory(tmp_path, workers=1)
+    assert [(t.name, t.uid) for t in loaded.get_sub_tasks()] == [
+        (t.name, t.uid) for t in tree.get_sub_tasks()
+    ]
@@ -0,0 +1,75 @@
+import os
+import stat
+
+import pytest
+
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+Task = task.Task
+
+
+def build_tree():
+    main = Task('Main')
+    for i in range(50):
+        main.add_sub_task(Task(f'Task {i}', priority=i % 3))
+    return main
+
+
+def test_failed_save_keeps_previous_file(tmp_path):
+    path = tmp_path / 'tasks.json.gz'
+    persistence.save_tasks_to_json(Task('Old'), path)
+    before = path.read_bytes()
+
+    progress = persistence.Progress()
+    progress.cancel()
+    with pytest.raises(persistence.OperationCancelled):
+        persistence.save_tasks_to_json(build_tree(), path, progress=progress)
+    assert path.read_bytes() == before
+    assert [p.name for p in tmp_path.iterdir()] == ['tasks.json.gz']
+
+
+@pytest.mark.parametrize(
+    'durability, syncs',
+    [('none', 0), ('fsync-file', 1), ('fsync-file-and-dir', 2)],
+)
+def test_durability_policies(tmp_path, monkeypatch, durability, syncs):
+    calls = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: calls.append(fd) or fsync(fd))
+    path = tmp_path / 'tasks.json'
+    persistence.save_tasks(build_tree(), path, durability=durability)
+    assert len(calls) == syncs
+    assert persistence.load_tasks(path).to_dict() == build_tree().to_dict()
+
+
+def test_unknown_durability_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        persistence.save_tasks_to_csv(build_tree(), tmp_path / 't.csv',
+                                      durability='sometimes')
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='POSIX permissions')
+def test_replacing_keeps_file_mode(tmp_path):
+    path = tmp_path / 'tasks.snapshot'
+    persistence.save_tasks_to_snapshot(build_tree(), path)
+    os.chmod(path, 0o640)
+    persistence.save_tasks_to_snapshot(Task('New'), path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert persistence.load_tasks(path).name == 'New'
+
+
+def test_scheduler_uses_durability(tmp_path, monkeypatch):
+    received = []
+
+    def fake_save(task, path, **kwargs):
+        received.append(kwargs)
+
+    monkeypatch.setattr(persistence, 'save_tasks_to_json', fake_save)
+    scheduler = persistence.SaveScheduler(
+        build_tree, tmp_path / 'tasks.json', durability='fsync-file'
+    )
+    scheduler.mark_dirty()
+    assert received == [{'durability': 'fsync-file'}]
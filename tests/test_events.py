@@ -0,0 +1,76 @@
+from helpers import load_module
+
+task = load_module("task")
+events = load_module("events")
+controller_mod = load_module("controller")
+Task = task.Task
+TaskController = controller_mod.TaskController
+EventBus = events.EventBus
+
+
+def record(bus):
+    received = []
+    bus.subscribe(received.append)
+    return received
+
+
+def test_subscribe_publish_unsubscribe():
+    bus = EventBus()
+    received = record(bus)
+    ev = events.TaskEvent(events.ADDED, Task("A"), Task("Main"), index=0)
+    bus.publish(ev)
+    assert received == [ev]
+    bus.unsubscribe(received.append)
+    bus.publish(ev)
+    assert received == [ev]
+    # Events do not change the tasks they describe
+    assert ev.task_id is None and ev.task.uid is None
+
+
+def test_failing_subscriber_does_not_block_others():
+    bus = EventBus()
+
+    def boom(event):
+        raise RuntimeError("boom")
+
+    bus.subscribe(boom)
+    received = record(bus)
+    bus.publish(events.TaskEvent(events.REORDERED, None, Task("Main")))
+    assert len(received) == 1
+
+
+def test_controller_publishes_fine_grained_events():
+    c = TaskController(Task("Main"))
+    received = record(c.bus)
+    c.add_task("A")
+    c.add_task("B")
+    c.move_task(0, 1)
+    c.update_task(0, name="B2", priority=3)
+    c.delete_task(1)
+    kinds = [e.kind for e in received]
+    assert kinds == ["added", "added", "moved", "changed", "removed"]
+    moved = received[2]
+    assert (moved.old_index, moved.index) == (0, 1)
+    assert received[3].fields == ("name", "priority")
+    assert received[3].task_id == received[1].task_id
+    assert all(e.parent_id == c.task.uid for e in received)
+
+
+def test_undo_publishes_inverse_event():
+    c = TaskController(Task("Main"))
+    c.add_task("A")
+    received = record(c.bus)
+    c.undo()
+    c.redo()
+    assert [e.kind for e in received] == ["removed", "added"]
+
+
+def test_spawned_controller_shares_bus():
+    main = Task("Main")
+    parent = Task("Parent")
+    main.add_sub_task(parent)
+    c = TaskController(main)
+    received = record(c.bus)
+    c.spawn(parent).add_task("Child")
+    assert received[0].parent is parent
+    assert received[0].task.name == "Child"
@@ -88,3 +88,142 @@ def test_ics_round_trip(tmp_path):
     assert loaded.priority == 1
 
 
+
+
+def test_csv_round_trip_deep_and_wide(tmp_path):
+    """Deep chains and many rows stream through without recursion."""
+    task = Task('Main')
+    node = task
+    for i in range(3000):
+        child = Task(f'Level {i}', priority=i % 4)
+        node.add_sub_task(child)
+        node = child
+    for i in range(2500):
+        task.add_sub_task(Task(f'Wide {i}', completed=i % 2 == 1))
+    path = tmp_path / 'big.csv'
+    progress = persistence_mod.Progress()
+    save_tasks_to_csv(task, path, progress=progress)
+    assert progress.done == progress.total == 5501
+
+    loaded = load_tasks_from_csv(path, use_cache=False)
+    rows = persistence_mod._csv_rows
+    assert list(rows(loaded)) == list(rows(task))
+
+
+def test_csv_without_depth_and_bad_rows(tmp_path):
+    path = tmp_path / 'flat.csv'
+    path.write_text(
+        'Name,Due Date,Priority,Completed,Depth\n'
+        'Main,,2,0,0\nA,,,1,1\nshort,1\nB,,,0,x\nC,,,0,3\n',
+        encoding='utf-8',
+    )
+    loaded = load_tasks_from_csv(path)
+    assert [t.name for t in loaded.get_sub_tasks()] == ['A']
+    assert loaded.get_sub_tasks()[0].get_sub_tasks()[0].name == 'C'
+
+    path.write_text(
+        'Name,Due Date,Priority,Completed\nMain,,,0\nA,2025-01-02,1,1\nB,,,0\n',
+        encoding='utf-8',
+    )
+    loaded = load_tasks_from_csv(path)
+    assert [t.name for t in loaded.get_sub_tasks()] == ['A', 'B']
+    assert loaded.get_sub_tasks()[0].due_date == '2025-01-02'
+
+
+def test_ics_round_trip_keeps_hierarchy(tmp_path):
+    task = build_deep_task_tree()
+    task.get_sub_tasks()[1].name = 'Café; bring milk, sugar\nand a very ' + 'long ' * 20
+    node = task.get_sub_tasks()[1]
+    for i in range(1500):
+        node.add_sub_task(Task(f'Level {i}', priority=i % 4))
+        node = node.get_sub_tasks()[0]
+    path = tmp_path / 'tree.ics'
+    load_module("controller").TaskController(task).assign_uids()
+    save_tasks_to_ics(task, path)
+
+    data = path.read_bytes()
+    lines = data.split(b'\r\n')
+    assert lines[-1] == b'' and b'\n' not in b''.join(lines)
+    assert max(len(line) for line in lines) <= 75
+    assert b'UID:' + task.uid.encode() in data
+    loaded = load_tasks_from_ics(path, use_cache=False)
+    rows = persistence_mod._csv_rows
+    assert list(rows(loaded)) == list(rows(task))
+    assert [t.uid for t, _ in persistence_mod._iterate_tasks(loaded)] == [
+        t.uid for t, _ in persistence_mod._iterate_tasks(task)
+    ]
+
+
+def test_exports_leave_the_tree_unchanged(tmp_path):
+    task = build_deep_task_tree()
+    save_tasks_to_ics(task, tmp_path / 'tree.ics')
+    save_tasks_to_csv(task, tmp_path / 'tree.csv', since=0)
+    assert all(t.uid is None for t in task.walk())
+    # Sub-tasks still refer to the uid their parent is exported under
+    loaded = load_tasks_from_ics(tmp_path / 'tree.ics', use_cache=False)
+    assert [t.name for t in loaded.walk()] == [t.name for t in task.walk()]
+
+    controller = load_module("controller").TaskController(task)
+    assert len(controller.assign_uids()) == 5
+    assert controller.assign_uids() == []
+    uids = [t.uid for t in task.walk()]
+    save_tasks_to_ics(task, tmp_path / 'again.ics')
+    assert [t.uid for t in task.walk()] == uids
+    assert f'UID:{uids[-1]}' in (tmp_path / 'again.ics').read_text(encoding='utf-8')
+
+
+def test_ics_import_links_related_tasks(tmp_path):
+    path = tmp_path / 'foreign.ics'
+    path.write_bytes(
+        b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+        b'BEGIN:VTODO\r\nUID:child\r\nSUMMARY:Child with a long\r\n\t folded name\r\n'
+        b'RELATED-TO;RELTYPE=PARENT:parent\r\n'
+        b'BEGIN:VALARM\r\nSUMMARY:Alarm\r\nEND:VALARM\r\nEND:VTODO\r\n'
+        b'BEGIN:VTODO\r\nUID:parent\r\nSUMMARY;LANGUAGE=en:Parent\r\n'
+        b'STATUS:COMPLETED\r\nDUE;VALUE=DATE:20250102\r\nEND:VTODO\r\n'
+        b'BEGIN:VTODO\r\nUID:sibling\r\nSUMMARY:Sibling\r\n'
+        b'RELATED-TO;RELTYPE=SIBLING:parent\r\nEND:VTODO\r\n'
+        b'BEGIN:VTODO\r\nUID:a\r\nSUMMARY:A\r\nRELATED-TO:b\r\nEND:VTODO\r\n'
+        b'BEGIN:VTODO\r\nUID:b\r\nSUMMARY:B\r\nRELATED-TO:a\r\nEND:VTODO\r\n'
+        b'BEGIN:VTODO\r\nSUMMARY:Orphan\r\nRELATED-TO:missing\r\nEND:VTODO\r\n'
+        b'END:VCALENDAR\r\n'
+    )
+    root = load_tasks_from_ics(path)
+    assert root.name == 'Parent' and root.completed
+    assert root.due_date == '2025-01-02'
+    assert [t.name for t in root.get_sub_tasks()] == [
+        'Child with a long folded name', 'Sibling', 'A', 'Orphan'
+    ]
+    # The link closing the A -> B -> A cycle is dropped
+    assert root.get_sub_tasks()[2].get_sub_tasks()[0].name == 'B'
+
+
+def test_incremental_exports_only_include_changes(tmp_path):
+    controller = load_module("controller").TaskController(Task('Main'))
+    for name in ('Keep', 'Edit', 'Drop'):
+        controller.add_task(name)
+    since = save_tasks_to_ics(controller.task, tmp_path / 'full.ics')
+    drop = controller.get_sub_tasks()[2]
+    controller.edit_task(1, 'Edited')
+    controller.delete_task(2)
+
+    save_tasks_to_ics(controller.task, tmp_path / 'delta.ics', since=since)
+    text = (tmp_path / 'delta.ics').read_text(encoding='utf-8')
+    assert text.count('BEGIN:VTODO') == 2
+    assert 'SUMMARY:Edited' in text and 'Keep' not in text
+    assert 'SEQUENCE:2' in text
+    assert f'UID:{drop.uid}\nDTSTAMP' in text
+    assert 'STATUS:CANCELLED' in text
+    # Cancelled items are not imported
+    edited = load_tasks_from_ics(tmp_path / 'delta.ics')
+    assert (edited.name, edited.revision, edited.get_sub_tasks()) == (
+        'Edited', 2, []
+    )
+
+    save_tasks_to_csv(controller.task, tmp_path / 'delta.csv', since=since)
+    with open(tmp_path / 'delta.csv', newline='', encoding='utf-8') as fh:
+        rows = list(csv.reader(fh))
+    assert rows[0][-4:] == ['UID', 'Parent UID', 'Sequence', 'Deleted']
+    assert [r[0] for r in rows[1:]] == ['Edited', '']
+    assert rows[1][-3:] == [controller.task.uid, '2', '0']
+    assert rows[2][-4:] == [drop.uid, '', str(drop.revision), '1']
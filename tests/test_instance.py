@@ -0,0 +1,176 @@
+import io
+import socket
+import threading
+import time
+
+import pytest
+
+from helpers import load_module
+
+task = load_module("task")
+controller_mod = load_module("controller")
+cli = load_module("cli")
+persistence = load_module("persistence")
+instance = load_module("instance")
+Task = task.Task
+
+pytestmark = pytest.mark.skipif(
+    not instance.supported(), reason="Unix domain sockets"
+)
+
+
+@pytest.fixture
+def runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    return tmp_path
+
+
+def serve_while(server, func):
+    """Run ``func`` on a thread while polling ``server``; return its result."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    while thread.is_alive():
+        server.poll()
+        time.sleep(0.005)
+    return result[0]
+
+
+def running(path):
+    controller = controller_mod.TaskController(Task("Main"), save_path=path)
+
+    def handle(request):
+        out, err = io.StringIO(), io.StringIO()
+        code = cli.execute(controller, request["argv"], out, err, request["cwd"])
+        return {"code": code, "output": out.getvalue(), "error": err.getvalue()}
+
+    server = instance.InstanceServer(path, handle)
+    assert server.start()
+    return controller, server
+
+
+def test_cli_commands_are_forwarded(runtime_dir, tmp_path):
+    path = tmp_path / "tasks.json"
+    controller, server = running(path)
+    try:
+        out = io.StringIO()
+        code = serve_while(
+            server, lambda: cli.main(["--file", str(path), "add", "Sent"], out)
+        )
+        assert (code, out.getvalue()) == (0, "1\n")
+        assert [t.name for t in controller.get_sub_tasks()] == ["Sent"]
+        # Saved by the running instance
+        assert persistence.load_tasks(path).get_sub_tasks()[0].name == "Sent"
+
+        reply = serve_while(server, lambda: instance.forward(path, {
+            "command": "cli", "argv": ["complete", "2"], "cwd": str(tmp_path)
+        }))
+        assert reply == {"code": 1, "output": "", "error": "error: no task at 2\n"}
+        assert server.handled == 2
+    finally:
+        server.close()
+    assert not server.path.exists()
+    assert instance.forward(path, {"command": "show"}) is None
+
+
+def test_silent_client_does_not_hold_up_others(runtime_dir, tmp_path):
+    path = tmp_path / "tasks.json"
+    controller, server = running(path)
+    silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # Connects but never sends its request
+        silent.connect(str(server.path))
+        start = time.monotonic()
+        reply = serve_while(server, lambda: instance.forward(path, {
+            "command": "cli", "argv": ["add", "Quick"], "cwd": str(tmp_path)
+        }))
+        assert reply["code"] == 0
+        assert time.monotonic() - start < 2
+    finally:
+        silent.close()
+        server.close()
+
+
+def test_stale_socket_is_replaced(runtime_dir, tmp_path):
+    path = tmp_path / "tasks.json"
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(instance.socket_path(path)))
+    stale.close()
+    assert instance.forward(path, {"command": "show"}) is None
+
+    controller, server = running(path)
+    try:
+        reply = serve_while(server, lambda: instance.forward(path, {
+            "command": "cli", "argv": ["list"], "cwd": str(tmp_path)
+        }))
+        assert reply["code"] == 0
+    finally:
+        server.close()
+
+
+def test_command_lines_are_forwarded_before_parsing(runtime_dir, tmp_path):
+    path = tmp_path / "tasks.json"
+    controller, server = running(path)
+    try:
+        for argv in (["--no-forward", "list"], ["--help"], ["--fil", str(path)]):
+            assert instance.forward_argv(argv, {"command": "show"}) is None
+        request = {"command": "cli", "argv": ["add", "--help"], "cwd": "."}
+        reply = serve_while(server, lambda: instance.forward_argv(
+            [f"--file={path}", "--shared", "add", "--help"], request
+        ))
+        assert reply["code"] == 0 and reply["output"].startswith("usage:")
+        assert controller.get_sub_tasks() == []
+    finally:
+        server.close()
+
+
+def test_socket_directory_must_be_private(tmp_path, monkeypatch):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(instance.tempfile, "gettempdir", lambda: str(tmp_path))
+    path = tmp_path / "tasks.json"
+    directory = instance.socket_path(path).parent
+    directory.mkdir(mode=0o755)
+    directory.chmod(0o755)
+    server = instance.InstanceServer(path, lambda request: None)
+    assert not server.start()
+    assert instance.forward(path, {"command": "show"}) is None
+
+    directory.chmod(0o700)
+    controller, server = running(path)
+    server.close()
+
+
+def test_live_socket_is_kept(runtime_dir, tmp_path):
+    path = tmp_path / "tasks.json"
+    controller, server = running(path)
+    try:
+        second = instance.InstanceServer(path, lambda request: None)
+        assert not second.start()
+        reply = serve_while(server, lambda: instance.forward(path, {
+            "command": "cli", "argv": ["list"], "cwd": str(tmp_path)
+        }))
+        assert reply["code"] == 0
+    finally:
+        server.close()
+
+
+def test_unanswered_requests_are_reported(runtime_dir, tmp_path, capsys):
+    path = tmp_path / "tasks.json"
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(instance.socket_path(path)))
+    listener.listen()
+
+    def hang_up():
+        for _ in range(2):
+            conn, _ = listener.accept()
+            conn.recv(65536)
+            conn.close()
+
+    thread = threading.Thread(target=hang_up)
+    thread.start()
+    with listener:
+        with pytest.raises(OSError):
+            instance.forward(path, {"command": "show"})
+        assert cli.main(["--file", str(path), "list"], io.StringIO()) == 1
+        thread.join(5)
+    assert "did not answer" in capsys.readouterr().err
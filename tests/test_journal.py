@@ -0,0 +1,204 @@
+import io
+
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+controller_mod = load_module("controller")
+journal_mod = load_module("journal")
+cli = load_module("cli")
+merge = load_module("merge")
+Task = task.Task
+
+
+def journaled_controller(path, **kwargs):
+    controller = controller_mod.TaskController(Task('Main'), save_path=path)
+    journal = journal_mod.Journal(path, lambda: controller.task, **kwargs)
+    controller.bus.subscribe(journal.record)
+    controller.scheduler.journal = journal
+    return controller, journal
+
+
+def recovered(path):
+    loaded = persistence.load_tasks(path)
+    journal = journal_mod.Journal(path, lambda: loaded)
+    return loaded, journal.recover(loaded)
+
+
+def test_edits_are_appended_and_replayed(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    controller.add_task('B', priority=2)
+    base = path.read_bytes()
+
+    controller.add_task('A')
+    sub = controller.spawn(controller.get_sub_tasks()[0])
+    sub.add_task('Child')
+    sub.update_task(0, name='Renamed', completed=True)
+    controller.sort_tasks_by_name()
+    controller.move_task(0, 2)
+    controller.add_task('Gone')
+    controller.delete_task(2)
+    controller.undo()
+
+    assert path.read_bytes() == base
+    assert journal.records == 8
+    loaded, recovery = recovered(path)
+    assert recovery.replayed == 8 and not recovery.recovered
+    assert loaded.to_dict() == controller.task.to_dict()
+
+
+def test_incomplete_record_is_cut_off(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    controller.add_task('A')
+    controller.add_task('B')
+    with open(journal.journal_path, 'ab') as fh:
+        fh.write(b'\x40\x00\x00\x00garbage')
+    size = journal.journal_path.stat().st_size
+
+    loaded, recovery = recovered(path)
+    assert [t.name for t in loaded.get_sub_tasks()] == ['A', 'B']
+    assert recovery.replayed == 1
+    assert recovery.discarded_bytes == 11
+    assert journal.journal_path.stat().st_size == size - 11
+    assert 'incomplete save' in recovery.format()
+
+
+def test_stale_journal_is_kept_and_leftovers_are_discarded(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    controller.add_task('A')
+    controller.add_task('B')
+    records = journal.journal_path.read_bytes()
+    persistence.save_tasks_to_json(Task('Replaced'), path)
+    (tmp_path / 'tasks.json.tmp').write_text('{"name": "Ha')
+
+    loaded, recovery = recovered(path)
+    assert loaded.name == 'Replaced'
+    assert recovery.stale and recovery.replayed == 0
+    assert recovery.removed == ['tasks.json.tmp']
+    assert recovery.kept == 'tasks.json.journal.stale'
+    assert 'kept 1 journal record(s)' in recovery.format()
+    assert (tmp_path / recovery.kept).read_bytes() == records
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'tasks.json', 'tasks.json.journal.stale'
+    ]
+
+    # An empty stale journal holds nothing worth keeping
+    journal_mod.Journal(path, lambda: loaded).reset()
+    persistence.save_tasks_to_json(Task('Again'), path)
+    loaded, recovery = recovered(path)
+    assert recovery.stale and recovery.kept is None
+    assert not journal.journal_path.exists()
+
+
+def test_cli_replays_and_folds_the_journal(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    for name in 'ABC':
+        controller.add_task(name)
+    assert journal.records == 2
+
+    code = cli.main(['--file', str(path), 'add', 'D'], out=io.StringIO())
+    assert code == 0
+    saved = persistence.load_tasks_from_json(path)
+    assert [t.name for t in saved.get_sub_tasks()] == list('ABCD')
+    loaded, recovery = recovered(path)
+    assert not recovery.recovered and recovery.replayed == 0
+
+
+def test_journal_is_compacted_in_background(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path, max_records=3)
+    for name in 'ABCDE':
+        controller.add_task(name)
+    assert journal.wait(5)
+    # The digest of the compacted file is known under its final name
+    cache = persistence.PARSE_CACHE
+    assert cache.digest(cache.key(path, 'json'))[1]
+    assert cache.own_save(path)
+    controller.add_task('F')
+
+    assert journal.records < 3
+    assert [t.name for t in persistence.load_tasks(path).get_sub_tasks()][:4] == [
+        'A', 'B', 'C', 'D'
+    ]
+    loaded, recovery = recovered(path)
+    assert not recovery.recovered
+    assert [t.name for t in loaded.get_sub_tasks()] == list('ABCDEF')
+
+
+def test_interrupted_compaction_is_completed(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    controller.add_task('A')
+    controller.add_task('B')
+    # A compaction that replaced the task file but not yet the journal
+    new_journal = tmp_path / 'tasks.json.journal.new'
+    persistence.save_tasks_to_json(controller.task, path)
+    identity = journal_mod._identity(path)
+    new_journal.write_bytes(
+        journal_mod._MAGIC + journal_mod._HEADER.pack(*identity)
+    )
+
+    loaded, recovery = recovered(path)
+    assert [t.name for t in loaded.get_sub_tasks()] == ['A', 'B']
+    assert not recovery.stale and recovery.replayed == 0
+    assert not new_journal.exists()
+
+
+def test_deletions_are_replayed_with_tombstones(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    controller.add_task('B')
+    controller.add_task('A')
+    controller.edit_task(1, 'A2')
+    controller.delete_task(1)
+
+    loaded, recovery = recovered(path)
+    assert recovery.replayed == 3 and len(loaded.deleted) == 1
+    assert loaded.deleted == controller.task.deleted
+    assert loaded.to_dict() == controller.task.to_dict()
+
+
+def test_merge_is_replayed(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    for name in 'ABC':
+        controller.add_task(name)
+    controller.scheduler.flush()
+    imported = Task('Main')
+    b = Task('B', uid=controller.get_sub_tasks()[1].uid, priority=2)
+    b.add_sub_task(Task('A', uid=controller.get_sub_tasks()[0].uid))
+    imported.add_sub_task(b)
+    imported.add_sub_task(Task('D'))
+    controller.merge_tasks(imported)
+
+    loaded = persistence.load_tasks(path)
+    journal_mod.Journal(path, lambda: loaded).recover(loaded)
+    assert loaded.to_dict() == controller.task.to_dict()
+    assert [t.name for t in loaded.walk()] == ['Main', 'B', 'A', 'C', 'D']
+
+
+def test_diff_is_replayed(tmp_path):
+    path = tmp_path / 'tasks.json'
+    controller, journal = journaled_controller(path)
+    for name in 'ABC':
+        controller.add_task(name)
+    b = controller.spawn(controller.get_sub_tasks()[1])
+    b.add_task('B1')
+    b.add_task('B2')
+    controller.scheduler.flush()
+    target = Task('Main')
+    for source in (controller.get_sub_tasks()[2], controller.get_sub_tasks()[0]):
+        target.add_sub_task(Task(source.name, uid=source.uid))
+    # B is deleted after its first step moves to C
+    step = controller.get_sub_tasks()[1].get_sub_tasks()[0]
+    target.get_sub_tasks()[0].add_sub_task(Task(step.name, uid=step.uid))
+    controller.apply_batch(merge.diff(controller.task, target))
+
+    loaded = persistence.load_tasks(path)
+    journal_mod.Journal(path, lambda: loaded).recover(loaded)
+    assert loaded.to_dict() == controller.task.to_dict()
+    assert [t.name for t in loaded.walk()] == ['Main', 'C', 'B1', 'A']
@@ -88,3 +88,151 @@ def test_load_tasks_with_json_array(tmp_path, caplog):
     assert task.name == 'Main'
     assert any('Invalid JSON structure' in rec.getMessage() for rec in caplog.records)
 
+
+
+def _read_in_small_chunks(text, chunk_size=7):
+    import io
+    reader = persistence_mod._JSONTaskReader(
+        io.BytesIO(text.encode("utf-8")), chunk_size=chunk_size
+    )
+    return reader.read()
+
+
+def test_streaming_reader_matches_json_module():
+    import json
+    data = {
+        "name": "Main é漢 \"quoted\" \\ 😀",
+        "extra": {"nested": [1, 2.5, -3e2, True, None, {"sub_tasks": [1]}]},
+        "sub_tasks": [
+            {"name": "", "priority": 3, "completed": True, "sub_tasks": []},
+            {"name": "B", "due_date": "2025-01-02", "uid": "abc",
+             "sub_tasks": [{"name": "C\\nD", "priority": -10}]},
+        ],
+        "due_date": None,
+    }
+    for text in (json.dumps(data), json.dumps(data, indent=2),
+                 json.dumps(data, ensure_ascii=False)):
+        for size in (1, 3, 7, 64):
+            loaded = _read_in_small_chunks(text, size)
+            assert loaded.to_dict() == Task.from_dict(data).to_dict()
+
+
+@pytest.mark.parametrize(
+    "text",
+    ['{"name": "A",}', '{"name": "A"} x', '{"sub_tasks": [1]}',
+     '{"sub_tasks": {"name": "A"}}', '{"name" "A"}', '{"name": tru}'],
+)
+@pytest.mark.parametrize("lazy", [False, True])
+def test_streaming_reader_rejects_invalid_documents(tmp_path, text, lazy):
+    path = tmp_path / "bad.json"
+    path.write_text(text, encoding="utf-8")
+    task = load_tasks_from_json(path, lazy=lazy)
+    assert task.name == "Main"
+    assert task.get_sub_tasks() == []
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_streaming_reader_handles_deep_nesting(tmp_path, lazy):
+    depth = 1500
+    path = tmp_path / "deep.json"
+    path.write_text(
+        '{"name": "Main", "sub_tasks": [' * depth
+        + '{"name": "Leaf"}'
+        + "]}" * depth,
+        encoding="utf-8",
+    )
+    task = load_tasks_from_json(path, lazy=lazy)
+    levels = 0
+    while task.get_sub_tasks():
+        task = task.get_sub_tasks()[0]
+        levels += 1
+    assert levels == depth
+    assert task.name == "Leaf"
+
+
+def test_lazy_load_defers_deeper_levels(tmp_path):
+    import json
+    data = {
+        "name": "Main",
+        "extra": {"sub_tasks": [{"name": "Not a task"}]},
+        "sub_tasks": [
+            {"name": 'A "sub_tasks": [', "extra": [{"sub_tasks": []}],
+             "sub_tasks": [{"name": "A1", "sub_tasks": [{"name": "A11"}]}]},
+            {"sub_tasks": [], "name": "", "priority": 2, "uid": "b"},
+        ],
+    }
+    path = tmp_path / "tasks.json"
+    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+    task = load_tasks_from_json(path, lazy=True)
+    first, second = task.get_sub_tasks()
+    assert not first.sub_tasks_loaded
+    assert first.has_sub_tasks()
+    assert not second.has_sub_tasks()
+    assert task.to_dict() == load_tasks_from_json(path).to_dict()
+    assert first.get_sub_tasks()[0].get_sub_tasks()[0].name == "A11"
+
+
+def test_lazy_load_decodes_only_the_levels_shown(tmp_path):
+    path = tmp_path / "tasks.json"
+    path.write_text(
+        '{"name": "Main", "sub_tasks": [{"name": "A", "sub_tasks": [\n'
+        '  {"name": "B ]}", "extra": [1, {"k": "}"}], "sub_tasks": [\n'
+        '    {"name": "C", "priority": tru}]}]},\n'
+        ' {"name": "D", "sub_tasks": []}]}',
+        encoding="utf-8",
+    )
+    task = load_tasks_from_json(path, lazy=True)
+    first, second = task.get_sub_tasks()
+    assert not second.has_sub_tasks()
+    # C is only decoded once B is expanded
+    nested = first.get_sub_tasks()[0]
+    assert nested.name == "B ]}"
+    with pytest.raises(ValueError):
+        nested.get_sub_tasks()
+
+
+def test_failed_lazy_load_keeps_sub_tasks_deferred(tmp_path):
+    import json
+    path = tmp_path / "tasks.json"
+    text = json.dumps({"name": "Main", "sub_tasks": [
+        {"name": "A", "sub_tasks": [{"name": "B", "sub_tasks": 5}]}
+    ]})
+    path.write_text(text, encoding="utf-8")
+    first = load_tasks_from_json(path, lazy=True).get_sub_tasks()[0]
+    for _ in range(2):
+        with pytest.raises(TypeError):
+            first.get_sub_tasks()
+        assert not first.sub_tasks_loaded and first.has_sub_tasks()
+    # Saving fails rather than writing the task without its sub-tasks
+    with pytest.raises(TypeError):
+        save_tasks_to_json(first, tmp_path / "out.json")
+    assert not (tmp_path / "out.json").exists()
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_streaming_writer_matches_json_dumps(tmp_path, indent):
+    import json
+    task = build_task_tree()
+    task.get_sub_tasks()[0].add_sub_task(Task('Deep "quoted" é', priority=3))
+    task.ensure_uid()
+    path = tmp_path / 'out.json'
+    save_tasks_to_json(task, path, indent=indent, fast=False)
+    separators = (",", ":") if indent is None else None
+    expected = json.dumps(task.to_dict(), indent=indent, separators=separators)
+    assert path.read_text(encoding='utf-8') == expected
+
+
+def test_change_stamps_round_trip(tmp_path):
+    main = Task('Main', deleted={'gone': [1.5, 3]})
+    sub = Task('Sub', uid='s1', modified=1760000000.25, revision=4)
+    main.add_sub_task(sub)
+    for indent in (None, 2):
+        path = tmp_path / f'tasks{indent}.json'
+        save_tasks_to_json(main, path, indent=indent)
+        for lazy in (False, True):
+            loaded = load_tasks_from_json(
+                path, lazy=lazy, use_cache=False
+            )
+            assert loaded.deleted == {'gone': [1.5, 3]}
+            assert loaded.to_dict() == main.to_dict()
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+
+import pytest
+from helpers import load_module
+
+task = load_module("task")
+locking = load_module("locking")
+merge = load_module("merge")
+persistence = load_module("persistence")
+controller_mod = load_module("controller")
+Task = task.Task
+
+
+def in_thread(func):
+    thread = threading.Thread(target=func, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_share_the_lock_and_writers_wait():
+    lock = locking.ReadWriteLock()
+    both_reading = threading.Barrier(3, timeout=5)
+
+    def read():
+        with lock.read():
+            both_reading.wait()
+            both_reading.wait()
+
+    readers = [in_thread(read), in_thread(read)]
+    both_reading.wait()
+    assert lock.readers == 2
+    order = []
+
+    def write():
+        with lock.write():
+            order.append("write")
+
+    def read_late():
+        with lock.read():
+            order.append("read")
+
+    writer = in_thread(write)
+    time.sleep(0.05)
+    # A waiting writer goes before readers arriving after it
+    late = in_thread(read_late)
+    time.sleep(0.05)
+    assert order == []
+    both_reading.wait()
+    for thread in readers + [writer, late]:
+        thread.join(5)
+    assert order == ["write", "read"]
+
+
+def test_lock_is_reentrant():
+    lock = locking.ReadWriteLock()
+    with lock.write():
+        with lock.read(), lock.write():
+            assert lock.writing and lock.readers == 0
+        assert lock.writing
+    assert not lock.writing
+    with lock.read(), lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    assert lock.readers == 0
+
+
+def test_thread_safe_controller_under_contention(tmp_path):
+    path = tmp_path / "tasks.json"
+    controller = controller_mod.TaskController(
+        Task("Main"), save_path=path, thread_safe=True
+    )
+    # Saved by the saver thread below instead of after every edit
+    controller.scheduler.after = lambda delay, func: None
+    root = controller.task
+    errors = []
+    done = threading.Event()
+
+    def guarded(func):
+        def run():
+            try:
+                func()
+            except BaseException as err:  # reported by the test
+                errors.append(err)
+
+        return run
+
+    def write(seed):
+        rng = random.Random(seed)
+        for _ in range(150):
+            action = rng.random()
+            if action < 0.5:
+                with controller.lock.write():
+                    n = len(root.sub_tasks)
+                    controller.apply_batch([
+                        ("insert", root, [(n, Task("x")), (n + 1, Task("y"))])
+                    ])
+            elif action < 0.7:
+                with controller.lock.write():
+                    n = len(root.sub_tasks)
+                    if n:
+                        controller.move_task(rng.randrange(n), rng.randrange(n))
+            elif action < 0.85:
+                with controller.lock.write():
+                    if root.sub_tasks:
+                        controller.update_task(0, priority=rng.randrange(5))
+            else:
+                controller.undo()
+
+    def read():
+        reads = 0
+        while not done.is_set() or not reads:
+            with controller.reading():
+                names = [t.name for t in root.sub_tasks]
+                assert names.count("x") == names.count("y")
+                assert len({id(t) for t in root.sub_tasks}) == len(names)
+                assert len(root.to_dict()["sub_tasks"]) == len(names)
+            reads += 1
+
+    def save():
+        while not done.is_set():
+            controller.scheduler.flush()
+            time.sleep(0.001)
+
+    writers = [in_thread(guarded(lambda s=s: write(s))) for s in range(4)]
+    others = [in_thread(guarded(read)) for _ in range(4)]
+    others.append(in_thread(guarded(save)))
+    for thread in writers:
+        thread.join(60)
+    done.set()
+    for thread in others:
+        thread.join(60)
+    assert errors == []
+    assert controller.lock.readers == 0 and not controller.lock.writing
+
+    assert controller.scheduler.flush()
+    saved = persistence.load_tasks(path, use_cache=False)
+    assert merge.trees_equal(saved, root)
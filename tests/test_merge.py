@@ -0,0 +1,236 @@
+import pytest
+from helpers import load_module
+
+task = load_module("task")
+controller_mod = load_module("controller")
+merge = load_module("merge")
+Task = task.Task
+TaskController = controller_mod.TaskController
+
+
+def snapshot(tree):
+    return [(t.name, t.due_date, t.priority, t.completed) for t in tree.walk()]
+
+
+def build_current():
+    main = Task('Main')
+    work = Task('Work', uid='work')
+    work.add_sub_task(Task('Report', due_date='2025-06-01'))
+    work.add_sub_task(Task('Slides', uid='slides'))
+    home = Task('Home')
+    home.add_sub_task(Task('Paint'))
+    main.add_sub_task(work)
+    main.add_sub_task(home)
+    return main
+
+
+def build_import():
+    main = Task('Exported')
+    work = Task('Work renamed', uid='work', priority=1)
+    # Matched by fingerprint: no uid on either side
+    work.add_sub_task(Task('Report', due_date='2025-06-01', completed=True))
+    work.add_sub_task(Task('Budget'))
+    home = Task('Home')
+    # Matched by uid and moved under Home
+    home.add_sub_task(Task('Slides', uid='slides'))
+    main.add_sub_task(work)
+    main.add_sub_task(home)
+    return main
+
+
+def test_merge_applies_differences_as_one_step():
+    controller = TaskController(build_current())
+    events = []
+    controller.bus.subscribe(events.append)
+    before = snapshot(controller.task)
+    work, home = controller.get_sub_tasks()
+    report, slides = work.get_sub_tasks()
+
+    controller.merge_tasks(build_import())
+
+    assert controller.task.name == 'Main'
+    assert controller.get_sub_tasks() == [work, home]
+    assert work.name == 'Work renamed' and work.priority == 1
+    assert work.get_sub_tasks()[0] is report and report.completed
+    assert [t.name for t in work.get_sub_tasks()] == ['Report', 'Budget']
+    assert home.get_sub_tasks()[1] is slides
+    assert sorted(e.kind for e in events) == [
+        'added', 'added', 'changed', 'changed', 'removed'
+    ]
+
+    # Merging the same file again changes nothing
+    assert controller.merge_tasks(build_import()) == []
+
+    controller.undo()
+    assert snapshot(controller.task) == before
+    controller.redo()
+    assert home.get_sub_tasks()[1] is slides and work.priority == 1
+
+
+def test_new_subtrees_and_duplicates():
+    current = Task('Main')
+    current.add_sub_task(Task('Same'))
+    imported = Task('Main')
+    for name in ('Same', 'Same', 'New'):
+        imported.add_sub_task(Task(name))
+    imported.get_sub_tasks()[2].add_sub_task(Task('Child'))
+
+    operations = merge.plan_merge(current, imported)
+    assert [op[0] for op in operations] == ['insert']
+    assert snapshot(current) == [('Main', None, None, False),
+                                 ('Same', None, None, False)]
+    controller = TaskController(current)
+    controller.apply_batch(operations)
+    assert [t.name for t in current.walk()] == [
+        'Main', 'Same', 'Same', 'New', 'Child'
+    ]
+
+
+def test_failed_batch_leaves_the_tree_unchanged():
+    current = build_current()
+    work, home = current.get_sub_tasks()
+    controller = TaskController(current)
+    controller.add_task('Errand')
+    before = snapshot(current)
+    stamps = [(t.modified, t.revision) for t in current.walk()]
+    events = []
+    controller.bus.subscribe(events.append)
+    for bad in (
+        ('remove', home, [(5, home.get_sub_tasks()[0])]),
+        ('insert', home, [(1, Task('B')), (0, Task('A'))]),
+        ('order', work, [work.get_sub_tasks()[0]]),
+        # Only valid before the insertion above
+        ('remove', work, [(1, work.get_sub_tasks()[1])]),
+        ('update', current, work, {'missing': 1}),
+    ):
+        operations = [
+            ('update', current, work, {'priority': 3}),
+            ('insert', work, [(0, Task('New'))]),
+            ('remove', current, [(2, current.get_sub_tasks()[2])]),
+            bad,
+        ]
+        with pytest.raises((IndexError, ValueError, AttributeError)):
+            controller.apply_batch(operations)
+        assert snapshot(current) == before
+        assert work.priority is None
+    # Nothing was published, stamped or marked deleted
+    assert events == []
+    assert [(t.modified, t.revision) for t in current.walk()] == stamps
+    assert current.deleted == {}
+    # The failed batches left nothing to undo
+    controller.undo()
+    assert [t.name for t in current.get_sub_tasks()] == ['Work', 'Home']
+
+
+def test_large_merge():
+    current = Task('Main')
+    for p in range(100):
+        project = Task(f'P{p}')
+        for i in range(100):
+            project.add_sub_task(Task(f'T{i}', uid=f'{p}-{i}'))
+        current.add_sub_task(project)
+    imported = Task('Main')
+    for p in range(100):
+        project = Task(f'P{p}')
+        for i in range(0, 200, 2):
+            project.add_sub_task(Task(f'T{i}', uid=f'{p}-{i}', completed=True))
+        imported.add_sub_task(project)
+
+    controller = TaskController(current)
+    controller.merge_tasks(imported)
+    assert sum(1 for _ in current.walk()) == 1 + 100 + 100 * 150
+    assert sum(t.completed for t in current.walk()) == 100 * 100
+
+
+def shape(tree):
+    return (tree.name, tree.due_date, tree.priority, tree.completed,
+            [shape(t) for t in tree.get_sub_tasks()])
+
+
+def build_old():
+    main = Task('Main')
+    for name in ('A', 'B', 'C'):
+        project = Task(name, uid=name)
+        for i in range(3):
+            project.add_sub_task(Task(f'{name}{i}'))
+        main.add_sub_task(project)
+    main.get_sub_tasks()[0].get_sub_tasks()[2].uid = 'a2'
+    main.get_sub_tasks()[1].get_sub_tasks()[0].add_sub_task(Task('Deep', uid='deep'))
+    return main
+
+
+def build_new():
+    main = Task('Main renamed')
+    # C and A swap places, B is deleted but its deep task is kept in A
+    c = Task('C', uid='C')
+    for name in ('C2', 'C1', 'C0'):
+        c.add_sub_task(Task(name))
+    a = Task('A', uid='A', priority=3)
+    a.add_sub_task(Task('A0'))
+    a.add_sub_task(Task('Deep', uid='deep', completed=True))
+    new = Task('New')
+    new.add_sub_task(Task('A2', uid='a2'))
+    a.add_sub_task(new)
+    main.add_sub_task(c)
+    main.add_sub_task(a)
+    return main
+
+
+def test_diff_turns_one_tree_into_the_other():
+    old, new = build_old(), build_new()
+    before = shape(old)
+    a = old.get_sub_tasks()[0]
+    a2 = a.get_sub_tasks()[2]
+    deep = old.get_sub_tasks()[1].get_sub_tasks()[0].get_sub_tasks()[0]
+
+    operations = merge.diff(old, new)
+    assert shape(old) == before
+    kinds = sorted((kind, t.name) for kind, t, _ in merge.changes(operations))
+    assert kinds == [
+        ('changed', 'A'), ('changed', 'Deep'), ('changed', 'Main'),
+        ('deleted', 'A1'), ('deleted', 'B'), ('inserted', 'New'),
+        ('moved', 'A2'), ('moved', 'Deep'), ('reordered', 'C'),
+        ('reordered', 'Main'),
+    ]
+
+    controller = TaskController(old)
+    controller.apply_batch(operations)
+    assert shape(old) == shape(new)
+    # Existing tasks are kept, wherever they moved
+    assert old.get_sub_tasks()[1] is a and a.get_sub_tasks()[1] is deep
+    assert a.get_sub_tasks()[2].get_sub_tasks()[0] is a2
+    assert merge.diff(old, new) == []
+
+    controller.undo()
+    assert shape(old) == before
+    controller.redo()
+    assert shape(old) == shape(new)
+
+
+def test_diff_skips_identical_subtrees(monkeypatch):
+    def build():
+        main = Task('Main')
+        for p in range(200):
+            project = Task(f'P{p}', uid=f'p{p}')
+            for i in range(50):
+                project.add_sub_task(Task(f'T{i}'))
+            main.add_sub_task(project)
+        return main
+
+    old, new = build(), build()
+    assert merge.diff(old, new) == [] and merge.trees_equal(old, new)
+    new.get_sub_tasks()[7].get_sub_tasks()[3].priority = 1
+    assert not merge.trees_equal(old, new)
+
+    compared = []
+    changed_fields = merge._changed_fields
+    monkeypatch.setattr(
+        merge, '_changed_fields',
+        lambda a, b: compared.append(a) or changed_fields(a, b),
+    )
+    operations = merge.diff(old, new)
+    target = old.get_sub_tasks()[7].get_sub_tasks()[3]
+    assert operations == [('update', old.get_sub_tasks()[7], target,
+                           {'priority': 1})]
+    # The root, the 200 projects and the sub-tasks of the changed project
+    assert len(compared) == 1 + 200 + 50
@@ -0,0 +1,110 @@
+import pytest
+
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+Task = task.Task
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = persistence.ParseCache()
+    monkeypatch.setattr(persistence, 'PARSE_CACHE', cache)
+    return cache
+
+
+def build_tree(count=20):
+    main = Task('Main', due_date='2025-12-31')
+    for i in range(count):
+        sub = Task(f'Task {i}', priority=i % 3, completed=i % 2 == 0)
+        sub.add_sub_task(Task(f'Step {i}'))
+        main.add_sub_task(sub)
+    return main
+
+
+def test_unchanged_file_is_not_parsed_again(tmp_path, cache, monkeypatch):
+    path = tmp_path / 'tasks.json'
+    persistence.save_tasks_to_json(build_tree(), path, indent=2)
+    # Trees are kept from the second parse on
+    persistence.load_tasks_from_json(path)
+    first = persistence.load_tasks_from_json(path)
+    assert cache.hits == 0
+
+    def fail(*args, **kwargs):
+        raise AssertionError('file parsed again')
+
+    monkeypatch.setattr(persistence, '_open_input', fail)
+    second = persistence.load_tasks_from_json(path)
+    assert cache.hits == 1
+    assert second.to_dict() == first.to_dict() == build_tree().to_dict()
+    # Every hit is a separate tree
+    second.get_sub_tasks()[0].name = 'Changed'
+    assert persistence.load_tasks(path).to_dict() == build_tree().to_dict()
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.ics'])
+def test_rewritten_file_is_parsed_again(tmp_path, cache, suffix):
+    path = tmp_path / f'tasks{suffix}'
+    save = getattr(persistence, f'save_tasks_to_{suffix[1:]}')
+    load = getattr(persistence, f'load_tasks_from_{suffix[1:]}')
+    save(build_tree(), path)
+    for _ in range(3):
+        assert load(path).name == 'Main'
+    assert cache.hits == 1
+
+    save(Task('Other'), path)
+    for _ in range(2):
+        assert load(path).name == 'Other'
+    assert cache.hits == 1
+    assert len(cache._entries) == 1
+
+
+def test_cache_can_be_bypassed(tmp_path, cache):
+    path = tmp_path / 'tasks.json'
+    persistence.save_tasks_to_json(build_tree(), path)
+    persistence.load_tasks(path, use_cache=False)
+    persistence.load_tasks(path, use_cache=False)
+    assert cache.hits == cache.misses == 0
+
+    disabled = persistence.ParseCache(max_bytes=0)
+    disabled.put(disabled.key(path, 'json'), tree=b'x', digest=b'y')
+    assert disabled.size == 0
+
+
+def test_least_recently_used_trees_are_evicted(tmp_path, cache):
+    tree = build_tree()
+    entry = len(b''.join(persistence._encode_snapshot(tree)))
+    entry += persistence._ENTRY_OVERHEAD
+    persistence.save_tasks_to_json(tree, tmp_path / 'size.json')
+    cache.max_bytes = 4 * (tmp_path / 'size.json').stat().st_size
+    fitting = cache.max_bytes // entry
+    paths = [tmp_path / f'{i}.json' for i in range(fitting + 1)]
+    for path in paths:
+        persistence.save_tasks_to_json(tree, path)
+    cache.clear()
+
+    for path in paths[:-1] * 2 + paths[:1] + paths[-1:] * 2:
+        persistence.load_tasks(path)
+
+    assert cache.size <= cache.max_bytes
+    cached = [cache.tree(cache.key(p, 'json')) is not None for p in paths]
+    assert cached == [True, False] + [True] * (fitting - 1)
+
+
+def test_match_is_decided_from_the_saved_digest(tmp_path, cache, monkeypatch):
+    path = tmp_path / 'tasks.json'
+    tree = build_tree()
+    persistence.save_tasks_to_json(tree, path)
+    load_tasks = persistence.load_tasks
+    monkeypatch.setattr(persistence, 'load_tasks', None)
+    assert persistence.tasks_match_file(tree, path)
+    tree.get_sub_tasks()[1].completed = True
+    assert not persistence.tasks_match_file(tree, path)
+    monkeypatch.setattr(persistence, 'load_tasks', load_tasks)
+
+    # Indented files differ from the digest and are compared after a parse
+    persistence.save_tasks_to_json(tree, path, indent=2)
+    assert persistence.tasks_match_file(tree, path)
+    assert not persistence.tasks_match_file(build_tree(), path)
+
@@ -99,9 +99,11 @@ def test_on_closing_write_failure(tmp_path, monkeypatch):
     file_path = tmp_path / 'tasks.json'
 
     original_open = builtins.open
+    # Saves write a temporary sibling that is then renamed over the file
+    targets = (file_path, file_path.with_name(file_path.name + '.tmp'))
 
     def fail_open(path, mode='r', *args, **kwargs):
-        if Path(path) == file_path and 'w' in mode:
+        if Path(path) in targets and 'w' in mode:
             raise OSError('write failed')
         return original_open(path, mode, *args, **kwargs)
 
@@ -111,3 +113,56 @@ def test_on_closing_write_failure(tmp_path, monkeypatch):
 
     assert root.destroyed
     assert warnings
+
+
+def test_on_closing_flushes_pending_autosave(tmp_path, monkeypatch):
+    """Pending auto-saves are written first so no prompt is needed."""
+    controller_mod = load_module("controller")
+    file_path = tmp_path / 'tasks.json'
+    controller = controller_mod.TaskController(Task('Main'), save_path=file_path)
+    controller.scheduler.after = lambda ms, func: None
+    controller.add_task('Sub')
+
+    asked = []
+    monkeypatch.setattr(tkMessageBox, 'askyesno', lambda *a, **k: asked.append(True))
+
+    class DummyRoot:
+        def destroy(self):
+            self.destroyed = True
+
+    root = DummyRoot()
+    on_closing(controller.task, root, file_path, scheduler=controller.scheduler)
+
+    assert root.destroyed
+    assert not asked
+    assert load_tasks_from_json(file_path).get_sub_tasks()[0].name == 'Sub'
+
+
+def test_on_closing_folds_the_journal(tmp_path, monkeypatch):
+    """Journaled auto-saves are written into the file itself on closing."""
+    controller_mod = load_module("controller")
+    journal_mod = load_module("journal")
+    file_path = tmp_path / 'tasks.json'
+    controller = controller_mod.TaskController(Task('Main'), save_path=file_path)
+    journal = journal_mod.Journal(file_path, lambda: controller.task)
+    controller.bus.subscribe(journal.record)
+    controller.scheduler.journal = journal
+    controller.add_task('A')
+    controller.add_task('B')
+    assert journal.records == 1
+
+    asked = []
+    monkeypatch.setattr(tkMessageBox, 'askyesno', lambda *a, **k: asked.append(True))
+
+    class DummyRoot:
+        def destroy(self):
+            self.destroyed = True
+
+    root = DummyRoot()
+    on_closing(controller.task, root, file_path, scheduler=controller.scheduler)
+
+    assert root.destroyed
+    assert not asked
+    assert journal.records == 0
+    saved = load_tasks_from_json(file_path)
+    assert [t.name for t in saved.get_sub_tasks()] == ['A', 'B']
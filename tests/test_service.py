@@ -0,0 +1,217 @@
+import asyncio
+import json
+
+import pytest
+
+from helpers import load_module
+
+task = load_module("task")
+controller_mod = load_module("controller")
+persistence = load_module("persistence")
+service_mod = load_module("service")
+Task = task.Task
+
+
+def serving(tmp_path, test):
+    """Run ``test(service)`` against a service of a new task file."""
+    path = tmp_path / "tasks.json"
+    controller = controller_mod.TaskController(Task("Main"), save_path=path)
+
+    async def run():
+        service = service_mod.TaskService(controller, port=0)
+        await service.start()
+        try:
+            await test(service)
+        finally:
+            await service.close()
+
+    asyncio.run(run())
+    return controller, path
+
+
+def rpc(method, request_id=1, **params):
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+
+
+async def call(reader, writer, request):
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def http(reader, writer, method, target, body=b"", **headers):
+    port = writer.get_extra_info("peername")[1]
+    headers = dict(
+        {"Host": f"localhost:{port}", "Content-Type": "application/json"},
+        **{name.replace("_", "-"): value for name, value in headers.items()},
+    )
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\n".encode()
+        + b"".join(f"{k}: {v}\r\n".encode() for k, v in headers.items() if v)
+        + f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    assert headers["transfer-encoding"] == "chunked"
+    chunks = []
+    while size := int(await reader.readline(), 16):
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()
+    await reader.readline()
+    return status, headers, chunks
+
+
+def test_line_protocol_calls_and_batches(tmp_path):
+    async def test(service):
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+        assert (await call(reader, writer, rpc("add", name="A")))["result"] == "1"
+        batch = [
+            rpc("add", 2, name="B", priority=1),
+            rpc("add", 3, name="B1", parent="2"),
+            {"jsonrpc": "2.0", "method": "complete", "params": {"path": "1"}},
+            rpc("move", 4, path="2", to=1),
+            rpc("list", 5),
+        ]
+        replies = await call(reader, writer, batch)
+        assert [r["id"] for r in replies] == [2, 3, 4, 5]
+        assert replies[2]["result"] == "1"
+        assert [(r["path"], r["name"], r["completed"]) for r in replies[3]["result"]] == [
+            ("1", "B", False), ("1.1", "B1", False), ("2", "A", True)
+        ]
+        assert (await call(reader, writer, rpc("query", search="b1")))["result"][0][
+            "path"
+        ] == "1.1"
+        errors = [
+            await call(reader, writer, rpc("remove", path="1")),
+            await call(reader, writer, rpc("edit", priority=2)),
+            await call(reader, writer, rpc("edit", path="7", name="X")),
+        ]
+        assert [e["error"]["code"] for e in errors] == [
+            service_mod.METHOD_NOT_FOUND,
+            service_mod.INVALID_PARAMS,
+            service_mod.TASK_ERROR,
+        ]
+        writer.write(b"{not json\n")
+        assert json.loads(await reader.readline())["error"]["code"] == (
+            service_mod.PARSE_ERROR
+        )
+        writer.close()
+
+    controller, path = serving(tmp_path, test)
+    saved = persistence.load_tasks(path, use_cache=False)
+    assert [t.name for t in saved.walk()] == ["Main", "B", "B1", "A"]
+
+
+def test_http_keeps_connections_and_streams_listings(tmp_path):
+    count = service_mod._CHUNK_ROWS * 2 + 10
+
+    async def test(service):
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+        batch = [rpc("add", i, name=f"T{i}") for i in range(count)]
+        status, _, chunks = await http(
+            reader, writer, "POST", "/rpc", json.dumps(batch).encode()
+        )
+        assert status == 200 and len(json.loads(b"".join(chunks))) == count
+        # Same connection
+        status, headers, chunks = await http(reader, writer, "GET", "/tasks")
+        assert headers["content-type"] == "application/x-ndjson"
+        assert len(chunks) == 3
+        lines = b"".join(chunks).splitlines()
+        assert [json.loads(line)["name"] for line in lines[:2]] == ["T0", "T1"]
+        assert len(lines) == count
+
+        status, _, chunks = await http(
+            reader, writer, "POST", "/rpc", json.dumps(rpc("list")).encode()
+        )
+        assert len(chunks) > 3
+        assert len(json.loads(b"".join(chunks))["result"]) == count
+        status, _, _ = await http(reader, writer, "GET", "/missing")
+        assert status == 404
+        writer.close()
+
+    serving(tmp_path, test)
+
+
+def test_concurrent_writes_are_serialized(tmp_path):
+    clients, calls = 20, 10
+
+    async def client(port, number):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        paths = []
+        for i in range(calls):
+            reply = await call(reader, writer, rpc("add", name=f"{number}-{i}"))
+            paths.append(reply["result"])
+        writer.close()
+        return paths
+
+    async def test(service):
+        results = await asyncio.gather(
+            *(client(service.port, n) for n in range(clients))
+        )
+        paths = [p for paths in results for p in paths]
+        assert sorted(paths, key=int) == [str(i) for i in range(1, 201)]
+        assert service.writes == clients * calls
+
+    controller, _ = serving(tmp_path, test)
+    assert len(controller.get_sub_tasks()) == clients * calls
+
+
+def test_http_rejects_requests_of_web_pages(tmp_path):
+    body = json.dumps(rpc("add", name="From a page")).encode()
+
+    async def send(port, method, target, **headers):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, _, _ = await http(reader, writer, method, target, body, **headers)
+        writer.close()
+        return status
+
+    async def test(service):
+        port = service.port
+        assert await send(port, "POST", "/rpc", Origin="http://evil.test") == 403
+        assert await send(port, "POST", "/rpc", Content_Type="text/plain") == 415
+        assert await send(port, "POST", "/rpc", Content_Type=None) == 415
+        for host in ("evil.test", f"evil.test:{port}", "localhost", None):
+            assert await send(port, "GET", "/tasks", Host=host) == 403
+        assert await send(port, "POST", "/rpc", Host=f"127.0.0.1:{port}") == 200
+
+    controller, _ = serving(tmp_path, test)
+    assert [t.name for t in controller.get_sub_tasks()] == ["From a page"]
+
+
+def test_serving_a_file_replays_its_journal_and_refuses_a_second_instance(
+    tmp_path, monkeypatch
+):
+    instance = load_module("instance")
+    journal_mod = load_module("journal")
+    if not instance.supported():
+        pytest.skip("Unix domain sockets")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    path = tmp_path / "tasks.json"
+    controller = controller_mod.TaskController(Task("Main"), save_path=path)
+    journal = journal_mod.Journal(path, lambda: controller.task)
+    controller.bus.subscribe(journal.record)
+    controller.scheduler.journal = journal
+    controller.add_task("Saved")
+    controller.add_task("Journaled")
+    assert journal.records == 1
+
+    async def run():
+        serving = asyncio.create_task(service_mod._serve_file(path, "127.0.0.1", 0))
+        while not instance.running(path):
+            await asyncio.sleep(0.01)
+        # A second instance of the file is refused before it loads it
+        assert await service_mod._serve_file(path, "127.0.0.1", 0) == 1
+        serving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await serving
+
+    asyncio.run(run())
+    # The journal was replayed on load and folded into the file on exit
+    saved = persistence.load_tasks_from_json(path)
+    assert [t.name for t in saved.get_sub_tasks()] == ["Saved", "Journaled"]
+    assert not instance.running(path)
@@ -0,0 +1,96 @@
+import pytest
+
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+controller_mod = load_module("controller")
+sharing = load_module("sharing")
+Task = task.Task
+
+
+def open_shared(path, merge=True):
+    shared = sharing.SharedFile(path)
+    controller = controller_mod.TaskController(shared.load(), save_path=path)
+    controller.scheduler.shared = shared
+    if merge:
+        controller.scheduler.on_conflict = controller.sync_tasks
+    return controller
+
+
+def names(tree):
+    return [t.name for t in tree.walk()][1:]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'tasks.json'
+    main = Task('Main')
+    for name in ('X', 'Y'):
+        main.add_sub_task(Task(name, uid=name.lower()))
+    persistence.save_tasks_to_json(main, path)
+    return path
+
+
+def test_concurrent_saves_are_merged(path):
+    first, second = open_shared(path), open_shared(path)
+    first.add_task('A1')
+    assert second.scheduler.shared.poll()
+    second.add_task('B1')
+    second.edit_task(0, 'X2')
+    first.add_task('A2')
+
+    # Tasks saved by the other process are added after the unsaved ones
+    assert names(persistence.load_tasks(path)) == ['X2', 'Y', 'A1', 'A2', 'B1']
+    assert names(first.task) == ['X2', 'Y', 'A1', 'A2', 'B1']
+    assert first.scheduler.shared.generation == 4
+    assert not first.scheduler.shared.poll()
+
+
+def test_latest_edit_and_deletion_win(path):
+    first, second = open_shared(path), open_shared(path)
+    first.edit_task(0, 'X renamed')
+    second.delete_task(0)
+    # Y is renamed after the other process deleted it and comes back
+    first.delete_task(1)
+    second.edit_task(0, 'Y renamed')
+
+    saved = persistence.load_tasks(path)
+    assert names(saved) == ['Y renamed']
+    assert 'x' in saved.deleted
+    first.add_task('Z')
+    assert names(first.task) == ['Z', 'Y renamed']
+
+
+def test_stale_save_is_rejected_without_merge(path):
+    first, second = open_shared(path), open_shared(path, merge=False)
+    first.add_task('A1')
+    before = path.read_bytes()
+    second.add_task('B1')
+    assert second.scheduler.dirty
+    assert path.read_bytes() == before
+    with pytest.raises(sharing.StaleFileError):
+        second.scheduler.shared.save(lambda: None)
+
+
+def test_outside_writes_are_detected(path):
+    controller = open_shared(path)
+    shared = controller.scheduler.shared
+    other = persistence.load_tasks(path)
+    other.add_sub_task(Task('Outside', uid='outside'))
+    persistence.save_tasks_to_json(other, path)
+    assert shared.poll()
+    controller.add_task('Inside')
+    assert names(persistence.load_tasks(path)) == ['X', 'Y', 'Inside', 'Outside']
+
+
+def test_lock_excludes_other_holders(path):
+    lock = sharing.FileLock(path)
+    other = sharing.FileLock(path, timeout=0.05)
+    with lock:
+        with lock:
+            lock.write_generation(7)
+        with pytest.raises(sharing.LockTimeout):
+            other.acquire()
+    with other:
+        assert other.read_generation() == 7
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+Task = task.Task
+
+
+def build_task_tree():
+    main = Task('Main', due_date='2025-12-31', priority=1)
+    sub1 = Task('Sub1 é', completed=True, uid='abc')
+    sub1.add_sub_task(Task('Deep', due_date='someday', priority=2.5))
+    sub1.add_sub_task(Task('', priority=2**40))
+    main.add_sub_task(sub1)
+    main.add_sub_task(Task('Sub2', due_date='2026-01-01', completed=1))
+    return main
+
+
+def test_snapshot_round_trips_exactly_with_json(tmp_path):
+    json_path = tmp_path / 'tasks.json'
+    persistence.save_tasks_to_json(build_task_tree(), json_path)
+    from_json = persistence.load_tasks_from_json(json_path)
+
+    snap_path = tmp_path / 'tasks.snapshot'
+    persistence.save_tasks_to_snapshot(from_json, snap_path)
+    from_snapshot = persistence.load_tasks(snap_path)
+    assert from_snapshot.to_dict() == from_json.to_dict()
+
+    before = tmp_path / 'before.json'
+    after = tmp_path / 'after.json'
+    persistence.save_tasks_to_json(from_json, before)
+    persistence.save_tasks_to_json(from_snapshot, after)
+    assert after.read_bytes() == before.read_bytes()
+
+
+def test_snapshot_decodes_one_level_at_a_time(tmp_path):
+    path = tmp_path / 'tasks.snapshot'
+    persistence.save_tasks_to_snapshot(build_task_tree(), path)
+    root = persistence.load_tasks_from_snapshot(path)
+    assert root.name == 'Main'
+    assert not root.sub_tasks_loaded
+    assert root.has_sub_tasks()
+
+    sub1, sub2 = root.get_sub_tasks()
+    assert not sub1.sub_tasks_loaded
+    assert sub2.sub_tasks_loaded and not sub2.has_sub_tasks()
+    assert [t.name for t in sub1.get_sub_tasks()] == ['Deep', '']
+
+
+def test_save_over_mapped_snapshot(tmp_path):
+    path = tmp_path / 'tasks.snapshot'
+    persistence.save_tasks_to_snapshot(build_task_tree(), path)
+    root = persistence.load_tasks(path)
+    expected = build_task_tree().to_dict()
+    root.add_sub_task(Task('New'))
+    expected['sub_tasks'].append(Task('New').to_dict())
+
+    scheduler = persistence.SaveScheduler(lambda: root, path)
+    scheduler.mark_dirty()
+    assert not scheduler.dirty
+    assert persistence.load_tasks(path).to_dict() == expected
+
+
+def test_invalid_snapshot_falls_back(tmp_path, caplog):
+    path = tmp_path / 'tasks.snapshot'
+    persistence.save_tasks_to_snapshot(build_task_tree(), path)
+    path.write_bytes(path.read_bytes()[:30])
+    loaded = persistence.load_tasks_from_snapshot(path)
+    assert loaded.name == 'Main'
+    assert loaded.get_sub_tasks() == []
+    assert any('Failed to load tasks' in r.getMessage() for r in caplog.records)
+
+
+def test_load_tasks_reads_json_when_not_a_snapshot(tmp_path):
+    path = tmp_path / 'tasks.snapshot'
+    path.write_text(json.dumps({'name': 'Main', 'sub_tasks': [{'name': 'A'}]}))
+    loaded = persistence.load_tasks(path)
+    assert [t.name for t in loaded.get_sub_tasks()] == ['A']
+
+
+def test_corrupt_records_are_reported_and_kept_deferred(tmp_path):
+    path = tmp_path / 'tasks.snapshot'
+    persistence.save_tasks_to_snapshot(build_task_tree(), path)
+    data = bytearray(path.read_bytes())
+    header = persistence._SNAPSHOT_HEADER.unpack_from(data, 0)
+    records = header[4]
+    # Records overlapping the header
+    bad = bytearray(data)
+    persistence._SNAPSHOT_HEADER.pack_into(bad, 0, *header[:4], 8, header[5])
+    path.write_bytes(bad)
+    assert persistence.load_tasks_from_snapshot(path).get_sub_tasks() == []
+
+    # The subtree of record 2 ends beyond the file
+    size = persistence._SNAPSHOT_RECORD.size
+    record = list(persistence._SNAPSHOT_RECORD.unpack_from(data, records + 2 * size))
+    record[1] = 99
+    persistence._SNAPSHOT_RECORD.pack_into(data, records + 2 * size, *record)
+    path.write_bytes(data)
+    sub1 = persistence.load_tasks_from_snapshot(path).get_sub_tasks()[0]
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            sub1.get_sub_tasks()
+        assert not sub1.sub_tasks_loaded
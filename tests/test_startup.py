@@ -0,0 +1,152 @@
+import subprocess
+import sys
+import tkinter
+
+from helpers import ROOT, load_module
+
+orga = load_module("orga")
+persistence = load_module("persistence")
+window = load_module("window")
+from task import Task
+
+
+class FakeRoot:
+    def __init__(self):
+        self.callbacks = []
+        self.timers = []
+        self.destroyed = False
+        self.protocols = {}
+        FakeRoot.last = self
+
+    def title(self, text):
+        self.text = text
+
+    def update_idletasks(self):
+        pass
+
+    def after(self, delay, func):
+        # Periodic checks such as the file watcher's never end; keep them
+        # out of the fake main loop
+        (self.timers if delay >= 1000 else self.callbacks).append(func)
+
+    def protocol(self, name, func):
+        self.protocols[name] = func
+
+    def mainloop(self):
+        while self.callbacks and not self.destroyed:
+            self.callbacks.pop(0)()
+
+    def destroy(self):
+        self.destroyed = True
+
+
+class FakeWindow:
+    instances = []
+
+    def __init__(self, root, controller):
+        self.controller = controller
+        self.shown = [t.name for t in controller.get_sub_tasks()]
+        self.replaced = None
+        FakeWindow.instances.append(self)
+
+    def _replace_tasks(self, task):
+        self.replaced = task
+        self.controller.replace_task(task)
+
+
+def test_window_shown_before_tasks_are_loaded(tmp_path, monkeypatch):
+    path = tmp_path / "tasks.json"
+    main = Task("Main")
+    main.add_sub_task(Task("Stored"))
+    persistence.save_tasks_to_json(main, path)
+
+    monkeypatch.setattr(tkinter, "Tk", FakeRoot)
+    monkeypatch.setattr(window, "Window", FakeWindow)
+    FakeWindow.instances.clear()
+    report = orga.StartupReport()
+
+    orga.run_gui(path, report=report)
+
+    win = FakeWindow.instances[0]
+    assert win.shown == []
+    assert [t.name for t in win.replaced.get_sub_tasks()] == ["Stored"]
+    assert not win.controller.scheduler.paused
+    assert len(FakeRoot.last.timers) == 1
+    labels = [phase[0] for phase in report.phases]
+    assert labels == [
+        "import GUI modules",
+        "show main window",
+        "load and display tasks",
+    ]
+    assert "load and display tasks" in report.format()
+
+
+def test_load_errors_are_shown_and_never_saved(tmp_path, monkeypatch):
+    from tkinter import messagebox
+
+    path = tmp_path / "tasks.json"
+    path.write_text("kept")
+
+    def fail(*args, **kwargs):
+        raise MemoryError("too big")
+
+    errors = []
+    monkeypatch.setattr(tkinter, "Tk", FakeRoot)
+    monkeypatch.setattr(window, "Window", FakeWindow)
+    monkeypatch.setattr(orga, "load_tasks", fail)
+    monkeypatch.setattr(messagebox, "showerror", lambda *a: errors.append(a))
+    FakeWindow.instances.clear()
+
+    orga.run_gui(path)
+
+    controller = FakeWindow.instances[0].controller
+    assert errors and "too big" in errors[0][1]
+    assert controller.scheduler.paused and FakeRoot.last.timers == []
+    controller.add_task("Lost")
+    FakeRoot.last.protocols["WM_DELETE_WINDOW"]()
+    assert FakeRoot.last.destroyed
+    assert path.read_text() == "kept"
+
+
+def test_window_import_defers_optional_modules():
+    code = (
+        "import sys\n"
+        "seen = []\n"
+        "class Finder:\n"
+        "    def find_spec(self, name, path=None, target=None):\n"
+        "        seen.append(name)\n"
+        "sys.meta_path.insert(0, Finder())\n"
+        "import window\n"
+        "print(sorted({n.split('.')[0] for n in seen} & {'ttkbootstrap', 'tkcalendar'}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_autosave_timers_of_worker_threads_start_on_the_tk_thread():
+    import threading
+
+    class ThreadRoot:
+        def __init__(self):
+            self.calls = []
+
+        def after(self, delay, func):
+            self.calls.append((delay, func, threading.get_ident()))
+
+    root = ThreadRoot()
+    after = orga._tk_after(root)
+    flush = lambda: None
+    worker = threading.Thread(target=lambda: after(500, flush))
+    worker.start()
+    worker.join(5)
+    [(delay, handover, thread)] = root.calls
+    assert delay == 0 and thread != threading.get_ident()
+    # Run by the Tk thread's event loop
+    handover()
+    assert root.calls[1] == (500, flush, threading.get_ident())
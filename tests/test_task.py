@@ -1,7 +1,8 @@
 import pytest
 from helpers import load_module
 
-Task = load_module("task").Task
+task_mod = load_module("task")
+Task = task_mod.Task
 
 
 def test_task_str_without_subtasks():
@@ -39,3 +40,17 @@ def test_task_due_date_priority_and_completion():
     assert task.completed
     task.mark_incomplete()
     assert not task.completed
+
+
+def test_expired_tombstones_are_pruned():
+    root = Task('Main', deleted={'old': [10.0, 1], 'kept': [500.0, 2]})
+    gone = Task('Gone', uid='gone')
+
+    root.mark_deleted(gone, 100.0 + task_mod.TOMBSTONE_MAX_AGE)
+    assert list(root.deleted) == ['kept', 'gone']
+
+    # Deleting a task again moves its tombstone to the end
+    root.mark_deleted(Task('Kept', uid='kept'), 200.0 + task_mod.TOMBSTONE_MAX_AGE)
+    assert list(root.deleted) == ['gone', 'kept']
+    assert root.prune_deleted(150.0 + task_mod.TOMBSTONE_MAX_AGE) == 1
+    assert list(root.deleted) == ['kept']
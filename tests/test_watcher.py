@@ -0,0 +1,108 @@
+import os
+import time
+
+from helpers import load_module
+
+task = load_module("task")
+persistence = load_module("persistence")
+controller_mod = load_module("controller")
+journal_mod = load_module("journal")
+watcher_mod = load_module("watcher")
+Task = task.Task
+
+
+def names(tree):
+    return [t.name for t in tree.walk()][1:]
+
+
+def watched(tmp_path, name='tasks.json'):
+    path = tmp_path / name
+    main = Task('Main')
+    for name in 'ABC':
+        main.add_sub_task(Task(name, uid=name.lower()))
+    persistence.save_tasks(main, path)
+    controller = controller_mod.TaskController(
+        persistence.load_tasks(path), save_path=path
+    )
+    timers = []
+    watcher = watcher_mod.FileWatcher(
+        path, lambda delay, func: timers.append(func), controller.reload_tasks
+    )
+    watcher.start()
+    return path, controller, watcher
+
+
+def settle(watcher):
+    while watcher.check():
+        time.sleep(0.01)
+
+
+def rewrite(path, edit):
+    tree = persistence.load_tasks(path, use_cache=False)
+    edit(tree)
+    # Moved into place as another program would, unknown to this process
+    other = path.with_name('other' + path.suffix)
+    persistence.save_tasks(tree, other)
+    os.replace(other, path)
+
+
+def test_outside_changes_are_applied_incrementally(tmp_path):
+    path, controller, watcher = watched(tmp_path)
+    events = []
+    controller.bus.subscribe(events.append)
+    b = controller.get_sub_tasks()[1]
+
+    def edit(tree):
+        tree.get_sub_tasks()[0].name = 'A2'
+        del tree.sub_tasks[2]
+        tree.add_sub_task(Task('D', uid='d'))
+
+    rewrite(path, edit)
+    settle(watcher)
+    assert watcher.reloads == 1
+    assert names(controller.task) == ['A2', 'B', 'D']
+    assert controller.get_sub_tasks()[1] is b
+    assert sorted(e.kind for e in events) == ['added', 'changed', 'removed']
+    controller.undo()
+    assert names(controller.task) == ['A', 'B', 'C']
+
+
+def test_touched_files_and_own_saves_are_not_reloaded(tmp_path):
+    path, controller, watcher = watched(tmp_path)
+    os.utime(path, ns=(0, 0))
+    settle(watcher)
+    controller.add_task('Mine')
+    settle(watcher)
+    assert watcher.reloads == 0
+    assert watcher.identity == watcher_mod.file_identity(path)
+
+
+def test_snapshot_saves_and_compactions_are_not_reloaded(tmp_path):
+    path, controller, watcher = watched(tmp_path, 'tasks' + persistence.SNAPSHOT_SUFFIX)
+    controller.add_task('Mine')
+    settle(watcher)
+    assert watcher.reloads == 0
+
+    journal = journal_mod.Journal(path, lambda: controller.task)
+    controller.bus.subscribe(journal.record)
+    controller.scheduler.journal = journal
+    controller.add_task('Checkpoint')
+    controller.add_task('Journaled')
+    assert journal.compact()
+    settle(watcher)
+    assert watcher.reloads == 0
+    assert watcher.identity == watcher_mod.file_identity(path)
+
+    rewrite(path, lambda tree: tree.add_sub_task(Task('Theirs', uid='t')))
+    settle(watcher)
+    assert watcher.reloads == 1
+    assert names(controller.task)[-1] == 'Theirs'
+
+
+def test_unsaved_edits_survive_a_reload(tmp_path):
+    path, controller, watcher = watched(tmp_path)
+    controller.scheduler.pause()
+    controller.edit_task(1, 'Mine')
+    rewrite(path, lambda tree: tree.add_sub_task(Task('Theirs', uid='t')))
+    settle(watcher)
+    assert names(controller.task) == ['A', 'Mine', 'C', 'Theirs']
@@ -88,7 +88,11 @@ class DummyTreeview(DummyWidget):
             self._counter += 1
         self.nodes[iid] = {"text": text, "tags": tags, "parent": parent}
         self.node_states[iid] = {"open": False}
-        self.children.setdefault(parent or "", []).append(iid)
+        siblings = self.children.setdefault(parent or "", [])
+        if isinstance(index, int):
+            siblings.insert(index, iid)
+        else:
+            siblings.append(iid)
         self.items.append(text)
         return iid
 
@@ -130,6 +134,9 @@ class DummyTreeview(DummyWidget):
     def bind(self, event, func):
         self.bindings[event] = func
 
+    def focus(self):
+        return self._selection[0] if self._selection else ""
+
     def yview(self, *args):
         self.yview_args = args
 
@@ -146,6 +153,12 @@ class DummyTreeview(DummyWidget):
         if kw:
             if "open" in kw:
                 state["open"] = kw["open"]
+            node = self.nodes.get(iid)
+            if node is not None and "text" in kw:
+                self.items[self.items.index(node["text"])] = kw["text"]
+                node["text"] = kw["text"]
+            if node is not None and "tags" in kw:
+                node["tags"] = kw["tags"]
         if option:
             return state.get(option)
         return state
@@ -968,3 +981,236 @@ def test_drag_and_drop_reorders(monkeypatch):
 
     assert [t.name for t in win.controller.get_sub_tasks()] == ["B", "A"]
     assert [win.tree.nodes[i]["text"].split()[0] for i in win.tree.get_children()] == ["B", "A"]
+
+
+def test_subwindow_change_updates_grandparent(monkeypatch):
+    win = setup_window(monkeypatch)
+    parent = Task("Parent")
+    child = Task("Child")
+    parent.add_sub_task(child)
+    win.controller.task.add_sub_task(parent)
+    win.refresh_window()
+
+    child_win = window.Window(
+        DummyRoot(), win.controller.spawn(parent), parent_window=win
+    )
+    grandchild_win = window.Window(
+        DummyRoot(), child_win.controller.spawn(child), parent_window=child_win
+    )
+    grandchild_win.controller.add_task("Grandchild")
+
+    parent_id = win.tree.get_children()[0]
+    child_id = win.tree.get_children(parent_id)[0]
+    assert [win.tree.nodes[i]["text"] for i in win.tree.get_children(child_id)] == [
+        "Grandchild"
+    ]
+    child_id = child_win.tree.get_children()[0]
+    assert len(child_win.tree.get_children(child_id)) == 1
+
+
+def test_sibling_window_sees_completion(monkeypatch):
+    win = setup_window(monkeypatch)
+    win.controller.add_task("A")
+    sibling = window.Window(
+        DummyRoot(), win.controller.spawn(win.controller.task), parent_window=win
+    )
+    sibling.tree.selection_set(sibling.tree.get_children()[0])
+    sibling.toggle_completion()
+    assert win.tree.items == ["A (Completed)"]
+
+
+def test_added_row_inserted_at_position(monkeypatch):
+    win = setup_window(monkeypatch)
+    for name in ("A", "B", "C"):
+        win.controller.add_task(name)
+    win.controller.delete_task(1)
+    win.controller.undo()
+    names = [win.tree.nodes[i]["text"] for i in win.tree.get_children()]
+    assert names == ["A", "B", "C"]
+
+
+def test_events_coalesced_until_idle(monkeypatch):
+    class IdleRoot(DummyRoot):
+        def __init__(self):
+            self.idle = []
+
+        def after_idle(self, func):
+            self.idle.append(func)
+
+    fake_tk = DummyTkModule()
+    monkeypatch.setattr(window, "tk", fake_tk)
+    monkeypatch.setattr(window, "ttk", fake_tk)
+    monkeypatch.setattr(window, "DateEntry", DummyEntry)
+    root = IdleRoot()
+    win = window.Window(root, TaskController(Task("Main")))
+    win.controller.add_task("A")
+    win.controller.add_task("B")
+    win.controller.mark_task_completed(0)
+    assert win.tree.items == []
+    assert len(root.idle) == 1
+    root.idle.pop()()
+    assert win.tree.items == ["A (Completed)", "B"]
+
+
+def test_events_of_other_threads_are_handed_to_tk(monkeypatch):
+    import threading
+
+    class LoopRoot(DummyRoot):
+        def __init__(self):
+            self.calls = []
+
+        def after(self, delay, func, *args):
+            self.calls.append((delay, func, args, threading.get_ident()))
+
+    fake_tk = DummyTkModule()
+    monkeypatch.setattr(window, "tk", fake_tk)
+    monkeypatch.setattr(window, "ttk", fake_tk)
+    monkeypatch.setattr(window, "DateEntry", DummyEntry)
+    root = LoopRoot()
+    controller = TaskController(Task("Main"), thread_safe=True)
+    win = window.Window(root, controller)
+    worker = threading.Thread(target=lambda: controller.add_task("A"))
+    worker.start()
+    worker.join(5)
+    assert win.tree.items == [] and win._pending_events == []
+    [(delay, func, args, _)] = root.calls
+    assert delay == 0
+    func(*args)
+    assert win.tree.items == ["A"]
+
+
+def test_detached_window_ignores_events(monkeypatch):
+    win = setup_window(monkeypatch)
+    win.detach()
+    win.controller.add_task("A")
+    assert win.tree.items == []
+
+
+def test_import_replaces_tasks_and_clears_undo(monkeypatch, tmp_path):
+    path = tmp_path / "import.json"
+    imported = Task("Imported")
+    imported.add_sub_task(Task("X"))
+    persistence.save_tasks_to_json(imported, path)
+
+    win = setup_window(monkeypatch)
+    win.controller.add_task("Old")
+    window.tk.filedialog = type(
+        "FD", (), {"askopenfilename": staticmethod(lambda **kw: str(path))}
+    )
+    job = win.import_tasks_json()
+    assert job.done and job.error is None
+    assert win.controller.task.name == "Imported"
+    assert win.tree.items == ["X"]
+    win.undo()
+    assert [t.name for t in win.controller.get_sub_tasks()] == ["X"]
+
+
+def test_export_writes_file(monkeypatch, tmp_path):
+    path = tmp_path / "export.csv"
+    win = setup_window(monkeypatch)
+    win.controller.add_task("A")
+    window.tk.filedialog = type(
+        "FD", (), {"asksaveasfilename": staticmethod(lambda **kw: str(path))}
+    )
+    win.export_tasks_csv()
+    assert "A" in path.read_text(encoding="utf-8")
+
+
+def test_json_export_is_indented(monkeypatch, tmp_path):
+    path = tmp_path / "export.json"
+    win = setup_window(monkeypatch)
+    win.controller.add_task("A")
+    window.tk.filedialog = type(
+        "FD", (), {"asksaveasfilename": staticmethod(lambda **kw: str(path))}
+    )
+    win.export_tasks()
+    assert path.read_text(encoding="utf-8").startswith('{\n  "name": "Main"')
+
+
+def test_deferred_subtasks_inserted_on_expand(monkeypatch):
+    win = setup_window(monkeypatch)
+    parent = Task("Parent")
+    loads = []
+
+    def load():
+        loads.append(True)
+        return [Task("Child")]
+
+    parent.defer_sub_tasks(load)
+    win.controller.task.add_sub_task(parent)
+    win.refresh_window()
+
+    parent_id = win.tree.get_children()[0]
+    assert len(win.tree.get_children(parent_id)) == 1  # placeholder
+    assert not loads
+
+    win.tree.selection_set(parent_id)
+    win.tree.bindings["<<TreeviewOpen>>"](None)
+    children = win.tree.get_children(parent_id)
+    assert loads == [True]
+    assert [win.tree.nodes[c]["text"] for c in children] == ["Child"]
+
+    # An expanded row stays expanded, with its children, after a refresh
+    win.tree.item(parent_id, open=True)
+    win.refresh_window()
+    parent_id = win.tree.get_children()[0]
+    assert [win.tree.nodes[c]["text"] for c in win.tree.get_children(parent_id)] == ["Child"]
+
+
+def test_import_recognises_the_format(monkeypatch, tmp_path):
+    path = tmp_path / "import.txt"
+    persistence.save_tasks_to_csv(Task("Imported"), path)
+    win = setup_window(monkeypatch)
+    window.tk.filedialog = type(
+        "FD", (), {"askopenfilename": staticmethod(lambda **kw: str(path))}
+    )
+    job = win.import_tasks()
+    assert job.done and job.error is None
+    assert win.controller.task.name == "Imported"
+
+
+def test_merge_import_keeps_tasks_and_undo(monkeypatch, tmp_path):
+    path = tmp_path / "import.csv"
+    imported = Task("Main")
+    for i in range(40):
+        imported.add_sub_task(Task(f"New {i}"))
+    imported.add_sub_task(Task("Old", completed=True))
+    persistence.save_tasks_to_csv(imported, path)
+
+    win = setup_window(monkeypatch)
+    win.controller.add_task("Old")
+    window.tk.filedialog = type(
+        "FD", (), {"askopenfilename": staticmethod(lambda **kw: str(path))}
+    )
+    job = win.merge_import()
+    assert job.done and job.error is None
+    assert win.tree.items == ["Old (Completed)"] + [f"New {i}" for i in range(40)]
+    win.undo()
+    assert win.tree.items == ["Old"]
+    assert not win.controller.get_sub_tasks()[0].completed
+
+
+def test_export_writes_a_copy_without_holding_the_lock(monkeypatch, tmp_path):
+    fake_tk = DummyTkModule()
+    monkeypatch.setattr(window, "tk", fake_tk)
+    monkeypatch.setattr(window, "ttk", fake_tk)
+    monkeypatch.setattr(window, "DateEntry", DummyEntry)
+    controller = TaskController(Task("Main"), thread_safe=True)
+    win = window.Window(DummyRoot(), controller)
+    controller.add_task("A")
+    saved = []
+
+    def save(task, path, progress=None, **options):
+        assert controller.lock.readers == 0
+        # Edits may go on while the copy is written
+        controller.add_task("B")
+        saved.append([t.name for t in task.get_sub_tasks()])
+
+    codec = persistence.codec_for_path("export.csv")
+    monkeypatch.setattr(codec, "save", save)
+    window.tk.filedialog = type(
+        "FD", (), {"asksaveasfilename": staticmethod(lambda **kw: str(tmp_path))}
+    )
+    job = win._export(codec)
+    assert job.done and job.error is None
+    assert saved == [["A"]]
@@ -0,0 +1,176 @@
+"""
+This module watches a task file for changes made by other programs.
+
+Checks are cheap enough to run from the GUI's event loop every second: they
+only compare the file's size, modification time and inode with ``os.stat``
+or, when the optional ``watchdog`` library is installed, test a flag its
+observer thread sets.  A file whose status changed is hashed on a worker
+thread; merely touched files and the application's own saves are not parsed
+again, and only files with new content are loaded and handed to the
+``on_change`` callback, which typically applies the differences to the open
+tree (see ``TaskController.reload_tasks``).
+
+Classes:
+- FileWatcher: Polls one task file from a Tk-style event loop.
+
+Usage:
+    watcher = FileWatcher(path, root.after, controller.reload_tasks)
+    watcher.start()
+"""
+import os
+import threading
+from pathlib import Path
+
+import persistence
+from sharing import file_identity
+from worker import BackgroundJob
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional, the file is polled with os.stat instead
+    Observer = None
+
+
+def _file_digest(path):
+    """Return the digest of the bytes of ``path``, or ``None``."""
+    digest = persistence._new_digest()
+    try:
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(persistence._CHUNK_SIZE), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.digest()
+
+
+if Observer is not None:
+
+    class _Handler(FileSystemEventHandler):
+        """Sets ``flag`` when an event concerns ``path``."""
+
+        def __init__(self, path, flag):
+            self.path = os.fspath(path)
+            self.flag = flag
+
+        def on_any_event(self, event):
+            paths = (event.src_path, getattr(event, "dest_path", None))
+            if self.path in paths:
+                self.flag.set()
+
+
+class FileWatcher:
+    """Reports new content of a task file written by someone else.
+
+    Attributes:
+        path (Path): The watched file.
+        interval_ms (int): Delay between two checks.
+        identity (tuple or None): Size, modification time and inode of the
+            version last examined.
+        digest (bytes or None): Digest of its content.
+        reloads (int): Number of times ``on_change`` was called.
+    """
+
+    def __init__(self, path, after, on_change, interval_ms=1000, load=None):
+        """
+        Args:
+            path (str or Path): Task file to watch.
+            after (callable): ``after(delay_ms, func)`` scheduling function
+                of the GUI's event loop, such as ``Tk.after``.
+            on_change (callable): Called on the event loop's thread with the
+                tree loaded from the file when its content changed.
+            interval_ms (int, optional): Delay between two checks.
+            load (callable, optional): ``load(path, progress)`` reading the
+                file; :py:func:`persistence.load_tasks` by default.
+        """
+        self.path = Path(path)
+        self.after = after
+        self.on_change = on_change
+        self.interval_ms = interval_ms
+        self.load = load if load is not None else persistence.load_tasks
+        self.identity = None
+        self.digest = None
+        self.reloads = 0
+        self._job = None
+        self._running = False
+        self._observer = None
+        self._flag = None
+
+    def start(self):
+        """Take the current file as known and start checking it."""
+        self.identity = file_identity(self.path)
+        self.digest = _file_digest(self.path)
+        self._running = True
+        if Observer is not None:
+            self._flag = threading.Event()
+            self._observer = Observer()
+            self._observer.schedule(
+                _Handler(self.path, self._flag), os.fspath(self.path.parent)
+            )
+            self._observer.daemon = True
+            self._observer.start()
+        self.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        """Stop checking the file."""
+        self._running = False
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def check(self):
+        """Examine the file now if its status changed.
+
+        Returns ``True`` while the file is being examined on a worker
+        thread; :py:meth:`poll_job` finishes that.
+        """
+        if self._job is not None:
+            return self.poll_job()
+        if self._flag is not None:
+            if not self._flag.is_set():
+                return False
+            self._flag.clear()
+        identity = file_identity(self.path)
+        if identity == self.identity or identity is None:
+            return False
+        self._job = BackgroundJob(lambda progress: self._examine(identity, progress))
+        self._job.start()
+        return True
+
+    def poll_job(self):
+        """Finish the examination once its job is done.
+
+        Returns ``True`` while it is still running.
+        """
+        job = self._job
+        if job is None:
+            return False
+        if not job.done:
+            return True
+        self._job = None
+        if job.error is not None:
+            # Half-written by a program that does not replace files
+            # atomically, for instance; the next check tries again
+            return False
+        self.identity, digest, tree = job.result
+        self.digest = digest
+        if tree is not None:
+            self.reloads += 1
+            self.on_change(tree)
+        return False
+
+    def _examine(self, identity, progress):
+        """Return ``(identity, digest, tree)``; ``tree`` is ``None`` unless
+        the content is new."""
+        digest = _file_digest(self.path)
+        if digest == self.digest:
+            return identity, digest, None
+        if persistence.PARSE_CACHE.own_save(self.path):
+            return identity, digest, None
+        return identity, digest, self.load(self.path, progress)
+
+    def _tick(self):
+        if not self._running:
+            return
+        self.check()
+        self.after(self.interval_ms, self._tick)
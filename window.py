@@ -6,41 +6,70 @@ Classes:
 
 Usage:
     This module provides the Window class for managing the main application window of a to-do list.
+
+    The optional ``ttkbootstrap`` and ``tkcalendar`` packages are imported the
+    first time a window or a date entry is created rather than when this
+    module is imported, so that the main window can appear as early as
+    possible.
 """
 
+import collections
+import functools
 import sys
+import threading
 import tkinter as tk
 import tkinter.ttk as _ttk
-ttk = _ttk  # default ttk module
 
-# Try to load ttkbootstrap for optional theming enhancements.  On
-# Python ≥ 3.10 any recent version works.  On Python 3.8/3.9 only the
-# 1.10.x series is compatible; newer releases raise ``TypeError`` when the
-# style class initialises.  If an incompatible or missing version is
-# detected we silently fall back to plain ``ttk``.
+import persistence
+from events import ADDED, REMOVED, MOVED, CHANGED, REORDERED
+from task import Task
+from worker import BackgroundJob
+
+ttk = _ttk  # default ttk module
 
+# Optional theming and calendar support, resolved by ``_load_bootstrap`` and
+# ``_load_calendar`` on first use.
 BootstrapStyle = None
 ttkb = None
-if sys.version_info >= (3, 10):
-    try:
-        from ttkbootstrap import Style as BootstrapStyle
-        import ttkbootstrap as ttkb
-    except Exception:
-        pass
-else:
+USE_BOOTSTRAP = False
+_bootstrap_loaded = False
+_TkCalendar = None
+_date_entry_class = None
+
+from tkinter import messagebox as tkMessageBox
+
+import calendar as _calendar
+import datetime as _datetime
+
+
+def _import_bootstrap():
+    """Return ``(ttkbootstrap, Style)`` or ``(None, None)``.
+
+    On Python ≥ 3.10 any recent version works.  On Python 3.8/3.9 only the
+    1.10.x series is compatible; newer releases raise ``TypeError`` when the
+    style class initialises.  If an incompatible or missing version is
+    detected we silently fall back to plain ``ttk``.
+    """
+    if sys.version_info >= (3, 10):
+        try:
+            from ttkbootstrap import Style as style_cls
+            import ttkbootstrap as module
+        except Exception:
+            return None, None
+        return module, style_cls
     try:
-        import ttkbootstrap as ttkb
-        ver = getattr(ttkb, "__version__", "")
+        import ttkbootstrap as module
+        ver = getattr(module, "__version__", "")
         if not ver or ver.startswith("1.10"):
-            from ttkbootstrap import Style as BootstrapStyle
+            from ttkbootstrap import Style as style_cls
         else:
             raise TypeError("incompatible ttkbootstrap")
     except Exception:
-        ttkb = None
-        BootstrapStyle = None
+        return None, None
+    return module, style_cls
+
 
-if ttkb is not None:
-    ttk = ttkb
+def _patch_style_builder(module):
     # Provide compatibility shims for older versions of ``ttkbootstrap``
     # that do not implement tkcalendar-specific style builders.  The
     # application does not rely on these styles being present, so missing
@@ -48,76 +77,85 @@ if ttkb is not None:
     # ``AttributeError`` during widget creation when tkcalendar attempts to
     # use them.
     try:
-        builder = ttkb.style.StyleBuilderTTK
+        builder = module.style.StyleBuilderTTK
     except Exception:
-        builder = None
-    if builder is not None:
-        def _ignore(self, style, **kw):
-            if hasattr(self, "style"):
-                if hasattr(self.style, "layout"):
-                    try:
-                        base = self.style.layout("Toplevel")
-                    except Exception:
-                        try:
-                            base = self.style.layout("TFrame")
-                        except Exception:
-                            base = ""
+        return
+
+    def _ignore(self, style, **kw):
+        if hasattr(self, "style"):
+            if hasattr(self.style, "layout"):
+                try:
+                    base = self.style.layout("Toplevel")
+                except Exception:
                     try:
-                        self.style.layout(style, base)
+                        base = self.style.layout("TFrame")
                     except Exception:
-                        pass
-                self.style.configure(style, **kw)
-
-        # ``tkcalendar`` expects several ``create_date_*`` methods on the style
-        # builder. Older versions of ``ttkbootstrap`` implemented only a subset
-        # of these.  Patch any that are missing so that applying themed styles
-        # with tkcalendar doesn't fail.
-        missing = []
-        for name in [
-            "create_date_frame_style",
-            "create_date_toplevel_style",
-            "create_date_entry_style",
-            "create_date_label_style",
-        ]:
-            if not hasattr(builder, name):
-                setattr(builder, name, _ignore)
-                missing.append(name)
-
-        if missing:
-            # ``name_to_method`` resolves method names dynamically and will
-            # raise ``AttributeError`` when a method is absent. Wrap it so
-            # unknown style methods fall back to ``_ignore`` instead.
-            orig_name_to_method = builder.name_to_method
-            try:
-                import inspect
-                _takes_self = len(inspect.signature(orig_name_to_method).parameters) > 1
-            except Exception:
-                _takes_self = True
-
-            def _safe_name_to_method(self, name):
+                        base = ""
                 try:
-                    if _takes_self:
-                        return orig_name_to_method(self, name)
-                    else:
-                        return orig_name_to_method(name)
-                except AttributeError:
-                    if name in missing:
-                        return _ignore
-                    raise
-
-            builder.name_to_method = _safe_name_to_method
-
-# Convenience flag used throughout the class to enable ttkbootstrap enhancements
-USE_BOOTSTRAP = BootstrapStyle is not None
-from tkinter import messagebox as tkMessageBox
-
-import calendar as _calendar
-import datetime as _datetime
-
-try:
-    from tkcalendar import DateEntry as _CalendarDateEntry
-    from tkcalendar.calendar_ import Calendar as _TkCalendar
+                    self.style.layout(style, base)
+                except Exception:
+                    pass
+            self.style.configure(style, **kw)
+
+    # ``tkcalendar`` expects several ``create_date_*`` methods on the style
+    # builder. Older versions of ``ttkbootstrap`` implemented only a subset
+    # of these.  Patch any that are missing so that applying themed styles
+    # with tkcalendar doesn't fail.
+    missing = []
+    for name in [
+        "create_date_frame_style",
+        "create_date_toplevel_style",
+        "create_date_entry_style",
+        "create_date_label_style",
+    ]:
+        if not hasattr(builder, name):
+            setattr(builder, name, _ignore)
+            missing.append(name)
+
+    if missing:
+        # ``name_to_method`` resolves method names dynamically and will
+        # raise ``AttributeError`` when a method is absent. Wrap it so
+        # unknown style methods fall back to ``_ignore`` instead.
+        orig_name_to_method = builder.name_to_method
+        try:
+            import inspect
+            _takes_self = len(inspect.signature(orig_name_to_method).parameters) > 1
+        except Exception:
+            _takes_self = True
 
+        def _safe_name_to_method(self, name):
+            try:
+                if _takes_self:
+                    return orig_name_to_method(self, name)
+                else:
+                    return orig_name_to_method(name)
+            except AttributeError:
+                if name in missing:
+                    return _ignore
+                raise
+
+        builder.name_to_method = _safe_name_to_method
+
+
+def _load_bootstrap():
+    """Import ``ttkbootstrap`` on first use and switch ``ttk`` over to it."""
+    global BootstrapStyle, ttkb, ttk, USE_BOOTSTRAP, _bootstrap_loaded
+    if not _bootstrap_loaded:
+        _bootstrap_loaded = True
+        ttkb, BootstrapStyle = _import_bootstrap()
+        if ttkb is not None:
+            _patch_style_builder(ttkb)
+        # Convenience flag used throughout the class to enable ttkbootstrap
+        # enhancements
+        USE_BOOTSTRAP = BootstrapStyle is not None
+    # Only replace the default module; a substituted ``ttk`` is left alone.
+    if ttkb is not None and ttk is _ttk:
+        ttk = ttkb
+    if not hasattr(ttk, "Listbox"):
+        ttk.Listbox = tk.Listbox
+
+
+def _patch_calendar(calendar_cls):
     # Work around a bug triggered when tkcalendar is used together with
     # ``ttkbootstrap``.  ``ttkbootstrap`` applies widget configuration very
     # early during ``Calendar`` initialisation which may happen before the
@@ -125,124 +163,129 @@ try:
     # attribute too early raises ``AttributeError``.  Ensure the attribute is
     # present before the original ``__init__`` runs so the configure call
     # succeeds.
-    if _TkCalendar is not None and not hasattr(_TkCalendar, "_bootstrap_patch"):
-        _orig_init = _TkCalendar.__init__
-        _orig_setitem = _TkCalendar.__setitem__
+    if calendar_cls is None or hasattr(calendar_cls, "_bootstrap_patch"):
+        return
+    _orig_init = calendar_cls.__init__
+    _orig_setitem = calendar_cls.__setitem__
 
-        def _patched_init(self, *args, **kwargs):
-            if not hasattr(self, "_properties"):
-                self._properties = {}
-            _orig_init(self, *args, **kwargs)
+    def _patched_init(self, *args, **kwargs):
+        if not hasattr(self, "_properties"):
+            self._properties = {}
+        _orig_init(self, *args, **kwargs)
 
-        def _patched_setitem(self, key, value):
-            try:
-                _orig_setitem(self, key, value)
-            except AttributeError:
-                if key == "style":
-                    self._properties[key] = value
-                else:
-                    raise
-
-        _TkCalendar.__init__ = _patched_init
-        _TkCalendar.__setitem__ = _patched_setitem
-        _TkCalendar._bootstrap_patch = True
-except ModuleNotFoundError:  # Fallback when tkcalendar is unavailable
-
-    class _SimpleCalendar(ttk.Frame):
-        """Very small calendar widget with month navigation."""
-
-        def __init__(self, master, variable, close_cb):
-            super().__init__(master)
-            self._var = variable
-            self._close_cb = close_cb
-            today = _datetime.date.today()
-            self._year = today.year
-            self._month = today.month
-
-            # Header with navigation
-            header = ttk.Frame(self)
-            header.grid(row=0, column=0, columnspan=7)
-            ttk.Button(header, text="<", command=self._prev_month).grid(row=0, column=0)
-            self._title = ttk.Label(header)
-            self._title.grid(row=0, column=1, columnspan=5)
-            ttk.Button(header, text=">", command=self._next_month).grid(row=0, column=6)
-
-            self._days = ttk.Frame(self)
-            self._days.grid(row=1, column=0, columnspan=7)
-            self._build_days()
-
-        def _build_days(self):
-            for w in self._days.winfo_children():
-                w.destroy()
-
-            self._title.config(text=f"{_calendar.month_name[self._month]} {self._year}")
-            for i, name in enumerate(["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]):
-                ttk.Label(self._days, text=name).grid(row=0, column=i)
-
-            cal = _calendar.Calendar()
-            row = 1
-            for week in cal.monthdayscalendar(self._year, self._month):
-                for col, day in enumerate(week):
-                    if day == 0:
-                        ttk.Label(self._days, text="").grid(row=row, column=col)
-                    else:
-                        btn = ttk.Button(
-                            self._days,
-                            text=str(day),
-                            width=2,
-                            command=lambda d=day: self._select_day(d),
-                        )
-                        btn.grid(row=row, column=col)
-                row += 1
-
-        def _select_day(self, day):
-            self._var.set(f"{self._year:04d}-{self._month:02d}-{day:02d}")
-            self._close_cb()
-
-        def _prev_month(self):
-            if self._month == 1:
-                self._month = 12
-                self._year -= 1
+    def _patched_setitem(self, key, value):
+        try:
+            _orig_setitem(self, key, value)
+        except AttributeError:
+            if key == "style":
+                self._properties[key] = value
             else:
-                self._month -= 1
-            self._build_days()
+                raise
+
+    calendar_cls.__init__ = _patched_init
+    calendar_cls.__setitem__ = _patched_setitem
+    calendar_cls._bootstrap_patch = True
+
+
+class _SimpleCalendar(_ttk.Frame):
+    """Very small calendar widget with month navigation."""
+
+    def __init__(self, master, variable, close_cb):
+        super().__init__(master)
+        self._var = variable
+        self._close_cb = close_cb
+        today = _datetime.date.today()
+        self._year = today.year
+        self._month = today.month
+
+        # Header with navigation
+        header = ttk.Frame(self)
+        header.grid(row=0, column=0, columnspan=7)
+        ttk.Button(header, text="<", command=self._prev_month).grid(row=0, column=0)
+        self._title = ttk.Label(header)
+        self._title.grid(row=0, column=1, columnspan=5)
+        ttk.Button(header, text=">", command=self._next_month).grid(row=0, column=6)
+
+        self._days = ttk.Frame(self)
+        self._days.grid(row=1, column=0, columnspan=7)
+        self._build_days()
+
+    def _build_days(self):
+        for w in self._days.winfo_children():
+            w.destroy()
+
+        self._title.config(text=f"{_calendar.month_name[self._month]} {self._year}")
+        for i, name in enumerate(["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]):
+            ttk.Label(self._days, text=name).grid(row=0, column=i)
+
+        cal = _calendar.Calendar()
+        row = 1
+        for week in cal.monthdayscalendar(self._year, self._month):
+            for col, day in enumerate(week):
+                if day == 0:
+                    ttk.Label(self._days, text="").grid(row=row, column=col)
+                else:
+                    btn = ttk.Button(
+                        self._days,
+                        text=str(day),
+                        width=2,
+                        command=lambda d=day: self._select_day(d),
+                    )
+                    btn.grid(row=row, column=col)
+            row += 1
+
+    def _select_day(self, day):
+        self._var.set(f"{self._year:04d}-{self._month:02d}-{day:02d}")
+        self._close_cb()
+
+    def _prev_month(self):
+        if self._month == 1:
+            self._month = 12
+            self._year -= 1
+        else:
+            self._month -= 1
+        self._build_days()
 
-        def _next_month(self):
-            if self._month == 12:
-                self._month = 1
-                self._year += 1
-            else:
-                self._month += 1
-            self._build_days()
+    def _next_month(self):
+        if self._month == 12:
+            self._month = 1
+            self._year += 1
+        else:
+            self._month += 1
+        self._build_days()
 
-    class DateEntry(ttk.Entry):
-        """Fallback DateEntry showing a popup calendar."""
 
-        def __init__(self, master=None, textvariable=None, **kwargs):
-            self._var = textvariable or tk.StringVar()
-            super().__init__(master, textvariable=self._var, **kwargs)
+class _SimpleDateEntry(_ttk.Entry):
+    """Fallback DateEntry showing a popup calendar."""
+
+    def __init__(self, master=None, textvariable=None, **kwargs):
+        self._var = textvariable or tk.StringVar()
+        super().__init__(master, textvariable=self._var, **kwargs)
+        self._popup = None
+        self.bind("<Button-1>", self._open_popup)
+
+    def _open_popup(self, event=None):
+        if self._popup:
+            return
+        self._popup = tk.Toplevel(self)
+        self._popup.transient(self)
+        self._popup.protocol("WM_DELETE_WINDOW", self._close_popup)
+        cal = _SimpleCalendar(self._popup, self._var, self._close_popup)
+        cal.pack()
+        x = self.winfo_rootx()
+        y = self.winfo_rooty() + self.winfo_height()
+        self._popup.geometry(f"+{x}+{y}")
+
+    def _close_popup(self):
+        if self._popup is not None:
+            self._popup.destroy()
             self._popup = None
-            self.bind("<Button-1>", self._open_popup)
 
-        def _open_popup(self, event=None):
-            if self._popup:
-                return
-            self._popup = tk.Toplevel(self)
-            self._popup.transient(self)
-            self._popup.protocol("WM_DELETE_WINDOW", self._close_popup)
-            cal = _SimpleCalendar(self._popup, self._var, self._close_popup)
-            cal.pack()
-            x = self.winfo_rootx()
-            y = self.winfo_rooty() + self.winfo_height()
-            self._popup.geometry(f"+{x}+{y}")
-
-        def _close_popup(self):
-            if self._popup is not None:
-                self._popup.destroy()
-                self._popup = None
-
-else:
-    class DateEntry(_CalendarDateEntry):
+
+def _wrap_date_entry(base):
+    """Return a subclass of tkcalendar's ``DateEntry`` safe to use with themes."""
+
+    class SafeDateEntry(base):
         """Safe DateEntry wrapper to handle early style configuration."""
 
         def __init__(self, *args, **kwargs):
@@ -251,22 +294,22 @@ else:
                 style.layout("Date.Toplevel")
             except tk.TclError:
                 try:
-                    base = style.layout("Toplevel")
+                    base_layout = style.layout("Toplevel")
                 except tk.TclError:
                     try:
-                        base = style.layout("TFrame")
+                        base_layout = style.layout("TFrame")
                     except tk.TclError:
-                        base = ""
+                        base_layout = ""
                 try:
-                    style.layout("Date.Toplevel", base)
+                    style.layout("Date.Toplevel", base_layout)
                 except tk.TclError:
                     pass
 
-            _CalendarDateEntry.__init__(self, *args, **kwargs)
+            base.__init__(self, *args, **kwargs)
 
         def configure(self, *args, **kwargs):
             try:
-                return _CalendarDateEntry.configure(self, *args, **kwargs)
+                return base.configure(self, *args, **kwargs)
             except AttributeError:
                 # ``tkcalendar`` may call ``configure`` before ``_calendar`` is
                 # initialized when using themed widgets like ``ttkbootstrap``.
@@ -274,11 +317,37 @@ else:
 
         config = configure
 
+    return SafeDateEntry
 
-if not hasattr(ttk, "Listbox"):
-    ttk.Listbox = tk.Listbox
-from task import Task
-from controller import TaskController
+
+def _load_calendar():
+    """Import ``tkcalendar`` on first use and return the date entry class.
+
+    Falls back to a small built-in popup calendar when tkcalendar is not
+    installed.
+    """
+    global _TkCalendar, _date_entry_class
+    if _date_entry_class is None:
+        _load_bootstrap()
+        try:
+            from tkcalendar import DateEntry as _CalendarDateEntry
+            from tkcalendar.calendar_ import Calendar as _TkCalendar
+        except ModuleNotFoundError:
+            _date_entry_class = _SimpleDateEntry
+        else:
+            _patch_calendar(_TkCalendar)
+            _date_entry_class = _wrap_date_entry(_CalendarDateEntry)
+    return _date_entry_class
+
+
+def DateEntry(master=None, **kwargs):
+    """Create a date entry, importing ``tkcalendar`` on first use."""
+    return _load_calendar()(master, **kwargs)
+
+
+# Number of rows added to or removed from one list by a batch of change
+# events above which the list is rebuilt instead
+_BULK_EVENTS = 32
 
 
 class Window:
@@ -300,6 +369,7 @@ class Window:
         edit_task: Displays a dialog to edit the selected task.
         confirm_edit: Confirms the edit of a task and updates the tree view.
         refresh_window: Refreshes the tree view displaying the tasks.
+        detach: Stops listening to change events of the controller.
     """
 
     def __init__(self, root, controller, parent_window=None):
@@ -309,8 +379,14 @@ class Window:
         Args:
             root: The root tkinter window.
             controller: The task controller managing the tasks.
+            parent_window (Window, optional): Window this one was opened from.
+                The controller joins the parent's event bus so that changes
+                made in either window show up in both.
         """
+        _load_bootstrap()
         self.root = root
+        if parent_window is not None:
+            controller.join(parent_window.controller)
         self.task_list = controller.get_sub_tasks()
         self.controller = controller
         # Expose current save path for convenience
@@ -318,6 +394,12 @@ class Window:
         self.parent_window = parent_window
         self.child_windows = []
         self.name = controller.get_task_name()
+        # Change events received from the bus, applied once the GUI is idle
+        self._pending_events = []
+        self._flush_scheduled = False
+        self._detached = False
+        # Windows are created on the Tk thread, the only one using Tk
+        self._tk_thread = threading.get_ident()
 
         # Determine which theme to apply.  If a parent window exists, re-use its
         # current theme so that all windows share consistent styling.
@@ -373,12 +455,13 @@ class Window:
         if hasattr(tk, "Menu") and hasattr(self.root, "config"):
             menubar = tk.Menu(self.root)
             file_menu = tk.Menu(menubar, tearoff=0)
-            file_menu.add_command(label="Export to JSON", command=self.export_tasks)
-            file_menu.add_command(label="Export to CSV", command=self.export_tasks_csv)
-            file_menu.add_command(label="Export to ICS", command=self.export_tasks_ics)
-            file_menu.add_command(label="Import from JSON", command=self.import_tasks_json)
-            file_menu.add_command(label="Import from CSV", command=self.import_tasks_csv)
-            file_menu.add_command(label="Import from ICS", command=self.import_tasks_ics)
+            for codec in persistence.registered_codecs():
+                file_menu.add_command(
+                    label=f"Export to {codec.label}",
+                    command=functools.partial(self.export_tasks_as, codec.name),
+                )
+            file_menu.add_command(label="Import...", command=self.import_tasks)
+            file_menu.add_command(label="Merge Import...", command=self.merge_import)
             menubar.add_cascade(label="File", menu=file_menu)
 
             edit_menu = tk.Menu(menubar, tearoff=0)
@@ -452,6 +535,11 @@ class Window:
         self.tree = ttk.Treeview(self.main_frame, show="tree")
         self.tree.grid(row=2, column=0, columnspan=3, sticky="nsew", pady=5)
         self.tree_items = {}
+        # Reverse mapping of ``tree_items`` used by incremental updates
+        self._task_iids = {}
+        # Rows whose sub-tasks are not loaded yet, mapped to the placeholder
+        # row that makes them expandable
+        self._lazy_rows = {}
 
         self.scrollbar = ttk.Scrollbar(
             self.main_frame, orient="vertical", command=self.tree.yview
@@ -482,6 +570,8 @@ class Window:
         # Enable drag and drop reordering
         self.tree.bind("<ButtonPress-1>", self._start_drag)
         self.tree.bind("<ButtonRelease-1>", self._end_drag)
+        # Insert the rows of deferred sub-tasks when their parent is expanded
+        self.tree.bind("<<TreeviewOpen>>", self._on_tree_open)
 
         btn_opts = {"bootstyle": "secondary"} if USE_BOOTSTRAP else {}
         view_subtasks_btn = ttk.Button(
@@ -596,6 +686,7 @@ class Window:
         ).grid(row=6, column=3, sticky="w")
 
         self.root.resizable(True, True)
+        self.controller.bus.subscribe(self._on_task_event)
         self.refresh_window()
 
     def view_subtasks(self):
@@ -609,7 +700,7 @@ class Window:
             return
 
         r = tk.Toplevel(self.root)
-        sub = Window(r, TaskController(task), parent_window=self)
+        sub = Window(r, self.controller.spawn(task), parent_window=self)
         self.child_windows.append(sub)
 
         def _close():
@@ -617,11 +708,23 @@ class Window:
                 self.child_windows.remove(sub)
             except ValueError:
                 pass
+            sub.detach()
             r.destroy()
 
         if hasattr(r, "protocol"):
             r.protocol("WM_DELETE_WINDOW", _close)
 
+    def detach(self):
+        """Stop receiving change events, e.g. when the window is closed."""
+        self._detached = True
+        self.controller.bus.unsubscribe(self._on_task_event)
+
+    def _controller_for(self, parent):
+        """Return a controller managing ``parent`` (``None`` for the window's task)."""
+        if parent is None:
+            return self.controller
+        return self.controller.spawn(parent)
+
     def delete_task(self):
         """Delete the selected task from the controller."""
         sel = self.tree.selection()
@@ -633,14 +736,8 @@ class Window:
         if task is None:
             return
 
-        if parent is None:
-            idx = self.controller.get_sub_tasks().index(task)
-            self.controller.delete_task(idx)
-        else:
-            parent.remove_sub_task(task)
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
+        controller = self._controller_for(parent)
+        controller.delete_task(controller.get_sub_tasks().index(task))
 
     def add_task(self):
         """Displays a dialog to add a new task using a Toplevel window."""
@@ -735,9 +832,6 @@ class Window:
         if completed:
             idx = len(self.controller.get_sub_tasks()) - 1
             self.controller.mark_task_completed(idx)
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
 
     def edit_task(self):
         """Display a dialog to edit the selected task."""
@@ -836,41 +930,30 @@ class Window:
         if dialog is not None:
             dialog.destroy()
 
-        task, _parent = self.tree_items.get(selected_item, (None, None))
+        task, parent = self.tree_items.get(selected_item, (None, None))
         if task is None:
             return
 
-        task.name = new_name
-        task.set_due_date(new_due or None)
-        task.set_priority(new_priority)
-        if completed:
-            task.mark_completed()
-        else:
-            task.mark_incomplete()
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
+        controller = self._controller_for(parent)
+        controller.update_task(
+            controller.get_sub_tasks().index(task),
+            name=new_name,
+            due_date=new_due or None,
+            priority=new_priority,
+            completed=completed,
+        )
 
     def sort_tasks_by_priority(self):
         """Sort tasks by priority using the controller and refresh the view."""
         self.controller.sort_tasks_by_priority()
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
 
     def sort_tasks_by_due_date(self):
         """Sort tasks by due date using the controller and refresh the view."""
         self.controller.sort_tasks_by_due_date()
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
 
     def sort_tasks_by_name(self):
         """Sort tasks alphabetically using the controller and refresh the view."""
         self.controller.sort_tasks_by_name()
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
 
     def move_selected_up(self):
         """Move the selected task up in the list."""
@@ -881,21 +964,11 @@ class Window:
         task, parent = self.tree_items.get(item, (None, None))
         if task is None:
             return
-        if parent is None:
-            lst = self.controller.get_sub_tasks()
-            idx = lst.index(task)
-            if idx == 0:
-                return
-            self.controller.move_task(idx, idx - 1)
-        else:
-            lst = parent.get_sub_tasks()
-            idx = lst.index(task)
-            if idx == 0:
-                return
-            lst.insert(idx - 1, lst.pop(idx))
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
+        controller = self._controller_for(parent)
+        idx = controller.get_sub_tasks().index(task)
+        if idx == 0:
+            return
+        controller.move_task(idx, idx - 1)
 
     def move_selected_down(self):
         """Move the selected task down in the list."""
@@ -906,21 +979,12 @@ class Window:
         task, parent = self.tree_items.get(item, (None, None))
         if task is None:
             return
-        if parent is None:
-            lst = self.controller.get_sub_tasks()
-            idx = lst.index(task)
-            if idx >= len(lst) - 1:
-                return
-            self.controller.move_task(idx, idx + 1)
-        else:
-            lst = parent.get_sub_tasks()
-            idx = lst.index(task)
-            if idx >= len(lst) - 1:
-                return
-            lst.insert(idx + 1, lst.pop(idx))
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
+        controller = self._controller_for(parent)
+        lst = controller.get_sub_tasks()
+        idx = lst.index(task)
+        if idx >= len(lst) - 1:
+            return
+        controller.move_task(idx, idx + 1)
 
     def toggle_completion(self):
         """Toggle the completion state of the selected task."""
@@ -933,22 +997,12 @@ class Window:
         if task is None:
             return
 
-        if parent is None:
-            idx = self.controller.get_sub_tasks().index(task)
-            if task.completed:
-                self.controller.mark_task_incomplete(idx)
-            else:
-                self.controller.mark_task_completed(idx)
+        controller = self._controller_for(parent)
+        idx = controller.get_sub_tasks().index(task)
+        if task.completed:
+            controller.mark_task_incomplete(idx)
         else:
-            task.completed = not task.completed
-            try:
-                self.controller._auto_save()
-            except Exception:
-                pass
-
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
+            controller.mark_task_completed(idx)
 
     def move_selected_task(self, offset):
         """Move the selected task up or down by ``offset`` positions."""
@@ -961,25 +1015,13 @@ class Window:
         if task is None:
             return
 
-        if parent is None:
-            lst = self.controller.get_sub_tasks()
-            idx = lst.index(task)
-            new_idx = idx + offset
-            if new_idx < 0 or new_idx >= len(lst):
-                return
-            self.controller.move_task(idx, new_idx)
-        else:
-            lst = parent.get_sub_tasks()
-            idx = lst.index(task)
-            new_idx = idx + offset
-            if new_idx < 0 or new_idx >= len(lst):
-                return
-            lst.pop(idx)
-            lst.insert(new_idx, task)
-
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
+        controller = self._controller_for(parent)
+        lst = controller.get_sub_tasks()
+        idx = lst.index(task)
+        new_idx = idx + offset
+        if new_idx < 0 or new_idx >= len(lst):
+            return
+        controller.move_task(idx, new_idx)
 
     # --- Drag and Drop -------------------------------------------------
 
@@ -1008,27 +1050,13 @@ class Window:
         if src_task is None or dst_task is None or src_parent is not dst_parent:
             return
 
-        if src_parent is None:
-            lst = self.controller.get_sub_tasks()
-            src_idx = lst.index(src_task)
-            dst_idx = lst.index(dst_task)
-            if src_idx == dst_idx:
-                return
-            self.controller.move_task(src_idx, dst_idx)
-        else:
-            lst = src_parent.get_sub_tasks()
-            src_idx = lst.index(src_task)
-            dst_idx = lst.index(dst_task)
-            if src_idx == dst_idx:
-                return
-            lst.pop(src_idx)
-            if src_idx < dst_idx:
-                dst_idx -= 1
-            lst.insert(dst_idx, src_task)
-
-        self.refresh_window()
-        if self.parent_window is not None:
-            self.parent_window.refresh_window()
+        controller = self._controller_for(src_parent)
+        lst = controller.get_sub_tasks()
+        src_idx = lst.index(src_task)
+        dst_idx = lst.index(dst_task)
+        if src_idx == dst_idx:
+            return
+        controller.move_task(src_idx, dst_idx)
 
     def _show_tree_menu(self, event):
         """Display the context menu at the pointer position."""
@@ -1047,127 +1075,196 @@ class Window:
     # --- Undo/Redo ------------------------------------------------------
 
     def undo(self):
-        """Undo the last action via the controller and refresh."""
-        try:
-            self.controller.undo()
-        finally:
-            self.refresh_window()
-            if self.parent_window is not None:
-                self.parent_window.refresh_window()
+        """Undo the last action via the controller."""
+        self.controller.undo()
 
     def redo(self):
-        """Redo the last undone action via the controller and refresh."""
-        try:
-            self.controller.redo()
-        finally:
-            self.refresh_window()
-            if self.parent_window is not None:
-                self.parent_window.refresh_window()
+        """Redo the last undone action via the controller."""
+        self.controller.redo()
 
-    def export_tasks(self):
-        """Prompt for a path and export tasks as JSON."""
+    # --- Import/Export --------------------------------------------------
+
+    def _filedialog(self):
         if not hasattr(tk, "filedialog"):
             from tkinter import filedialog
         else:
             filedialog = tk.filedialog
-        path = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+        return filedialog
+
+    def _run_in_background(self, title, func, on_success=None):
+        """Run ``func(progress)`` on a worker thread behind a progress dialog.
+
+        ``on_success`` is called with the result on the Tk thread once the job
+        completed.  Without an event loop (``root.after`` is unavailable) the
+        job runs synchronously.
+        """
+        job = BackgroundJob(func)
+        if not hasattr(self.root, "after"):
+            job.run()
+            self._finish_job(job, on_success)
+            return job
+        dialog = self._open_progress_dialog(title, job)
+        job.start()
+        self._poll_job(job, dialog, on_success)
+        return job
+
+    def _open_progress_dialog(self, title, job):
+        """Create a modal dialog with a progress bar and a Cancel button."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(title)
+        dialog.status_var = tk.StringVar()
+        dialog.status_var.set(title)
+        ttk.Label(dialog, textvariable=dialog.status_var).grid(
+            row=0, column=0, padx=10, pady=5
         )
-        if path:
-            from persistence import save_tasks_to_json
+        dialog.bar = ttk.Progressbar(dialog, length=250, maximum=100)
+        dialog.bar.grid(row=1, column=0, padx=10, pady=5)
+        ttk.Button(dialog, text="Cancel", command=job.cancel).grid(
+            row=2, column=0, pady=5
+        )
+        dialog.protocol("WM_DELETE_WINDOW", job.cancel)
+        try:
+            # Keep the tree unchanged while the worker reads it
+            dialog.transient(self.root)
+            dialog.grab_set()
+        except Exception:
+            pass
+        return dialog
 
-            save_tasks_to_json(self.controller.task, path)
+    def _poll_job(self, job, dialog, on_success):
+        """Update ``dialog`` until ``job`` finished, then hand over its result."""
+        if not job.done:
+            progress = job.progress
+            try:
+                fraction = progress.fraction
+                if fraction is None:
+                    dialog.bar.configure(mode="indeterminate")
+                    dialog.bar.step(5)
+                else:
+                    dialog.bar.configure(mode="determinate", value=fraction * 100)
+                dialog.status_var.set(f"{progress.done:,} {progress.unit} processed")
+            except Exception:
+                pass
+            self.root.after(100, lambda: self._poll_job(job, dialog, on_success))
+            return
+        try:
+            dialog.destroy()
+        except Exception:
+            pass
+        self._finish_job(job, on_success)
 
-    def export_tasks_csv(self):
-        """Prompt for a path and export tasks as CSV."""
-        if not hasattr(tk, "filedialog"):
-            from tkinter import filedialog
+    def _finish_job(self, job, on_success):
+        if job.cancelled:
+            return
+        if job.error is not None:
+            try:
+                tkMessageBox.showwarning("Error", str(job.error))
+            except Exception:
+                pass
+            return
+        if on_success is not None:
+            on_success(job.result)
+
+    def _export(self, codec, **options):
+        """Prompt for a path and write the tasks with ``codec`` in the background.
+
+        ``options`` are passed on to :py:meth:`persistence.Codec.save`.
+        """
+        path = self._filedialog().asksaveasfilename(
+            defaultextension=codec.suffixes[0], filetypes=codec.filetypes()
+        )
+        if not path:
+            return None
+        controller = self.controller
+        task = controller.task
+        if "since" in codec.save_options:
+            # Formats referring to tasks by uid
+            controller.assign_uids()
+
+        def export(progress):
+            # Edits on the Tk thread only wait for the copy, not the save
+            with controller.reading():
+                copy = persistence.copy_tasks(task)
+            return codec.save(copy, path, progress=progress, **options)
+
+        return self._run_in_background(f"Exporting {path}", export)
+
+    def _import(self, codec=None, merge=False):
+        """Prompt for a file and replace the current tasks with its content.
+
+        Without ``codec`` the format is recognised from the file (see
+        :py:func:`persistence.load_tasks`).  The file is parsed in the
+        background; the tree is swapped in on the Tk thread once parsing
+        completed, or merged into the current one if ``merge`` is set.
+        """
+        if codec is None:
+            filetypes = [
+                (f"{c.label} files", " ".join("*" + x for x in c.suffixes))
+                for c in persistence.registered_codecs()
+            ]
+            filetypes.append(("All files", "*.*"))
+            load = persistence.load_tasks
         else:
-            filedialog = tk.filedialog
-        path = filedialog.asksaveasfilename(
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            filetypes = codec.filetypes()
+            load = codec.load
+        path = self._filedialog().askopenfilename(filetypes=filetypes)
+        if not path:
+            return None
+        return self._run_in_background(
+            f"Importing {path}",
+            lambda progress: load(path, progress=progress),
+            self.controller.merge_tasks if merge else self._replace_tasks,
         )
-        if path:
-            from persistence import save_tasks_to_csv
 
-            save_tasks_to_csv(self.controller.task, path)
+    def _replace_tasks(self, task):
+        self.controller.replace_task(task)
+        self.task_list = task.get_sub_tasks()
+        self.name = task.name
+        self.refresh_window()
+
+    def export_tasks_as(self, name):
+        """Prompt for a path and export tasks with the codec named ``name``.
+
+        JSON exports are indented to be read by people.
+        """
+        codec = persistence.get_codec(name)
+        return self._export(codec, indent=2)
+
+    def export_tasks(self):
+        """Prompt for a path and export tasks as indented JSON."""
+        return self.export_tasks_as("json")
+
+    def export_tasks_csv(self):
+        """Prompt for a path and export tasks as CSV."""
+        return self.export_tasks_as("csv")
 
     def export_tasks_ics(self):
         """Prompt for a path and export tasks in ICS format."""
-        if not hasattr(tk, "filedialog"):
-            from tkinter import filedialog
-        else:
-            filedialog = tk.filedialog
-        path = filedialog.asksaveasfilename(
-            defaultextension=".ics",
-            filetypes=[("iCalendar files", "*.ics"), ("All files", "*.*")],
-        )
-        if path:
-            from persistence import save_tasks_to_ics
+        return self.export_tasks_as("ics")
 
-            save_tasks_to_ics(self.controller.task, path)
+    def import_tasks(self):
+        """Prompt for a task file in any registered format and replace current tasks."""
+        return self._import()
+
+    def merge_import(self):
+        """Prompt for a task file and merge it into the current tasks.
+
+        Imported tasks matching existing ones update them, others are
+        added; the merge is undone in one step.
+        """
+        return self._import(merge=True)
 
     def import_tasks_json(self):
         """Prompt for a JSON file and replace current tasks."""
-        if not hasattr(tk, "filedialog"):
-            from tkinter import filedialog
-        else:
-            filedialog = tk.filedialog
-        path = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-        )
-        if path:
-            from persistence import load_tasks_from_json
-
-            task = load_tasks_from_json(path)
-            self.controller.task = task
-            self.task_list = task.get_sub_tasks()
-            self.name = task.name
-            self.refresh_window()
-            if self.parent_window is not None:
-                self.parent_window.refresh_window()
+        return self._import(persistence.get_codec("json"))
 
     def import_tasks_csv(self):
         """Prompt for a CSV file and replace current tasks."""
-        if not hasattr(tk, "filedialog"):
-            from tkinter import filedialog
-        else:
-            filedialog = tk.filedialog
-        path = filedialog.askopenfilename(
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
-        )
-        if path:
-            from persistence import load_tasks_from_csv
-
-            task = load_tasks_from_csv(path)
-            self.controller.task = task
-            self.task_list = task.get_sub_tasks()
-            self.name = task.name
-            self.refresh_window()
-            if self.parent_window is not None:
-                self.parent_window.refresh_window()
+        return self._import(persistence.get_codec("csv"))
 
     def import_tasks_ics(self):
         """Prompt for an ICS file and replace current tasks."""
-        if not hasattr(tk, "filedialog"):
-            from tkinter import filedialog
-        else:
-            filedialog = tk.filedialog
-        path = filedialog.askopenfilename(
-            filetypes=[("iCalendar files", "*.ics"), ("All files", "*.*")]
-        )
-        if path:
-            from persistence import load_tasks_from_ics
-
-            task = load_tasks_from_ics(path)
-            self.controller.task = task
-            self.task_list = task.get_sub_tasks()
-            self.name = task.name
-            self.refresh_window()
-            if self.parent_window is not None:
-                self.parent_window.refresh_window()
+        return self._import(persistence.get_codec("ics"))
 
     def _task_visible(
         self,
@@ -1186,48 +1283,17 @@ class Window:
         if not isinstance(task, Task):
             return False
 
-        if show_completed_only and not task.completed:
-            return False
-
-        if hide_completed and task.completed:
-            return False
-
-        if search_term and search_term not in task.name.lower():
-            return False
-
-        if due_value and (before or after):
-            try:
-                fdate = _datetime.date.fromisoformat(due_value)
-            except ValueError:
-                # Invalid user input - skip due date filtering entirely
-                return True
-
-            try:
-                tdate = (
-                    _datetime.date.fromisoformat(str(task.due_date))
-                    if getattr(task, "due_date", None)
-                    else None
-                )
-            except ValueError:
-                tdate = None
-            if before and (tdate is None or tdate >= fdate):
-                return False
-            if after and (tdate is None or tdate <= fdate):
-                return False
-
-        if prio_value and (above or below):
-            try:
-                threshold = int(prio_value)
-            except ValueError:
-                threshold = None
-            if threshold is not None:
-                pval = getattr(task, "priority", None)
-                if above and (pval is None or pval <= threshold):
-                    return False
-                if below and (pval is None or pval >= threshold):
-                    return False
-
-        return True
+        return task.matches(
+            search_term=search_term,
+            hide_completed=hide_completed,
+            show_completed_only=show_completed_only,
+            due_value=due_value,
+            before=before,
+            after=after,
+            prio_value=prio_value,
+            above=above,
+            below=below,
+        )
 
     def _format_task(self, task):
         """Return display text and color for ``task``."""
@@ -1273,8 +1339,13 @@ class Window:
         prio_value="",
         above=False,
         below=False,
+        position=None,
     ):
-        """Insert ``task`` and its subtasks into the tree if visible."""
+        """Insert ``task`` and its subtasks into the tree if visible.
+
+        ``position`` is the index among the children of ``parent_id``; the
+        task is appended when it is ``None``.
+        """
         if not self._task_visible(
             task,
             search_term=search_term,
@@ -1291,8 +1362,19 @@ class Window:
 
         display, color = self._format_task(task)
         self.tree.tag_configure(color, foreground=color)
-        iid = self.tree.insert(parent_id, tk.END, text=display, tags=(color,))
+        iid = self.tree.insert(
+            parent_id,
+            tk.END if position is None else position,
+            text=display,
+            tags=(color,),
+        )
         self.tree_items[iid] = (task, parent_task)
+        self._task_iids[task] = iid
+
+        if not task.sub_tasks_loaded:
+            # Loading the sub-tasks is deferred until the row is expanded
+            self._lazy_rows[iid] = self.tree.insert(iid, tk.END, text="…")
+            return
 
         for sub in task.get_sub_tasks():
             self._insert_task(
@@ -1310,97 +1392,285 @@ class Window:
                 below,
             )
 
-    def refresh_window(self):
-        """Refresh the Treeview displaying the tasks."""
-        # Capture which tasks are currently expanded so we can restore the
-        # state after rebuilding the tree.  Also remember the currently
-        # selected task, if any.
+    def _on_tree_open(self, event=None):
+        self._expand_lazy_row(self.tree.focus())
+
+    def _expand_lazy_row(self, iid):
+        """Replace the placeholder of ``iid`` with rows for its sub-tasks."""
+        placeholder = self._lazy_rows.pop(iid, None)
+        if placeholder is None:
+            return
+        self.tree.delete(placeholder)
+        task = self.tree_items[iid][0]
+        options = self._filter_options()
+        for sub in task.get_sub_tasks():
+            self._insert_task(sub, iid, task, **options)
+
+    def _filter_options(self):
+        """Return the current filter settings as keyword arguments."""
+        return {
+            "search_term": (
+                self.search_var.get().lower().strip()
+                if hasattr(self, "search_var")
+                else ""
+            ),
+            "hide_completed": (
+                bool(self.hide_completed_var.get())
+                if hasattr(self, "hide_completed_var")
+                else False
+            ),
+            "show_completed_only": (
+                bool(self.show_completed_only_var.get())
+                if hasattr(self, "show_completed_only_var")
+                else False
+            ),
+            "due_value": (
+                self.due_filter_var.get().strip()
+                if hasattr(self, "due_filter_var")
+                else ""
+            ),
+            "before": (
+                bool(self.due_before_var.get())
+                if hasattr(self, "due_before_var")
+                else False
+            ),
+            "after": (
+                bool(self.due_after_var.get())
+                if hasattr(self, "due_after_var")
+                else False
+            ),
+            "prio_value": (
+                self.priority_filter_var.get().strip()
+                if hasattr(self, "priority_filter_var")
+                else ""
+            ),
+            "above": (
+                bool(self.priority_above_var.get())
+                if hasattr(self, "priority_above_var")
+                else False
+            ),
+            "below": (
+                bool(self.priority_below_var.get())
+                if hasattr(self, "priority_below_var")
+                else False
+            ),
+        }
+
+    def _subtree_iids(self, iid):
+        """Yield ``iid`` and the ids of all its descendants in the tree."""
+        stack = [iid]
+        while stack:
+            current = stack.pop()
+            yield current
+            stack.extend(self.tree.get_children(current))
+
+    def _capture_view_state(self, iids):
+        """Return the expanded tasks among ``iids`` and the selected task."""
         open_tasks = set()
-        selected_task = None
-        for iid, (task, _parent) in self.tree_items.items():
+        for iid in iids:
             try:
                 if self.tree.item(iid, "open"):
-                    open_tasks.add(task)
+                    open_tasks.add(self.tree_items[iid][0])
             except Exception:
                 pass
+        selected_task = None
         sel = self.tree.selection()
         if sel:
             selected_task = self.tree_items.get(sel[0], (None, None))[0]
-
-        for child in self.tree.get_children():
-            self.tree.delete(child)
-        self.tree_items.clear()
-
-        search_term = (
-            self.search_var.get().lower().strip() if hasattr(self, "search_var") else ""
-        )
-        hide_completed = (
-            bool(self.hide_completed_var.get())
-            if hasattr(self, "hide_completed_var")
-            else False
-        )
-        show_completed_only = (
-            bool(self.show_completed_only_var.get())
-            if hasattr(self, "show_completed_only_var")
-            else False
-        )
-        due_value = (
-            self.due_filter_var.get().strip() if hasattr(self, "due_filter_var") else ""
-        )
-        before = (
-            bool(self.due_before_var.get())
-            if hasattr(self, "due_before_var")
-            else False
-        )
-        after = (
-            bool(self.due_after_var.get()) if hasattr(self, "due_after_var") else False
-        )
-        prio_value = (
-            self.priority_filter_var.get().strip()
-            if hasattr(self, "priority_filter_var")
-            else ""
-        )
-        above = (
-            bool(self.priority_above_var.get())
-            if hasattr(self, "priority_above_var")
-            else False
-        )
-        below = (
-            bool(self.priority_below_var.get())
-            if hasattr(self, "priority_below_var")
-            else False
-        )
-
-        for task in self.controller.get_sub_tasks():
-            self._insert_task(
-                task,
-                "",
-                None,
-                search_term=search_term,
-                hide_completed=hide_completed,
-                show_completed_only=show_completed_only,
-                due_value=due_value,
-                before=before,
-                after=after,
-                prio_value=prio_value,
-                above=above,
-                below=below,
-            )
-
-        # Restore previously expanded nodes and selection after rebuilding the
-        # tree so that the user's view is preserved.
-        for iid, (task, _parent) in self.tree_items.items():
+        return open_tasks, selected_task
+
+    def _restore_view_state(self, iids, open_tasks, selected_task):
+        """Re-expand ``open_tasks`` and reselect ``selected_task`` among ``iids``."""
+        pending = list(iids)
+        while pending:
+            iid = pending.pop()
+            task = self.tree_items.get(iid, (None, None))[0]
+            if task is None:
+                continue
             if task in open_tasks:
                 try:
                     self.tree.item(iid, open=True)
                 except Exception:
                     pass
+                if iid in self._lazy_rows:
+                    self._expand_lazy_row(iid)
+                    pending.extend(
+                        sub
+                        for child in self.tree.get_children(iid)
+                        for sub in self._subtree_iids(child)
+                    )
             if selected_task is task:
                 try:
                     self.tree.selection_set(iid)
                 except Exception:
                     pass
 
+    def _forget(self, iid):
+        """Delete ``iid`` and its descendants from the tree and the mappings."""
+        for current in list(self._subtree_iids(iid)):
+            task, _parent = self.tree_items.pop(current, (None, None))
+            self._task_iids.pop(task, None)
+            self._lazy_rows.pop(current, None)
+        self.tree.delete(iid)
+
+    def _iid_for(self, task):
+        """Return the tree id under which children of ``task`` are shown.
+
+        The window's own task maps to the tree root ``""``; ``None`` is
+        returned when ``task`` is not displayed in this window.
+        """
+        if task is self.controller.task:
+            return ""
+        return self._task_iids.get(task)
+
+    def _rebuild_children(self, parent_task):
+        """Re-insert the children of ``parent_task`` keeping the view state."""
+        parent_iid = self._iid_for(parent_task)
+        if parent_iid is None or parent_iid in self._lazy_rows:
+            return
+        old_iids = [
+            iid
+            for child in self.tree.get_children(parent_iid)
+            for iid in self._subtree_iids(child)
+        ]
+        open_tasks, selected_task = self._capture_view_state(old_iids)
+        for child in self.tree.get_children(parent_iid):
+            self._forget(child)
+
+        display_parent = None if parent_iid == "" else parent_task
+        options = self._filter_options()
+        for task in parent_task.get_sub_tasks():
+            self._insert_task(task, parent_iid, display_parent, **options)
+
+        new_iids = [
+            iid
+            for child in self.tree.get_children(parent_iid)
+            for iid in self._subtree_iids(child)
+        ]
+        self._restore_view_state(new_iids, open_tasks, selected_task)
+
+    def refresh_window(self):
+        """Refresh the Treeview displaying the tasks."""
+        # Capture which tasks are currently expanded so we can restore the
+        # state after rebuilding the tree.  Also remember the currently
+        # selected task, if any.
+        open_tasks, selected_task = self._capture_view_state(list(self.tree_items))
+
+        for child in self.tree.get_children():
+            self.tree.delete(child)
+        self.tree_items.clear()
+        self._task_iids.clear()
+        self._lazy_rows.clear()
+
+        options = self._filter_options()
+        for task in self.controller.get_sub_tasks():
+            self._insert_task(task, "", None, **options)
+
+        # Restore previously expanded nodes and selection after rebuilding the
+        # tree so that the user's view is preserved.
+        self._restore_view_state(list(self.tree_items), open_tasks, selected_task)
+
+    # --- Change events --------------------------------------------------
+
+    def _on_task_event(self, event):
+        """Queue ``event`` and apply the pending events once the GUI is idle.
+
+        Several changes made in a single callback are thus coalesced into one
+        update of the tree.  Without an event loop (e.g. in tests) the event
+        is applied immediately.  Events published by other threads, through
+        a thread-safe controller, are handed to the Tk thread first.
+        """
+        if threading.get_ident() != self._tk_thread and hasattr(self.root, "after"):
+            self.root.after(0, self._on_task_event, event)
+            return
+        self._pending_events.append(event)
+        if self._flush_scheduled:
+            return
+        if hasattr(self.root, "after_idle"):
+            try:
+                self.root.after_idle(self._flush_events)
+                self._flush_scheduled = True
+                return
+            except Exception:
+                pass
+        self._flush_events()
+
+    def _flush_events(self):
+        """Apply all queued change events to the tree view."""
+        events, self._pending_events = self._pending_events, []
+        self._flush_scheduled = False
+        if self._detached or not events:
+            return
+
+        # Removals first so that positions computed for added rows only count
+        # rows whose tasks still exist.  Reordered lists, and lists with
+        # more rows added or removed than placing them one by one is worth
+        # (e.g. after a merge-import), are rebuilt once.
+        counts = collections.Counter(
+            event.parent for event in events if event.kind in (ADDED, REMOVED)
+        )
+        rebuilt = {
+            parent for parent, count in counts.items() if count > _BULK_EVENTS
+        }
+        for event in events:
+            if event.kind == REMOVED and event.parent not in rebuilt:
+                self._apply_removed(event)
+        for parent in rebuilt:
+            self._rebuild_children(parent)
+        for event in events:
+            if event.kind in (MOVED, REORDERED) and event.parent not in rebuilt:
+                rebuilt.add(event.parent)
+                self._rebuild_children(event.parent)
+        for event in events:
+            if event.kind == ADDED:
+                self._apply_added(event)
+        for event in events:
+            if event.kind == CHANGED:
+                self._apply_changed(event)
+
+    def _apply_removed(self, event):
+        """Delete the row of a removed task."""
+        iid = self._task_iids.get(event.task)
+        if iid is None or event.task in event.parent.get_sub_tasks():
+            return
+        self._forget(iid)
+
+    def _apply_added(self, event):
+        """Insert a row for an added task at its position among its siblings."""
+        task, parent = event.task, event.parent
+        if task in self._task_iids:
+            return
+        parent_iid = self._iid_for(parent)
+        if parent_iid is None or parent_iid in self._lazy_rows:
+            return
+        siblings = parent.get_sub_tasks()
+        try:
+            index = siblings.index(task)
+        except ValueError:
+            return
+        position = sum(1 for t in siblings[:index] if t in self._task_iids)
+        display_parent = None if parent_iid == "" else parent
+        self._insert_task(
+            task,
+            parent_iid,
+            display_parent,
+            position=position,
+            **self._filter_options(),
+        )
+
+    def _apply_changed(self, event):
+        """Update the row of a changed task in place."""
+        task = event.task
+        iid = self._task_iids.get(task)
+        visible = self._task_visible(task, **self._filter_options())
+        if iid is not None and visible:
+            display, color = self._format_task(task)
+            self.tree.tag_configure(color, foreground=color)
+            self.tree.item(iid, text=display, tags=(color,))
+        elif iid is not None or visible:
+            # The task was filtered in or out by the change
+            self._rebuild_children(event.parent)
+
     def use_theme(self, theme_name):
         """Change the ttk theme for this window."""
         try:
@@ -0,0 +1,65 @@
+"""
+This module runs long loads and saves off the GUI thread.
+
+Classes:
+- BackgroundJob: Runs a function on a worker thread with progress reporting.
+
+Usage:
+    The function receives a :py:class:`persistence.Progress` object that it
+    passes on to the persistence layer.  The GUI polls :pyattr:`done` from its
+    event loop and consumes :pyattr:`result` on its own thread, so the task
+    tree is never swapped in from the worker thread.
+"""
+import threading
+
+from persistence import OperationCancelled, Progress
+
+
+class BackgroundJob:
+    """
+    Runs ``func(progress)`` on a daemon thread.
+
+    Attributes:
+        progress (Progress): Progress and cancellation state of the job.
+        result: Return value of ``func`` once the job succeeded.
+        error (BaseException or None): Exception raised by ``func``, if any.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.progress = Progress()
+        self.result = None
+        self.error = None
+        self._thread = None
+        self._finished = threading.Event()
+
+    def run(self):
+        """Run the job on the calling thread."""
+        try:
+            self.result = self.func(self.progress)
+        except BaseException as err:  # reported to the GUI thread
+            self.error = err
+        finally:
+            self._finished.set()
+
+    def start(self):
+        """Start the job on a worker thread and return ``self``."""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Ask the job to stop at its next progress update."""
+        self.progress.cancel()
+
+    def wait(self, timeout=None):
+        """Block until the job finished; return ``True`` if it did."""
+        return self._finished.wait(timeout)
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    @property
+    def cancelled(self):
+        return isinstance(self.error, OperationCancelled)